@@ -10,14 +10,14 @@ from datetime import datetime, timezone
 
 from pydantic_ai import Agent
 # OpenAIModel is no longer directly used, SafeOpenAIModel is used instead
-from pydantic_ai.providers.openai import OpenAIProvider
-from pydantic_ai.mcp import MCPServerHTTP, MCPServerStdio
+from pydantic_ai.mcp import MCPServer, MCPServerHTTP
+from backend.ai.tool_memo import tool_memo_scope
 from pydantic_ai.messages import ModelMessage, ModelRequest, ModelResponse
 
 from backend.ai.models import (
     StepType, InvestigationStepModel, InvestigationPlanModel, 
     InvestigationDependencies, PlanRevisionRequest, PlanRevisionResult,
-    SafeOpenAIModel # Import the custom model
+    SafeOpenAIModel, get_openrouter_provider # Import the custom model
 )
 from backend.ai.step_result import StepResult
 from backend.ai.step_processor import StepProcessor
@@ -91,17 +91,11 @@ class AIAgent:
         self.settings = get_settings()
         self.model = SafeOpenAIModel(
             "openai/gpt-4.1",
-            provider=OpenAIProvider(
-                base_url='https://openrouter.ai/api/v1',
-                api_key=self.settings.openrouter_api_key,
-            ),
+            provider=get_openrouter_provider(),
         )
         self.planner_model = SafeOpenAIModel(
             "anthropic/claude-3.7-sonnet:thinking",
-            provider=OpenAIProvider(
-                base_url='https://openrouter.ai/api/v1',
-                api_key=self.settings.openrouter_api_key,
-            ),
+            provider=get_openrouter_provider(),
         )
         self.notebook_id = notebook_id
         self.available_data_sources = available_data_sources
@@ -153,10 +147,7 @@ class AIAgent:
         self.markdown_generator = Agent(
             SafeOpenAIModel(
                 "openai/gpt-4.1",
-                provider=OpenAIProvider(
-                    base_url='https://openrouter.ai/api/v1',
-                    api_key=self.settings.openrouter_api_key,
-                ),
+                provider=get_openrouter_provider(),
             ),
             output_type=str,
             system_prompt=MARKDOWN_GENERATOR_SYSTEM_PROMPT,
@@ -168,7 +159,7 @@ class AIAgent:
         ai_logger.info(f"AIAgent __init__ completed for notebook {notebook_id}.")
 
     @staticmethod
-    async def _create_mcp_server(connection_type: str, connection_manager: ConnectionManager) -> Optional[MCPServerStdio]:
+    async def _create_mcp_server(connection_type: str, connection_manager: ConnectionManager) -> Optional[MCPServer]:
         """Helper to get an MCP server instance for a given connection type."""
         try:
             default_conn = await connection_manager.get_default_connection(connection_type)
@@ -180,13 +171,13 @@ class AIAgent:
                 return None
 
             handler = get_handler(connection_type)
-            stdio_params = handler.get_stdio_params(default_conn.config)
-            ai_logger.info(f"AIAgent MCP setup: Retrieved StdioServerParameters for {connection_type}. Command: {stdio_params.command}, Args: {stdio_params.args}")
-            return MCPServerStdio(command=stdio_params.command, args=stdio_params.args, env=stdio_params.env)
+            server = handler.create_mcp_server(default_conn.config, connection_key=f"{connection_type}:{default_conn.id}")
+            ai_logger.info(f"AIAgent MCP setup: Created {type(server).__name__} for {connection_type}.")
+            return server
         except ValueError as ve:
             ai_logger.error(f"AIAgent MCP setup: Configuration error getting {connection_type} stdio params: {ve}", exc_info=True)
         except Exception as e:
-            ai_logger.error(f"AIAgent MCP setup: Error creating MCPServerStdio instance for {connection_type}: {e}", exc_info=True)
+            ai_logger.error(f"AIAgent MCP setup: Error creating MCP server for {connection_type}: {e}", exc_info=True)
         return None
 
     @classmethod
@@ -246,135 +237,136 @@ class AIAgent:
         Investigate a query by creating and executing a plan.
         Streams status updates as steps are completed.
         """
-        async with get_db_session() as db:
-            if not cell_tools:
-                raise ValueError("cell_tools is required for creating cells")
+        with tool_memo_scope():
+            async with get_db_session() as db:
+                if not cell_tools:
+                    raise ValueError("cell_tools is required for creating cells")
                 
-            notebook_id_str = notebook_id or self.notebook_id
-            if not notebook_id_str:
-                raise ValueError("notebook_id is required for creating cells")
+                notebook_id_str = notebook_id or self.notebook_id
+                if not notebook_id_str:
+                    raise ValueError("notebook_id is required for creating cells")
             
-            # Fetch the actual Notebook object
-            try:
-                notebook_uuid = UUID(notebook_id_str)
-                notebook: Notebook = await self.notebook_manager.get_notebook(db=db, notebook_id=notebook_uuid)
-            except ValueError:
-                ai_logger.error(f"Invalid notebook_id format: {notebook_id_str}")
-                raise ValueError(f"Invalid notebook_id format: {notebook_id_str}")
-            except Exception as e:
-                ai_logger.error(f"Failed to fetch notebook {notebook_id_str}: {e}", exc_info=True)
-                raise ValueError(f"Failed to fetch notebook {notebook_id_str}")
-
-            # Create the investigation plan
-            plan = await self.create_investigation_plan(
-                query,
-                notebook_id_str,
-                message_history,
-                notebook_context_summary,
-            )
+                # Fetch the actual Notebook object
+                try:
+                    notebook_uuid = UUID(notebook_id_str)
+                    notebook: Notebook = await self.notebook_manager.get_notebook(db=db, notebook_id=notebook_uuid)
+                except ValueError:
+                    ai_logger.error(f"Invalid notebook_id format: {notebook_id_str}")
+                    raise ValueError(f"Invalid notebook_id format: {notebook_id_str}")
+                except Exception as e:
+                    ai_logger.error(f"Failed to fetch notebook {notebook_id_str}: {e}", exc_info=True)
+                    raise ValueError(f"Failed to fetch notebook {notebook_id_str}")
+
+                # Create the investigation plan
+                plan = await self.create_investigation_plan(
+                    query,
+                    notebook_id_str,
+                    message_history,
+                    notebook_context_summary,
+                )
             
-            # Yield plan created event
-            yield PlanCreatedEvent(thinking=plan.thinking, session_id=session_id, notebook_id=notebook_id_str)
+                # Yield plan created event
+                yield PlanCreatedEvent(thinking=plan.thinking, session_id=session_id, notebook_id=notebook_id_str)
             
-            # Initialize tracking
-            plan_step_id_to_cell_ids: Dict[str, List[UUID]] = {}
-            executed_steps: Dict[str, Any] = {}
-            step_results: Dict[str, Any] = {}
-
-            # Create plan explanation cell if there are multiple steps
-            if len(plan.steps) > 1:
-                plan_cell_event = await self.create_plan_explanation_cell(plan, cell_tools, session_id, notebook_id_str)
-                if plan_cell_event:
-                    yield plan_cell_event
-
-            # Execute the plan steps
-            remaining_steps = plan.steps.copy()
-
-            while remaining_steps:
-                # Get executable steps (all dependencies satisfied)
-                executable_steps = [
-                    step for step in remaining_steps
-                    if all(dep in executed_steps for dep in step.dependencies)
-                ]
-
-                if not executable_steps:
-                    # Check if we're blocked on dependencies
-                    is_stalled, stall_error = self.check_plan_stalled(remaining_steps, executed_steps, session_id, notebook_id_str)
-                    if is_stalled:
-                        if stall_error:
-                            yield stall_error
+                # Initialize tracking
+                plan_step_id_to_cell_ids: Dict[str, List[UUID]] = {}
+                executed_steps: Dict[str, Any] = {}
+                step_results: Dict[str, Any] = {}
+
+                # Create plan explanation cell if there are multiple steps
+                if len(plan.steps) > 1:
+                    plan_cell_event = await self.create_plan_explanation_cell(plan, cell_tools, session_id, notebook_id_str)
+                    if plan_cell_event:
+                        yield plan_cell_event
+
+                # Execute the plan steps
+                remaining_steps = plan.steps.copy()
+
+                while remaining_steps:
+                    # Get executable steps (all dependencies satisfied)
+                    executable_steps = [
+                        step for step in remaining_steps
+                        if all(dep in executed_steps for dep in step.dependencies)
+                    ]
+
+                    if not executable_steps:
+                        # Check if we're blocked on dependencies
+                        is_stalled, stall_error = self.check_plan_stalled(remaining_steps, executed_steps, session_id, notebook_id_str)
+                        if is_stalled:
+                            if stall_error:
+                                yield stall_error
+                            break
                         break
-                    break
                 
-                # Execute the first available step
-                current_step = executable_steps[0]
-                remaining_steps.remove(current_step)
+                    # Execute the first available step
+                    current_step = executable_steps[0]
+                    remaining_steps.remove(current_step)
 
-                # Get the agent type for this step
-                agent_type = self._get_agent_type_for_step(current_step.step_type)
+                    # Get the agent type for this step
+                    agent_type = self._get_agent_type_for_step(current_step.step_type)
                 
-                # Yield step started event
-                yield StepStartedEvent(
-                    step_id=current_step.step_id, 
-                    agent_type=agent_type, 
-                    session_id=session_id, 
-                    notebook_id=notebook_id_str
-                )
+                    # Yield step started event
+                    yield StepStartedEvent(
+                        step_id=current_step.step_id, 
+                        agent_type=agent_type, 
+                        session_id=session_id, 
+                        notebook_id=notebook_id_str
+                    )
                 
-                # Process the step
-                async for event in self.step_processor.process_step(
-                    step=current_step,
-                    executed_steps=executed_steps,
-                    step_results=step_results,
-                    plan_step_id_to_cell_ids=plan_step_id_to_cell_ids,
-                    cell_tools=cell_tools,
-                    session_id=session_id,
-                    db=db,
-                    original_query=query
-                ):
-                    # Process specific events for AIAgent's internal state first
-                    processed_internally = False
-                    if isinstance(event, StepExecutionCompleteEvent):
-                        # Update executed_steps based on the StepExecutionCompleteEvent
-                        step_result = step_results.get(current_step.step_id)
+                    # Process the step
+                    async for event in self.step_processor.process_step(
+                        step=current_step,
+                        executed_steps=executed_steps,
+                        step_results=step_results,
+                        plan_step_id_to_cell_ids=plan_step_id_to_cell_ids,
+                        cell_tools=cell_tools,
+                        session_id=session_id,
+                        db=db,
+                        original_query=query
+                    ):
+                        # Process specific events for AIAgent's internal state first
+                        processed_internally = False
+                        if isinstance(event, StepExecutionCompleteEvent):
+                            # Update executed_steps based on the StepExecutionCompleteEvent
+                            step_result = step_results.get(current_step.step_id)
                         
-                        if step_result and isinstance(step_result, StepResult):
-                            executed_steps[current_step.step_id] = {
-                                "step": current_step.model_dump(),
-                                "content": self._get_step_summary_content(step_result),
-                                "error": step_result.get_combined_error()
-                            }
-                        else:
-                            ai_logger.warning(f"StepResult not found or invalid for step {current_step.step_id} upon StepExecutionCompleteEvent. Fallback.")
-                            executed_steps[current_step.step_id] = {
-                                "step": current_step.model_dump(),
-                                "content": None,
-                                "error": event.step_error or "Step result missing after execution"
-                            }
-                        processed_internally = True
-                        # This event will also be yielded below by the BaseEvent check
-
-                    # Forward all BaseEvents (including StepExecutionCompleteEvent after its specific processing) to the client
-                    if isinstance(event, BaseEvent):
-                        yield event
-                    elif not processed_internally:
-                        ai_logger.warning(
-                            f"Received unexpected event type from StepProcessor: {type(event)}. This event was not yielded."
-                        )
-
-            # All steps completed
-            ai_logger.info(f"Investigation plan execution finished for notebook {notebook_id_str}")
+                            if step_result and isinstance(step_result, StepResult):
+                                executed_steps[current_step.step_id] = {
+                                    "step": current_step.model_dump(),
+                                    "content": self._get_step_summary_content(step_result),
+                                    "error": step_result.get_combined_error()
+                                }
+                            else:
+                                ai_logger.warning(f"StepResult not found or invalid for step {current_step.step_id} upon StepExecutionCompleteEvent. Fallback.")
+                                executed_steps[current_step.step_id] = {
+                                    "step": current_step.model_dump(),
+                                    "content": None,
+                                    "error": event.step_error or "Step result missing after execution"
+                                }
+                            processed_internally = True
+                            # This event will also be yielded below by the BaseEvent check
+
+                        # Forward all BaseEvents (including StepExecutionCompleteEvent after its specific processing) to the client
+                        if isinstance(event, BaseEvent):
+                            yield event
+                        elif not processed_internally:
+                            ai_logger.warning(
+                                f"Received unexpected event type from StepProcessor: {type(event)}. This event was not yielded."
+                            )
+
+                # All steps completed
+                ai_logger.info(f"Investigation plan execution finished for notebook {notebook_id_str}")
             
-            # Yield investigation complete event
-            yield InvestigationCompleteEvent(session_id=session_id, notebook_id=notebook_id_str)
+                # Yield investigation complete event
+                yield InvestigationCompleteEvent(session_id=session_id, notebook_id=notebook_id_str)
             
-            # Save the notebook state
-            if 'notebook' in locals() and notebook is not None:
-                try:
-                    await self.notebook_manager.save_notebook(db=db, notebook_id=notebook.id, notebook=notebook)
-                    ai_logger.info(f"Successfully saved notebook {notebook.id} state after investigation.")
-                except Exception as save_err:
-                    ai_logger.error(f"Failed to save notebook {notebook.id} state: {save_err}", exc_info=True)
+                # Save the notebook state
+                if 'notebook' in locals() and notebook is not None:
+                    try:
+                        await self.notebook_manager.save_notebook(db=db, notebook_id=notebook.id, notebook=notebook)
+                        ai_logger.info(f"Successfully saved notebook {notebook.id} state after investigation.")
+                    except Exception as save_err:
+                        ai_logger.error(f"Failed to save notebook {notebook.id} state: {save_err}", exc_info=True)
 
     def _get_step_summary_content(self, step_result: StepResult) -> str:
         """Get a summary content string for the step result"""
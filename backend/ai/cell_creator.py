@@ -8,13 +8,19 @@ from uuid import UUID, uuid4
 
 from backend.ai.models import StepType, InvestigationStepModel
 from backend.ai.events import AgentType, ToolSuccessEvent
+from backend.ai.tool_memo import get_current_tool_memo
 from backend.core.cell import CellType, CellResult, CellStatus
 from backend.ai.chat_tools import NotebookCellTools, CreateCellParams
 from backend.core.query_result import InvestigationReport
 from backend.services.connection_manager import ConnectionManager
+from backend.ai.utils.truncation import render_tool_output, truncate_tool_output
+from backend.config import get_settings
 
 ai_logger = logging.getLogger("ai")
 
+# Tools whose results become a code index query cell (MCP dense search and the native hybrid search)
+CODE_SEARCH_TOOL_NAMES = frozenset({"qdrant-find", "hybrid_code_search"})
+
 class CellCreator:
     """Handles cell creation for different step types"""
     def __init__(self, notebook_id: str, connection_manager: ConnectionManager):
@@ -30,10 +36,10 @@ class CellCreator:
         session_id: str
     ) -> Tuple[Optional[UUID], Optional[CreateCellParams], Optional[str]]:
         """Create a cell for code index query results and return its ID, params and any error"""
-        if not tool_event.tool_call_id or tool_event.tool_name != "qdrant-find":
-            return None, None, f"Tool event is not for qdrant-find or missing tool_call_id for step {step.step_id}"
+        if not tool_event.tool_call_id or tool_event.tool_name not in CODE_SEARCH_TOOL_NAMES:
+            return None, None, f"Tool event is not a code search ({tool_event.tool_name}) or missing tool_call_id for step {step.step_id}"
 
-        # The result from qdrant-find is expected to be a list of search hits (dictionaries)
+        # The result of a code search tool is expected to be a list of search hits (dictionaries)
         search_results = tool_event.tool_result if isinstance(tool_event.tool_result, list) else []
 
         # For content, we can create a summary or just store the raw results.
@@ -43,7 +49,10 @@ class CellCreator:
         if search_results:
             cell_content_lines.append(f"Found {len(search_results)} results:\n")
             for i, hit in enumerate(search_results[:5]): # Display first 5 hits in markdown
-                file_path = hit.get("metadata", {}).get("file_path", "N/A")
+                # hybrid_code_search hits are flat; qdrant-find nests the payload under metadata
+                file_path = hit.get("file_path") or hit.get("metadata", {}).get("file_path", "N/A")
+                if hit.get("start_line") is not None:
+                    file_path = f"{file_path}:{hit['start_line']}-{hit.get('end_line', hit['start_line'])}"
                 score = hit.get("score", "N/A")
                 # Robust score formatting – handle non-numeric gracefully
                 if isinstance(score, (int, float)):
@@ -53,7 +62,7 @@ class CellCreator:
 
                 # snippet = hit.get("document", {}).get("page_content", "Snippet unavailable")[:200]  # Optionally include snippet
                 # For now, let's assume the payload is directly the document content or a summary
-                payload_content = str(hit.get("payload", "Content unavailable"))[:200]
+                payload_content = str(hit.get("content") or hit.get("payload", "Content unavailable"))[:200]
 
 
                 cell_content_lines.append(f"**{i+1}. File:** `{file_path}` (Score: {score_str})")
@@ -110,7 +119,8 @@ class CellCreator:
         step: InvestigationStepModel, 
         result: Any,  # Should be MarkdownQueryResult
         dependency_cell_ids: List[UUID],
-        session_id: str
+        session_id: str,
+        cell_id: Optional[UUID] = None  # Pre-assigned ID of a streamed preview
     ) -> Tuple[Optional[UUID], Optional[CreateCellParams], Optional[str]]:
         """Create a markdown cell and return its ID, params and any error"""
         error = getattr(result, "error", None)
@@ -131,7 +141,7 @@ class CellCreator:
         )
         
         try:
-            cell_result = await cell_tools.create_cell(params=cell_params)
+            cell_result = await cell_tools.create_cell(params=cell_params, cell_id=cell_id)
             cell_id_str = cell_result.get("cell_id")
             if cell_id_str:
                 return UUID(cell_id_str), cell_params, None
@@ -141,17 +151,24 @@ class CellCreator:
             ai_logger.error(f"Failed to create markdown cell for step {step.step_id}: {e}", exc_info=True)
             return None, cell_params, str(e)
     
+    @staticmethod
+    def report_cell_content(report: Any) -> str:
+        """Markdown shown in a report cell; also used for previews of partially generated reports."""
+        title = getattr(report, "title", None) or "Generating..."
+        return f"# Investigation Report: {title}\n\n_Structured report data generated._"
+
     async def create_report_cell(
         self,
         cell_tools: NotebookCellTools, 
         step: InvestigationStepModel, 
         report: InvestigationReport,
         dependency_cell_ids: List[UUID],
-        session_id: str
+        session_id: str,
+        cell_id: Optional[UUID] = None  # Pre-assigned ID of a streamed preview
     ) -> Tuple[Optional[UUID], Optional[CreateCellParams], Optional[str]]:
         """Create an investigation report cell and return its ID, params and any error"""
         error = report.error
-        report_cell_content = f"# Investigation Report: {report.title}\n\n_Structured report data generated._"
+        report_cell_content = self.report_cell_content(report)
         report_data_dict = report.model_dump(mode='json')
         
         report_cell_metadata = {
@@ -176,7 +193,7 @@ class CellCreator:
         )
         
         try:
-            report_cell_result = await cell_tools.create_cell(params=report_cell_params)
+            report_cell_result = await cell_tools.create_cell(params=report_cell_params, cell_id=cell_id)
             report_cell_id_str = report_cell_result.get("cell_id")
             if report_cell_id_str:
                 return UUID(report_cell_id_str), report_cell_params, None
@@ -343,6 +360,10 @@ class CellCreator:
             "original_plan_step_id": step.step_id,
             "external_tool_call_id": tool_event.tool_call_id
         }
+        # Mark cells whose result was served from the investigation's tool memo
+        tool_memo = get_current_tool_memo()
+        if tool_memo is not None and tool_memo.consume_cached_marker(tool_event.tool_name, tool_event.tool_args):
+            cell_metadata["cached"] = True
         
         # Serialize result content
         tool_result_content = tool_event.tool_result
@@ -381,14 +402,16 @@ class CellCreator:
             return None, cell_params, error_msg
     
     def _serialize_tool_result(self, result: Any, tool_name: str) -> Optional[Union[Dict, List, str, int, float, bool]]:
-        """Serialize tool result to a JSON-compatible format"""
+        """Serialize tool result to a JSON-compatible format, elided to the cell size budget"""
         from pydantic import BaseModel
         
-        if isinstance(result, (dict, list, str, int, float, bool, type(None))):
+        if isinstance(result, (dict, list, str)):
+            return truncate_tool_output(result, limit=get_settings().tool_result_cell_max_chars)
+        elif isinstance(result, (int, float, bool, type(None))):
             return result
         elif isinstance(result, BaseModel):
             try:
-                return result.model_dump(mode='json')
+                return truncate_tool_output(result.model_dump(mode='json'), limit=get_settings().tool_result_cell_max_chars)
             except Exception as e:
                 ai_logger.warning(f"Failed to dump Pydantic model result for {tool_name}: {e}")
                 return str(result)
@@ -412,9 +435,7 @@ class CellCreator:
         tool_name = tool_event.tool_name or "log_ai_tool"
 
         # Truncate tool result for inline markdown preview
-        preview_str = str(tool_event.tool_result)
-        if len(preview_str) > 500:
-            preview_str = preview_str[:500] + " …"
+        preview_str = render_tool_output(tool_event.tool_result, 500)
 
         cell_content = (
             f"## Log-AI tool result: `{tool_name}`\n\n"
@@ -0,0 +1,128 @@
+"""
+Streaming previews for cells whose content is generated by a model.
+
+Markdown, report and summary cells used to appear only after the full model
+response arrived. StreamingCellPreview publishes the partial content to the
+notebook's websocket clients as a provisional cell in the STREAMING status,
+throttled to one update per `cell_stream_update_interval` seconds. Nothing is
+written to the database while streaming; the caller persists the cell once,
+with the final content, under the same `cell_id` so clients can swap the
+preview for the stored cell.
+"""
+
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from uuid import UUID, uuid4
+
+from pydantic import ValidationError
+
+from backend.config import get_settings
+from backend.core.cell import Cell, CellResult, CellStatus, CellType
+
+cell_streaming_logger = logging.getLogger("ai.cell_streaming")
+
+
+async def stream_partial_outputs(streamed_run: Any, debounce_by: Optional[float] = 0.1) -> AsyncIterator[Tuple[Any, bool]]:
+    """
+    Yield (partial_output, is_last) from a pydantic-ai StreamedRunResult.
+
+    Structured outputs are validated in partial mode; chunks that cannot be
+    validated yet (e.g. required fields not streamed so far) are skipped.
+    """
+    async for message, is_last in streamed_run.stream_structured(debounce_by=debounce_by):
+        try:
+            output = await streamed_run.validate_structured_output(message, allow_partial=not is_last)
+        except ValidationError:
+            if is_last:
+                raise
+            continue
+        yield output, is_last
+
+
+class StreamingCellPreview:
+    """Throttled websocket previews of a cell that is still being generated."""
+
+    def __init__(
+        self,
+        notebook_manager: Any,
+        notebook_id: str,
+        cell_type: CellType,
+        metadata: Optional[Dict[str, Any]] = None,
+        dependencies: Optional[List[UUID]] = None,
+        min_interval: Optional[float] = None,
+    ):
+        self.notebook_manager = notebook_manager
+        self.notebook_id = notebook_id
+        self.cell_type = cell_type
+        self.metadata = metadata or {}
+        self.dependencies = dependencies or []
+        self.min_interval = get_settings().cell_stream_update_interval if min_interval is None else min_interval
+        self.cell_id: UUID = uuid4()
+        self.updates_sent = 0
+        self._last_sent_at: Optional[float] = None
+        self._sent_content: Optional[str] = None
+        self._pending: Optional[Tuple[str, Any]] = None
+        self.completed = False
+
+    async def update(self, content: str, result_content: Any = None) -> bool:
+        """Record new partial content; publish it if the throttle interval has elapsed."""
+        self._pending = (content, result_content)
+        now = time.monotonic()
+        if self._last_sent_at is not None and now - self._last_sent_at < self.min_interval:
+            return False
+        return await self.flush()
+
+    async def flush(self) -> bool:
+        """Publish the latest pending content immediately (no-op if unchanged)."""
+        if self._pending is None:
+            return False
+        content, result_content = self._pending
+        self._pending = None
+        if content == self._sent_content and result_content is None:
+            return False
+        await self._publish(content, CellStatus.STREAMING, result_content)
+        return True
+
+    async def complete(self, content: str, status: CellStatus = CellStatus.SUCCESS, result_content: Any = None, error: Optional[str] = None) -> None:
+        """Publish the final state of a cell that was not persisted (e.g. its creation failed)."""
+        self._pending = None
+        self.completed = True
+        await self._publish(content, status, result_content, error)
+
+    def persisted(self) -> None:
+        """
+        The cell was stored under `cell_id`: stop previewing without publishing.
+        Clients merge previews into the cell they hold, so a final preview would overwrite the stored cell.
+        """
+        self._pending = None
+        self.completed = True
+
+    async def fail(self, error: str) -> None:
+        """Mark the cell as errored, keeping the content streamed so far, unless it was already completed."""
+        if self.completed:
+            return
+        content = self._pending[0] if self._pending else (self._sent_content or "")
+        await self.complete(content, CellStatus.ERROR, error=error)
+
+    async def _publish(self, content: str, status: CellStatus, result_content: Any = None, error: Optional[str] = None) -> None:
+        if not self.notebook_manager:
+            return
+        cell = Cell(
+            id=self.cell_id,
+            type=self.cell_type,
+            content=content,
+            status=status,
+            dependencies=set(self.dependencies),
+            cell_metadata={**self.metadata, "streaming": status == CellStatus.STREAMING},
+            result=CellResult(content=result_content, error=error) if result_content is not None or error else None,
+        )
+        try:
+            await self.notebook_manager.publish_cell_preview(UUID(str(self.notebook_id)), cell.model_dump(mode="json"))
+        except Exception as e:
+            # Previews are best-effort; the persisted cell is what counts.
+            cell_streaming_logger.warning(f"Failed to publish preview for streaming cell {self.cell_id}: {e}")
+            return
+        self._last_sent_at = time.monotonic()
+        self._sent_content = content
+        self.updates_sent += 1
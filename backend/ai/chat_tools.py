@@ -147,7 +147,8 @@ class NotebookCellTools:
                     tool_arguments=params.tool_arguments,
                     result=params.result,
                     status=params.status,
-                    connection_id=params.connection_id
+                    connection_id=params.connection_id,
+                    cell_id=kwargs.get('cell_id')
                 )
                 
                 tools_logger.info(f"Created cell {cell.id} in notebook {notebook_id}")
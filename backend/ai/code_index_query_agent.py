@@ -8,7 +8,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.core.logging import get_logger
 from backend.ai.step_agents import StepAgent
-from backend.ai.models import InvestigationStepModel, SafeOpenAIModel
+from backend.ai.models import InvestigationStepModel, SafeOpenAIModel, get_openrouter_provider
 from backend.ai.events import (
     AgentType,
     StatusType,
@@ -24,9 +24,10 @@ from backend.services.connection_handlers.registry import get_handler
 
 # pydantic-ai imports
 from pydantic_ai import Agent, CallToolsNode, UnexpectedModelBehavior
-from pydantic_ai.providers.openai import OpenAIProvider
 from pydantic_ai.messages import FunctionToolCallEvent, FunctionToolResultEvent, ModelMessage
 from pydantic_ai.mcp import MCPServerStdio
+from backend.ai.tool_memo import MemoizingMCPServerStdio
+from backend.ai.code_search_tools import create_code_search_tools
 from mcp.shared.exceptions import McpError
 
 logger = get_logger(__name__)
@@ -38,29 +39,36 @@ logger = get_logger(__name__)
 SYSTEM_PROMPT = (
     """
 You are a helpful AI assistant specialised in searching large codebases that have
-been indexed into Qdrant.  You have access to the `qdrant.qdrant-find` tool via
-your MCP connection.  Given a natural-language description of what the user is
-looking for, you should:
-
-1. Convert the description into an appropriate semantic search query.
-2. Call the `qdrant.qdrant-find` tool exactly once, providing the following
+been indexed into Qdrant.  You have access to the `hybrid_code_search` tool and,
+via your MCP connection, the `qdrant.qdrant-find` tool.  Given a natural-language
+description of what the user is looking for, you should:
+
+1. Convert the description into an appropriate search query.  Keep any exact
+   identifiers, error messages or config keys from the description verbatim –
+   `hybrid_code_search` matches them literally as well as semantically.
+2. Call the `hybrid_code_search` tool exactly once, providing the following
    arguments:
       • `query`:   the search text you generated.
       • `collection_name`: the Qdrant collection that was provided to you.
       • `limit`:   the maximum number of results you should return (default 5).
+   Only if `hybrid_code_search` is unavailable or fails, call
+   `qdrant.qdrant-find` once with the same `query`, `collection_name` and `limit`.
 3. Do NOT attempt to post-process or re-call the tool.  Simply return the tool
    result to the caller.
 
+Each hit is a chunk of a file rather than the whole file; it carries
+`file_path`, `start_line`/`end_line` and the `symbol` (function/class) it covers.
+
 Return format guidance:
-• The raw list returned by `qdrant.qdrant-find` should be forwarded directly –
+• The raw list returned by the tool should be forwarded directly –
   do not wrap it in additional prose.
 """
 )
 
 
 class CodeIndexQueryAgent(StepAgent):
-    """Step agent that leverages a pydantic-ai Agent + Qdrant MCP to perform a
-    semantic search over an indexed codebase.
+    """Step agent that leverages a pydantic-ai Agent + Qdrant (hybrid search tool
+    and MCP) to search an indexed codebase.
     """
 
     def __init__(
@@ -82,10 +90,7 @@ class CodeIndexQueryAgent(StepAgent):
         settings = get_settings()
         self._model = SafeOpenAIModel(
             "openai/gpt-4.1",
-            provider=OpenAIProvider(
-                base_url="https://openrouter.ai/api/v1",
-                api_key=settings.openrouter_api_key,
-            ),
+            provider=get_openrouter_provider(),
         )
 
         self._agent: Optional[Agent] = None  # lazy init in _ensure_agent
@@ -109,7 +114,10 @@ class CodeIndexQueryAgent(StepAgent):
             # Assuming the git_repo handler provides Qdrant server params
             stdio_params = handler.get_stdio_params(default_conn.config)
             logger.info(f"Retrieved StdioServerParameters for Qdrant MCP via {connection_type}. Command: {stdio_params.command}")
-            return MCPServerStdio(command=stdio_params.command, args=stdio_params.args, env=stdio_params.env)
+            return MemoizingMCPServerStdio(
+                command=stdio_params.command, args=stdio_params.args, env=stdio_params.env,
+                connection_key=f"{connection_type}:{default_conn.id}",
+            )
         except ValueError as ve:
             logger.error(f"Configuration error getting {connection_type} stdio params for Qdrant MCP: {ve}", exc_info=True)
         except Exception as e:
@@ -127,15 +135,18 @@ class CodeIndexQueryAgent(StepAgent):
         if self.qdrant_mcp_server is None:
             self.qdrant_mcp_server = await self._get_qdrant_mcp_server()
 
-        # If fetching failed, we can't proceed
-        if self.qdrant_mcp_server is None:
+        search_tools = create_code_search_tools()
+
+        # If neither search path is available, we can't proceed
+        if self.qdrant_mcp_server is None and not search_tools:
             logger.error("Could not obtain Qdrant MCP server configuration.")
             return None
 
         self._agent = Agent(
             model=self._model,
             system_prompt=SYSTEM_PROMPT,
-            mcp_servers=[self.qdrant_mcp_server], # Use the fetched server
+            tools=search_tools,
+            mcp_servers=[self.qdrant_mcp_server] if self.qdrant_mcp_server else [],
         )
         logger.info("pydantic-ai Agent for CodeIndexQueryAgent initialized.")
         return self._agent
@@ -179,7 +190,7 @@ class CodeIndexQueryAgent(StepAgent):
         # Ensure we have a working pydantic-ai Agent (and therefore MCP server)
         agent = await self._ensure_agent() # Now async
         if agent is None:
-            err_msg = "Qdrant MCP server is not available – cannot execute code-index search."
+            err_msg = "Neither hybrid search nor the Qdrant MCP server is available – cannot execute code-index search."
             yield ToolErrorEvent(
                 original_plan_step_id=step.step_id,
                 tool_name="qdrant-find",
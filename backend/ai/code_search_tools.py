@@ -0,0 +1,77 @@
+"""Hybrid code search tool to expose to Pydantic-AI agents.
+
+`qdrant-find` (mcp-server-qdrant) only runs a dense semantic query, which
+misses exact identifiers, error strings and config keys. `hybrid_code_search`
+queries the same git_repo collection with both the dense vector and the BM25
+sparse vector written at index time and fuses the two rankings (see
+`backend.services.code_search`).
+
+The tool is generated via `create_code_search_tools` so that the Qdrant URL and
+embedding model can be captured in a closure. If Qdrant is not configured the
+helper returns an empty list, which is safe to pass to the Agent constructor.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from qdrant_client import AsyncQdrantClient
+
+from backend.services.code_search import hybrid_search
+from backend.services.git_index_pipeline import embed_documents, fastembed_vector_name, get_embedding_executor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+MAX_RESULTS = 20
+
+
+def create_code_search_tools(
+    qdrant_url: Optional[str] = None,
+    embedding_model: Optional[str] = None,
+):
+    """Return `[hybrid_code_search]`, or `[]` if no Qdrant URL is configured.
+
+    Defaults come from the same environment variables the git_repo indexer uses
+    (`SHERLOG_QDRANT_DB_URL`, `SHERLOG_QDRANT_EMBEDDING_MODEL`).
+    """
+    qdrant_url = qdrant_url or os.getenv("SHERLOG_QDRANT_DB_URL")
+    embedding_model = embedding_model or os.getenv("SHERLOG_QDRANT_EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL)
+    if not qdrant_url:
+        logger.warning("SHERLOG_QDRANT_DB_URL not set – hybrid code search tool will not be registered.")
+        return []
+
+    async def embed_query(text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        vectors = await loop.run_in_executor(get_embedding_executor(), embed_documents, embedding_model, [text])
+        return vectors[0]
+
+    async def hybrid_code_search(query: str, collection_name: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Search an indexed repository for code matching `query`.
+
+        Combines semantic (dense) search with exact term (BM25) matching, so both
+        descriptions ("where are retries configured") and literal identifiers,
+        error messages or config keys ("MAX_RETRY_COUNT", "connection reset by
+        peer") find the right chunk. Returns up to `limit` hits, best first, each
+        with file_path, start_line, end_line, symbol, score and content.
+        """
+        limit = max(1, min(int(limit), MAX_RESULTS))
+        client = AsyncQdrantClient(url=qdrant_url, prefer_grpc=True, timeout=30)
+        try:
+            return await hybrid_search(
+                client,
+                collection_name,
+                query,
+                dense_vector_name=fastembed_vector_name(embedding_model),
+                embed_query=embed_query,
+                limit=limit,
+            )
+        except Exception as exc:  # noqa: BLE001 (returned to the model, logged here)
+            logger.error("hybrid_code_search failed for collection %s: %s", collection_name, exc, exc_info=True)
+            raise
+        finally:
+            await client.close()
+
+    hybrid_code_search.__name__ = "hybrid_code_search"
+    return [hybrid_code_search]
@@ -0,0 +1,58 @@
+"""Dataset description tool to expose to the Python agent.
+
+`describe_dataset` returns the schema, row count and a few sample rows of a
+delimited file (CSV/TSV) plus the path of its Parquet copy, so the agent can
+plan its analysis without loading the data and read the columnar copy instead
+of re-parsing the text on every script. Descriptions and conversions are cached
+per file by `backend.core.tabular_staging`.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict
+
+from pydantic import BaseModel, Field
+
+from backend.core.tabular_staging import describe_tabular_file
+
+logger = logging.getLogger(__name__)
+
+
+class DescribeDatasetParams(BaseModel):
+    """Parameters for the `describe_dataset` tool."""
+    path: str = Field(..., description="ABSOLUTE host path of a CSV/TSV file.")
+
+
+def create_dataset_tools():
+    """Return `[describe_dataset]`."""
+
+    async def describe_dataset(params: DescribeDatasetParams) -> Dict[str, Any]:
+        """Schema, row count and sample rows of a CSV/TSV file, without loading it.
+
+        The result also contains `load_with`: a pandas expression that loads the
+        file's cached Parquet copy (memory-mapped) – use it in `run_script`
+        instead of `load_csv` for large files.
+
+        Raises ValueError if the file does not exist or is not tabular.
+        """
+        if not os.path.isfile(params.path):
+            raise ValueError(f"File not found: {params.path}")
+        try:
+            info = await asyncio.to_thread(describe_tabular_file, params.path)
+        except Exception as exc:  # noqa: BLE001
+            logger.error("describe_dataset failed for %s: %s", params.path, exc, exc_info=True)
+            raise ValueError(f"Could not read {params.path} as a table: {exc}") from exc
+        if info is None:
+            raise ValueError(f"{params.path} does not look like delimited tabular data")
+        return {
+            "path": info.source_path,
+            "row_count": info.row_count,
+            "columns": info.columns,
+            "sample": info.sample,
+            "columnar_path": info.columnar_path,
+            "load_with": info.load_hint(),
+        }
+
+    describe_dataset.__name__ = "describe_dataset"
+    return [describe_dataset]
@@ -192,6 +192,7 @@ class FinalStatusEvent(BaseEvent):
     agent_type: Optional[AgentType] = Field(None, description="Agent reporting the final status")
     attempts: Optional[int] = Field(None, description="Number of attempts made")
     message: Optional[str] = Field(None, description="Optional final message")
+    attempt_timings: Optional[List[Dict[str, Any]]] = Field(None, description="Per-attempt duration and outcome, if tracked")
 
 
 class FatalErrorEvent(BaseEvent):
@@ -238,6 +239,7 @@ class StepExecutionCompleteEvent(BaseEvent):
     python_step_has_tool_errors: bool = Field(False, description="Did any Python tool fail within this step?")
     code_index_query_step_has_tool_errors: bool = Field(False, description="Did any Code Index Query tool fail within this step?") # Added
     step_outputs: Optional[List[Any]] = Field(None, description="Collected outputs for the step (especially for GitHub multi-tool steps)")
+    context_tokens: Optional[int] = Field(None, description="Estimated prompt tokens assembled for this step (description + dependency context)")
 
 
 class StepCompletedEvent(BaseEvent):
@@ -17,11 +17,9 @@ from pydantic_ai.messages import (
     ModelMessage, # For message_history
 )
 # from pydantic_ai.models.openai import OpenAIModel # Replaced with SafeOpenAIModel
-from backend.ai.models import SafeOpenAIModel # Added for safer timestamp handling
-from pydantic_ai.providers.openai import OpenAIProvider
-from pydantic_ai.mcp import MCPServerStdio
+from backend.ai.models import SafeOpenAIModel, get_openrouter_provider # Added for safer timestamp handling
+from pydantic_ai.mcp import MCPServer
 from mcp.shared.exceptions import McpError 
-from mcp import StdioServerParameters
 
 from backend.config import get_settings
 from backend.ai.events import (
@@ -37,27 +35,11 @@ from backend.ai.events import (
 )
 from backend.services.connection_manager import get_connection_manager
 from backend.services.connection_handlers.registry import get_handler
-from backend.ai.utils.context_utils import _truncate_output, TOOL_RESULT_MAX_CHARS as DEFAULT_TRUNCATE_LIMIT
+from backend.ai.utils.truncation import truncate_tool_output, TOOL_RESULT_MAX_CHARS
 
 # Updated logger name
 filesystem_agent_logger = logging.getLogger("ai.filesystem_agent")
 
-# CONSTANTS
-TOOL_RESULT_MAX_CHARS = 10000  # maximum characters to keep from a tool result
-
-# Helper to truncate long strings clearly
-
-def _truncate_output(content: Any, limit: int = TOOL_RESULT_MAX_CHARS) -> Any:
-    """Truncate the given string if it exceeds *limit* characters, appending an indicator.
-
-    Non-string content is returned unchanged so the caller can forward it as-is.
-    """
-    if not isinstance(content, str):
-        return content  # Non-string results are returned unchanged
-    if len(content) <= limit:
-        return content
-    truncated = content[:limit]
-    return truncated + f"\n\n...[output truncated – original length {len(content)} characters]"
 
 class FileSystemAgent:
     """Agent for interacting with Filesystem MCP server using stdio."""
@@ -67,17 +49,14 @@ class FileSystemAgent:
         # Using the same AI model settings as GitHub agent for now
         self.model = SafeOpenAIModel( # Changed from OpenAIModel to SafeOpenAIModel
                 "openai/gpt-4.1",
-                provider=OpenAIProvider(
-                    base_url='https://openrouter.ai/api/v1',
-                    api_key=self.settings.openrouter_api_key,
-                ),
+                provider=get_openrouter_provider(),
         )
         self.notebook_id = notebook_id
         self.agent = None
         filesystem_agent_logger.info(f"FileSystemAgent initialized successfully (Agent instance created later).")
 
-    async def _get_stdio_server(self) -> Optional[MCPServerStdio]:
-        """Fetches default Filesystem connection, gets handler, and creates MCPServerStdio instance."""
+    async def _get_stdio_server(self) -> Optional[MCPServer]:
+        """Fetches default Filesystem connection, gets handler, and creates its MCP server."""
         try:
             connection_manager = get_connection_manager()
             # Get the default filesystem connection
@@ -95,17 +74,16 @@ class FileSystemAgent:
                  filesystem_agent_logger.error("Filesystem connection handler not found.")
                  return None
                  
-            stdio_params: StdioServerParameters = handler.get_stdio_params(default_conn.config)
-
-            filesystem_agent_logger.info(f"Retrieved StdioServerParameters. Command: {stdio_params.command} Args: {stdio_params.args}")
-            # Create the MCPServerStdio instance needed by the agent
-            return MCPServerStdio(command=stdio_params.command, args=stdio_params.args, env=stdio_params.env)
+            # The native filesystem server runs in-process: no subprocess to start per session
+            server = handler.create_mcp_server(default_conn.config, connection_key=f"filesystem:{default_conn.id}")
+            filesystem_agent_logger.info(f"Created {type(server).__name__} for the Filesystem connection.")
+            return server
 
         except ValueError as ve: # Catch errors from get_handler or get_stdio_params
              filesystem_agent_logger.error(f"Configuration error getting Filesystem stdio params: {ve}", exc_info=True)
              return None
         except Exception as e:
-            filesystem_agent_logger.error(f"Error creating MCPServerStdio instance: {e}", exc_info=True)
+            filesystem_agent_logger.error(f"Error creating Filesystem MCP server: {e}", exc_info=True)
             return None
 
     def _read_system_prompt(self) -> str:
@@ -122,7 +100,7 @@ class FileSystemAgent:
             filesystem_agent_logger.error(f"Error reading system prompt file {prompt_file_path}: {e}", exc_info=True)
             return "You are a helpful AI assistant interacting with a Filesystem MCP server."
 
-    def _initialize_agent(self, stdio_server: MCPServerStdio) -> Agent:
+    def _initialize_agent(self, stdio_server: MCPServer) -> Agent:
         """Initializes the Pydantic AI Agent with Filesystem specific configuration."""
         system_prompt = self._read_system_prompt()
 
@@ -131,7 +109,7 @@ class FileSystemAgent:
             mcp_servers=[stdio_server],
             system_prompt=system_prompt,
         )
-        filesystem_agent_logger.info(f"Agent instance created with MCPServerStdio.")
+        filesystem_agent_logger.info(f"Agent instance created with {type(stdio_server).__name__}.")
         return agent
 
     # Removed _run_single_attempt as its logic is now directly in run_query's attempt loop.
@@ -345,7 +323,7 @@ class FileSystemAgent:
                                                         original_tool_content = event.result.content # Get original content
 
                                                         # Truncate the result that pydantic-ai will use for the next LLM call
-                                                        truncated_content_for_llm = _truncate_output(original_tool_content, limit=DEFAULT_TRUNCATE_LIMIT)
+                                                        truncated_content_for_llm = truncate_tool_output(original_tool_content, limit=TOOL_RESULT_MAX_CHARS)
                                                         
                                                         if isinstance(original_tool_content, str) and \
                                                            isinstance(truncated_content_for_llm, str) and \
@@ -384,7 +362,7 @@ class FileSystemAgent:
                                                         else:
                                                             # For other tools, pass the original, untruncated result from the MCP tool call
                                                             # into our application's ToolSuccessEvent. The LLM history part (event.result.content)
-                                                            # has already been set to the truncated version if the original_tool_content was a string.
+                                                            # has already been set to the truncated version (text or structurally elided). Cell storage applies its own budget.
                                                             app_event_tool_result = original_tool_content
                                                         
                                                         # Yield a ToolSuccessEvent for our application's event stream.
@@ -482,7 +460,7 @@ class FileSystemAgent:
                             for _msg in raw_history:
                                 _cnt = getattr(_msg, "content", None)
                                 if isinstance(_cnt, str):  # Only truncate textual content
-                                    setattr(_msg, "content", _truncate_output(_cnt, limit=DEFAULT_TRUNCATE_LIMIT))
+                                    setattr(_msg, "content", truncate_tool_output(_cnt, limit=TOOL_RESULT_MAX_CHARS))
                             accumulated_message_history = raw_history
                             filesystem_agent_logger.info(
                                 f"Attempt {attempt_completed} (finally): Captured message history of length {len(accumulated_message_history)} (after truncation)."
@@ -18,9 +18,9 @@ from pydantic_ai.messages import (
     ModelMessage, # For message_history
 )
 # from pydantic_ai.models.openai import OpenAIModel # Replaced with SafeOpenAIModel
-from backend.ai.models import SafeOpenAIModel # Added for safer timestamp handling
-from pydantic_ai.providers.openai import OpenAIProvider
+from backend.ai.models import SafeOpenAIModel, get_openrouter_provider # Added for safer timestamp handling
 from pydantic_ai.mcp import MCPServerStdio
+from backend.ai.tool_memo import MemoizingMCPServerStdio
 from mcp.shared.exceptions import McpError 
 from mcp import StdioServerParameters
 
@@ -48,10 +48,7 @@ class GitHubQueryAgent:
         self.settings = get_settings()
         self.model = SafeOpenAIModel( # Changed from OpenAIModel to SafeOpenAIModel
                 "openai/gpt-4.1",
-                provider=OpenAIProvider(
-                    base_url='https://openrouter.ai/api/v1',
-                    api_key=self.settings.openrouter_api_key,
-                ),
+                provider=get_openrouter_provider(),
         )
         self.notebook_id = notebook_id
         self.agent = None
@@ -76,7 +73,10 @@ class GitHubQueryAgent:
 
             github_query_agent_logger.info(f"Retrieved StdioServerParameters. Command: {stdio_params.command} Args: {stdio_params.args}")
             # Create the MCPServerStdio instance needed by the agent
-            return MCPServerStdio(command=stdio_params.command, args=stdio_params.args, env=stdio_params.env)
+            return MemoizingMCPServerStdio(
+                command=stdio_params.command, args=stdio_params.args, env=stdio_params.env,
+                connection_key=f"github:{default_conn.id}",
+            )
 
         except ValueError as ve: # Catch errors from get_handler or get_stdio_params
              github_query_agent_logger.error(f"Configuration error getting GitHub stdio params: {ve}", exc_info=True)
@@ -10,9 +10,9 @@ from typing import Optional, AsyncGenerator, Union, Dict, Any, TYPE_CHECKING, Li
 
 from pydantic_ai import Agent, UnexpectedModelBehavior
 from pydantic_ai.models.openai import OpenAIModel
-from pydantic_ai.providers.openai import OpenAIProvider
 
-from backend.ai.models import SafeOpenAIModel
+from backend.ai.models import SafeOpenAIModel, get_openrouter_provider
+from backend.ai.cell_streaming import stream_partial_outputs
 from backend.config import get_settings
 from backend.core.query_result import InvestigationReport, Finding # Import the target model AND Finding
 from backend.ai.events import (
@@ -71,10 +71,7 @@ class InvestigationReportAgent:
         agent = Agent(
             model=SafeOpenAIModel(  # Use the SafeOpenAIModel
                 "openai/gpt-4.1",
-                provider=OpenAIProvider(
-                    base_url='https://openrouter.ai/api/v1',
-                    api_key=self.settings.openrouter_api_key,
-                ),
+                provider=get_openrouter_provider(),
             ),
             output_type=InvestigationReport, # Use the target Pydantic model
             system_prompt=system_prompt,
@@ -90,8 +87,11 @@ class InvestigationReportAgent:
         findings_summary: str, # Combined text from executed steps
         session_id: str, # Added session_id
         notebook_id: str # Added notebook_id (matches self.notebook_id)
-    ) -> AsyncGenerator[Union[StatusUpdateEvent, InvestigationReport], None]:
-        """Generate an InvestigationReport from findings, yielding status updates."""
+    ) -> AsyncGenerator[Union[StatusUpdateEvent, InvestigationReport, Dict[str, Any]], None]:
+        """
+        Generate an InvestigationReport from findings, yielding status updates and
+        {"type": "partial_step_result"} dicts with partially generated reports.
+        """
         report_description = f"Generate report for query: {original_query[:100]}..."
         investigation_report_agent_logger.info(f"Running report generation for: '{report_description}'")
         
@@ -160,11 +160,15 @@ Please analyze the above and generate the InvestigationReport JSON object.
 
             try:
                 investigation_report_agent_logger.info(f"Running agent with findings summary length: {len(findings_summary)}")
-                run_result_obj = await self.agent.run(input_prompt)
+                run_result = None
+                # Stream the report so partially generated fields can be previewed in the report cell
+                async with self.agent.run_stream(input_prompt) as streamed_run:
+                    async for partial_report, is_last in stream_partial_outputs(streamed_run):
+                        run_result = partial_report
+                        if not is_last:
+                            yield {"type": "partial_step_result", "result": partial_report}
                 investigation_report_agent_logger.info(f"Attempt {current_attempt}: Agent run finished.")
-                investigation_report_agent_logger.info(f"Attempt {current_attempt}: Raw agent result object: {run_result_obj!r}") # Log raw result object
                 
-                run_result = run_result_obj.output
                 investigation_report_agent_logger.info(f"Attempt {current_attempt}: Extracted agent output: {run_result!r}") # Log extracted output
 
                 if isinstance(run_result, InvestigationReport):
@@ -27,7 +27,6 @@ from pydantic_ai.messages import (
     FunctionToolResultEvent,
 )
 from pydantic_ai.models.openai import OpenAIModel
-from pydantic_ai.providers.openai import OpenAIProvider
 from pydantic_ai.mcp import MCPServerStdio
 from mcp import StdioServerParameters
 from mcp.shared.exceptions import McpError
@@ -42,7 +41,7 @@ from backend.ai.events import (
     ToolErrorEvent,
     FatalErrorEvent,
 )
-from backend.ai.models import SafeOpenAIModel
+from backend.ai.models import SafeOpenAIModel, get_openrouter_provider
 from backend.ai.notebook_context_tools import create_notebook_context_tools
 from backend.services.notebook_manager import NotebookManager
 
@@ -62,10 +61,7 @@ class LogAIAgent:
         settings = __import__("backend.config", fromlist=["get_settings"]).get_settings()
         self.model: OpenAIModel = SafeOpenAIModel(
             "openai/gpt-4.1",
-            provider=OpenAIProvider(
-                base_url="https://openrouter.ai/api/v1",
-                api_key=settings.openrouter_api_key,
-            ),
+            provider=get_openrouter_provider(),
         )
         self._agent: Optional[Agent] = None  # lazily initialised per query
 
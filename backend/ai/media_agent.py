@@ -14,16 +14,15 @@ from enum import Enum
 
 from pydantic import BaseModel, Field
 from pydantic_ai import Agent
-from pydantic_ai.providers.openai import OpenAIProvider
 
 from backend.services.connection_manager import ConnectionManager
 from backend.services.connection_handlers.registry import get_handler
-from pydantic_ai.mcp import MCPServerStdio
+from pydantic_ai.mcp import MCPServer
 from backend.config import get_settings
 from backend.services.notebook_manager import NotebookManager
 from backend.ai.notebook_context_tools import create_notebook_context_tools
 from backend.ai.prompts.correlator_prompts import CORRELATOR_SYSTEM_PROMPT
-from backend.ai.models import SafeOpenAIModel
+from backend.ai.models import SafeOpenAIModel, get_openrouter_provider
 from backend.ai.events import (
     EventType,
     AgentType,
@@ -111,16 +110,13 @@ class MediaUrlsExtractorAgent:
         self.settings = get_settings()
         self.model = SafeOpenAIModel(
                 "openai/gpt-4.1-mini",
-                provider=OpenAIProvider(
-                    base_url='https://openrouter.ai/api/v1',
-                    api_key=self.settings.openrouter_api_key,
-                ),
+                provider=get_openrouter_provider(),
         )
         self.agent = None
         self.notebook_manager: Optional[NotebookManager] = notebook_manager
         media_agent_logger.info(f"MediaUrlsExtractorAgent class initialized (model configured, agent instance created per run).")
-        self.github_mcp_server: Optional[MCPServerStdio] = None
-        self.filesystem_mcp_server: Optional[MCPServerStdio] = None
+        self.github_mcp_server: Optional[MCPServer] = None
+        self.filesystem_mcp_server: Optional[MCPServer] = None
 
     def _read_system_prompt(self) -> str:
         system_prompt = """
@@ -158,7 +154,7 @@ class MediaUrlsExtractorAgent:
 
         return system_prompt
         
-    async def _get_mcp_server(self, connection_type: str) -> Optional[MCPServerStdio]:
+    async def _get_mcp_server(self, connection_type: str) -> Optional[MCPServer]:
         """Helper to get an MCP server instance for a given connection type."""
         try:
             default_conn = await self.connection_manager.get_default_connection(connection_type)
@@ -170,13 +166,13 @@ class MediaUrlsExtractorAgent:
                 return None
 
             handler = get_handler(connection_type)
-            stdio_params = handler.get_stdio_params(default_conn.config)
-            media_agent_logger.info(f"Retrieved StdioServerParameters for {connection_type}. Command: {stdio_params.command}")
-            return MCPServerStdio(command=stdio_params.command, args=stdio_params.args, env=stdio_params.env)
+            server = handler.create_mcp_server(default_conn.config, connection_key=f"{connection_type}:{default_conn.id}")
+            media_agent_logger.info(f"Created {type(server).__name__} for {connection_type}.")
+            return server
         except ValueError as ve:
             media_agent_logger.error(f"Configuration error getting {connection_type} stdio params: {ve}", exc_info=True)
         except Exception as e:
-            media_agent_logger.error(f"Error creating MCPServerStdio instance for {connection_type}: {e}", exc_info=True)
+            media_agent_logger.error(f"Error creating MCP server for {connection_type}: {e}", exc_info=True)
         return None
         
     
@@ -256,11 +252,11 @@ class MediaCorrelatorAgent:
         self.additional_mcp_servers = mcp_servers or [] # Store additional mcp_servers
 
         # Standard MCP servers to be fetched by the agent
-        self.github_mcp_server: Optional[MCPServerStdio] = None
-        self.filesystem_mcp_server: Optional[MCPServerStdio] = None
-        self.qdrant_git_repo_mcp_server: Optional[MCPServerStdio] = None # For Qdrant via git_repo
+        self.github_mcp_server: Optional[MCPServer] = None
+        self.filesystem_mcp_server: Optional[MCPServer] = None
+        self.qdrant_git_repo_mcp_server: Optional[MCPServer] = None # For Qdrant via git_repo
 
-    async def _get_mcp_server(self, connection_type: str) -> Optional[MCPServerStdio]:
+    async def _get_mcp_server(self, connection_type: str) -> Optional[MCPServer]:
         """Helper to get an MCP server instance for a given connection type."""
         try:
             default_conn = await self.connection_manager.get_default_connection(connection_type)
@@ -272,13 +268,13 @@ class MediaCorrelatorAgent:
                 return None
 
             handler = get_handler(connection_type)
-            stdio_params = handler.get_stdio_params(default_conn.config)
-            media_agent_logger.info(f"Retrieved StdioServerParameters for {connection_type}. Command: {stdio_params.command}")
-            return MCPServerStdio(command=stdio_params.command, args=stdio_params.args, env=stdio_params.env)
+            server = handler.create_mcp_server(default_conn.config, connection_key=f"{connection_type}:{default_conn.id}")
+            media_agent_logger.info(f"Created {type(server).__name__} for {connection_type}.")
+            return server
         except ValueError as ve:
             media_agent_logger.error(f"Configuration error getting {connection_type} stdio params: {ve}", exc_info=True)
         except Exception as e:
-            media_agent_logger.error(f"Error creating MCPServerStdio instance for {connection_type}: {e}", exc_info=True)
+            media_agent_logger.error(f"Error creating MCP server for {connection_type}: {e}", exc_info=True)
         return None
 
     async def _initialize_correlator_agent(self) -> Optional[Agent[None, CorrelatorResult]]:
@@ -286,7 +282,7 @@ class MediaCorrelatorAgent:
 
         notebook_tools = create_notebook_context_tools(self.notebook_id, self.notebook_manager)
         
-        current_mcp_servers: List[MCPServerStdio] = []
+        current_mcp_servers: List[MCPServer] = []
 
         # Fetch standard MCP servers if not already initialized
         if self.github_mcp_server is None:
@@ -306,10 +302,10 @@ class MediaCorrelatorAgent:
 
         # Add any additional MCP servers passed during initialization
         for server in self.additional_mcp_servers:
-            if isinstance(server, MCPServerStdio) and server not in current_mcp_servers: # Avoid duplicates if passed
+            if isinstance(server, MCPServer) and server not in current_mcp_servers: # Avoid duplicates if passed
                  current_mcp_servers.append(server)
-            elif not isinstance(server, MCPServerStdio):
-                 media_agent_logger.warning(f"Non-MCPServerStdio object found in additional_mcp_servers: {type(server)}")
+            elif not isinstance(server, MCPServer):
+                 media_agent_logger.warning(f"Non-MCPServer object found in additional_mcp_servers: {type(server)}")
 
 
         if not current_mcp_servers:
@@ -318,10 +314,7 @@ class MediaCorrelatorAgent:
 
         self.model = SafeOpenAIModel(
             "openai/gpt-4.1", # Consider using a more capable model if complex reasoning over tools is needed
-            provider=OpenAIProvider(
-                base_url='https://openrouter.ai/api/v1',
-                api_key=self.settings.openrouter_api_key,
-            ),
+            provider=get_openrouter_provider(),
         )
         self.correlator_agent = Agent[None, CorrelatorResult](
             self.model,
@@ -9,19 +9,36 @@ obtain a concise, textual timeline that can be consumed by the correlator
 agent without having to embed raw BinaryContent objects.
 
 The implementation purposefully keeps the HTTP logic minimal and fully async
-(using httpx.AsyncClient) so that multiple media files can be processed in
-parallel.
+(using the shared pooled httpx.AsyncClient) so that multiple media files can be
+processed in parallel over warm keep-alive connections.
+
+Media goes through the on-disk media cache (`backend.services.media_cache`):
+videos are downloaded once and shown to the model as keyframes, and the
+description of every image/keyframe is stored under its content hash, so
+re-analysing the same bug video only describes frames not seen before.
+
+Items still to be described are split into shards (`_shard_items`): every
+whole video on its own, keyframes of one video together, screenshots together,
+each shard capped in item count and bytes. Shards are described concurrently
+(at most ``media_describe_concurrency`` calls at a time); items a shard call
+did not describe – because it failed, timed out or skipped them – are retried
+one by one with `_describe_single` under ``media_item_timeout``. Whatever
+still fails keeps a placeholder, so one bad item never loses the others.
 """
 
 import asyncio
+import base64
 import json
 import logging
+from dataclasses import dataclass
+from pathlib import Path
 from typing import List, Optional
 
-import httpx
 from pydantic import BaseModel
 
 from backend.config import get_settings
+from backend.services.http_client import get_http_client
+from backend.services.media_cache import MediaCache, format_timestamp, get_media_cache
 from backend.ai.media_agent import (
     MediaTimelineEvent,
     MediaTimelinePayload,
@@ -31,6 +48,10 @@ from backend.ai.media_agent import (
 
 logger = logging.getLogger("ai.media_describer_agent")
 
+_VISION_MODEL = "google/gemini-2.5-pro-preview"
+# Cached descriptions are only reused for the same model and bulk prompt; bump on prompt changes
+_DESCRIPTION_VARIANT = f"{_VISION_MODEL}:bulk-v1"
+
 # ----------------------------------------------------------------------------
 # Helper pydantic model to capture the raw response we expect from OpenRouter
 # ----------------------------------------------------------------------------
@@ -50,6 +71,48 @@ class _OpenRouterResponse(BaseModel):
             return ""
 
 
+@dataclass
+class _MediaItem:
+    """One thing shown to the vision model: an image, a video, or a keyframe of a video."""
+
+    identifier: str  # names the item in the prompt and in the model's response
+    media: MediaUrl
+    cache_key: Optional[str] = None  # description cache key (None when the content is unknown)
+    frame_path: Optional[Path] = None  # keyframe sent inline instead of the media URL
+    timestamp: Optional[float] = None
+    size: int = 0  # bytes of the content, 0 when unknown
+
+    @property
+    def shard_group(self) -> str:
+        """Items are only sharded together with items of the same group."""
+        if self.frame_path is not None:
+            return f"frames:{self.media.url}"
+        return "video" if self.is_video else "images"
+
+    @property
+    def is_video(self) -> bool:
+        return self.media.type == UrlType.VIDEO and self.frame_path is None
+
+    def block(self) -> dict:
+        """The multimodal message block for this item (reads keyframes from disk)."""
+        if self.frame_path is not None:
+            encoded = base64.b64encode(self.frame_path.read_bytes()).decode("ascii")
+            return {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{encoded}"}}
+        if self.is_video:
+            return {"type": "video_url", "video_url": {"url": self.media.url}}
+        return {"type": "image_url", "image_url": {"url": self.media.url}}
+
+    def instruction(self) -> str:
+        if self.frame_path is not None:
+            return (
+                f"- {self.identifier} → frame at {format_timestamp(self.timestamp or 0)} of video "
+                f"{self.media.url} – analyze all visible elements"
+            )
+        if self.is_video:
+            return f"- {self.identifier} → video – generate detailed timeline with timestamps"
+        return f"- {self.identifier} → image – analyze all visible elements"
+
+
 # ----------------------------------------------------------------------------
 # Main agent class
 # ----------------------------------------------------------------------------
@@ -82,6 +145,14 @@ class MediaDescriberAgent:
             "Content-Type": "application/json",
             # Leaving HTTP-Referer / X-Title optional – configurable via env later.
         }
+        self._completions_url = f"{self.settings.openrouter_base_url.rstrip('/')}/chat/completions"
+        self._media_cache: Optional[MediaCache] = None
+
+    @property
+    def media_cache(self) -> MediaCache:
+        if self._media_cache is None:
+            self._media_cache = get_media_cache()
+        return self._media_cache
 
     # ---------------------------------------------------------------------
     # Public API
@@ -90,24 +161,24 @@ class MediaDescriberAgent:
     async def describe_media(self, original_query: str, urls: List[MediaUrl]) -> MediaTimelinePayload:
         """Return a MediaTimelinePayload for the given URLs."""
 
-        # Perform a single multimodal call with **all** media URLs to reduce latency
-        # and LLM invocation cost. The model is instructed to return descriptions
-        # grouped by URL so we can split them back into individual timeline events.
-        try:
-            bulk_response = await self._describe_bulk(original_query, urls)
-        except Exception as exc:
-            logger.exception("Bulk media description call failed: %s", exc)
-            bulk_response = ""
+        items = await self._prepare_items(urls)
+        descriptions = await asyncio.to_thread(self._cached_descriptions, items)
+        pending = [item for item in items if item.identifier not in descriptions]
+        logger.info(
+            "Describing %d media items (%d descriptions reused from cache)",
+            len(pending),
+            len(items) - len(pending),
+        )
 
-        # Parse the bulk response and map each URL to its description.
-        url_to_desc = self._parse_bulk_response(bulk_response, urls)
+        if pending:
+            descriptions.update(await self._describe_pending(original_query, pending))
 
         timeline_events: List[MediaTimelineEvent] = []
-        for media in urls:
-            desc = url_to_desc.get(media.url, "(No description returned)")
+        for item in items:
+            desc = descriptions.get(item.identifier, "(No description returned)")
             timeline_events.append(
                 MediaTimelineEvent(
-                    image_identifier=media.url,
+                    image_identifier=item.identifier,
                     description=desc.strip(),
                     code_references=[],
                 )
@@ -130,20 +201,134 @@ class MediaDescriberAgent:
     # Internal helpers
     # ------------------------------------------------------------------
 
-    async def _describe_single(self, media: MediaUrl, original_query: str) -> str:
-        """Call OpenRouter and return the raw assistant content."""
+    async def _prepare_items(self, urls: List[MediaUrl]) -> List[_MediaItem]:
+        """Download (or reuse) every media file and expand videos into their keyframes."""
+
+        async def prepare(media: MediaUrl) -> List[_MediaItem]:
+            try:
+                cached = await self.media_cache.get_media(media.url, media.type == UrlType.VIDEO)
+            except Exception as exc:  # the URL itself can still be described
+                logger.warning("Media cache failed for %s: %s", media.url, exc)
+                cached = None
+            if cached is None:
+                return [_MediaItem(identifier=media.url, media=media)]
+            if not cached.frames:
+                key = MediaCache.description_key(cached.sha256, _DESCRIPTION_VARIANT)
+                return [_MediaItem(identifier=media.url, media=media, cache_key=key, size=cached.size)]
+            return [
+                _MediaItem(
+                    identifier=f"{media.url}#t={int(frame.timestamp)}",
+                    media=media,
+                    cache_key=MediaCache.description_key(frame.sha256, _DESCRIPTION_VARIANT),
+                    frame_path=frame.path,
+                    timestamp=frame.timestamp,
+                    size=frame.size,
+                )
+                for frame in cached.frames
+            ]
+
+        prepared = await asyncio.gather(*(prepare(media) for media in urls))
+        return [item for items in prepared for item in items]
+
+    def _shard_items(self, items: List[_MediaItem]) -> List[List[_MediaItem]]:
+        """
+        Split *items* into shards of one group each, in order, within
+        ``media_shard_max_items`` items and ``media_shard_max_bytes`` bytes
+        (a single larger item gets a shard of its own). Whole videos are never
+        sharded together: one long video would hold up every item next to it.
+        """
+        max_items = max(1, self.settings.media_shard_max_items)
+        max_bytes = self.settings.media_shard_max_bytes
+        shards: List[List[_MediaItem]] = []
+        open_shards: dict[str, tuple[List[_MediaItem], int]] = {}
+        for item in items:
+            group = item.shard_group
+            shard, used = open_shards.get(group, ([], 0))
+            full = bool(shard) and (len(shard) >= max_items or used + item.size > max_bytes)
+            if group == "video" or not shard or full:
+                shard, used = [], 0
+                shards.append(shard)
+            shard.append(item)
+            open_shards[group] = (shard, used + item.size)
+        return shards
+
+    async def _describe_pending(self, original_query: str, items: List[_MediaItem]) -> dict[str, str]:
+        """Describe *items* shard by shard, concurrently; returns the descriptions obtained."""
+        semaphore = asyncio.Semaphore(max(1, self.settings.media_describe_concurrency))
+        shard_timeout = self.settings.media_shard_timeout
+        item_timeout = self.settings.media_item_timeout
+
+        async def describe_shard(shard: List[_MediaItem]) -> dict[str, str]:
+            # The model is instructed to return descriptions grouped by identifier
+            # so we can split them back into individual timeline events.
+            timed_out = False
+            async with semaphore:
+                try:
+                    response = await asyncio.wait_for(self._describe_bulk(original_query, shard), timeout=shard_timeout)
+                except asyncio.TimeoutError:
+                    logger.warning("Media description of a %d-item shard timed out", len(shard))
+                    response, timed_out = "", True
+                except Exception as exc:
+                    logger.warning("Media description of a %d-item shard failed: %s", len(shard), exc)
+                    response = ""
+            parsed = self._parse_bulk_response(response, [item.identifier for item in shard])
+            missing = [item for item in shard if not parsed.get(item.identifier)]
+            # A lone item that already timed out is not tried again
+            if missing and not (timed_out and len(shard) == 1):
+                results = await asyncio.gather(*(describe_alone(item) for item in missing))
+                parsed.update({item.identifier: desc for item, desc in zip(missing, results) if desc})
+            # Cached after the fallback, so items only it recovered are not re-described next run
+            await asyncio.to_thread(self._store_descriptions, shard, parsed)
+            return parsed
+
+        async def describe_alone(item: _MediaItem) -> Optional[str]:
+            async with semaphore:
+                try:
+                    return await asyncio.wait_for(self._describe_single(item, original_query), timeout=item_timeout)
+                except asyncio.TimeoutError:
+                    logger.warning("Media description of %s timed out", item.identifier)
+                    return None
+                except Exception as exc:
+                    logger.warning("Media description of %s failed: %s", item.identifier, exc)
+                    return None
+
+        shards = self._shard_items(items)
+        logger.info("Describing %d media items in %d shards", len(items), len(shards))
+        merged: dict[str, str] = {}
+        # gather keeps shard order, so the merge does not depend on completion order
+        for result in await asyncio.gather(*(describe_shard(shard) for shard in shards)):
+            merged.update(result)
+        return merged
+
+    def _cached_descriptions(self, items: List[_MediaItem]) -> dict[str, str]:
+        found: dict[str, str] = {}
+        for item in items:
+            if item.cache_key:
+                description = self.media_cache.get_description(item.cache_key)
+                if description:
+                    found[item.identifier] = description
+        return found
+
+    def _store_descriptions(self, items: List[_MediaItem], descriptions: dict[str, str]) -> None:
+        for item in items:
+            description = descriptions.get(item.identifier)
+            if item.cache_key and description:
+                try:
+                    self.media_cache.put_description(item.cache_key, description)
+                except OSError as exc:
+                    logger.warning("Could not cache description of %s: %s", item.identifier, exc)
+
+    async def _describe_single(self, item: _MediaItem, original_query: str) -> str:
+        """Call OpenRouter for one item and return the raw assistant content."""
 
         # Compose a prompt that includes the high-level issue context provided by the user
         # followed by the modality-specific instructions.
-        base_prompt = (
-            self._PROMPT_FOR_VIDEO if media.type == UrlType.VIDEO else self._PROMPT_FOR_IMAGE
-        )
+        base_prompt = self._PROMPT_FOR_VIDEO if item.is_video else self._PROMPT_FOR_IMAGE
+        if item.frame_path is not None:
+            base_prompt += f" The image is the frame at {format_timestamp(item.timestamp or 0)} of a video."
         prompt = f"Issue context: {original_query}\n\n{base_prompt}"
 
-        if media.type == UrlType.VIDEO:
-            media_block = {"type": "video_url", "video_url": {"url": media.url}}
-        else:
-            media_block = {"type": "image_url", "image_url": {"url": media.url}}
+        media_block = await asyncio.to_thread(item.block)
 
         message_content = [
             {"type": "text", "text": prompt},
@@ -151,47 +336,41 @@ class MediaDescriberAgent:
         ]
 
         payload = {
-            "model": "google/gemini-2.5-pro-preview",
+            "model": _VISION_MODEL,
             "messages": [{"role": "user", "content": message_content}],
             # Temperature / other params could be made configurable.
             "max_tokens": 1024,
         }
 
-        logger.info("Requesting media description for %s", media.url)
+        logger.info("Requesting media description for %s", item.identifier)
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=self._headers,
-                json=payload,
+        response = await get_http_client().post(
+            self._completions_url,
+            headers=self._headers,
+            json=payload,
+            timeout=60.0,
+        )
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"OpenRouter request failed (status {response.status_code}): {response.text}"
             )
-            if response.status_code != 200:
-                raise RuntimeError(
-                    f"OpenRouter request failed (status {response.status_code}): {response.text}"
-                )
 
-            # Validate / extract.
-            parsed = _OpenRouterResponse.model_validate_json(response.text)
-            content = parsed.first_message_content()
-            logger.info("Received description for %s (chars=%d)", media.url, len(content))
-            return content
+        # Validate / extract.
+        parsed = _OpenRouterResponse.model_validate_json(response.text)
+        content = parsed.first_message_content()
+        logger.info("Received description for %s (chars=%d)", item.identifier, len(content))
+        return content
 
     # ------------------------------------------------------------------
     # Bulk helper – new implementation making a SINGLE LLM call
     # ------------------------------------------------------------------
 
-    async def _describe_bulk(self, original_query: str, medias: List[MediaUrl]) -> str:
-        """Describe a list of media objects with a single OpenRouter call."""
+    async def _describe_bulk(self, original_query: str, items: List[_MediaItem]) -> str:
+        """Describe a list of media items with a single OpenRouter call."""
 
         # Craft a comprehensive prompt that tells the model exactly how we
         # expect the output so we can map it back deterministically.
-        modality_instructions = []
-        for m in medias:
-            if m.type == UrlType.VIDEO:
-                modality_instructions.append(f"- {m.url} → video – generate detailed timeline with timestamps")
-            else:
-                modality_instructions.append(f"- {m.url} → image – analyze all visible elements")
-        joined_instructions = "\n".join(modality_instructions)
+        joined_instructions = "\n".join(item.instruction() for item in items)
         prompt_text = (
             f"# Bug Analysis Context\n"
             f"Original issue: {original_query}\n\n"
@@ -219,9 +398,9 @@ class MediaDescriberAgent:
             "4. **Performance Issues**: Identify lags, freezes, or unexpected behaviors\n"
             "5. **Error Details**: Capture complete text of any error messages that appear\n\n"
             "## Output Format\n"
-            "For each URL, create a Markdown section with this structure:\n\n"
+            "For each identifier, create a Markdown section with this structure:\n\n"
             "```\n"
-            "<URL>:\n"
+            "<identifier>:\n"
             "# Summary (1-2 sentences describing what's shown/happening)\n\n"
             "## Key Elements\n"
             "- Element 1: [description with exact text and identifiable details]\n"
@@ -241,58 +420,55 @@ class MediaDescriberAgent:
             "Begin your detailed analysis now."
         )
 
-        # Compose the multimodal message content list: first text, then each block.
-        message_content = [{"type": "text", "text": prompt_text}]
-        for m in medias:
-            if m.type == UrlType.VIDEO:
-                block = {"type": "video_url", "video_url": {"url": m.url}}
-            else:
-                block = {"type": "image_url", "image_url": {"url": m.url}}
-            message_content.append(block)
+        # Compose the multimodal message content list: first text, then each block
+        # in the order of the instructions (keyframes are read from the cache here).
+        blocks = await asyncio.to_thread(lambda: [item.block() for item in items])
+        message_content = [{"type": "text", "text": prompt_text}, *blocks]
 
         payload = {
-            "model": "google/gemini-2.5-pro-preview",
+            "model": _VISION_MODEL,
             "messages": [{"role": "user", "content": message_content}],
             "max_tokens": 2048,
         }
 
-        logger.info("Requesting bulk media description for %d items", len(medias))
+        logger.info("Requesting bulk media description for %d items", len(items))
 
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=self._headers,
-                json=payload,
+        response = await get_http_client().post(
+            self._completions_url,
+            headers=self._headers,
+            json=payload,
+            timeout=120.0,
+        )
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"OpenRouter bulk request failed (status {response.status_code}): {response.text}"
             )
-            if response.status_code != 200:
-                raise RuntimeError(
-                    f"OpenRouter bulk request failed (status {response.status_code}): {response.text}"
-                )
 
-            parsed = _OpenRouterResponse.model_validate_json(response.text)
-            content = parsed.first_message_content()
-            logger.info("Received bulk description (chars=%d)", len(content))
-            return content
+        parsed = _OpenRouterResponse.model_validate_json(response.text)
+        content = parsed.first_message_content()
+        logger.info("Received bulk description (chars=%d)", len(content))
+        return content
 
     # ------------------------------------------------------------------
     # Parsing helper
     # ------------------------------------------------------------------
 
     @staticmethod
-    def _parse_bulk_response(content: str, medias: List[MediaUrl]) -> dict[str, str]:
-        """Best-effort extraction of descriptions per URL from the LLM response."""
+    def _parse_bulk_response(content: str, identifiers: List[str]) -> dict[str, str]:
+        """Best-effort extraction of descriptions per identifier from the LLM response."""
 
         if not content:
             return {}
 
         lines = content.splitlines()
-        url_set = {m.url for m in medias}
+        # Longest first: a keyframe "<url>#t=10" must not claim the section of "<url>#t=100"
+        url_set = sorted(set(identifiers), key=len, reverse=True)
         current_url: Optional[str] = None
         accum: dict[str, list[str]] = {u: [] for u in url_set}
 
         for line in lines:
             stripped = line.strip()
-            # Detect a new section starting with a URL followed by a colon
+            # Detect a new section starting with an identifier followed by a colon
             for url in url_set:
                 if stripped.startswith(url):
                     current_url = url
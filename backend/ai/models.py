@@ -9,12 +9,16 @@ from pydantic import BaseModel, Field
 from datetime import datetime, timezone
 from pydantic_ai.models.openai import OpenAIModel
 from pydantic_ai import UnexpectedModelBehavior # Added import
-from pydantic_ai.providers.openai import OpenAIProvider # Though not directly used in SafeOpenAIModel, good for context
+from pydantic_ai.providers.openai import OpenAIProvider
+from openai import AsyncOpenAI
 # Corrected imports for OpenAI response types
 from openai.types.chat import ChatCompletion as ChatCompletions # OpenAI's ChatCompletion is the response type
 from pydantic_ai.messages import ModelResponse # Import ModelResponse directly
 from pydantic import model_validator  # For custom validation logic
 
+from backend.config import get_settings
+from backend.services.http_client import get_http_client
+
 class StepType(str, Enum):
     """Enumeration of possible step types in an investigation."""
     MARKDOWN = "markdown"
@@ -206,6 +210,22 @@ class SafeOpenAIModel(OpenAIModel):
         return super()._process_response(response)
 
 
+def get_openrouter_provider() -> OpenAIProvider:
+    """
+    Build an OpenRouter provider backed by the shared pooled HTTP client, so every
+    model construction re-uses warm keep-alive connections instead of opening its own.
+    The client's transport does the retrying, so the SDK's own retries are turned off.
+    """
+    settings = get_settings()
+    client = AsyncOpenAI(
+        base_url=settings.openrouter_base_url,
+        api_key=settings.openrouter_api_key,
+        http_client=get_http_client(),
+        max_retries=0,
+    )
+    return OpenAIProvider(openai_client=client)
+
+
 class FileDataRef(BaseModel):
     type: str = Field(..., description="Type of data reference, e.g., 'content_string' or 'fsmcp_path'.") # content_string, fsmcp_path
     value: str = Field(..., description="The actual CSV content string or the path string on the Filesystem MCP.")
@@ -207,6 +207,8 @@ def create_notebook_context_tools(
     async def get_uploaded_file_path(params: GetUploadedFilePathParams) -> str:
         """Return the server-side relative filepath for *file_id*.
 
+        The path is the shared content blob and has no file extension; use the
+        ``filename`` from ``list_uploaded_files`` to tell the file type.
         Raises ValueError if not found so the LLM sees an explicit error message.
         """
         async with get_db_session() as db:
@@ -1,10 +1,13 @@
 """
 Python Agent Service
 
-Agent for handling Python code execution via a locally running MCP server.
+Agent for handling Python code execution in the notebook's persistent Python kernel
+(a long-lived mcp-server-data-exploration process, see backend.services.python_kernels).
 """
 
+import asyncio
 import logging
+import time
 from typing import  Optional, AsyncGenerator, Dict, Any, Union, List
 from datetime import datetime, timezone
 import json
@@ -20,17 +23,16 @@ from pydantic_ai.messages import (
     ModelMessage, # For message_history
 )
 # from pydantic_ai.models.openai import OpenAIModel # Replaced with SafeOpenAIModel
-from backend.ai.models import SafeOpenAIModel, FileDataRef, PythonAgentInput # Added for safer timestamp handling and new input models
-from pydantic_ai.providers.openai import OpenAIProvider
-from pydantic_ai.mcp import MCPServerStdio
+from backend.ai.models import SafeOpenAIModel, FileDataRef, PythonAgentInput, get_openrouter_provider # Added for safer timestamp handling and new input models
 # from mcp.shared.exceptions import McpError # Not directly used by PythonAgent for calling other MCPs now
-from mcp import StdioServerParameters
 from backend.core.cell import CellStatus # Added import
 # Potential import if NotebookManager is injected - for type hinting
 from backend.services.notebook_manager import NotebookManager # For type hinting
 from sqlalchemy.ext.asyncio import AsyncSession # Added import
 
 from backend.config import get_settings
+from backend.services.artifact_store import externalize_python_output
+from backend.services.python_kernels import PythonKernel, get_python_kernel_manager
 from backend.ai.events import (
     EventType,
     AgentType,
@@ -49,6 +51,117 @@ python_agent_logger = logging.getLogger("ai.python_agent")
 # For Docker, this path is relative to the container's filesystem.
 IMPORTED_DATA_BASE_PATH = "data/imported_datasets"
 
+RETRY_ERROR_MAX_CHARS = 2000
+
+
+class PythonRetryState:
+    """
+    What the data-exploration server already holds across the attempts of one
+    run_query call, plus per-attempt timings. Used to build compact retry prompts
+    when the server session is kept alive between attempts.
+    """
+
+    def __init__(self):
+        self.loaded_dataframes: Dict[str, str] = {}  # df_name -> csv_path
+        self.successful_scripts = 0
+        self.last_failed_tool: Optional[Dict[str, Any]] = None
+        self.attempt_timings: List[Dict[str, Any]] = []
+        self.kernel: Optional[PythonKernel] = None
+        self._kernel_restarts_at_start = 0
+
+    @staticmethod
+    def _result_error(parsed_result: Dict[str, Any]) -> Optional[str]:
+        stdout = parsed_result.get("stdout")
+        if parsed_result.get("status") == "error":
+            details = parsed_result.get("error_details") or {}
+            return str(details.get("message") or parsed_result.get("stderr") or "Unknown error")
+        # mcp-server-ds reports script exceptions as plain text rather than tool errors
+        if isinstance(stdout, str) and stdout.lstrip().startswith("Error"):
+            return stdout.strip()
+        return None
+
+    def record_tool_result(self, tool_name: str, tool_args: Any, parsed_result: Dict[str, Any]) -> None:
+        normalized_name = (tool_name or "").replace("-", "_")
+        error = self._result_error(parsed_result)
+        if error:
+            self.last_failed_tool = {"tool_name": tool_name, "tool_args": tool_args, "error": error}
+            return
+        if normalized_name == "load_csv":
+            args = tool_args if isinstance(tool_args, dict) else {}
+            df_name = args.get("df_name")
+            match = re.search(r"dataframe\s+'?([\w]+)'?", str(parsed_result.get("stdout") or ""), re.IGNORECASE)
+            if match:
+                df_name = match.group(1)
+            if df_name:
+                self.loaded_dataframes[df_name] = str(args.get("csv_path", ""))
+        elif normalized_name == "run_script":
+            self.successful_scripts += 1
+
+    def begin_attempt(self, kernel: Optional[PythonKernel] = None) -> float:
+        """Reset per-attempt failure tracking and return the attempt start time."""
+        self.last_failed_tool = None
+        self.kernel = kernel
+        if kernel is not None:
+            self._kernel_restarts_at_start = self._kernel_restarts(kernel)
+        return time.perf_counter()
+
+    @staticmethod
+    def _kernel_restarts(kernel: PythonKernel) -> int:
+        # A stopped kernel only bumps `restarts` on its next call; count that restart already
+        return kernel.restarts + int(kernel.pending_restart)
+
+    def kernel_was_restarted(self) -> bool:
+        """True if the kernel lost its variables since the attempt started (timeout, crash or eviction)."""
+        if self.kernel is None:
+            return False
+        return self._kernel_restarts(self.kernel) != self._kernel_restarts_at_start
+
+    def record_attempt(self, attempt: int, started_at: float, succeeded: bool, error: Optional[str] = None) -> None:
+        timing = {
+            "attempt": attempt,
+            "duration_ms": round((time.perf_counter() - started_at) * 1000, 1),
+            "succeeded": succeeded,
+        }
+        if error:
+            timing["error"] = error[:200]
+        self.attempt_timings.append(timing)
+        python_agent_logger.info(f"Python attempt {attempt} finished in {timing['duration_ms']}ms (succeeded={succeeded})")
+
+    def build_retry_prompt(self, base_prompt: str, failed_attempt: int, attempt_error: Optional[str]) -> str:
+        """
+        Original instructions plus the preserved session state and only the failing step's error.
+        If the kernel was restarted, the state recorded so far is dropped and the model told to reload.
+        """
+        restarted = self.kernel_was_restarted()
+        if restarted:
+            self.loaded_dataframes.clear()
+            self.successful_scripts = 0
+            lines = [
+                base_prompt,
+                f"RETRY: attempt {failed_attempt} failed and the Python session was restarted: "
+                f"every DataFrame and variable from earlier attempts is gone. Load the data you need again before using it.",
+            ]
+        else:
+            lines = [base_prompt, f"RETRY: attempt {failed_attempt} failed. The Python session from that attempt is still running."]
+        if self.loaded_dataframes:
+            loaded = ", ".join(f"{name} (from {path})" if path else name for name, path in self.loaded_dataframes.items())
+            lines.append(f"DataFrames already loaded and still available (do NOT call load_csv for them again): {loaded}.")
+        if self.successful_scripts:
+            lines.append(
+                f"{self.successful_scripts} script(s) already ran successfully. Only loaded DataFrames persist between scripts; "
+                f"re-run nothing that is not needed to fix the failure."
+            )
+        if self.last_failed_tool:
+            failing = self.last_failed_tool
+            lines.append(f"Failing step: tool '{failing['tool_name']}' returned: {failing['error'][:RETRY_ERROR_MAX_CHARS]}")
+        if attempt_error:
+            lines.append(f"Attempt error: {attempt_error[:RETRY_ERROR_MAX_CHARS]}")
+        if restarted:
+            lines.append("Fix the failing step, reloading its data first.")
+        else:
+            lines.append("Fix only the failing step and continue from the current session state.")
+        return "\n\n".join(lines)
+
 
 class PythonAgent:
     """Agent for interacting with Python MCP server using stdio."""
@@ -57,10 +170,7 @@ class PythonAgent:
         self.settings = get_settings()
         self.model = SafeOpenAIModel(
                 "openai/gpt-4.1",
-                provider=OpenAIProvider(
-                    base_url='https://openrouter.ai/api/v1',
-                    api_key=self.settings.openrouter_api_key,
-                ),
+                provider=get_openrouter_provider(),
         )
         self.agent = None # Will be initialized in run_query
         self.notebook_manager: Optional[NotebookManager] = notebook_manager # Assign passed manager
@@ -198,31 +308,6 @@ class PythonAgent:
             python_agent_logger.warning(f"Unexpected MCP output type: {type(raw_output)}. Returning error structure.")
             return {"status": "error", "stderr": f"Invalid output type: {type(raw_output)}", "stdout": None, "return_value": None, "dependencies": None, "error_details": {"type": "ParsingError", "message": "Invalid/unexpected output type from MCP server"}}
 
-    def _get_stdio_server_params(self) -> StdioServerParameters:
-        """Returns the StdioServerParameters for the mcp-server-data-exploration."""
-        env = os.environ.copy()
-        server_params = StdioServerParameters(
-            command='/root/.local/bin/uv',
-            args=[
-                '--directory',
-                '/opt/mcp-server-data-exploration', # Path where we cloned it in Dockerfile.backend
-                'run',
-                'mcp-server-ds' # Changed to 'mcp-server-ds' based on documentation
-            ],
-            env=env
-        )
-        python_agent_logger.info(f"Using StdioServerParameters for mcp-server-data-exploration. Command: {server_params.command} Args: {server_params.args}")
-        return server_params
-
-    async def _get_stdio_server(self) -> Optional[MCPServerStdio]:
-        """Creates the MCPServerStdio instance using hardcoded parameters."""
-        try:
-            stdio_params = self._get_stdio_server_params()
-            return MCPServerStdio(command=stdio_params.command, args=stdio_params.args, env=stdio_params.env)
-        except Exception as e:
-            python_agent_logger.error(f"Error creating MCPServerStdio instance: {e}", exc_info=True)
-            return None
-
     def _read_system_prompt(self) -> str:
         """Reads the system prompt from the dedicated file."""
         prompt_file_path = os.path.join(os.path.dirname(__file__), "prompts", "python_agent_system_prompt.txt")
@@ -236,21 +321,20 @@ class PythonAgent:
             python_agent_logger.error(f"Error reading system prompt file {prompt_file_path}: {e}", exc_info=True)
             return "You are a helpful AI assistant interacting with a Python execution MCP server."
 
-    def _initialize_agent(self, stdio_server: MCPServerStdio, extra_tools: Optional[list] = None) -> Agent:
+    def _initialize_agent(self, extra_tools: Optional[list] = None) -> Agent:
         """Initializes the Pydantic AI Agent with Python specific configuration.
 
-        The caller can supply *extra_tools* (e.g. `list_cells` / `get_cell`) which
-        will be registered with the underlying Agent instance.
+        The caller supplies the tools (the notebook kernel's `load_csv` /
+        `run_script` / `list_variables` plus e.g. `list_cells` / `get_cell`)
+        which will be registered with the underlying Agent instance.
         """
         system_prompt = self._read_system_prompt()
         agent = Agent(
             self.model,
-            mcp_servers=[stdio_server],
             system_prompt=system_prompt,
             tools=extra_tools or [],  # type: ignore[arg-type]
         )
-        python_agent_logger.info("Agent instance created with MCPServerStdio and %d extra tools.", len(extra_tools or []))
-        python_agent_logger.info(f"PythonAgent: Pydantic AI Agent initialized with {len(extra_tools or [])} notebook context tools.")
+        python_agent_logger.info(f"PythonAgent: Pydantic AI Agent initialized with {len(extra_tools or [])} tools.")
         return agent
 
     async def run_query(
@@ -271,23 +355,23 @@ class PythonAgent:
             attempt=None, max_attempts=None, reason=None, step_id=None, original_plan_step_id=None
         )
 
-        stdio_server = await self._get_stdio_server()
-        if not stdio_server:
-            error_msg = "Failed to configure Python MCP stdio server."
-            python_agent_logger.error(error_msg)
-            yield FatalErrorEvent(type=EventType.FATAL_ERROR, status=StatusType.FATAL_ERROR, agent_type=AgentType.PYTHON, error=error_msg, notebook_id=notebook_id, session_id=session_id)
-            return
+        # The notebook's kernel outlives this run: DataFrames loaded by earlier steps and cells are still there
+        kernel = get_python_kernel_manager().get_kernel(str(notebook_id))
 
         yield StatusUpdateEvent(
             type=EventType.STATUS_UPDATE, status=StatusType.CONNECTION_READY, agent_type=AgentType.PYTHON,
-            message="Python MCP server connection configured.", notebook_id=notebook_id, session_id=session_id,
+            message="Python kernel for the notebook is ready.", notebook_id=notebook_id, session_id=session_id,
             attempt=None, max_attempts=None, reason=None, step_id=None, original_plan_step_id=None
         )
 
         try:
             from backend.ai.notebook_context_tools import create_notebook_context_tools
+            from backend.ai.dataset_tools import create_dataset_tools
+            from backend.ai.python_kernel_tools import create_python_kernel_tools
             notebook_tools = create_notebook_context_tools(notebook_id, self.notebook_manager)
-            self.agent = self._initialize_agent(stdio_server, extra_tools=notebook_tools)
+            self.agent = self._initialize_agent(
+                extra_tools=create_python_kernel_tools(kernel) + notebook_tools + create_dataset_tools()
+            )
             yield StatusUpdateEvent(
                 type=EventType.STATUS_UPDATE, status=StatusType.AGENT_CREATED, agent_type=AgentType.PYTHON, 
                 message="Pydantic AI agent instance created.", notebook_id=notebook_id, session_id=session_id,
@@ -307,8 +391,11 @@ class PythonAgent:
             f"If your task requires data or file paths from a previous step (e.g., from a filesystem operation like search_files, read_file, or get_file_info), "
             f"use the 'get_cell' tool with the appropriate cell ID from the 'dependency_cell_ids' mapping. "
             f"Inspect the 'tool_args' (for input paths/args of the dependency) or 'tool_result' (for output paths/data of the dependency) of the fetched cell content to find the necessary information (e.g., file paths). "
-            f"Paths obtained this way are direct host paths and can be used with your Python tools (like 'load_csv').\n\n"
-            f"Available Python execution tools (via mcp-server-data-exploration): load_csv, run_script. "
+            f"Paths obtained this way are direct host paths and can be used with your Python tools (like 'load_csv').\n"
+            f"For CSV/TSV files call 'describe_dataset' first: it returns the schema, row count and sample rows without loading the data, "
+            f"and a 'load_with' expression that reads a cached Parquet copy; prefer it in run_script over load_csv for large files.\n\n"
+            f"Available Python execution tools (the notebook's persistent Python kernel): list_variables, load_csv, run_script. "
+            f"DataFrames loaded by earlier steps or cells of this notebook stay in memory: call 'list_variables' first and reuse them instead of loading files again. "
             f"Follow output formatting instructions (DataFrame, Plot, JSON - details will be in the main system prompt).\n"
         )
         current_description = prompt_instructions_for_llm 
@@ -318,6 +405,8 @@ class PythonAgent:
         attempt_completed = 0
         success_occurred = False
         accumulated_message_history: list[ModelMessage] = []
+        stateful_retries = self.settings.python_agent_stateful_retries
+        retry_state = PythonRetryState()
 
         yield StatusUpdateEvent(
             type=EventType.STATUS_UPDATE, status=StatusType.STARTING_ATTEMPTS,
@@ -329,6 +418,7 @@ class PythonAgent:
         try:
             for attempt in range(max_attempts):
                 attempt_completed = attempt + 1
+                attempt_started_at = retry_state.begin_attempt(kernel)
                 python_agent_logger.info(f"Python Query Attempt {attempt_completed}/{max_attempts}")
                 yield StatusUpdateEvent(
                     type=EventType.STATUS_UPDATE, status=StatusType.ATTEMPT_START,
@@ -341,74 +431,79 @@ class PythonAgent:
                 agent_produced_final_result = False
 
                 try:
-                    async with self.agent.run_mcp_servers():
-                        python_agent_logger.info(f"Attempt {attempt_completed}: MCP Server context entered.")
-                        async with self.agent.iter(current_description, message_history=accumulated_message_history) as agent_run:
-                            yield StatusUpdateEvent(
-                                type=EventType.STATUS_UPDATE, status=StatusType.MCP_CONNECTION_ACTIVE,
-                                agent_type=AgentType.PYTHON, attempt=attempt_completed,
-                                message="MCP server connection established and agent.iter active.",
-                                notebook_id=notebook_id, session_id=session_id,
-                                max_attempts=None, reason=None, step_id=None, original_plan_step_id=None
-                            )
-                            pending_tool_calls: Dict[str, Dict[str, Any]] = {}
-                            yield StatusUpdateEvent(
-                                type=EventType.STATUS_UPDATE, status=StatusType.AGENT_ITERATING,
-                                agent_type=AgentType.PYTHON, attempt=attempt_completed,
-                                message="Agent is processing Python request...",
-                                notebook_id=notebook_id, session_id=session_id,
-                                max_attempts=None, reason=None, step_id=None, original_plan_step_id=None
-                            )
-                            try:
-                                async for node in agent_run: 
-                                    if isinstance(node, CallToolsNode):
-                                        python_agent_logger.info(f"Attempt {attempt_completed}: Processing CallToolsNode, streaming events...")
-                                        try:
-                                            async with node.stream(agent_run.ctx) as handle_stream: 
-                                                async for event in handle_stream:
-                                                    if isinstance(event, FunctionToolCallEvent):
-                                                        tool_call_id = event.part.tool_call_id; tool_name = getattr(event.part, 'tool_name', "UnknownTool"); tool_args = getattr(event.part, 'args', {})
-                                                        if isinstance(tool_args, str): tool_args = json.loads(tool_args) if tool_name != 'run-script' else {'script': tool_args}
-                                                        pending_tool_calls[tool_call_id] = {"tool_name": tool_name, "tool_args": tool_args}
-                                                        yield ToolCallRequestedEvent(type=EventType.TOOL_CALL_REQUESTED, status=StatusType.TOOL_CALL_REQUESTED,agent_type=AgentType.PYTHON, attempt=attempt_completed,tool_call_id=tool_call_id, tool_name=tool_name, tool_args=tool_args,notebook_id=notebook_id, session_id=session_id, original_plan_step_id=None)
-                                                    elif isinstance(event, FunctionToolResultEvent):
-                                                        tool_call_id = event.tool_call_id; raw_tool_result = event.result.content
-                                                        if tool_call_id in pending_tool_calls:
-                                                            call_info = pending_tool_calls.pop(tool_call_id)
-                                                            parsed_tool_result = self._parse_python_mcp_output(str(raw_tool_result) if not isinstance(raw_tool_result, (str, dict)) else raw_tool_result)
-                                                            yield ToolSuccessEvent(type=EventType.TOOL_SUCCESS, status=StatusType.TOOL_SUCCESS,agent_type=AgentType.PYTHON, attempt=attempt_completed,tool_call_id=tool_call_id, tool_name=call_info["tool_name"],tool_args=call_info["tool_args"], tool_result=parsed_tool_result,notebook_id=notebook_id, session_id=session_id, original_plan_step_id=None)
-                                                            success_occurred = True
-                                        except Exception as stream_err_inner: 
-                                            python_agent_logger.error(f"Attempt {attempt_completed}: Error during CallToolsNode stream: {stream_err_inner}", exc_info=True)
-                                            yield ToolErrorEvent(type=EventType.TOOL_ERROR, status=StatusType.ERROR, agent_type=AgentType.PYTHON,attempt=attempt_completed, error=f"Stream Processing Error: {stream_err_inner}",notebook_id=notebook_id, session_id=session_id, tool_call_id=None, tool_name=None, tool_args=None, message=None, original_plan_step_id=None)
-                                            raise stream_err_inner 
-                                run_result = agent_run.result 
-                                python_agent_logger.info(f"Attempt {attempt_completed}: Agent iteration finished. Raw final result: {run_result}")
-                                if not attempt_failed: agent_produced_final_result = True
-                            except UnexpectedModelBehavior as e_model_behavior: 
-                                python_agent_logger.error(f"Attempt {attempt_completed} caught UnexpectedModelBehavior: {e_model_behavior}", exc_info=True)
-                                last_error_for_attempt = f"Agent run failed due to unexpected model behavior: {str(e_model_behavior)}"
-                                attempt_failed = True
-                                yield ToolErrorEvent(type=EventType.TOOL_ERROR, status=StatusType.MODEL_ERROR,agent_type=AgentType.PYTHON, attempt=attempt_completed,error=last_error_for_attempt,notebook_id=notebook_id, session_id=session_id, tool_call_id=None, tool_name=None, tool_args=None, message=None, original_plan_step_id=None)
-                            except Exception as e_general_iter: 
-                                error_msg_detail = str(e_general_iter)
-                                is_timestamp_error = isinstance(e_general_iter, TypeError) and "'NoneType' object cannot be interpreted as an integer" in error_msg_detail
-                                error_msg = "TypeError: OpenAI API response likely missing 'created' timestamp." if is_timestamp_error else f"Agent iteration failed unexpectedly: {error_msg_detail}"
-                                error_status = StatusType.TIMESTAMP_ERROR if is_timestamp_error else StatusType.GENERAL_ERROR_RUN
-                                python_agent_logger.error(f"Attempt {attempt_completed} caught general error during agent.iter: {error_msg}", exc_info=True)
-                                last_error_for_attempt = error_msg
-                                attempt_failed = True
-                                yield ToolErrorEvent(type=EventType.TOOL_ERROR,status=error_status,agent_type=AgentType.PYTHON,attempt=attempt_completed,error=error_msg,notebook_id=notebook_id, session_id=session_id, tool_call_id=None, tool_name=None, tool_args=None, message=None, original_plan_step_id=None)
-                            finally: 
-                                if hasattr(agent_run, 'ctx') and hasattr(agent_run.ctx, 'state') and hasattr(agent_run.ctx.state, 'message_history'): 
-                                    accumulated_message_history = agent_run.ctx.state.message_history[:]
+                    python_agent_logger.info(f"Attempt {attempt_completed}: running agent against the notebook's Python kernel.")
+                    async with self.agent.iter(current_description, message_history=accumulated_message_history) as agent_run:
+                        yield StatusUpdateEvent(
+                            type=EventType.STATUS_UPDATE, status=StatusType.MCP_CONNECTION_ACTIVE,
+                            agent_type=AgentType.PYTHON, attempt=attempt_completed,
+                            message="Python kernel attached and agent.iter active.",
+                            notebook_id=notebook_id, session_id=session_id,
+                            max_attempts=None, reason=None, step_id=None, original_plan_step_id=None
+                        )
+                        pending_tool_calls: Dict[str, Dict[str, Any]] = {}
+                        yield StatusUpdateEvent(
+                            type=EventType.STATUS_UPDATE, status=StatusType.AGENT_ITERATING,
+                            agent_type=AgentType.PYTHON, attempt=attempt_completed,
+                            message="Agent is processing Python request...",
+                            notebook_id=notebook_id, session_id=session_id,
+                            max_attempts=None, reason=None, step_id=None, original_plan_step_id=None
+                        )
+                        try:
+                            async for node in agent_run: 
+                                if isinstance(node, CallToolsNode):
+                                    python_agent_logger.info(f"Attempt {attempt_completed}: Processing CallToolsNode, streaming events...")
+                                    try:
+                                        async with node.stream(agent_run.ctx) as handle_stream: 
+                                            async for event in handle_stream:
+                                                if isinstance(event, FunctionToolCallEvent):
+                                                    tool_call_id = event.part.tool_call_id; tool_name = getattr(event.part, 'tool_name', "UnknownTool"); tool_args = getattr(event.part, 'args', {})
+                                                    if isinstance(tool_args, str): tool_args = json.loads(tool_args) if tool_name not in ('run-script', 'run_script') else {'script': tool_args}
+                                                    pending_tool_calls[tool_call_id] = {"tool_name": tool_name, "tool_args": tool_args}
+                                                    yield ToolCallRequestedEvent(type=EventType.TOOL_CALL_REQUESTED, status=StatusType.TOOL_CALL_REQUESTED,agent_type=AgentType.PYTHON, attempt=attempt_completed,tool_call_id=tool_call_id, tool_name=tool_name, tool_args=tool_args,notebook_id=notebook_id, session_id=session_id, original_plan_step_id=None)
+                                                elif isinstance(event, FunctionToolResultEvent):
+                                                    tool_call_id = event.tool_call_id; raw_tool_result = event.result.content
+                                                    if tool_call_id in pending_tool_calls:
+                                                        call_info = pending_tool_calls.pop(tool_call_id)
+                                                        parsed_tool_result = self._parse_python_mcp_output(str(raw_tool_result) if not isinstance(raw_tool_result, (str, dict)) else raw_tool_result)
+                                                        retry_state.record_tool_result(call_info["tool_name"], call_info["tool_args"], parsed_tool_result)
+                                                        if isinstance(parsed_tool_result.get("stdout"), str):
+                                                            # The cell result keeps artifact references instead of inline plots / tables
+                                                            parsed_tool_result["stdout"], parsed_tool_result["artifacts"] = await asyncio.to_thread(externalize_python_output, parsed_tool_result["stdout"])
+                                                        yield ToolSuccessEvent(type=EventType.TOOL_SUCCESS, status=StatusType.TOOL_SUCCESS,agent_type=AgentType.PYTHON, attempt=attempt_completed,tool_call_id=tool_call_id, tool_name=call_info["tool_name"],tool_args=call_info["tool_args"], tool_result=parsed_tool_result,notebook_id=notebook_id, session_id=session_id, original_plan_step_id=None)
+                                                        success_occurred = True
+                                    except Exception as stream_err_inner: 
+                                        python_agent_logger.error(f"Attempt {attempt_completed}: Error during CallToolsNode stream: {stream_err_inner}", exc_info=True)
+                                        yield ToolErrorEvent(type=EventType.TOOL_ERROR, status=StatusType.ERROR, agent_type=AgentType.PYTHON,attempt=attempt_completed, error=f"Stream Processing Error: {stream_err_inner}",notebook_id=notebook_id, session_id=session_id, tool_call_id=None, tool_name=None, tool_args=None, message=None, original_plan_step_id=None)
+                                        raise stream_err_inner 
+                            run_result = agent_run.result 
+                            python_agent_logger.info(f"Attempt {attempt_completed}: Agent iteration finished. Raw final result: {run_result}")
+                            if not attempt_failed: agent_produced_final_result = True
+                        except UnexpectedModelBehavior as e_model_behavior: 
+                            python_agent_logger.error(f"Attempt {attempt_completed} caught UnexpectedModelBehavior: {e_model_behavior}", exc_info=True)
+                            last_error_for_attempt = f"Agent run failed due to unexpected model behavior: {str(e_model_behavior)}"
+                            attempt_failed = True
+                            yield ToolErrorEvent(type=EventType.TOOL_ERROR, status=StatusType.MODEL_ERROR,agent_type=AgentType.PYTHON, attempt=attempt_completed,error=last_error_for_attempt,notebook_id=notebook_id, session_id=session_id, tool_call_id=None, tool_name=None, tool_args=None, message=None, original_plan_step_id=None)
+                        except Exception as e_general_iter: 
+                            error_msg_detail = str(e_general_iter)
+                            is_timestamp_error = isinstance(e_general_iter, TypeError) and "'NoneType' object cannot be interpreted as an integer" in error_msg_detail
+                            error_msg = "TypeError: OpenAI API response likely missing 'created' timestamp." if is_timestamp_error else f"Agent iteration failed unexpectedly: {error_msg_detail}"
+                            error_status = StatusType.TIMESTAMP_ERROR if is_timestamp_error else StatusType.GENERAL_ERROR_RUN
+                            python_agent_logger.error(f"Attempt {attempt_completed} caught general error during agent.iter: {error_msg}", exc_info=True)
+                            last_error_for_attempt = error_msg
+                            attempt_failed = True
+                            yield ToolErrorEvent(type=EventType.TOOL_ERROR,status=error_status,agent_type=AgentType.PYTHON,attempt=attempt_completed,error=error_msg,notebook_id=notebook_id, session_id=session_id, tool_call_id=None, tool_name=None, tool_args=None, message=None, original_plan_step_id=None)
+                        finally: 
+                            if hasattr(agent_run, 'ctx') and hasattr(agent_run.ctx, 'state') and hasattr(agent_run.ctx.state, 'message_history'): 
+                                accumulated_message_history = agent_run.ctx.state.message_history[:]
                 except Exception as mcp_context_err:
                     python_agent_logger.error(f"Error with MCP server context or agent.iter context for attempt {attempt_completed}: {mcp_context_err}", exc_info=True)
                     last_error_for_attempt = f"MCP/Agent Context Error: {str(mcp_context_err)}"
                     attempt_failed = True
+                    retry_state.record_attempt(attempt_completed, attempt_started_at, False, last_error_for_attempt)
                     yield FatalErrorEvent(type=EventType.FATAL_ERROR,status=StatusType.FATAL_MCP_ERROR, agent_type=AgentType.PYTHON,error=last_error_for_attempt, session_id=session_id,notebook_id=notebook_id)
                     break 
 
+                retry_state.record_attempt(attempt_completed, attempt_started_at, agent_produced_final_result and not attempt_failed, last_error_for_attempt)
                 if agent_produced_final_result and not attempt_failed:
                     python_agent_logger.info(f"Agent completed successfully on attempt {attempt_completed}. Exiting loop.")
                     break
@@ -417,8 +512,13 @@ class PythonAgent:
                     if last_error_for_attempt and "TypeError: OpenAI API response likely missing 'created' timestamp." in last_error_for_attempt:
                         break
                     if attempt < max_attempts - 1:
-                        error_context = f"\\n\\nINFO: Attempt {attempt_completed} failed with error: {last_error_for_attempt}. Retrying..."
-                        current_description += error_context
+                        if stateful_retries:
+                            # The kernel still holds this run's DataFrames (unless it was restarted); send a compact prompt instead of the full transcript
+                            current_description = retry_state.build_retry_prompt(prompt_instructions_for_llm, attempt_completed, last_error_for_attempt)
+                            accumulated_message_history = []
+                        else:
+                            error_context = f"\\n\\nINFO: Attempt {attempt_completed} failed with error: {last_error_for_attempt}. Retrying..."
+                            current_description += error_context
                         yield StatusUpdateEvent(type=EventType.STATUS_UPDATE, status=StatusType.RETRYING,agent_type=AgentType.PYTHON,attempt=attempt_completed,reason=f"error: {str(last_error_for_attempt)[:100]}...",notebook_id=notebook_id, session_id=session_id, max_attempts=max_attempts, message=None, step_id=None, original_plan_step_id=None)
                         continue
                     else:
@@ -437,12 +537,12 @@ class PythonAgent:
             python_agent_logger.info("Exiting PythonAgent.run_query method's main try/except/finally block.")
 
         if success_occurred and not last_error:
-            yield FinalStatusEvent(type=EventType.FINAL_STATUS,status=StatusType.FINISHED_SUCCESS,agent_type=AgentType.PYTHON,attempts=attempt_completed,session_id=session_id,notebook_id=notebook_id, message=None)
+            yield FinalStatusEvent(type=EventType.FINAL_STATUS,status=StatusType.FINISHED_SUCCESS,agent_type=AgentType.PYTHON,attempts=attempt_completed,attempt_timings=retry_state.attempt_timings,session_id=session_id,notebook_id=notebook_id, message=None)
         elif last_error:
             final_error_msg = f"Python query finished after {attempt_completed} attempts. Last error: {last_error}"
             python_agent_logger.error(final_error_msg)
-            yield FinalStatusEvent(type=EventType.FINAL_STATUS,status=StatusType.FINISHED_ERROR, agent_type=AgentType.PYTHON,attempts=attempt_completed,message=final_error_msg,session_id=session_id,notebook_id=notebook_id)
+            yield FinalStatusEvent(type=EventType.FINAL_STATUS,status=StatusType.FINISHED_ERROR, agent_type=AgentType.PYTHON,attempts=attempt_completed,attempt_timings=retry_state.attempt_timings,message=final_error_msg,session_id=session_id,notebook_id=notebook_id)
         else:
             final_error_msg = f"Python query finished after {attempt_completed} attempts without reported success or error."
             python_agent_logger.warning(final_error_msg)
-            yield FinalStatusEvent(type=EventType.FINAL_STATUS,status=StatusType.FINISHED_NO_RESULT,agent_type=AgentType.PYTHON,attempts=attempt_completed,message=final_error_msg,session_id=session_id,notebook_id=notebook_id)
+            yield FinalStatusEvent(type=EventType.FINAL_STATUS,status=StatusType.FINISHED_NO_RESULT,agent_type=AgentType.PYTHON,attempts=attempt_completed,attempt_timings=retry_state.attempt_timings,message=final_error_msg,session_id=session_id,notebook_id=notebook_id)
@@ -0,0 +1,68 @@
+"""Python execution tools to expose to the Python agent.
+
+The tools proxy to the notebook's persistent kernel (see
+`backend.services.python_kernels`), so DataFrames loaded with `load_csv` or
+kept with `save_to_memory` stay available to later agent steps and to the
+notebook's Python cells, and `list_variables` tells the agent what is already
+loaded before it reads a file again. Plots printed by `run_script` are replaced
+by artifact references before the output reaches the model.
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from backend.ai.utils.truncation import TOOL_RESULT_MAX_CHARS, truncate_text
+from backend.services.artifact_store import externalize_python_output
+from backend.services.python_kernels import PythonKernel
+
+logger = logging.getLogger(__name__)
+
+SCRIPT_OUTPUT_MAX_CHARS = 3 * TOOL_RESULT_MAX_CHARS  # printed tables are what most scripts are for
+
+
+class LoadCsvParams(BaseModel):
+    """Parameters for the `load_csv` tool."""
+    csv_path: str = Field(..., description="ABSOLUTE host path of the CSV file.")
+    df_name: Optional[str] = Field(None, description="Variable name for the DataFrame (defaults to df_1, df_2, ...).")
+
+
+class RunScriptParams(BaseModel):
+    """Parameters for the `run_script` tool."""
+    script: str = Field(..., description="Python script to execute. Loaded DataFrames are available as variables.")
+    save_to_memory: Optional[List[str]] = Field(
+        None, description="Names of variables created by the script to keep for later scripts and steps."
+    )
+
+
+def create_python_kernel_tools(kernel: PythonKernel):
+    """Return `[load_csv, run_script, list_variables]` bound to *kernel*."""
+
+    async def load_csv(params: LoadCsvParams) -> str:
+        """Load a CSV file into a DataFrame that stays in memory for later scripts and steps."""
+        return await kernel.load_csv(params.csv_path, params.df_name)
+
+    async def run_script(params: RunScriptParams) -> str:
+        """Execute a Python script in the notebook's kernel and return what it printed.
+
+        Only DataFrames (from `load_csv`) and variables listed in
+        `save_to_memory` persist after the script finishes.
+        """
+        output = await kernel.run_script(params.script, params.save_to_memory)
+        # Plots are stored as artifacts; the model only needs the reference, not the base64
+        output, _ = await asyncio.to_thread(externalize_python_output, output, None, ("plot",))
+        return truncate_text(output, SCRIPT_OUTPUT_MAX_CHARS)
+
+    async def list_variables() -> List[Dict[str, Any]]:
+        """Variables already held by the notebook's kernel: name, type, shape and columns.
+
+        Call it before loading data – a DataFrame listed here does not need to be loaded again.
+        """
+        return await kernel.list_variables()
+
+    load_csv.__name__ = "load_csv"
+    run_script.__name__ = "run_script"
+    list_variables.__name__ = "list_variables"
+    return [load_csv, run_script, list_variables]
@@ -9,10 +9,12 @@ from datetime import datetime, timezone
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from pydantic_ai import Agent
+from pydantic import ValidationError
+from pydantic_ai import Agent, UnexpectedModelBehavior
 from pydantic_ai.models.openai import OpenAIModel
 
 from backend.ai.models import InvestigationStepModel
+from backend.ai.cell_streaming import stream_partial_outputs
 from backend.ai.events import (
     BaseEvent, AgentType, StatusType, StatusUpdateEvent,
     ToolSuccessEvent, ToolErrorEvent, FinalStatusEvent, FatalErrorEvent, # Added FatalErrorEvent
@@ -168,12 +170,28 @@ class MarkdownStepAgent(StepAgent):
             notebook_id=self.notebook_id
         )
         
-        result = await self.markdown_generator.run(prompt_with_context)
-        if isinstance(result.output, MarkdownQueryResult):
-            final_result = result.output
+        # Stream the response so the step processor can show partial markdown while it is generated
+        output = None
+        try:
+            async with self.markdown_generator.run_stream(prompt_with_context) as streamed_run:
+                async for partial, is_last in stream_partial_outputs(streamed_run):
+                    output = partial
+                    if not is_last:
+                        yield {"type": "partial_step_result", "result": partial}
+        except (UnexpectedModelBehavior, ValidationError) as e:
+            # Unlike run(), a stream does not retry a final output that fails validation
+            ai_logger.warning(f"Streamed markdown for step {step.step_id} was invalid ({e}); running once without streaming.")
+            try:
+                output = (await self.markdown_generator.run(prompt_with_context)).output
+            except UnexpectedModelBehavior:
+                if output is None:
+                    raise
+                ai_logger.warning(f"Markdown retry for step {step.step_id} failed; keeping the last streamed content.")
+        if isinstance(output, MarkdownQueryResult):
+            final_result = output
         else:
-            ai_logger.warning(f"Markdown generator did not return MarkdownQueryResult. Got: {type(result.output)}. Falling back.")
-            fallback_content = str(result.output) if result.output else ''
+            ai_logger.warning(f"Markdown generator did not return MarkdownQueryResult. Got: {type(output)}. Falling back.")
+            fallback_content = str(output) if output else ''
             final_result = MarkdownQueryResult(query=step.description, data=fallback_content)
             
         yield {"type": "final_step_result", "result": final_result}
@@ -440,7 +458,9 @@ class ReportStepAgent(StepAgent):
                 session_id=session_id,
                 notebook_id=self.notebook_id
             ):
-                if isinstance(result_part, InvestigationReport):
+                if isinstance(result_part, dict) and result_part.get("type") == "partial_step_result":
+                    yield result_part
+                elif isinstance(result_part, InvestigationReport):
                     final_report_object = result_part
                     report_error = final_report_object.error
                     yield StatusUpdateEvent(
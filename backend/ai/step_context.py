@@ -0,0 +1,244 @@
+"""
+Token-budgeted context assembly for investigation steps.
+
+Dependency outputs used to be concatenated as fixed-size string slices, which
+bloats prompts for steps with many dependencies and starves steps that depend
+on a single large output. This module instead:
+
+1. Renders every dependency output once per StepResult (cached on the result).
+2. Scores each dependency by keyword relevance to the step being built.
+3. Splits a token budget across dependencies in proportion to relevance,
+   handing surplus from small dependencies to the ones that need more room.
+"""
+
+import logging
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from backend.ai.models import InvestigationStepModel
+from backend.ai.step_result import StepResult
+from backend.ai.utils.context_utils import STOP_WORDS_CONTEXT_PREP
+from backend.ai.utils.truncation import render_tool_output
+from backend.core.query_result import QueryResult
+
+step_context_logger = logging.getLogger("ai.step_context")
+
+CHARS_PER_TOKEN = 4  # Rough average for English text / code with GPT-style tokenizers
+RENDERED_OUTPUT_MAX_CHARS = 40000  # Upper bound kept per rendered output in the StepResult cache
+DEPENDENCY_DESCRIPTION_MAX_CHARS = 1000
+MIN_DEPENDENCY_WEIGHT = 0.25
+TRUNCATION_MARKER = "...[truncated]"
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (ceil(chars / 4)); avoids pulling a tokenizer into the hot path."""
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Trim *text* so that it fits within *max_tokens*, marking the cut."""
+    if max_tokens <= 0:
+        return ""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    max_chars = max(0, max_tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARKER))
+    return text[:max_chars].rstrip() + TRUNCATION_MARKER
+
+
+def render_step_output(out_data: Any) -> str:
+    """Render a single step output into the text form used in dependency context."""
+    limit = RENDERED_OUTPUT_MAX_CHARS
+    if isinstance(out_data, dict):
+        if out_data.get("status") == "success" and out_data.get("stdout") is not None:
+            rendered = f"(stdout): {render_tool_output(out_data['stdout'], limit).strip()}"
+        elif "path" in out_data and "content" in out_data:
+            rendered = f"(file: {out_data['path']}): {render_tool_output(out_data['content'], limit).strip()}"
+        elif "search_results" in out_data:
+            search_results_data = out_data.get("search_results")
+            count = len(search_results_data) if isinstance(search_results_data, list) else 0
+            rendered = f"({count} search results found)."
+            if count > 0:
+                rendered += f" First: {render_tool_output(search_results_data[0], limit)}"
+        else:
+            rendered = render_tool_output(out_data, limit).strip()
+    elif isinstance(out_data, list):
+        rendered = f"(list with {len(out_data)} items). First: {render_tool_output(out_data[0], limit)}" if out_data else "(empty list)."
+    elif isinstance(out_data, QueryResult):
+        rendered = render_tool_output(out_data.data, limit).strip()
+    else:
+        rendered = render_tool_output(out_data, limit).strip()
+    return rendered[:RENDERED_OUTPUT_MAX_CHARS]
+
+
+def _keywords(text: str) -> Set[str]:
+    return {
+        word for word in re.findall(r"\b\w+\b", text.lower())
+        if word not in STOP_WORDS_CONTEXT_PREP and len(word) > 2
+    }
+
+
+def score_dependency_relevance(step_keywords: Set[str], dep_text: str, has_outputs: bool) -> float:
+    """
+    Relevance weight for one dependency: 1.0 baseline plus keyword overlap with the
+    step being built. Dependencies with no usable outputs get a small floor weight.
+    """
+    if not has_outputs:
+        return MIN_DEPENDENCY_WEIGHT
+    if not step_keywords:
+        return 1.0
+    overlap = len(step_keywords & _keywords(dep_text))
+    return 1.0 + 3.0 * (overlap / len(step_keywords))
+
+
+def allocate_token_budget(demands: Dict[str, int], weights: Dict[str, float], budget: int) -> Dict[str, int]:
+    """
+    Split *budget* across keys proportionally to *weights* without giving any key more
+    than it asked for. Surplus from satisfied keys is redistributed (water-filling).
+    """
+    allocation = {key: 0 for key in demands}
+    active = {key for key, demand in demands.items() if demand > 0}
+    remaining = max(0, budget)
+
+    while active and remaining > 0:
+        total_weight = sum(max(weights.get(key, 1.0), MIN_DEPENDENCY_WEIGHT) for key in active)
+        shares = {
+            key: remaining * max(weights.get(key, 1.0), MIN_DEPENDENCY_WEIGHT) / total_weight
+            for key in active
+        }
+        satisfied = [key for key in active if demands[key] - allocation[key] <= shares[key]]
+        if not satisfied:
+            for key in active:
+                allocation[key] += int(shares[key])
+            break
+        for key in satisfied:
+            remaining -= demands[key] - allocation[key]
+            allocation[key] = demands[key]
+            active.discard(key)
+
+    return allocation
+
+
+class StepContextBuilder:
+    """Builds the dependency section of a step prompt within a token budget."""
+
+    def __init__(self, token_budget: int):
+        self.token_budget = token_budget
+
+    def build_dependency_context(
+        self,
+        step: InvestigationStepModel,
+        executed_steps: Dict[str, Any],
+        step_results: Dict[str, StepResult],
+    ) -> Tuple[List[str], Dict[str, int]]:
+        """
+        Returns the dependency context lines (one per dependency, in dependency order)
+        and the number of tokens spent on each dependency.
+        """
+        step_text = step.description + " " + " ".join(f"{k} {v}" for k, v in step.parameters.items())
+        step_keywords = _keywords(step_text)
+
+        headers: Dict[str, str] = {}
+        bodies: Dict[str, List[str]] = {}
+        fixed_lines: Dict[str, str] = {}
+        weights: Dict[str, float] = {}
+        demands: Dict[str, int] = {}
+
+        for dep_id in step.dependencies:
+            if dep_id not in executed_steps:
+                continue
+            header, rendered, status_note = self._describe_dependency(dep_id, executed_steps[dep_id], step_results.get(dep_id))
+            if header is None:
+                fixed_lines[dep_id] = status_note
+                continue
+            headers[dep_id] = header
+            if rendered:
+                bodies[dep_id] = rendered
+                demands[dep_id] = sum(estimate_tokens(r) for r in rendered)
+                weights[dep_id] = score_dependency_relevance(step_keywords, header + " " + " ".join(rendered), True)
+            else:
+                fixed_lines[dep_id] = header + status_note
+
+        fixed_tokens = sum(estimate_tokens(line) for line in fixed_lines.values())
+        fixed_tokens += sum(estimate_tokens(headers[dep_id]) for dep_id in bodies)
+        allocation = allocate_token_budget(demands, weights, self.token_budget - fixed_tokens)
+
+        lines: List[str] = []
+        tokens_used: Dict[str, int] = {}
+        for dep_id in step.dependencies:
+            if dep_id in fixed_lines:
+                line = fixed_lines[dep_id]
+            elif dep_id in bodies:
+                line = headers[dep_id] + " (Outputs Available)" + self._fit_outputs(bodies[dep_id], allocation.get(dep_id, 0))
+            else:
+                continue
+            lines.append(line)
+            tokens_used[dep_id] = estimate_tokens(line)
+
+        step_context_logger.info(
+            f"Step {step.step_id} dependency context: {sum(tokens_used.values())} tokens "
+            f"(budget {self.token_budget}) across {len(tokens_used)} dependencies; "
+            f"weights={ {k: round(v, 2) for k, v in weights.items()} }"
+        )
+        return lines, tokens_used
+
+    @staticmethod
+    def _fit_outputs(rendered: List[str], token_allowance: int) -> str:
+        """Lay out rendered outputs in order, truncating once the allowance is exhausted."""
+        parts: List[str] = []
+        remaining = token_allowance
+        for i, text in enumerate(rendered):
+            prefix = f"\n  - Output {i+1}: "
+            if remaining <= estimate_tokens(prefix):
+                omitted = len(rendered) - i
+                parts.append(f"\n  - ... {omitted} more output(s) omitted to fit the context budget.")
+                break
+            body = truncate_to_tokens(text, remaining - estimate_tokens(prefix))
+            parts.append(prefix + body)
+            remaining -= estimate_tokens(prefix + body)
+        return "".join(parts)
+
+    @staticmethod
+    def _describe_dependency(
+        dep_id: str,
+        dep_step_info: Any,
+        dep_result_obj: Optional[StepResult],
+    ) -> Tuple[Optional[str], List[str], str]:
+        """
+        Returns (header, rendered_outputs, status_note). A None header means the
+        dependency could not be described and status_note holds the full line.
+        """
+        if not isinstance(dep_step_info, dict):
+            step_context_logger.warning(f"Dependency info for {dep_id} is not a dictionary: {type(dep_step_info)}. Skipping context for this dependency.")
+            return None, [], f"- Dependency '{dep_id}': Information malformed or unavailable."
+
+        raw_dep_step_model_data = dep_step_info.get('step')
+        dep_overall_error = dep_step_info.get('error')
+
+        if not raw_dep_step_model_data:
+            step_context_logger.warning(f"Could not find step model data for dependency ID {dep_id} in executed_steps.")
+            return None, [], f"- Dependency '{dep_id}': Step model data unavailable."
+        if not isinstance(raw_dep_step_model_data, dict):
+            step_context_logger.error(f"Step model data for dependency {dep_id} is not a dictionary: {type(raw_dep_step_model_data)}. Skipping.")
+            return None, [], f"- Dependency '{dep_id}': Invalid step model data format."
+        try:
+            dep_step_model = InvestigationStepModel(**raw_dep_step_model_data)
+        except Exception as e:
+            step_context_logger.error(f"Failed to parse InvestigationStepModel for dependency {dep_id} from data {raw_dep_step_model_data}: {e}")
+            return None, [], f"- Dependency '{dep_id}': Error parsing step model data."
+
+        description = dep_step_model.description[:DEPENDENCY_DESCRIPTION_MAX_CHARS]
+        header = f"- Dependency '{dep_id}' ({dep_step_model.step_type.value}): {description}"
+
+        if isinstance(dep_result_obj, StepResult) and dep_result_obj.outputs:
+            rendered = dep_result_obj.get_rendered_outputs(render_step_output)
+            if any(rendered):
+                return header, rendered, ""
+            return header, [], " (Step had outputs, but they could not be summarized for context.)"
+        if dep_overall_error:
+            return header, [], f" (Failed: {str(dep_overall_error)[:DEPENDENCY_DESCRIPTION_MAX_CHARS]} No usable output data for context.)"
+        if isinstance(dep_result_obj, StepResult) and dep_result_obj.has_error():
+            combined_error = dep_result_obj.get_combined_error() or "Unknown error"
+            return header, [], f" (Failed: {combined_error[:DEPENDENCY_DESCRIPTION_MAX_CHARS]} No usable output data for context.)"
+        return header, [], " (Completed with no specific output data for context.)"
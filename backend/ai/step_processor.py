@@ -11,10 +11,13 @@ from uuid import UUID, uuid4
 # Model Imports
 from backend.ai.models import StepType, InvestigationStepModel, PythonAgentInput # Added PythonAgentInput
 from backend.ai.step_result import StepResult
+from backend.ai.step_context import StepContextBuilder, estimate_tokens
+from backend.ai.utils.truncation import render_tool_output
 from backend.ai.step_agents import StepAgent, MarkdownStepAgent, GitHubStepAgent, FileSystemStepAgent, PythonStepAgent, ReportStepAgent
 from backend.ai.media_agent import MediaTimelineAgent # Import MediaTimelineAgent
 from backend.ai.code_index_query_agent import CodeIndexQueryAgent # Import CodeIndexQueryAgent
 from backend.ai.cell_creator import CellCreator
+from backend.ai.cell_streaming import StreamingCellPreview
 from pydantic_ai.models.openai import OpenAIModel
 from backend.core.cell import CellType, CellStatus # Added CellStatus
 from backend.core.query_result import QueryResult, InvestigationReport # Added InvestigationReport
@@ -43,13 +46,11 @@ from backend.ai.events import (
 )
 
 # Model imports
-from backend.ai.models import SafeOpenAIModel  # For using Claude model
-from pydantic_ai.providers.openai import OpenAIProvider  # Provider for Claude model
+from backend.ai.models import SafeOpenAIModel, get_openrouter_provider  # For using Claude model
 from backend.config import get_settings  # Access OpenRouter API key
 
 ai_logger = logging.getLogger("ai")
 
-STEP_CONTEXT_SNIPPET_LIMIT = 40000
 REPORT_CONTEXT_SNIPPET_LIMIT = 40000
 
 class StepProcessor:
@@ -70,6 +71,7 @@ class StepProcessor:
         self.notebook_manager = notebook_manager # Store notebook_manager
         self.mcp_servers = mcp_servers or [] # Store mcp_servers
         self.cell_creator = CellCreator(notebook_id, connection_manager)
+        self.context_builder = StepContextBuilder(get_settings().step_context_token_budget)
         
         # Initialize step agent registry
         self._step_agents: Dict[StepType, StepAgent] = {}
@@ -82,10 +84,7 @@ class StepProcessor:
                 settings = get_settings()
                 claude_model = SafeOpenAIModel(
                     "anthropic/claude-3.7-sonnet:thinking",
-                    provider=OpenAIProvider(
-                        base_url="https://openrouter.ai/api/v1",
-                        api_key=settings.openrouter_api_key,
-                    ),
+                    provider=get_openrouter_provider(),
                 )
 
                 self._step_agents[step_type] = MarkdownStepAgent(
@@ -171,6 +170,12 @@ class StepProcessor:
             context["original_query"] = original_query
             # Also prepend a reference to original query at top of prompt for clarity
             context["prompt"] = f"Original user query: {original_query}\n\n" + context["prompt"]
+
+        # Record how many tokens the assembled prompt costs so plans can be tuned per step.
+        # Kept out of `context` itself since agents render every context item into their prompts.
+        step_result.metadata["dependency_tokens"] = context.pop("dependency_tokens", {})
+        step_result.metadata["context_tokens"] = estimate_tokens(context["prompt"])
+        ai_logger.info(f"Step {step.step_id} prompt context uses ~{step_result.metadata['context_tokens']} tokens")
         
         # Get the appropriate agent for this step type
         try:
@@ -208,51 +213,78 @@ class StepProcessor:
             
             report_error = None
             report_result = None
+            report_preview: Optional[StreamingCellPreview] = None
+            dependency_cell_ids = [cid for dep_id in step.dependencies for cid in plan_step_id_to_cell_ids.get(dep_id, [])]
             
-            generator = step_agent.execute(step, context.get("prompt", ""), session_id, context, db=db)
-            async for event in generator:
-                if isinstance(event, BaseEvent):
-                    yield event
-                elif isinstance(event, dict) and event.get("type") == "final_step_result":
-                    report_result = event.get("result")
-                    report_error = event.get("error")
+            try:
+                generator = step_agent.execute(step, context.get("prompt", ""), session_id, context, db=db)
+                async for event in generator:
+                    if isinstance(event, BaseEvent):
+                        yield event
+                    elif isinstance(event, dict) and event.get("type") == "partial_step_result":
+                        if report_preview is None:
+                            report_preview = self._start_cell_preview(cell_tools, step, CellType.INVESTIGATION_REPORT, dependency_cell_ids, session_id)
+                        partial_report = event.get("result")
+                        await report_preview.update(
+                            self.cell_creator.report_cell_content(partial_report),
+                            partial_report.model_dump(mode='json') if hasattr(partial_report, "model_dump") else None,
+                        )
+                    elif isinstance(event, dict) and event.get("type") == "final_step_result":
+                        report_result = event.get("result")
+                        report_error = event.get("error")
                 
-            if report_result:
-                dependency_cell_ids = [cid for dep_id in step.dependencies for cid in plan_step_id_to_cell_ids.get(dep_id, [])]
-                created_cell_id, cell_params, cell_error = await self.cell_creator.create_report_cell(
-                    cell_tools=cell_tools, step=step, report=report_result,
-                    dependency_cell_ids=dependency_cell_ids, session_id=session_id
-                )
-                if cell_error:
-                    yield SummaryCellErrorEvent(
-                        error=cell_error, cell_params=cell_params.model_dump() if cell_params else None,
-                        session_id=session_id, notebook_id=self.notebook_id
+                if report_result:
+                    created_cell_id, cell_params, cell_error = await self.cell_creator.create_report_cell(
+                        cell_tools=cell_tools, step=step, report=report_result,
+                        dependency_cell_ids=dependency_cell_ids, session_id=session_id,
+                        cell_id=report_preview.cell_id if report_preview else None
                     )
-                    step_result.add_error(cell_error)
+                    if report_preview and created_cell_id:
+                        report_preview.persisted()
+                    elif report_preview:
+                        await report_preview.complete(
+                            cell_params.content if cell_params else "", CellStatus.ERROR,
+                            report_result.model_dump(mode='json'), report_error or cell_error
+                        )
+                    if cell_error:
+                        yield SummaryCellErrorEvent(
+                            error=cell_error, cell_params=cell_params.model_dump() if cell_params else None,
+                            session_id=session_id, notebook_id=self.notebook_id
+                        )
+                        step_result.add_error(cell_error)
+                    else:
+                        yield SummaryCellCreatedEvent(
+                            cell_params=cell_params.model_dump() if cell_params else {},
+                            cell_id=str(created_cell_id) if created_cell_id else None,
+                            error=report_error, session_id=session_id, notebook_id=self.notebook_id
+                        )
+                    if created_cell_id:
+                        plan_step_id_to_cell_ids.setdefault(step.step_id, []).append(created_cell_id)
+                        step_result.add_cell_id(created_cell_id)
+                    final_result_data = report_result
+                    step_result.add_output(report_result)
+                    if report_error:
+                        step_result.add_error(report_error)
                 else:
-                    yield SummaryCellCreatedEvent(
-                        cell_params=cell_params.model_dump() if cell_params else {},
-                        cell_id=str(created_cell_id) if created_cell_id else None,
-                        error=report_error, session_id=session_id, notebook_id=self.notebook_id
-                    )
-                if created_cell_id:
-                    plan_step_id_to_cell_ids.setdefault(step.step_id, []).append(created_cell_id)
-                    step_result.add_cell_id(created_cell_id)
-                final_result_data = report_result
-                step_result.add_output(report_result)
-                if report_error:
-                    step_result.add_error(report_error)
-            else:
-                error_msg = "Report generation failed to produce a report"
-                step_result.add_error(error_msg)
-            
+                    error_msg = "Report generation failed to produce a report"
+                    step_result.add_error(error_msg)
+                    if report_preview:
+                        await report_preview.complete("", CellStatus.ERROR, error=error_msg)
+            except Exception as e:
+                report_error = report_error or f"Report generation failed: {e}"
+                raise
+            finally:
+                # Never leave the provisional cell streaming, whatever stopped the agent
+                if report_preview is not None:
+                    await report_preview.fail(report_error or "Report generation was interrupted")
+
             step_results[step.step_id] = step_result
             yield StepExecutionCompleteEvent(
                 step_id=step.step_id, final_result_data=final_result_data,
                 step_outputs=step_result.outputs, step_error=step_result.get_combined_error(),
                 github_step_has_tool_errors=False, filesystem_step_has_tool_errors=False,
                 python_step_has_tool_errors=False, code_index_query_step_has_tool_errors=code_index_query_step_has_tool_errors, # Use the variable
-                session_id=session_id, notebook_id=self.notebook_id
+                context_tokens=step_result.metadata.get("context_tokens"), session_id=session_id, notebook_id=self.notebook_id
             )
             return
         
@@ -301,7 +333,7 @@ class StepProcessor:
                 )
                 step_result.add_error(error_msg)
                 step_results[step.step_id] = step_result
-                yield StepExecutionCompleteEvent(step_id=step.step_id, final_result_data=None, step_outputs=step_result.outputs, step_error=step_result.get_combined_error(), github_step_has_tool_errors=False, filesystem_step_has_tool_errors=False, python_step_has_tool_errors=True, code_index_query_step_has_tool_errors=code_index_query_step_has_tool_errors, session_id=session_id, notebook_id=self.notebook_id) # Use the variable
+                yield StepExecutionCompleteEvent(step_id=step.step_id, final_result_data=None, step_outputs=step_result.outputs, step_error=step_result.get_combined_error(), github_step_has_tool_errors=False, filesystem_step_has_tool_errors=False, python_step_has_tool_errors=True, code_index_query_step_has_tool_errors=code_index_query_step_has_tool_errors, context_tokens=step_result.metadata.get("context_tokens"), session_id=session_id, notebook_id=self.notebook_id) # Use the variable
                 return
         
         # This was the part with agent_input_data for PythonAgent, MediaTimelineAgent also takes similar care
@@ -319,146 +351,167 @@ class StepProcessor:
             agent_input_data = context.get("prompt", step.description) # Default to step.description
             ai_logger.info(f"Preparing to call MediaTimelineAgent.execute with input: {str(agent_input_data)[:200]}")
 
+        markdown_preview: Optional[StreamingCellPreview] = None
         generator = step_agent.execute(step, agent_input_data, session_id, context, db=db)
-        async for event in generator:
-            if isinstance(event, StatusUpdateEvent):
-                ai_logger.info(f"Step {step.step_id} yielding StatusUpdateEvent: {event.status} - {event.message}")
-                if not event.step_id:
-                    yield StatusUpdateEvent(
-                        status=event.status, agent_type=event.agent_type, message=event.message,
-                        attempt=event.attempt, max_attempts=event.max_attempts, reason=event.reason,
-                        step_id=step.step_id, original_plan_step_id=event.original_plan_step_id,
-                        session_id=session_id, notebook_id=self.notebook_id
-                    )
-                else:
-                    yield event
-            elif isinstance(event, dict) and event.get("type") == "final_step_result" and step.step_type not in [StepType.GITHUB, StepType.FILESYSTEM, StepType.PYTHON]:
-                final_result_data = event.get("result")
-                ai_logger.info(f"Step {step.step_id} received final_step_result (non-tool based): {type(final_result_data)}")
-                if step.step_type == StepType.MEDIA_TIMELINE:
-                    # Media timeline returns a specialized payload, not QueryResult
-                    step_result.add_output(final_result_data)
-                else:
-                    if not isinstance(final_result_data, QueryResult):
-                        ai_logger.error(f"final_step_result did not contain QueryResult for step {step.step_id}")
-                        final_result_data = None
-                        step_result.add_error("Internal error: Invalid final result format")
+        stream_error: Optional[str] = None
+        try:
+            async for event in generator:
+                if isinstance(event, StatusUpdateEvent):
+                    ai_logger.info(f"Step {step.step_id} yielding StatusUpdateEvent: {event.status} - {event.message}")
+                    if not event.step_id:
+                        yield StatusUpdateEvent(
+                            status=event.status, agent_type=event.agent_type, message=event.message,
+                            attempt=event.attempt, max_attempts=event.max_attempts, reason=event.reason,
+                            step_id=step.step_id, original_plan_step_id=event.original_plan_step_id,
+                            session_id=session_id, notebook_id=self.notebook_id
+                        )
                     else:
+                        yield event
+                elif isinstance(event, dict) and event.get("type") == "partial_step_result" and step.step_type == StepType.MARKDOWN:
+                    if markdown_preview is None:
+                        dependency_cell_ids = [cid for dep_id in step.dependencies for cid in plan_step_id_to_cell_ids.get(dep_id, [])]
+                        markdown_preview = self._start_cell_preview(cell_tools, step, CellType.MARKDOWN, dependency_cell_ids, session_id)
+                    await markdown_preview.update(getattr(event.get("result"), "data", "") or "")
+                elif isinstance(event, dict) and event.get("type") == "final_step_result" and step.step_type not in [StepType.GITHUB, StepType.FILESYSTEM, StepType.PYTHON]:
+                    final_result_data = event.get("result")
+                    ai_logger.info(f"Step {step.step_id} received final_step_result (non-tool based): {type(final_result_data)}")
+                    if step.step_type == StepType.MEDIA_TIMELINE:
+                        # Media timeline returns a specialized payload, not QueryResult
                         step_result.add_output(final_result_data)
-                        if final_result_data.error:
-                            step_result.add_error(final_result_data.error)
-                break
-            elif isinstance(event, ToolSuccessEvent):
-                ai_logger.info(f"Step {step.step_id} received ToolSuccessEvent: {event.tool_name}")
-                created_event_map = {
-                    StepType.GITHUB: GitHubToolCellCreatedEvent,
-                    StepType.FILESYSTEM: FileSystemToolCellCreatedEvent,
-                    StepType.PYTHON: PythonToolCellCreatedEvent,
-                    StepType.CODE_INDEX_QUERY: CodeIndexQueryToolCellCreatedEvent,
-                    StepType.LOG_AI: LogAIToolCellCreatedEvent,
-                }
-                created_event_class = created_event_map.get(step.step_type)
-                if created_event_class:
-                    # For CodeIndexQuery steps, create a dedicated cell regardless of the exact MCP tool name.
-                    if step.step_type == StepType.CODE_INDEX_QUERY and isinstance(event, ToolSuccessEvent):
-                        # Accept tool names like "qdrant-find" or "qdrant.qdrant-find" etc.
-                        tool_name_for_display = event.tool_name or "qdrant-find"
-                        created_cell_id, cell_params_model, cell_creation_error_msg = await self.cell_creator.create_code_index_query_cell(
-                            cell_tools=cell_tools, step=step, tool_event=event,
-                            dependency_cell_ids=[cid for dep_id in step.dependencies for cid in plan_step_id_to_cell_ids.get(dep_id, [])],
-                            session_id=session_id
-                        )
-                        if cell_creation_error_msg:
-                            step_result.add_error(cell_creation_error_msg)
-                            # Yield a ToolErrorEvent if cell creation fails for this specific case
-                            yield CodeIndexQueryToolErrorEvent(
-                                original_plan_step_id=step.step_id,
-                                tool_name=tool_name_for_display,
-                                tool_args=event.tool_args,
-                                error=cell_creation_error_msg,
-                                agent_type=agent_type,
-                                session_id=session_id,
-                                notebook_id=self.notebook_id,
-                                tool_call_id=event.tool_call_id
+                    else:
+                        if not isinstance(final_result_data, QueryResult):
+                            ai_logger.error(f"final_step_result did not contain QueryResult for step {step.step_id}")
+                            final_result_data = None
+                            step_result.add_error("Internal error: Invalid final result format")
+                        else:
+                            step_result.add_output(final_result_data)
+                            if final_result_data.error:
+                                step_result.add_error(final_result_data.error)
+                    break
+                elif isinstance(event, ToolSuccessEvent):
+                    ai_logger.info(f"Step {step.step_id} received ToolSuccessEvent: {event.tool_name}")
+                    created_event_map = {
+                        StepType.GITHUB: GitHubToolCellCreatedEvent,
+                        StepType.FILESYSTEM: FileSystemToolCellCreatedEvent,
+                        StepType.PYTHON: PythonToolCellCreatedEvent,
+                        StepType.CODE_INDEX_QUERY: CodeIndexQueryToolCellCreatedEvent,
+                        StepType.LOG_AI: LogAIToolCellCreatedEvent,
+                    }
+                    created_event_class = created_event_map.get(step.step_type)
+                    if created_event_class:
+                        # For CodeIndexQuery steps, create a dedicated cell regardless of the exact MCP tool name.
+                        if step.step_type == StepType.CODE_INDEX_QUERY and isinstance(event, ToolSuccessEvent):
+                            # Accept tool names like "qdrant-find" or "qdrant.qdrant-find" etc.
+                            tool_name_for_display = event.tool_name or "qdrant-find"
+                            created_cell_id, cell_params_model, cell_creation_error_msg = await self.cell_creator.create_code_index_query_cell(
+                                cell_tools=cell_tools, step=step, tool_event=event,
+                                dependency_cell_ids=[cid for dep_id in step.dependencies for cid in plan_step_id_to_cell_ids.get(dep_id, [])],
+                                session_id=session_id
                             )
-                            code_index_query_step_has_tool_errors = True
-                        elif created_cell_id and cell_params_model:
-                            step_result.add_cell_id(created_cell_id)
-                            plan_step_id_to_cell_ids.setdefault(step.step_id, []).append(created_cell_id)
-                            yield CodeIndexQueryToolCellCreatedEvent(
-                                original_plan_step_id=step.step_id,
-                                cell_id=str(created_cell_id),
-                                tool_name=tool_name_for_display,
-                                tool_args=event.tool_args,
-                                result=event.tool_result,
-                                cell_params=cell_params_model.model_dump(),
-                                session_id=session_id,
-                                notebook_id=self.notebook_id
+                            if cell_creation_error_msg:
+                                step_result.add_error(cell_creation_error_msg)
+                                # Yield a ToolErrorEvent if cell creation fails for this specific case
+                                yield CodeIndexQueryToolErrorEvent(
+                                    original_plan_step_id=step.step_id,
+                                    tool_name=tool_name_for_display,
+                                    tool_args=event.tool_args,
+                                    error=cell_creation_error_msg,
+                                    agent_type=agent_type,
+                                    session_id=session_id,
+                                    notebook_id=self.notebook_id,
+                                    tool_call_id=event.tool_call_id
+                                )
+                                code_index_query_step_has_tool_errors = True
+                            elif created_cell_id and cell_params_model:
+                                step_result.add_cell_id(created_cell_id)
+                                plan_step_id_to_cell_ids.setdefault(step.step_id, []).append(created_cell_id)
+                                yield CodeIndexQueryToolCellCreatedEvent(
+                                    original_plan_step_id=step.step_id,
+                                    cell_id=str(created_cell_id),
+                                    tool_name=tool_name_for_display,
+                                    tool_args=event.tool_args,
+                                    result=event.tool_result,
+                                    cell_params=cell_params_model.model_dump(),
+                                    session_id=session_id,
+                                    notebook_id=self.notebook_id
+                                )
+                            step_result.add_output(self.cell_creator._serialize_tool_result(event.tool_result, tool_name_for_display))
+
+                        elif created_event_class != ToolSuccessEvent: # For other specific tool cell created events
+                            _, tool_event = await self._process_tool_success_event(
+                                event=event, step=step, step_type=step.step_type, agent_type=agent_type,
+                                plan_step_id_to_cell_ids=plan_step_id_to_cell_ids, cell_tools=cell_tools,
+                                session_id=session_id, created_event_class=created_event_class,
+                                step_result=step_result
                             )
-                        step_result.add_output(self.cell_creator._serialize_tool_result(event.tool_result, tool_name_for_display))
-
-                    elif created_event_class != ToolSuccessEvent: # For other specific tool cell created events
-                        _, tool_event = await self._process_tool_success_event(
-                            event=event, step=step, step_type=step.step_type, agent_type=agent_type,
-                            plan_step_id_to_cell_ids=plan_step_id_to_cell_ids, cell_tools=cell_tools,
-                            session_id=session_id, created_event_class=created_event_class,
-                            step_result=step_result
-                        )
-                        yield tool_event
-                    # If created_event_class is ToolSuccessEvent but not handled above (e.g. internal tools), it's processed by _process_tool_success_event
-                    # but the resulting event might not be yielded if it's for an internal tool.
-                    # The CodeIndexQueryAgent itself yields a ToolSuccessEvent, which is caught here.
-                    # We only want to create a cell and yield CodeIndexQueryToolCellCreatedEvent.
-                    # Other ToolSuccessEvents are handled by _process_tool_success_event.
-
-            elif isinstance(event, ToolErrorEvent):
-                error_event_map = {
-                    StepType.GITHUB: GitHubToolErrorEvent,
-                    StepType.FILESYSTEM: FileSystemToolErrorEvent,
-                    StepType.PYTHON: PythonToolErrorEvent,
-                    StepType.CODE_INDEX_QUERY: CodeIndexQueryToolErrorEvent,
-                    StepType.LOG_AI: LogAIToolErrorEvent,
-                }
-                error_event_class = error_event_map.get(step.step_type)
-                if error_event_class:
-                    # For generic ToolErrorEvent, we might need to pass more fields if its constructor expects them
-                    # For now, assuming it matches the specific error events' signature or handles missing fields.
-                    ai_logger.info(f"Step {step.step_id} yielding {error_event_class.__name__} for tool {event.tool_name} error: {event.error}")
+                            yield tool_event
+                        # If created_event_class is ToolSuccessEvent but not handled above (e.g. internal tools), it's processed by _process_tool_success_event
+                        # but the resulting event might not be yielded if it's for an internal tool.
+                        # The CodeIndexQueryAgent itself yields a ToolSuccessEvent, which is caught here.
+                        # We only want to create a cell and yield CodeIndexQueryToolCellCreatedEvent.
+                        # Other ToolSuccessEvents are handled by _process_tool_success_event.
+
+                elif isinstance(event, ToolErrorEvent):
+                    error_event_map = {
+                        StepType.GITHUB: GitHubToolErrorEvent,
+                        StepType.FILESYSTEM: FileSystemToolErrorEvent,
+                        StepType.PYTHON: PythonToolErrorEvent,
+                        StepType.CODE_INDEX_QUERY: CodeIndexQueryToolErrorEvent,
+                        StepType.LOG_AI: LogAIToolErrorEvent,
+                    }
+                    error_event_class = error_event_map.get(step.step_type)
+                    if error_event_class:
+                        # For generic ToolErrorEvent, we might need to pass more fields if its constructor expects them
+                        # For now, assuming it matches the specific error events' signature or handles missing fields.
+                        ai_logger.info(f"Step {step.step_id} yielding {error_event_class.__name__} for tool {event.tool_name} error: {event.error}")
                     
-                    # Construct the event based on whether it's a generic ToolErrorEvent or a specific one
-                    # For generic ToolErrorEvent, we might need to pass more fields if its constructor expects them
-                    # For now, assuming it matches the specific error events' signature or handles missing fields.
-                    # This block will now primarily handle specific error events.
-                    # The CodeIndexQueryAgent yields a ToolErrorEvent directly with all necessary fields.
-                    if error_event_class and error_event_class != ToolErrorEvent: # Only yield specific, non-generic error events here
-                        yield error_event_class(
-                            original_plan_step_id=step.step_id, tool_call_id=event.tool_call_id,
-                            tool_name=event.tool_name, tool_args=event.tool_args, error=event.error,
-                            session_id=session_id, notebook_id=self.notebook_id
-                        )
-                    elif error_event_class == ToolErrorEvent: # If it's a generic ToolErrorEvent (e.g. from CodeIndexQueryAgent)
-                        yield event # Forward the already constructed ToolErrorEvent
-                    else:
-                        ai_logger.warning(f"No specific error event class found for step type {step.step_type} and tool {event.tool_name}")
+                        # Construct the event based on whether it's a generic ToolErrorEvent or a specific one
+                        # For generic ToolErrorEvent, we might need to pass more fields if its constructor expects them
+                        # For now, assuming it matches the specific error events' signature or handles missing fields.
+                        # This block will now primarily handle specific error events.
+                        # The CodeIndexQueryAgent yields a ToolErrorEvent directly with all necessary fields.
+                        if error_event_class and error_event_class != ToolErrorEvent: # Only yield specific, non-generic error events here
+                            yield error_event_class(
+                                original_plan_step_id=step.step_id, tool_call_id=event.tool_call_id,
+                                tool_name=event.tool_name, tool_args=event.tool_args, error=event.error,
+                                session_id=session_id, notebook_id=self.notebook_id
+                            )
+                        elif error_event_class == ToolErrorEvent: # If it's a generic ToolErrorEvent (e.g. from CodeIndexQueryAgent)
+                            yield event # Forward the already constructed ToolErrorEvent
+                        else:
+                            ai_logger.warning(f"No specific error event class found for step type {step.step_type} and tool {event.tool_name}")
 
 
-                if step.step_type == StepType.FILESYSTEM: filesystem_step_has_tool_errors = True
-                if step.step_type == StepType.PYTHON: python_step_has_tool_errors = True
-                if step.step_type == StepType.CODE_INDEX_QUERY: code_index_query_step_has_tool_errors = True # Added
-                step_result.add_error(f"Error in tool {event.tool_name}: {event.error}")
-            elif isinstance(event, BaseEvent): # Catch other BaseEvents that might be ToolErrorEvent from CodeIndexQueryAgent
-                if isinstance(event, ToolErrorEvent) and event.tool_name and event.tool_name.endswith("qdrant-find"):
-                    code_index_query_step_has_tool_errors = True
+                    if step.step_type == StepType.FILESYSTEM: filesystem_step_has_tool_errors = True
+                    if step.step_type == StepType.PYTHON: python_step_has_tool_errors = True
+                    if step.step_type == StepType.CODE_INDEX_QUERY: code_index_query_step_has_tool_errors = True # Added
                     step_result.add_error(f"Error in tool {event.tool_name}: {event.error}")
-                ai_logger.info(f"Step {step.step_id} yielding generic BaseEvent: {type(event)}")
-                yield event
-        
+                elif isinstance(event, BaseEvent): # Catch other BaseEvents that might be ToolErrorEvent from CodeIndexQueryAgent
+                    if isinstance(event, ToolErrorEvent) and event.tool_name and event.tool_name.endswith(("qdrant-find", "hybrid_code_search")):
+                        code_index_query_step_has_tool_errors = True
+                        step_result.add_error(f"Error in tool {event.tool_name}: {event.error}")
+                    ai_logger.info(f"Step {step.step_id} yielding generic BaseEvent: {type(event)}")
+                    yield event
+        except Exception as e:
+            stream_error = f"Markdown generation failed: {e}"
+            raise
+        finally:
+            # Without a final result the markdown cell below is never created
+            if markdown_preview is not None and final_result_data is None:
+                await markdown_preview.fail(stream_error or "Markdown generation did not produce a result")
+
         if step.step_type == StepType.MARKDOWN and final_result_data:
             dependency_cell_ids = [cid for dep_id in step.dependencies for cid in plan_step_id_to_cell_ids.get(dep_id, [])]
             created_cell_id, cell_params, cell_error = await self.cell_creator.create_markdown_cell(
                 cell_tools=cell_tools, step=step, result=final_result_data,
-                dependency_cell_ids=dependency_cell_ids, session_id=session_id
+                dependency_cell_ids=dependency_cell_ids, session_id=session_id,
+                cell_id=markdown_preview.cell_id if markdown_preview else None
             )
+            if markdown_preview:
+                if created_cell_id:
+                    markdown_preview.persisted()
+                else:
+                    await markdown_preview.complete(cell_params.content if cell_params else "", CellStatus.ERROR, error=cell_error)
             if cell_error:
                 step_result.add_error(cell_error)
             if created_cell_id:
@@ -550,9 +603,27 @@ class StepProcessor:
             filesystem_step_has_tool_errors=filesystem_step_has_tool_errors,
             python_step_has_tool_errors=python_step_has_tool_errors,
             code_index_query_step_has_tool_errors=code_index_query_step_has_tool_errors, # Added
-            session_id=session_id, notebook_id=self.notebook_id
+            context_tokens=step_result.metadata.get("context_tokens"), session_id=session_id, notebook_id=self.notebook_id
         )
     
+    def _start_cell_preview(
+        self,
+        cell_tools: NotebookCellTools,
+        step: InvestigationStepModel,
+        cell_type: CellType,
+        dependency_cell_ids: List[UUID],
+        session_id: str
+    ) -> StreamingCellPreview:
+        """Begin websocket previews for a cell whose content is still being streamed from the model"""
+        ai_logger.info(f"Step {step.step_id}: streaming {cell_type.value} cell preview")
+        return StreamingCellPreview(
+            notebook_manager=cell_tools.notebook_manager,
+            notebook_id=self.notebook_id,
+            cell_type=cell_type,
+            metadata={"session_id": session_id, "step_id": step.step_id},
+            dependencies=dependency_cell_ids,
+        )
+
     async def _process_tool_success_event(
         self, 
         event: ToolSuccessEvent,
@@ -657,77 +728,11 @@ class StepProcessor:
             context["prompt"] += f"\n\nParameters for this step:\n{params_str}"
             ai_logger.info(f"Step {step.step_id} parameters added to prompt: {params_str}")
         
-        dependency_context = []
-        for dep_id in step.dependencies:
-            if dep_id in executed_steps:
-                dep_step_info = executed_steps[dep_id]
-
-                if not isinstance(dep_step_info, dict):
-                    ai_logger.warning(f"Dependency info for {dep_id} is not a dictionary: {type(dep_step_info)}. Skipping context for this dependency.")
-                    dependency_context.append(f"- Dependency '{dep_id}': Information malformed or unavailable.")
-                    continue
-
-                raw_dep_step_model_data = dep_step_info.get('step')
-                dep_overall_error = dep_step_info.get('error')
-                dep_result_obj = step_results.get(dep_id)
-
-                if not raw_dep_step_model_data: # This check handles if 'step' key is missing or its value is None
-                    ai_logger.warning(f"Could not find step model data for dependency ID {dep_id} in executed_steps.")
-                    dependency_context.append(f"- Dependency '{dep_id}': Step model data unavailable.")
-                    continue
-                
-                # Ensure raw_dep_step_model_data is a dict before attempting to create InvestigationStepModel from it
-                if not isinstance(raw_dep_step_model_data, dict):
-                    ai_logger.error(f"Step model data for dependency {dep_id} is not a dictionary: {type(raw_dep_step_model_data)}. Skipping.")
-                    dependency_context.append(f"- Dependency '{dep_id}': Invalid step model data format.")
-                    continue
+        dependency_context, dependency_tokens = self.context_builder.build_dependency_context(
+            step, executed_steps, step_results
+        )
+        context["dependency_tokens"] = dependency_tokens
 
-                try:
-                    dep_step_model = InvestigationStepModel(**raw_dep_step_model_data)
-                except Exception as e:
-                    ai_logger.error(f"Failed to parse InvestigationStepModel for dependency {dep_id} from data {raw_dep_step_model_data}: {e}")
-                    dependency_context.append(f"- Dependency '{dep_id}': Error parsing step model data.")
-                    continue
-                    
-                context_limit = STEP_CONTEXT_SNIPPET_LIMIT # Use updated limit
-                context_line = f"- Dependency '{dep_id}' ({dep_step_model.step_type.value}): {dep_step_model.description[:context_limit]}..."
-                
-                if isinstance(dep_result_obj, StepResult) and dep_result_obj.outputs:
-                    context_line += " (Outputs Available)"
-                    outputs_summary_lines = []
-                    for i, out_data in enumerate(dep_result_obj.outputs): # Limit number of outputs summarized
-                        summary_prefix = f"  - Output {i+1}:"
-                        if isinstance(out_data, dict):
-                            if out_data.get("status") == "success" and "stdout" in out_data and out_data.get("stdout") is not None:
-                                outputs_summary_lines.append(f"{summary_prefix} (stdout): {str(out_data['stdout'])[:context_limit].strip()}...")
-                            elif "path" in out_data and "content" in out_data:
-                                outputs_summary_lines.append(f"{summary_prefix} (file: {out_data['path']}): {str(out_data['content'])[:context_limit].strip()}...")
-                            elif "search_results" in out_data:
-                                search_results_data = out_data.get("search_results")
-                                count = len(search_results_data) if isinstance(search_results_data, list) else 0
-                                first_item_str = str(search_results_data[0])[:context_limit] if search_results_data and count > 0 else ""
-                                outputs_summary_lines.append(f"{summary_prefix} ({count} search results found).{' First: ' + first_item_str + '...' if count > 0 else ''}")
-                            else:
-                                outputs_summary_lines.append(f"{summary_prefix} {str(out_data)[:context_limit].strip()}...")
-                        elif isinstance(out_data, list):
-                             outputs_summary_lines.append(f"{summary_prefix} (list with {len(out_data)} items). First: {str(out_data[0])[:context_limit]}..." if out_data else f"{summary_prefix} (empty list).")
-                        elif isinstance(out_data, QueryResult):
-                             outputs_summary_lines.append(f"{summary_prefix} {str(out_data.data)[:context_limit].strip()}...")
-                        else:
-                            outputs_summary_lines.append(f"{summary_prefix} {str(out_data)[:context_limit].strip()}...")
-                    
-                    if outputs_summary_lines: context_line += "\n" + "\n".join(outputs_summary_lines)
-                    else: context_line += " (Step had outputs, but they could not be summarized for context.)"
-                elif dep_overall_error:
-                    context_line += f" (Failed: {str(dep_overall_error)[:context_limit]}... No usable output data for context.)"
-                elif isinstance(dep_result_obj, StepResult) and dep_result_obj.has_error():
-                     combined_error = dep_result_obj.get_combined_error()
-                     error_snippet = str(combined_error)[:context_limit] if combined_error else "Unknown error"
-                     context_line += f" (Failed: {error_snippet}... No usable output data for context.)"
-                else:
-                    context_line += " (Completed with no specific output data for context.)"
-                dependency_context.append(context_line)
-        
         if dependency_context:
             context["prompt"] += f"\n\nContext from Dependencies:\n" + "\n".join(dependency_context)
             ai_logger.info(f"Step {step.step_id} full dependency context: {' '.join(dependency_context)}")
@@ -807,14 +812,14 @@ class StepProcessor:
                     if step_res_obj.step_type == StepType.MARKDOWN and step_res_obj.outputs:
                         output = step_res_obj.outputs[0]
                         data_to_show = output.data if isinstance(output, QueryResult) else output
-                        result_str = f"Data: {str(data_to_show)[:REPORT_CONTEXT_SNIPPET_LIMIT]}..."
+                        result_str = f"Data: {render_tool_output(data_to_show, REPORT_CONTEXT_SNIPPET_LIMIT)}"
                     else:
                         # Summarize multiple outputs, with a cap on the number of outputs and length of each
                         formatted_outputs = []
                         for i, output_data in enumerate(step_res_obj.outputs[:5]): # Show max 5 outputs
                             # Truncate each output summary, dividing the limit among them or using a smaller fixed limit per output
-                            output_summary = str(output_data)[:REPORT_CONTEXT_SNIPPET_LIMIT // 2] # e.g. 2000 chars per output
-                            formatted_outputs.append(f"  - Output {i+1}: {output_summary}...")
+                            output_summary = render_tool_output(output_data, REPORT_CONTEXT_SNIPPET_LIMIT // 2) # e.g. 2000 chars per output
+                            formatted_outputs.append(f"  - Output {i+1}: {output_summary}")
                         if len(step_res_obj.outputs) > 5:
                             formatted_outputs.append(f"  ... and {len(step_res_obj.outputs) - 5} more outputs.")
                         result_str = "Data (multiple outputs):\\n" + "\\n".join(formatted_outputs) if formatted_outputs else "Step completed, but no specific outputs captured."
@@ -2,7 +2,7 @@
 StepResult class for tracking comprehensive results from investigation steps.
 """
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 from uuid import UUID
 
 from backend.ai.models import StepType
@@ -16,10 +16,18 @@ class StepResult:
         self.errors: List[str] = []   # List of all errors encountered
         self.cell_ids: List[UUID] = [] # List of all cell IDs created for this step
         self.metadata: Dict[str, Any] = {} # Additional metadata about the step
+        self._rendered_outputs: Optional[List[str]] = None # Cached context rendering of outputs
 
     def add_output(self, output: Any) -> None:
         """Add an output from a cell to this step's results"""
         self.outputs.append(output)
+        self._rendered_outputs = None
+
+    def get_rendered_outputs(self, renderer: Callable[[Any], str]) -> List[str]:
+        """Render every output once and cache the result until a new output is added"""
+        if self._rendered_outputs is None:
+            self._rendered_outputs = [renderer(output) for output in self.outputs]
+        return self._rendered_outputs
     
     def add_error(self, error: str) -> None:
         """Add an error encountered during step execution"""
@@ -11,7 +11,8 @@ import os
 from pydantic_ai import Agent, UnexpectedModelBehavior
 
 from pydantic_ai.models.openai import OpenAIModel
-from pydantic_ai.providers.openai import OpenAIProvider
+from backend.ai.models import get_openrouter_provider
+from backend.ai.cell_streaming import stream_partial_outputs
 
 from backend.config import get_settings
 # Need to define SummarizationQueryResult later in backend/core/query_result.py
@@ -33,10 +34,7 @@ class SummarizationAgent:
         self.settings = get_settings()
         self.model = OpenAIModel(
                 self.settings.ai_model,
-                provider=OpenAIProvider(
-                    base_url='https://openrouter.ai/api/v1',
-                    api_key=self.settings.openrouter_api_key,
-                ),
+                provider=get_openrouter_provider(),
         )
         self.notebook_id = notebook_id
         self.agent: Optional[Agent] = None # Agent instance created lazily or during run
@@ -122,12 +120,14 @@ class SummarizationAgent:
 
             try:
                 summarization_agent_logger.info(f"Running agent with prompt: {input_prompt[:200]}...")
-                # Use agent.run directly as no complex iteration or tool calls are expected
-                run_result_obj = await self.agent.run(input_prompt)
-                summarization_agent_logger.info(f"Attempt {current_attempt}: Agent run finished. Raw result: {run_result_obj}")
-                
-                # Access the output Pydantic model
-                run_result = run_result_obj.output
+                # Stream the summary; partial markdown is surfaced as SummaryUpdateEvents so callers can preview it
+                run_result = None
+                async with self.agent.run_stream(input_prompt) as streamed_run:
+                    async for partial_summary, is_last in stream_partial_outputs(streamed_run):
+                        run_result = partial_summary
+                        if not is_last and getattr(partial_summary, "data", None):
+                            yield SummaryUpdateEvent(update_info={"partial_data": partial_summary.data, "attempt": current_attempt}, **event_common)
+                summarization_agent_logger.info(f"Attempt {current_attempt}: Agent run finished. Result: {run_result}")
 
                 # Process the result
                 if isinstance(run_result, SummarizationQueryResult):
@@ -0,0 +1,203 @@
+"""
+Per-investigation memoization of read-only MCP tool calls.
+
+Separate steps of one plan frequently issue the exact same MCP call (the same
+`read_file` path, the same GitHub `search_code` query, retries of the same
+lookup). While an investigation runs, a ToolCallMemo is active in the current
+context and every MemoizingMCPServerStdio consults it before going to the
+remote server. Only tools on READ_ONLY_TOOL_ALLOWLIST are memoized, so calls
+with side effects always reach the server, and they drop the results memoized
+for their connection.
+
+Results are keyed by (connection, tool name, canonicalized arguments). Hits are
+also recorded by (tool name, arguments) so the step processor can mark the
+cells created from a cached result.
+"""
+
+import copy
+import json
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from pydantic_ai.mcp import MCPServerStdio
+from pydantic_ai.tools import ToolDefinition
+
+tool_memo_logger = logging.getLogger("ai.tool_memo")
+
+READ_ONLY_TOOL_ALLOWLIST = frozenset({
+    # Filesystem MCP server
+    "read_file",
+    "read_multiple_files",
+    "list_directory",
+    "directory_tree",
+    "search_files",
+    "get_file_info",
+    "list_allowed_directories",
+    "search_content",
+    "read_lines",
+    "tail_lines",
+    "read_time_window",
+    "grep_file",
+    # GitHub MCP server
+    "get_file_contents",
+    "search_code",
+    "search_repositories",
+    "search_issues",
+    "search_users",
+    "get_issue",
+    "get_issue_comments",
+    "list_issues",
+    "get_pull_request",
+    "get_pull_request_files",
+    "get_pull_request_status",
+    "get_pull_request_comments",
+    "get_pull_request_reviews",
+    "list_pull_requests",
+    "list_commits",
+    "get_commit",
+    "list_branches",
+    "list_tags",
+    "get_tag",
+    "get_me",
+    # Qdrant MCP server (git_repo connections)
+    "qdrant-find",
+})
+
+MAX_MEMO_ENTRIES = 512
+
+_current_tool_memo: ContextVar[Optional["ToolCallMemo"]] = ContextVar("current_tool_memo", default=None)
+
+
+def canonicalize_args(arguments: Optional[Dict[str, Any]]) -> str:
+    """Stable string form of tool arguments (key order and whitespace independent)."""
+    return json.dumps(arguments or {}, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class ToolCallMemo:
+    """In-memory store of read-only tool results for a single investigation."""
+
+    def __init__(self, max_entries: int = MAX_MEMO_ENTRIES):
+        self.max_entries = max_entries
+        self._results: Dict[Tuple[str, str, str], Any] = {}
+        self._served_from_cache: Counter = Counter()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def is_memoizable(tool_name: str) -> bool:
+        return tool_name in READ_ONLY_TOOL_ALLOWLIST
+
+    def lookup(self, connection_key: str, tool_name: str, arguments: Optional[Dict[str, Any]]) -> Tuple[bool, Any]:
+        """Return (found, result). A found result is a copy the caller may mutate freely."""
+        key = (connection_key, tool_name, canonicalize_args(arguments))
+        if key not in self._results:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        self._served_from_cache[(tool_name, key[2])] += 1
+        return True, copy.deepcopy(self._results[key])
+
+    def store(self, connection_key: str, tool_name: str, arguments: Optional[Dict[str, Any]], result: Any) -> None:
+        if len(self._results) >= self.max_entries:
+            tool_memo_logger.debug(f"Tool memo full ({self.max_entries} entries); not caching {tool_name}")
+            return
+        self._results[(connection_key, tool_name, canonicalize_args(arguments))] = copy.deepcopy(result)
+
+    def invalidate(self, connection_key: str) -> int:
+        """Drop every result memoized for `connection_key`; returns how many were dropped."""
+        stale = [key for key in self._results if key[0] == connection_key]
+        for key in stale:
+            del self._results[key]
+        return len(stale)
+
+    def consume_cached_marker(self, tool_name: Optional[str], arguments: Optional[Dict[str, Any]]) -> bool:
+        """
+        True if a call with this tool name and arguments was answered from the memo
+        and has not been claimed yet. Each hit can be claimed once, so a cell is only
+        marked cached for the call that actually skipped the server.
+        """
+        if not tool_name:
+            return False
+        marker = (tool_name, canonicalize_args(arguments))
+        if self._served_from_cache[marker] > 0:
+            self._served_from_cache[marker] -= 1
+            return True
+        return False
+
+
+def get_current_tool_memo() -> Optional[ToolCallMemo]:
+    """The memo of the investigation running in the current context, if any."""
+    return _current_tool_memo.get()
+
+
+@contextmanager
+def tool_memo_scope() -> Iterator[ToolCallMemo]:
+    """Activate a fresh ToolCallMemo for the duration of one investigation."""
+    memo = ToolCallMemo()
+    token = _current_tool_memo.set(memo)
+    try:
+        yield memo
+    finally:
+        tool_memo_logger.info(f"Tool memo closed: {memo.hits} hits, {memo.misses} misses")
+        try:
+            _current_tool_memo.reset(token)
+        except ValueError:
+            # Generator finalized from a different context (e.g. garbage collected); nothing to restore.
+            pass
+
+
+async def memoized_call_tool(
+    connection_key: str,
+    tool_name: str,
+    arguments: Dict[str, Any],
+    call: Callable[[str, Dict[str, Any]], Awaitable[Any]],
+) -> Any:
+    """`call(tool_name, arguments)`, answered from the active ToolCallMemo when the tool is allowlisted."""
+    memo = get_current_tool_memo()
+    if memo is None:
+        return await call(tool_name, arguments)
+    if not memo.is_memoizable(tool_name):
+        # Anything off the allowlist may write, so earlier reads on this connection are stale
+        try:
+            return await call(tool_name, arguments)
+        finally:
+            dropped = memo.invalidate(connection_key)
+            if dropped:
+                tool_memo_logger.info(f"{tool_name} on {connection_key} invalidated {dropped} memoized results")
+
+    found, result = memo.lookup(connection_key, tool_name, arguments)
+    if found:
+        tool_memo_logger.info(f"Serving {tool_name} on {connection_key} from investigation memo")
+        return result
+
+    result = await call(tool_name, arguments)
+    memo.store(connection_key, tool_name, arguments, result)
+    return result
+
+
+class MemoizingMCPServerStdio(MCPServerStdio):
+    """
+    MCPServerStdio that serves allowlisted read-only calls from the active ToolCallMemo
+    and lists the server's tools once per run.
+    """
+
+    def __init__(self, *args: Any, connection_key: str = "default", **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._connection_key = connection_key
+        self._tool_definitions: Optional[List[ToolDefinition]] = None
+
+    async def __aenter__(self) -> "MemoizingMCPServerStdio":
+        self._tool_definitions = None
+        return await super().__aenter__()
+
+    async def list_tools(self) -> List[ToolDefinition]:
+        # pydantic-ai asks before every model request; a running server's tools do not change
+        if self._tool_definitions is None:
+            self._tool_definitions = await super().list_tools()
+        return list(self._tool_definitions)
+
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Any:
+        return await memoized_call_tool(self._connection_key, tool_name, arguments, super().call_tool)
@@ -1 +1,9 @@
- 
\ No newline at end of file
+from backend.ai.utils.truncation import (
+    TOOL_RESULT_MAX_CHARS,
+    render_tool_output,
+    truncate_structure,
+    truncate_text,
+    truncate_tool_output,
+)
+
+_truncate_output = truncate_tool_output  # previous name, still used by callers and tests
@@ -7,25 +7,11 @@ from datetime import datetime, timezone
 # It's crucial that this CellStatus import points to the correct location
 # in your project. Adjust if necessary.
 from backend.core.cell import CellStatus
+from backend.ai.utils.truncation import render_tool_output
+from backend.services.artifact_store import ARTIFACT_REF_RE, get_artifact_store
 
 context_utils_logger = logging.getLogger("ai.context_utils")
 
-# --- Added from backend/ai/utils.py ---
-TOOL_RESULT_MAX_CHARS = 10000  # Default from filesystem_agent, can be overridden by caller
-
-def _truncate_output(content: Any, limit: int = TOOL_RESULT_MAX_CHARS) -> Any:
-    """Truncate the given string if it exceeds *limit* characters, appending an indicator.
-
-    Non-string content is returned unchanged so the caller can forward it as-is.
-    """
-    if not isinstance(content, str):
-        return content  # Non-string results are returned unchanged
-    if len(content) <= limit:
-        return content
-    truncated = content[:limit]
-    return truncated + f"\n\n...[output truncated – original length {len(content)} characters]" 
-# --- End Added ---
-
 # Consider moving STOP_WORDS_CONTEXT_PREP to a shared constants file if used elsewhere.
 STOP_WORDS_CONTEXT_PREP = set([
     "a", "an", "the", "is", "are", "was", "were", "be", "been", "being",
@@ -49,14 +35,30 @@ INDIVIDUAL_TOOL_ARG_TRUNCATE_LIMIT = 30
 
 
 def _truncate_for_context(content: Any, limit: int = DEFAULT_CONTEXT_TRUNCATE_LIMIT) -> str:
-    """Safely converts content to string and truncates it."""
-    content_str = str(content)
+    """Safely converts content to string and truncates it (structures are elided while walking, not stringified whole)."""
+    content_str = content if isinstance(content, str) else render_tool_output(content, limit)
     if len(content_str) <= limit:
         return content_str
     truncated = content_str[:limit]
     return truncated + f"... (truncated, original length {len(content_str)})"
 
 
+def _summarize_artifact_ref(match: "re.Match", limit: int) -> str:
+    """One-line planner summary of an `<ARTIFACT .../>` reference in Python output."""
+    kind, artifact_id = match.group(1), match.group(2)
+    if kind == "plot":
+        return "Python Output: Plot generated."
+    preview = get_artifact_store().load_dataframe(artifact_id)
+    if not preview:
+        return "Python Output: DataFrame displayed."
+    columns = ", ".join(f"{c['name']} ({c['type']})" for c in preview.get("columns", []))
+    head = json.dumps(preview.get("rows", [])[:3], default=str)
+    return _truncate_for_context(
+        f"Python Output: DataFrame displayed ({preview.get('total_rows')} rows; columns: {columns}); first rows: {head}",
+        limit=limit,
+    )
+
+
 def _parse_datetime_optional(ts_str: Optional[str]) -> datetime:
     """Parses an optional ISO datetime string to a timezone-aware datetime object."""
     if not ts_str:
@@ -172,12 +174,18 @@ def prepare_notebook_context_for_planner(
         if cell_output_data and cell_output_data.get('content') is not None:
             raw_output_content = cell_output_data.get('content')
             temp_summary = ""
+            if cell_type == 'python' and isinstance(raw_output_content, dict) and isinstance(raw_output_content.get('stdout'), str):
+                raw_output_content = raw_output_content['stdout']  # Summarize what the script printed, not the envelope
             if cell_type == 'python' and isinstance(raw_output_content, str):
-                # Basic checks for common Python rich output patterns
+                # Plots / DataFrames are stored as artifacts and referenced from the output
+                artifact_match = ARTIFACT_REF_RE.search(raw_output_content)
+                # Basic checks for common Python rich output patterns (outputs stored before artifacts)
                 df_match = re.search(r"--- DataFrame ---(.*?)--- End DataFrame ---", raw_output_content, re.DOTALL)
                 plot_match = re.search(r"<PLOT_BASE64>(.*?)</PLOT_BASE64>", raw_output_content)
                 json_match = re.search(r"<JSON_OUTPUT>(.*?)</JSON_OUTPUT>", raw_output_content, re.DOTALL)
-                if df_match:
+                if artifact_match:
+                    temp_summary = _summarize_artifact_ref(artifact_match, context_summary_truncate_limit)
+                elif df_match:
                     temp_summary = f"Python Output: DataFrame displayed (preview): {_truncate_for_context(df_match.group(1).strip(), limit=context_summary_truncate_limit)}"
                 elif plot_match:
                     temp_summary = "Python Output: Plot generated." # Avoid showing base64
@@ -186,9 +194,9 @@ def prepare_notebook_context_for_planner(
                 else:
                     temp_summary = f"Python Output: {_truncate_for_context(str(raw_output_content), limit=context_summary_truncate_limit)}"
             elif isinstance(raw_output_content, list):
-                temp_summary = f"Output (list): {_truncate_for_context(json.dumps(raw_output_content), limit=context_summary_truncate_limit)}"
+                temp_summary = f"Output (list): {_truncate_for_context(raw_output_content, limit=context_summary_truncate_limit)}"
             elif isinstance(raw_output_content, dict): # For general structured dict output
-                temp_summary = f"Output (structured): {_truncate_for_context(json.dumps(raw_output_content), limit=context_summary_truncate_limit)}"
+                temp_summary = f"Output (structured): {_truncate_for_context(raw_output_content, limit=context_summary_truncate_limit)}"
             else: # For plain string output or other types
                 temp_summary = f"Output: {_truncate_for_context(str(raw_output_content), limit=context_summary_truncate_limit)}"
             
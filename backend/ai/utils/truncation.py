@@ -0,0 +1,162 @@
+"""
+Size-aware truncation of tool results before they enter prompts or cells.
+
+The previous helpers called ``str()`` / ``json.dumps`` on the whole result and
+then sliced it, so a 200MB ``read_file`` result was fully materialized (often
+more than once) to keep a few thousand characters. The helpers here walk the
+result instead and stop once the budget is spent:
+
+  * text keeps its first lines and a few tail lines around an elision marker
+    that states what was dropped (characters and lines, counted in place);
+  * dicts keep their keys in order until the budget runs out, then list the
+    elided keys;
+  * lists keep head items and the last item around an ``...[N items elided]``
+    marker;
+  * bytes become a ``<N bytes>`` placeholder.
+
+Budgets are in characters of the rendered (JSON) text, which is what prompts
+pay for. Results that already fit are returned unchanged, as the same object.
+"""
+
+import json
+from typing import Any, List, Tuple
+
+TOOL_RESULT_MAX_CHARS = 10000  # default budget for a tool result sent to the model
+
+TAIL_FRACTION = 4  # the text tail gets at most limit // TAIL_FRACTION characters
+MIN_CHILD_BUDGET = 64  # smallest budget handed to a nested value
+MAX_ELIDED_KEYS_LISTED = 10
+_SCALAR_COST = 8
+
+
+def truncate_text(text: str, limit: int = TOOL_RESULT_MAX_CHARS) -> str:
+    """
+    The first *limit* characters of *text* (ending at a line break when there is
+    one), a marker with the original size, then the last lines within
+    ``limit // TAIL_FRACTION`` characters. Text within *limit* is returned as is.
+    """
+    if len(text) <= limit:
+        return text
+    limit = max(limit, 0)
+    head_end = limit
+    line_end = text.rfind("\n", 0, limit)
+    if line_end > limit // 2:
+        head_end = line_end  # keep whole lines when that costs at most half the head
+    tail_start = len(text)
+    tail_budget = limit // TAIL_FRACTION
+    if tail_budget:
+        # The tail starts at a line start so only whole lines are shown
+        tail_line = text.find("\n", max(head_end, len(text) - tail_budget))
+        if tail_line != -1:
+            tail_start = tail_line + 1
+    elided_lines = text.count("\n", head_end, tail_start)
+    marker = (
+        f"\n\n...[output truncated – original length {len(text)} characters, "
+        f"{text.count(chr(10)) + 1} lines; {tail_start - head_end} characters ({elided_lines} lines) elided]"
+    )
+    tail = text[tail_start:]
+    return text[:head_end] + marker + (f"\n\n{tail}" if tail else "")
+
+
+def _shrink(value: Any, budget: int) -> Tuple[Any, int, bool]:
+    """(elided copy of *value*, approximate rendered size, whether anything was elided)."""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value, _SCALAR_COST, False
+    if isinstance(value, str):
+        if len(value) + 2 <= budget:
+            return value, len(value) + 2, False
+        shortened = truncate_text(value, max(budget - 2, MIN_CHILD_BUDGET) * TAIL_FRACTION // (TAIL_FRACTION + 1))
+        return shortened, len(shortened) + 2, True
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        placeholder = f"<{len(value)} bytes>"
+        return placeholder, len(placeholder) + 2, True
+    if hasattr(value, "model_dump"):  # pydantic models: walk their fields, not their repr
+        return _shrink(value.model_dump(mode="python"), budget)
+    if isinstance(value, dict):
+        return _shrink_dict(value, budget)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return _shrink_list(list(value) if isinstance(value, (set, frozenset)) else value, budget)
+    return _shrink(str(value), budget)
+
+
+def _shrink_dict(value: dict, budget: int) -> Tuple[Any, int, bool]:
+    out = {}
+    used = 2
+    elided = False
+    keys = list(value.keys())
+    for index, key in enumerate(keys):
+        key_cost = len(str(key)) + 4
+        # Values later in the dict still get a share: the remaining budget is split over the next few keys
+        remaining = budget - used - key_cost
+        share = max(remaining // max(1, min(len(keys) - index, 4)), MIN_CHILD_BUDGET)
+        child, size, child_elided = _shrink(value[key], share)
+        if index > 0 and used + key_cost + size > budget:
+            rest = keys[index:]
+            listed = ", ".join(str(k) for k in rest[:MAX_ELIDED_KEYS_LISTED])
+            more = f", ... (+{len(rest) - MAX_ELIDED_KEYS_LISTED})" if len(rest) > MAX_ELIDED_KEYS_LISTED else ""
+            note = f"[{len(rest)} more keys elided: {listed}{more}]"
+            out["..."] = note
+            return out, used + len(note) + 9, True
+        out[key] = child
+        used += key_cost + size
+        elided = elided or child_elided
+    return (out if elided else value), used, elided
+
+
+def _shrink_list(value: List[Any], budget: int) -> Tuple[Any, int, bool]:
+    count = len(value)
+    head: List[Any] = []
+    used = 2
+    elided = False
+    tail_reserve = budget // TAIL_FRACTION if count > 1 else 0
+    index = 0
+    while index < count:
+        is_last = index == count - 1
+        limit = budget if is_last else budget - tail_reserve
+        share = max((limit - used) // max(1, min(count - index, 8)), MIN_CHILD_BUDGET)
+        child, size, child_elided = _shrink(value[index], share)
+        if index > 0 and used + size + 2 > limit:
+            break
+        head.append(child)
+        used += size + 2
+        elided = elided or child_elided
+        index += 1
+    if index == count:
+        return (head if elided else value), used, elided
+
+    # Keep the last item (often a total or the latest entry) when the reserve allows it
+    tail: List[Any] = []
+    if index < count - 1 and tail_reserve >= _SCALAR_COST:
+        child, size, _ = _shrink(value[-1], tail_reserve)
+        if size <= tail_reserve or tail_reserve >= MIN_CHILD_BUDGET:
+            tail.append(child)
+            used += size + 2
+    skipped = count - index - len(tail)
+    marker = f"...[{skipped} of {count} items elided]..."
+    return head + [marker] + tail, used + len(marker) + 4, True
+
+
+def truncate_structure(value: Any, budget: int = TOOL_RESULT_MAX_CHARS) -> Any:
+    """JSON-compatible copy of *value* within roughly *budget* characters (the same object if it fits)."""
+    return _shrink(value, budget)[0]
+
+
+def truncate_tool_output(content: Any, limit: int = TOOL_RESULT_MAX_CHARS) -> Any:
+    """
+    A tool result cut down to about *limit* characters, keeping its type: text is
+    truncated with `truncate_text`, dicts/lists structurally. Results that fit,
+    and scalars, are returned unchanged.
+    """
+    if isinstance(content, str):
+        return truncate_text(content, limit)
+    if isinstance(content, (dict, list, tuple)) or hasattr(content, "model_dump"):
+        shrunk, _, elided = _shrink(content, limit)
+        return shrunk if elided else content
+    return content
+
+
+def render_tool_output(content: Any, limit: int = TOOL_RESULT_MAX_CHARS) -> str:
+    """Text of a tool result for a prompt, within about *limit* characters."""
+    if isinstance(content, str):
+        return truncate_text(content, limit)
+    return json.dumps(truncate_structure(content, limit), default=str, ensure_ascii=False)
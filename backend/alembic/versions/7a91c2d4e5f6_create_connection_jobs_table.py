@@ -0,0 +1,52 @@
+"""create_connection_jobs_table
+
+Revision ID: 7a91c2d4e5f6
+Revises: 4c1ed825800b
+Create Date: 2026-10-19 10:12:41.502318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a91c2d4e5f6'
+down_revision: Union[str, None] = '4c1ed825800b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'connection_jobs',
+        sa.Column('id', sa.String(length=36), primary_key=True),
+        sa.Column('connection_id', sa.String(), nullable=False),
+        sa.Column('job_type', sa.String(length=50), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='queued'),
+        sa.Column('params', sa.JSON(), nullable=False),
+        sa.Column('progress', sa.JSON(), nullable=False),
+        sa.Column('checkpoint', sa.JSON(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('max_attempts', sa.Integer(), nullable=False, server_default='3'),
+        sa.Column('cancel_requested', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('worker_id', sa.String(), nullable=True),
+        sa.Column('run_after', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index(op.f('ix_connection_jobs_connection_id'), 'connection_jobs', ['connection_id'], unique=False)
+    op.create_index('ix_connection_jobs_status_run_after', 'connection_jobs', ['status', 'run_after'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_connection_jobs_status_run_after', table_name='connection_jobs')
+    op.drop_index(op.f('ix_connection_jobs_connection_id'), table_name='connection_jobs')
+    op.drop_table('connection_jobs')
@@ -0,0 +1,57 @@
+"""create_upload_blobs_table
+
+Revision ID: b3e8f1a27c90
+Revises: 7a91c2d4e5f6
+Create Date: 2026-10-19 14:03:27.918204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e8f1a27c90'
+down_revision: Union[str, None] = '7a91c2d4e5f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# uploaded_files.filepath was created with an unnamed unique constraint; SQLite
+# batch mode needs a naming convention to address it, PostgreSQL names it itself.
+_FILEPATH_UNIQUE_SQLITE = 'uq_uploaded_files_filepath'
+_FILEPATH_UNIQUE_POSTGRES = 'uploaded_files_filepath_key'
+_NAMING_CONVENTION = {'uq': 'uq_%(table_name)s_%(column_0_name)s'}
+
+
+def _filepath_unique_name() -> str:
+    return _FILEPATH_UNIQUE_SQLITE if op.get_bind().dialect.name == 'sqlite' else _FILEPATH_UNIQUE_POSTGRES
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'upload_blobs',
+        sa.Column('sha256', sa.String(length=64), primary_key=True),
+        sa.Column('storage_path', sa.String(), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('released_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+    # Many uploads now share one blob path, so filepath is no longer unique
+    with op.batch_alter_table('uploaded_files', naming_convention=_NAMING_CONVENTION) as batch_op:
+        batch_op.drop_constraint(_filepath_unique_name(), type_='unique')
+        batch_op.add_column(sa.Column('blob_sha256', sa.String(length=64), nullable=True))
+        batch_op.alter_column('size', existing_type=sa.Integer(), type_=sa.BigInteger(), existing_nullable=True)
+    op.create_index('ix_uploaded_files_blob_sha256', 'uploaded_files', ['blob_sha256'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_uploaded_files_blob_sha256', table_name='uploaded_files')
+    with op.batch_alter_table('uploaded_files', naming_convention=_NAMING_CONVENTION) as batch_op:
+        batch_op.alter_column('size', existing_type=sa.BigInteger(), type_=sa.Integer(), existing_nullable=True)
+        batch_op.drop_column('blob_sha256')
+        batch_op.create_unique_constraint(_filepath_unique_name(), ['filepath'])
+    op.drop_table('upload_blobs')
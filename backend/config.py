@@ -1,5 +1,5 @@
 from functools import lru_cache
-from typing import List
+from typing import List, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -16,11 +16,25 @@ class Settings(BaseSettings):
     openrouter_api_key: str = ""
     ai_model: str = "anthropic/claude-3.7-sonnet"
     sherlog_env: str = ""
+    openrouter_base_url: str = "https://openrouter.ai/api/v1"
+    # Shared outbound HTTP client settings (used for all LLM provider calls)
+    http2_enabled: bool = True
+    http_timeout: float = 120.0  # seconds
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 60.0  # seconds
+    http_max_retries: int = 3
+    http_retry_backoff_base: float = 0.5  # seconds
+    http_per_host_concurrency: int = 32
     # Logging settings
     environment: str = "development"
     # Connection storage settings
     connection_storage_type: str = "file"  # Options: file, env, db, none
     connection_file_path: str = "./data/connections.json"
+    connection_cache_ttl: float = 300.0  # seconds before cached connection configs are reloaded without an invalidation (covers missed Redis messages)
+    tool_schema_cache_path: str = "./data/tool_schemas.json"  # MCP tool schemas per connection type, kept across restarts
+    tool_schema_cache_ttl: float = 86400.0  # seconds before cached tool schemas are rediscovered from the MCP server
+    tool_schema_prewarm: bool = True  # discover missing or expired tool schemas in the background at startup
     # Database settings
     db_host: str = "localhost"
     db_port: int = 5432
@@ -42,8 +56,63 @@ class Settings(BaseSettings):
     # Cell execution settings
     python_cell_timeout: int = 30  # seconds
     python_cell_max_memory: int = 1024  # MB
+    python_agent_stateful_retries: bool = True  # retry with a compact prompt that relies on the kernel's loaded DataFrames instead of the full transcript
+    python_kernel_idle_timeout: int = 900  # seconds a notebook's Python kernel (and its DataFrames) is kept without use
+    python_kernel_max_kernels: int = 8  # live Python kernels; the least recently used one is evicted beyond this
+    # Step context assembly settings
+    step_context_token_budget: int = 12000  # tokens shared across all dependency outputs of a step
+    cell_stream_update_interval: float = 0.25  # seconds between websocket previews of a cell being generated
+    # Git repository indexing settings
+    git_index_state_dir: str = "./data/git_index"  # per-connection manifests (commit SHA + file hashes) for incremental re-indexing
+    git_index_embed_workers: int = 2  # processes running FastEmbed while indexing (keeps the event loop free)
+    git_index_batch_size: int = 64  # documents per embedding/upsert batch
+    git_index_max_in_flight: int = 4  # batches being embedded or upserted concurrently
+    git_index_chunk_max_chars: int = 2048  # max characters per code chunk (~512 tokens for the embedding model)
+    git_index_chunk_overlap_lines: int = 5  # lines shared by consecutive line-window chunks
+    git_index_max_file_bytes: int = 1024 * 1024  # larger files are skipped when indexing (as are binary files)
+    git_index_clone_dir: Optional[str] = None  # where temporary shallow clones go (system temp dir if unset)
+    embedding_cache_enabled: bool = True  # reuse vectors across repos/refreshes, keyed by model + chunk hash
+    embedding_cache_dir: str = "./data/embedding_cache"
+    embedding_cache_max_mb: int = 1024  # LRU eviction above this size of cached vectors
+    # Connection background jobs (post_create_actions, e.g. git indexing)
+    connection_job_worker_autostart: bool = True  # spawn a job worker process alongside the API
+    connection_job_max_attempts: int = 3
+    connection_job_retry_backoff: float = 30.0  # seconds before the first retry, doubled per attempt
+    connection_job_heartbeat_interval: float = 5.0  # seconds between progress/liveness updates
+    connection_job_stale_after: float = 60.0  # seconds without heartbeat before a running job is requeued
+    connection_job_poll_interval: float = 2.0  # seconds between queue polls when idle
+    connection_job_checkpoint_interval: float = 30.0  # seconds between git index manifest checkpoints
+    # Chat file upload settings
+    upload_dir: str = "/app/uploads"
+    upload_max_bytes: int = 10 * 1024 ** 3  # uploads above this are rejected (413)
+    upload_chunk_size_bytes: int = 1024 * 1024  # read/write size while streaming an upload to disk
+    upload_max_chunk_bytes: int = 64 * 1024 * 1024  # largest single PUT of a resumable upload
+    upload_orphan_grace_seconds: int = 3600  # blob files without a DB row are deleted once this old
+    # Python output artifacts (plots, DataFrame previews)
+    artifact_dir: str = "/app/artifacts"  # plots and DataFrame previews extracted from Python output
+    artifact_thumbnail_px: int = 480  # longest side of plot thumbnails
+    dataframe_preview_max_rows: int = 200  # rows kept in a stored DataFrame preview
+    # Bug-report media (videos, screenshots) described by the media timeline agent
+    media_cache_dir: str = "./data/media_cache"  # downloaded media, keyframes and their descriptions
+    media_frame_interval: float = 5.0  # seconds between keyframes taken from a video
+    media_max_frames: int = 40  # keyframes per video at most (a longer video is cut off)
+    media_frame_extraction_timeout: float = 300.0  # seconds ffmpeg may take to extract a video's keyframes before it is killed
+    media_max_download_mb: int = 500  # larger media is not downloaded; it is described from its URL
+    media_describe_concurrency: int = 4  # vision-model calls in flight per describe run
+    media_shard_max_items: int = 8  # images/keyframes per vision-model call
+    media_shard_max_bytes: int = 8 * 1024 * 1024  # content bytes per vision-model call (one larger item still goes alone)
+    media_shard_timeout: float = 120.0  # seconds for one multi-item call before its items are retried one by one
+    media_item_timeout: float = 60.0  # seconds for the description of a single item
+    # Filesystem connection content index (connections with content_index enabled)
+    filesystem_index_poll_interval: float = 30.0  # seconds between re-walks picking up new/changed files
+    filesystem_index_max_file_mb: int = 2048  # larger files are neither indexed nor scanned by content search
+    filesystem_index_idle_seconds: float = 3600.0  # indexes no agent has requested for this long are dropped from memory
+    filesystem_line_index_dir: str = "./data/line_index"  # saved line-offset indexes of large files (range/tail/time-window reads)
+    filesystem_line_index_stride: int = 1024  # lines between recorded offsets (memory vs. lines scanned per seek)
+    filesystem_line_index_min_mb: int = 16  # line indexes of smaller files are kept in memory only
     # Query execution settings
     default_query_timeout: int = 30  # seconds
+    tool_result_cell_max_chars: int = 1_000_000  # larger tool results are stored in cells with an elided middle
     # Qdrant MCP Server (uvx/stdio) settings
     qdrant_mcp_enabled: bool = True # Control whether to launch the stdio server
     qdrant_local_path: str | None = None # Path for local Qdrant storage (required if enabled)
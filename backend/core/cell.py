@@ -40,6 +40,7 @@ class CellStatus(str, Enum):
         SUCCESS: Cell executed successfully
         ERROR: Cell execution resulted in an error
         STALE: Cell needs to be re-executed due to dependency changes
+        STREAMING: Cell content is still being generated (websocket preview only, not persisted)
     """
     IDLE = "idle"
     QUEUED = "queued"
@@ -47,6 +48,7 @@ class CellStatus(str, Enum):
     SUCCESS = "success"
     ERROR = "error"
     STALE = "stale"
+    STREAMING = "streaming"
 
 
 class CellType(str, Enum):
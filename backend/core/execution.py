@@ -30,6 +30,8 @@ from backend.config import get_settings
 from mcp.types import ErrorData
 # Import DB session management
 from backend.db.database import get_db_session 
+from backend.services.artifact_store import externalize_python_output
+from backend.services.python_kernels import KernelTimeoutError, get_python_kernel_manager
 
 # Initialize loggers
 execution_logger = logging.getLogger("execution")
@@ -464,67 +466,30 @@ class CellExecutor:
             return cell.content
 
         elif cell.type == CellType.PYTHON:
-            self.logger.info(f"Executing Python cell {cell.id} using mcp-server-data-exploration.", extra={'correlation_id': correlation_id, 'cell_id': cell.id})
+            self.logger.info(f"Executing Python cell {cell.id} in the notebook's Python kernel.", extra={'correlation_id': correlation_id, 'cell_id': cell.id})
             python_code = cell.content
             if not python_code:
                 self.logger.warning(f"Python cell {cell.id} is empty.", extra={'correlation_id': correlation_id, 'cell_id': cell.id})
                 return {"status": "success", "stdout": "", "stderr": None} # Or an error?
 
-            # Get StdioServerParameters for mcp-server-data-exploration
-            # This is similar to PythonAgent._get_stdio_server_params
-            # TODO: Consider refactoring to a shared utility if this pattern repeats
-            env = os.environ.copy()
-            server_params = StdioServerParameters(
-                command='/root/.local/bin/uv',
-                args=[
-                    '--directory',
-                    '/opt/mcp-server-data-exploration',
-                    'run',
-                    'mcp-server-ds' 
-                ],
-                env=env
-            )
-            
-            # Create a client session for this execution
-            # The MCPServerStdio instance from pydantic-ai is for agent use.
-            # For direct client calls, we use mcp.client.stdio.stdio_client
+            # The kernel (one mcp-server-data-exploration process per notebook) keeps DataFrames
+            # loaded by earlier cells and agent steps, and enforces the cell timeout and memory limit.
+            kernel = get_python_kernel_manager().get_kernel(str(context.notebook.id))
             try:
-                async with stdio_client(server_params) as (read, write):
-                    async with ClientSession(read, write) as session:
-                        self.logger.info(f"Calling 'run-script' for Python cell {cell.id} with code: '''{python_code[:200]}...'''", extra={'correlation_id': correlation_id, 'cell_id': cell.id})
-                        await session.initialize()
-                        response = await session.call_tool(
-                            "run-script",
-                            arguments={"script": python_code},
-                        )
-                        self.logger.info(f"Received response from 'run-script' for Python cell {cell.id}. Response type: {type(response)}, Response: {str(response)[:500]}...", extra={'correlation_id': correlation_id, 'cell_id': cell.id})
-                        
-                        # We can adapt PythonAgent's _parse_python_mcp_output or simplify
-                        if isinstance(response, dict):
-                            # Basic parsing, similar to a simplified _parse_python_mcp_output
-                            parsed_result = {
-                                "status": response.get("status", "success" if response.get("stdout") is not None else "error"),
-                                "stdout": response.get("stdout"),
-                                "stderr": response.get("stderr"),
-                                # Add other fields if mcp-server-data-exploration provides them
-                            }
-                            if parsed_result["status"] == "error" and parsed_result["stderr"] and not response.get("error_details"):
-                                parsed_result["error_details"] = {
-                                    "type": "PythonExecutionError",
-                                    "message": str(parsed_result["stderr"]).splitlines()[-1] if parsed_result["stderr"] else "Unknown Python error",
-                                    "traceback": str(parsed_result["stderr"])
-                                }
-                            return parsed_result
-                        else:
-                            # Fallback if response is not a dict (e.g., just a string)
-                            self.logger.warning(f"Unexpected response type from 'run-script' for cell {cell.id}: {type(response)}. Treating as stdout.", extra={'correlation_id': correlation_id, 'cell_id': cell.id})
-                            return {"status": "success", "stdout": str(response), "stderr": None}
-
+                self.logger.info(f"Calling 'run-script' for Python cell {cell.id} with code: '''{python_code[:200]}...'''", extra={'correlation_id': correlation_id, 'cell_id': cell.id})
+                output = await kernel.run_script(python_code)
+                self.logger.info(f"Received response from 'run-script' for Python cell {cell.id}: {output[:500]}...", extra={'correlation_id': correlation_id, 'cell_id': cell.id})
+                # Plots and DataFrame blocks are stored as artifacts; the result keeps references
+                output, artifacts = await asyncio.to_thread(externalize_python_output, output)
+                return {"status": "success", "stdout": output, "stderr": None, "artifacts": artifacts}
+            except KernelTimeoutError as timeout_e:
+                self.logger.warning(f"Python cell {cell.id} timed out: {timeout_e}", extra={'correlation_id': correlation_id, 'cell_id': cell.id})
+                raise
             except McpError as mcp_e:
                 self.logger.error(f"McpError during Python cell {cell.id} execution: {mcp_e}", exc_info=True, extra={'correlation_id': correlation_id, 'cell_id': cell.id})
                 raise # Re-raise to be caught by the outer try-except
             except Exception as e:
-                self.logger.error(f"Unexpected error during Python cell {cell.id} execution with mcp-server-data-exploration: {e}", exc_info=True, extra={'correlation_id': correlation_id, 'cell_id': cell.id})
+                self.logger.error(f"Unexpected error during Python cell {cell.id} execution in the Python kernel: {e}", exc_info=True, extra={'correlation_id': correlation_id, 'cell_id': cell.id})
                 raise # Re-raise to be caught by the outer try-except
         
         elif cell.type == CellType.LOG_AI:
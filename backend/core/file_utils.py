@@ -1,6 +1,7 @@
 """
 Utilities for handling files within the backend, particularly for staging agent inputs.
 """
+import asyncio
 import os
 import re
 import uuid
@@ -31,6 +32,9 @@ async def stage_file_content(
         session_id: The ID of the current session context.
         source_cell_id: Optional ID of the cell that produced this content.
 
+    Tabular content is also converted once to a columnar (Parquet) copy with a
+    cached schema/row count/sample, see `backend.core.tabular_staging`.
+
     Returns:
         The absolute path to the newly created local file.
 
@@ -74,7 +78,19 @@ async def stage_file_content(
         with open(absolute_path, 'w', encoding='utf-8') as f:
             f.write(content) 
         file_utils_logger.info(f"Successfully wrote data to permanent local file: {absolute_path} (source: {original_filename or 'N/A'}, cell: {source_cell_id or 'N/A'})")
-        return absolute_path
     except IOError as e:
         file_utils_logger.error(f"Failed to write to local file {absolute_path}: {e}", exc_info=True)
         raise # Re-raise to be caught by caller
+
+    await asyncio.to_thread(_stage_columnar_copy, absolute_path)
+    return absolute_path
+
+
+def _stage_columnar_copy(path: str) -> None:
+    """Best effort: the staged CSV stays usable even if the columnar conversion fails."""
+    from backend.core.tabular_staging import describe_tabular_file  # imports IMPORTED_DATA_BASE_PATH from here
+
+    try:
+        describe_tabular_file(path)
+    except Exception as e:
+        file_utils_logger.warning(f"Could not stage a columnar copy of {path}: {e}", exc_info=True)
@@ -0,0 +1,213 @@
+"""
+Columnar staging and cached descriptions of tabular files for the Python agent.
+
+Delimited text (CSV/TSV/...) used to be handed to the Python MCP's `load_csv`,
+which re-parses the whole file on every use. `describe_tabular_file` detects
+delimited content, converts it once to Parquet (schema inferred by pyarrow,
+streamed block by block from a memory-mapped source, so a 1GB CSV is never held
+in memory) and caches the schema, row count and a few sample rows in a JSON
+sidecar. Later calls return the cached description without touching the data
+as long as the source file's size and mtime are unchanged, and scripts read the
+Parquet copy with ``pd.read_parquet(path, memory_map=True)``.
+
+pyarrow is optional: without it only the description is cached (computed with
+a chunked pandas pass) and no columnar copy is written.
+"""
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from backend.core.file_utils import IMPORTED_DATA_BASE_PATH
+
+DATASET_CACHE_DIR = os.path.join(IMPORTED_DATA_BASE_PATH, ".columnar")
+
+SNIFF_BYTES = 64 * 1024
+SNIFF_MAX_LINES = 50
+SAMPLE_ROWS = 5
+PANDAS_CHUNK_ROWS = 100_000
+_DELIMITERS = ",\t;|"
+
+tabular_logger = logging.getLogger(__name__)
+
+
+class DatasetInfo(BaseModel):
+    """Cached description of a delimited text file."""
+    source_path: str
+    source_size: int
+    source_mtime_ns: int
+    delimiter: str
+    columns: List[Dict[str, str]]  # [{"name": ..., "type": ...}]
+    row_count: int
+    sample: List[Dict[str, Any]]
+    columnar_path: Optional[str] = None  # Parquet copy, if pyarrow is available
+    format: Optional[str] = None
+
+    def load_hint(self) -> str:
+        if self.columnar_path:
+            return f"pd.read_parquet({self.columnar_path!r}, memory_map=True)"
+        sep = "\\t" if self.delimiter == "\t" else self.delimiter
+        return f"pd.read_csv({self.source_path!r}, sep={sep!r})"
+
+
+def _pyarrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.csv  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def detect_delimiter(sample: str) -> Optional[str]:
+    """
+    Delimiter of `sample` if it looks like a table (a header plus rows with the
+    same number of fields, at least two), otherwise None.
+    """
+    lines = sample.splitlines()
+    if len(sample) >= SNIFF_BYTES and len(lines) > 1:
+        lines = lines[:-1]  # the sample may end in the middle of a row
+    lines = [line for line in lines[:SNIFF_MAX_LINES] if line.strip()]
+    if len(lines) < 2:
+        return None
+    text = "\n".join(lines)
+    try:
+        delimiter = csv.Sniffer().sniff(text, delimiters=_DELIMITERS).delimiter
+    except csv.Error:
+        return None
+    widths = {len(row) for row in csv.reader(io.StringIO(text), delimiter=delimiter) if row}
+    if len(widths) == 1 and widths.pop() >= 2:
+        return delimiter
+    return None
+
+
+def _cache_paths(source_path: str) -> Dict[str, str]:
+    """Staged files keep their cache next to them (removed with the notebook's data); others share DATASET_CACHE_DIR."""
+    key = hashlib.sha1(source_path.encode("utf-8")).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(source_path))[0][:64]
+    cache_dir = os.path.abspath(DATASET_CACHE_DIR)
+    if source_path.startswith(os.path.abspath(IMPORTED_DATA_BASE_PATH) + os.sep):
+        cache_dir = os.path.join(os.path.dirname(source_path), ".columnar")
+    base = os.path.join(cache_dir, f"{stem}_{key}")
+    return {"meta": base + ".meta.json", "parquet": base + ".parquet"}
+
+
+def _load_cached(meta_path: str, stat: os.stat_result) -> Optional[DatasetInfo]:
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            info = DatasetInfo.model_validate_json(f.read())
+    except (OSError, ValueError):
+        return None
+    if info.source_size != stat.st_size or info.source_mtime_ns != stat.st_mtime_ns:
+        return None
+    if info.columnar_path and not os.path.exists(info.columnar_path):
+        return None
+    return info
+
+
+def _json_safe(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return json.loads(json.dumps(rows, default=str))
+
+
+def _convert_with_pyarrow(source_path: str, delimiter: str, parquet_path: str) -> Dict[str, Any]:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+
+    parse_options = pacsv.ParseOptions(delimiter=delimiter, newlines_in_values=True)
+    tmp_path = parquet_path + ".tmp"
+
+    def write(convert_options: Optional[Any]) -> Dict[str, Any]:
+        rows = 0
+        sample: Optional[List[Dict[str, Any]]] = None
+        with pa.memory_map(source_path, "r") as source:
+            reader = pacsv.open_csv(source, parse_options=parse_options, convert_options=convert_options)
+            with pq.ParquetWriter(tmp_path, reader.schema) as writer:
+                for batch in reader:
+                    writer.write_batch(batch)
+                    rows += batch.num_rows
+                    if sample is None:
+                        sample = batch.slice(0, SAMPLE_ROWS).to_pylist()
+        return {
+            "columns": [{"name": field.name, "type": str(field.type)} for field in reader.schema],
+            "row_count": rows,
+            "sample": _json_safe(sample or []),
+        }
+
+    try:
+        try:
+            result = write(None)
+        except pa.ArrowInvalid as e:
+            # Types are inferred from the first block; a later block disagreed, so keep every column as text
+            tabular_logger.info(f"Type inference failed for {source_path} ({e}); storing all columns as strings")
+            with pa.memory_map(source_path, "r") as source:
+                names = pacsv.open_csv(source, parse_options=parse_options).schema.names
+            result = write(pacsv.ConvertOptions(column_types={name: pa.string() for name in names}))
+        os.replace(tmp_path, parquet_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    result.update(columnar_path=parquet_path, format="parquet")
+    return result
+
+
+def _describe_with_pandas(source_path: str, delimiter: str) -> Dict[str, Any]:
+    import pandas as pd
+
+    rows = 0
+    columns: List[Dict[str, str]] = []
+    sample: List[Dict[str, Any]] = []
+    for chunk in pd.read_csv(source_path, sep=delimiter, chunksize=PANDAS_CHUNK_ROWS):
+        if not columns:
+            columns = [{"name": str(name), "type": str(dtype)} for name, dtype in chunk.dtypes.items()]
+            head = chunk.head(SAMPLE_ROWS).astype(object)
+            sample = _json_safe(head.where(head.notna(), None).to_dict("records"))
+        rows += len(chunk)
+    return {"columns": columns, "row_count": rows, "sample": sample}
+
+
+def describe_tabular_file(path: str) -> Optional[DatasetInfo]:
+    """
+    Schema, row count and sample rows of a delimited text file, converting it to
+    Parquet on first use. Returns None if the file does not look tabular.
+    Cached per file until its size or mtime changes. Blocking: call it in a thread.
+    """
+    source_path = os.path.abspath(path)
+    stat = os.stat(source_path)
+    cache = _cache_paths(source_path)
+    cached = _load_cached(cache["meta"], stat)
+    if cached is not None:
+        return cached
+
+    with open(source_path, "r", encoding="utf-8", errors="replace") as f:
+        delimiter = detect_delimiter(f.read(SNIFF_BYTES))
+    if delimiter is None:
+        return None
+
+    os.makedirs(os.path.dirname(cache["meta"]), exist_ok=True)
+    if _pyarrow_available():
+        details = _convert_with_pyarrow(source_path, delimiter, cache["parquet"])
+    else:
+        details = _describe_with_pandas(source_path, delimiter)
+    info = DatasetInfo(
+        source_path=source_path,
+        source_size=stat.st_size,
+        source_mtime_ns=stat.st_mtime_ns,
+        delimiter=delimiter,
+        **details,
+    )
+    tmp_meta = cache["meta"] + ".tmp"
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        f.write(info.model_dump_json())
+    os.replace(tmp_meta, cache["meta"])
+    tabular_logger.info(
+        f"Staged tabular file {source_path}: {info.row_count} rows, {len(info.columns)} columns"
+        f"{f', columnar copy {info.columnar_path}' if info.columnar_path else ''}"
+    )
+    return info
@@ -6,7 +6,7 @@ import uuid
 from datetime import datetime
 from typing import Dict, Any, Optional, List, Set
 
-from sqlalchemy import Column, String, DateTime, ForeignKey, Boolean, JSON, func, Text, Integer, Enum, Float, UUID, Index
+from sqlalchemy import Column, String, DateTime, ForeignKey, Boolean, JSON, func, Text, Integer, BigInteger, Enum, Float, UUID, Index
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.dialects.postgresql import UUID as PgUUID
@@ -50,6 +50,59 @@ class DefaultConnection(Base):
     connection = relationship("Connection")
 
 
+class ConnectionJob(Base):
+    """Persisted long-running task for a connection (e.g. indexing a git repository)"""
+    __tablename__ = "connection_jobs"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    connection_id = Column(String, nullable=False, index=True)
+    job_type = Column(String(50), nullable=False)  # post_create_actions, ...
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, succeeded, failed, cancelled
+    params = Column(JSON, nullable=False, default=dict)
+    progress = Column(JSON, nullable=False, default=dict)
+    checkpoint = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    worker_id = Column(String, nullable=True)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    heartbeat_at = Column(DateTime, nullable=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_connection_jobs_status_run_after", "status", "run_after"),
+    )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert model to dictionary"""
+        def _iso(value: Optional[datetime]) -> Optional[str]:
+            return value.isoformat() if isinstance(value, datetime) else None
+
+        return {
+            "id": self.id,
+            "connection_id": self.connection_id,
+            "job_type": self.job_type,
+            "status": self.status,
+            "params": self.params or {},
+            "progress": self.progress or {},
+            "checkpoint": self.checkpoint,
+            "error": self.error,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "cancel_requested": bool(self.cancel_requested),
+            "run_after": _iso(self.run_after),
+            "heartbeat_at": _iso(self.heartbeat_at),
+            "started_at": _iso(self.started_at),
+            "finished_at": _iso(self.finished_at),
+            "created_at": _iso(self.created_at),
+            "updated_at": _iso(self.updated_at),
+        }
+
+
 class SQLiteUUID:
     """SQLite-compatible UUID type"""
     def __init__(self, value=None):
@@ -185,17 +238,33 @@ class CellDependency(Base):
     dependency_id = Column(String(36), ForeignKey("cells.id", ondelete="CASCADE"), primary_key=True)
 
 
+class UploadBlob(Base):
+    """Content-addressed file shared by every UploadedFile with the same SHA-256"""
+    __tablename__ = "upload_blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    storage_path = Column(String, nullable=False) # Relative to the upload directory
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0) # Number of UploadedFile rows using the blob
+    released_at = Column(DateTime, nullable=True) # When ref_count last dropped to 0
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<UploadBlob(sha256={self.sha256}, ref_count={self.ref_count})>"
+
+
 class UploadedFile(Base):
     __tablename__ = "uploaded_files"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    session_id = Column(String, nullable=False, index=True)
-    notebook_id = Column(UUID(as_uuid=True), nullable=True, index=True) # Can be linked to a notebook
+    session_id = Column(String, nullable=False)
+    notebook_id = Column(UUID(as_uuid=True), nullable=True) # Can be linked to a notebook
     
     filename = Column(String, nullable=False)
-    filepath = Column(String, nullable=False, unique=True) # Path on the server
+    filepath = Column(String, nullable=False) # Path on the server (the shared blob for deduplicated uploads)
+    blob_sha256 = Column(String(64), nullable=True) # UploadBlob holding the content; NULL for legacy per-session files
     file_type = Column(String, nullable=True) # MIME type
-    size = Column(Integer, nullable=True) # Size in bytes
+    size = Column(BigInteger, nullable=True) # Size in bytes
     
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -205,6 +274,7 @@ class UploadedFile(Base):
     __table_args__ = (
         Index("ix_uploaded_files_session_id", "session_id"),
         Index("ix_uploaded_files_notebook_id", "notebook_id"),
+        Index("ix_uploaded_files_blob_sha256", "blob_sha256"),
     )
 
     def __repr__(self):
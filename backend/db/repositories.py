@@ -12,7 +12,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload, selectinload
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError, NoResultFound
 
-from backend.db.models import Connection, DefaultConnection, Notebook, Cell, CellDependency
+from backend.db.models import Connection, ConnectionJob, DefaultConnection, Notebook, Cell, CellDependency
 from backend.core.cell import CellStatus
 from backend.core.types import ToolCallID
 
@@ -178,6 +178,20 @@ class ConnectionRepository:
             logger.error("Error fetching default connection for type %s: %s", connection_type, str(e), extra={'correlation_id': 'N/A'})
             raise
     
+    async def get_default_connection_ids(self) -> Dict[str, str]:
+        """Get the default connection ID of every connection type"""
+        logger.info("Fetching default connection IDs", extra={'correlation_id': 'N/A'})
+        try:
+            result = await self.session.execute(select(DefaultConnection))
+            return {
+                str(default_conn.connection_type): str(default_conn.connection_id)
+                for default_conn in result.scalars().all()
+                if default_conn.connection_id is not None
+            }
+        except SQLAlchemyError as e:
+            logger.error("Error fetching default connection IDs: %s", str(e), extra={'correlation_id': 'N/A'})
+            raise
+    
     async def set_default_connection(self, connection_type: str, connection_id: str) -> DefaultConnection:
         """Set a connection as default for its type"""
         logger.info("Setting connection %s as default for type: %s", connection_id, connection_type, extra={'correlation_id': 'N/A'})
@@ -222,6 +236,167 @@ class ConnectionRepository:
             raise
 
 
+
+class ConnectionJobRepository:
+    """Repository for persisted connection jobs (queue, progress and lifecycle)"""
+
+    ACTIVE_STATUSES = ("queued", "running")
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def create(self, connection_id: str, job_type: str, params: Optional[Dict[str, Any]] = None, max_attempts: int = 3) -> ConnectionJob:
+        """Queue a new job"""
+        logger.info("Queueing %s job for connection %s", job_type, connection_id, extra={'correlation_id': 'N/A'})
+        try:
+            job = ConnectionJob(
+                connection_id=connection_id,
+                job_type=job_type,
+                status="queued",
+                params=params or {},
+                progress={},
+                max_attempts=max_attempts,
+                run_after=datetime.utcnow(),
+            )
+            self.session.add(job)
+            await self.session.commit()
+            await self.session.refresh(job)
+            return job
+        except SQLAlchemyError as e:
+            await self.session.rollback()
+            logger.error("Error queueing job for connection %s: %s", connection_id, str(e), extra={'correlation_id': 'N/A'})
+            raise
+
+    async def get(self, job_id: str) -> Optional[ConnectionJob]:
+        """Get a job by ID"""
+        result = await self.session.execute(select(ConnectionJob).where(ConnectionJob.id == job_id))
+        return result.scalar_one_or_none()
+
+    async def list_for_connection(self, connection_id: str, limit: int = 20) -> List[ConnectionJob]:
+        """Most recent jobs of a connection, newest first"""
+        query = (
+            select(ConnectionJob)
+            .where(ConnectionJob.connection_id == connection_id)
+            .order_by(ConnectionJob.created_at.desc())
+            .limit(limit)
+        )
+        result = await self.session.execute(query)
+        return list(result.scalars().all())
+
+    async def get_active(self, connection_id: str, job_type: str) -> Optional[ConnectionJob]:
+        """The queued or running job of this type for a connection, if any"""
+        query = select(ConnectionJob).where(
+            and_(
+                ConnectionJob.connection_id == connection_id,
+                ConnectionJob.job_type == job_type,
+                ConnectionJob.status.in_(self.ACTIVE_STATUSES),
+            )
+        )
+        result = await self.session.execute(query)
+        return result.scalars().first()
+
+    async def claim_next(self, worker_id: str) -> Optional[ConnectionJob]:
+        """
+        Atomically move the oldest due queued job to 'running' for this worker.
+        The conditional UPDATE makes concurrent workers safe: only one of them
+        sees a matching row.
+        """
+        now = datetime.utcnow()
+        query = (
+            select(ConnectionJob.id)
+            .where(and_(ConnectionJob.status == "queued", ConnectionJob.run_after <= now))
+            .order_by(ConnectionJob.run_after, ConnectionJob.created_at)
+            .limit(1)
+        )
+        job_id = (await self.session.execute(query)).scalar_one_or_none()
+        if job_id is None:
+            return None
+        stmt = (
+            update(ConnectionJob)
+            .where(and_(ConnectionJob.id == job_id, ConnectionJob.status == "queued"))
+            .values(
+                status="running",
+                worker_id=worker_id,
+                attempts=ConnectionJob.attempts + 1,
+                started_at=now,
+                heartbeat_at=now,
+                error=None,
+            )
+        )
+        result = await self.session.execute(stmt)
+        await self.session.commit()
+        if result.rowcount != 1:
+            return None
+        job = await self.get(job_id)
+        if job is not None:
+            await self.session.refresh(job)
+        return job
+
+    async def heartbeat(self, job_id: str, progress: Optional[Dict[str, Any]] = None, checkpoint: Optional[Dict[str, Any]] = None) -> bool:
+        """Record liveness (and optionally progress/checkpoint). Returns True if cancellation was requested."""
+        values: Dict[str, Any] = {"heartbeat_at": datetime.utcnow()}
+        if progress is not None:
+            values["progress"] = progress
+        if checkpoint is not None:
+            values["checkpoint"] = checkpoint
+        await self.session.execute(update(ConnectionJob).where(ConnectionJob.id == job_id).values(**values))
+        await self.session.commit()
+        result = await self.session.execute(select(ConnectionJob.cancel_requested).where(ConnectionJob.id == job_id))
+        return bool(result.scalar_one_or_none())
+
+    async def finish(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        """Move a job to a terminal status"""
+        logger.info("Job %s finished with status %s", job_id, status, extra={'correlation_id': 'N/A'})
+        stmt = update(ConnectionJob).where(ConnectionJob.id == job_id).values(
+            status=status, error=error, finished_at=datetime.utcnow(), worker_id=None
+        )
+        await self.session.execute(stmt)
+        await self.session.commit()
+
+    async def requeue(self, job_id: str, run_after: datetime, error: Optional[str] = None, refund_attempt: bool = False) -> None:
+        """Put a job back in the queue (retry after failure, or worker shutdown)"""
+        values: Dict[str, Any] = {"status": "queued", "run_after": run_after, "error": error, "worker_id": None}
+        if refund_attempt:
+            values["attempts"] = ConnectionJob.attempts - 1
+        await self.session.execute(update(ConnectionJob).where(ConnectionJob.id == job_id).values(**values))
+        await self.session.commit()
+
+    async def request_cancel(self, job_id: str) -> Optional[ConnectionJob]:
+        """Cancel a queued job immediately; flag a running one so its worker stops at the next checkpoint"""
+        job = await self.get(job_id)
+        if job is None or job.status not in self.ACTIVE_STATUSES:
+            return job
+        if job.status == "queued":
+            stmt = update(ConnectionJob).where(and_(ConnectionJob.id == job_id, ConnectionJob.status == "queued")).values(
+                status="cancelled", cancel_requested=True, finished_at=datetime.utcnow()
+            )
+        else:
+            stmt = update(ConnectionJob).where(ConnectionJob.id == job_id).values(cancel_requested=True)
+        await self.session.execute(stmt)
+        await self.session.commit()
+        await self.session.refresh(job)
+        return job
+
+    async def requeue_stale(self, stale_before: datetime) -> int:
+        """Requeue running jobs whose worker stopped sending heartbeats (crashed or killed)"""
+        query = select(ConnectionJob).where(
+            and_(ConnectionJob.status == "running", ConnectionJob.heartbeat_at < stale_before)
+        )
+        stale = list((await self.session.execute(query)).scalars().all())
+        now = datetime.utcnow()
+        for job in stale:
+            if job.cancel_requested:
+                job.status, job.finished_at = "cancelled", now
+            elif job.attempts >= job.max_attempts:
+                job.status, job.finished_at, job.error = "failed", now, "Worker stopped responding"
+            else:
+                job.status, job.run_after, job.error = "queued", now, "Worker stopped responding; resuming from checkpoint"
+            job.worker_id = None
+        if stale:
+            await self.session.commit()
+            logger.warning("Recovered %d stale connection jobs", len(stale), extra={'correlation_id': 'N/A'})
+        return len(stale)
+
 class NotebookRepository:
     """Repository for notebook operations"""
     
@@ -416,8 +591,9 @@ class NotebookRepository:
                     result_error: Optional[str] = None,
                     result_execution_time: Optional[float] = None,
                     status: Optional[str] = None,
+                    cell_id: Optional[str] = None,
                     ) -> Optional[Cell]:
-        """Create a new cell in a notebook"""
+        """Create a new cell in a notebook (cell_id may be pre-assigned, e.g. for streamed cells)"""
         logger.info("Attempting to create cell in notebook %s: Type='%s', Position=%d, ConnectionID='%s', Metadata=%s, Settings=%s, ToolName='%s'",
                     notebook_id, cell_type, position, connection_id, metadata, settings, tool_name, extra={'correlation_id': 'N/A'})
         try:
@@ -429,7 +605,7 @@ class NotebookRepository:
             from uuid import uuid4
 
             cell = Cell(
-                id=str(uuid4()),
+                id=cell_id or str(uuid4()),
                 notebook_id=notebook_id,
                 type=cell_type,
                 content=content,
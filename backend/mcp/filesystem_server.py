@@ -0,0 +1,517 @@
+"""
+Native filesystem MCP server.
+
+Filesystem connections used to start ``npx -y @modelcontextprotocol/server-filesystem``
+for every agent session: a Node start-up plus a package resolution before the
+first tool call, and only the first of the connection's ``allowed_directories``
+was passed to it. This module implements the same read-only tools in Python:
+
+  * ``read_file`` / ``read_multiple_files`` (mmap-backed, optional ``head``/``tail``)
+  * ``list_directory`` and ``directory_tree``
+  * ``search_files`` (case-insensitive name match, glob ``excludePatterns``)
+  * ``get_file_info`` and ``list_allowed_directories``
+
+with the same names, arguments and text output. Every path is resolved
+(symlinks included) and must lie inside one of the allowed directories.
+
+Agents run it in-process through `InProcessMCPServer` (memory streams, no
+subprocess); `python -m backend.mcp.filesystem_server DIR [DIR ...]` serves it
+over stdio for callers that still need a command line.
+
+For large logs, ``read_lines``, ``tail_lines``, ``read_time_window`` and
+``grep_file`` seek through a per-file line-offset index (`LineIndexCache`)
+instead of reading from the top, and return numbered lines.
+
+It also adds ``search_content``, a substring/regex search over file contents that
+returns ``path:line:offset: text`` hits. When the connection has a
+`ContentIndex` (``content_index`` enabled), only the files whose trigrams can
+match are scanned; otherwise, or while the index is still being built, every
+file under the searched path is.
+"""
+
+import asyncio
+import fnmatch
+import json
+import mmap
+import os
+import re
+import stat
+import sys
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from functools import partial
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+import anyio
+from mcp.server.fastmcp import FastMCP
+from mcp.shared.memory import create_client_server_memory_streams
+from pydantic_ai.mcp import MCPServer
+from pydantic_ai.tools import ToolDefinition
+
+from backend.ai.tool_memo import memoized_call_tool
+from backend.core.logging import get_logger
+from backend.services.content_index import ContentIndex, SearchHit, compile_query, scan_file, search_tree
+from backend.services.line_index import (
+    LineIndexCache,
+    get_line_index_cache,
+    grep_with_context,
+    parse_query_time,
+    read_line_range,
+    tail_lines,
+    time_window,
+)
+
+logger = get_logger(__name__)
+
+READ_MAX_BYTES = 256 * 1024 * 1024  # whole-file reads above this must use head/tail
+MAX_LINES_PER_CALL = 2000  # line-based tools return at most this many lines
+
+
+class AccessDeniedError(PermissionError):
+    """A requested path resolves outside every allowed directory."""
+
+
+class FilesystemTools:
+    """Read-only filesystem operations confined to `allowed_directories`."""
+
+    def __init__(
+        self,
+        allowed_directories: Sequence[str],
+        read_max_bytes: int = READ_MAX_BYTES,
+        index: Optional[ContentIndex] = None,
+        line_indexes: Optional[LineIndexCache] = None,
+    ):
+        if not allowed_directories:
+            raise ValueError("At least one allowed directory must be provided.")
+        self.allowed_directories = [os.path.realpath(os.path.expanduser(d)) for d in allowed_directories]
+        self.read_max_bytes = read_max_bytes
+        self.index = index
+        self.line_indexes = line_indexes or get_line_index_cache()
+
+    # ------------------------------------------------------------------
+    # Path validation
+    # ------------------------------------------------------------------
+
+    def _is_allowed(self, real_path: str) -> bool:
+        for root in self.allowed_directories:
+            if real_path == root or real_path.startswith(root.rstrip(os.sep) + os.sep):
+                return True
+        return False
+
+    def resolve(self, path: str) -> str:
+        """
+        Absolute, symlink-free form of `path`, raising AccessDeniedError when it
+        is outside the allowed directories. Relative paths are taken relative to
+        the first allowed directory that contains them (else the first one).
+        """
+        expanded = os.path.expanduser(path)
+        if os.path.isabs(expanded):
+            candidate = expanded
+        else:
+            candidate = next(
+                (os.path.join(root, expanded) for root in self.allowed_directories if os.path.lexists(os.path.join(root, expanded))),
+                os.path.join(self.allowed_directories[0], expanded),
+            )
+        real_path = os.path.realpath(candidate)
+        if not self._is_allowed(real_path):
+            raise AccessDeniedError(
+                f"Access denied - path outside allowed directories: {real_path} not in {', '.join(self.allowed_directories)}"
+            )
+        return real_path
+
+    # ------------------------------------------------------------------
+    # Blocking implementations (run in a worker thread)
+    # ------------------------------------------------------------------
+
+    def _read(self, path: str, head: Optional[int], tail: Optional[int]) -> str:
+        if head is not None and tail is not None:
+            raise ValueError("Cannot specify both head and tail parameters simultaneously")
+        real_path = self.resolve(path)
+        with open(real_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return ""
+            if head is None and tail is None and size > self.read_max_bytes:
+                raise ValueError(
+                    f"File is {size} bytes, more than the {self.read_max_bytes} bytes read at once; "
+                    "use the head or tail parameter to read part of it"
+                )
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if head is not None:
+                    end = 0
+                    for _ in range(max(head, 0)):
+                        newline = mm.find(b"\n", end)
+                        if newline == -1:
+                            end = size
+                            break
+                        end = newline + 1
+                    data = mm[:end]
+                elif tail is not None:
+                    start = size
+                    search_end = size - 1 if mm[size - 1:size] == b"\n" else size  # a final newline ends the last line
+                    for _ in range(max(tail, 0)):
+                        newline = mm.rfind(b"\n", 0, search_end)
+                        start = newline + 1
+                        if newline == -1:
+                            break
+                        search_end = newline
+                    data = mm[start:]
+                else:
+                    data = mm[:]
+        return data.decode("utf-8", errors="replace")
+
+    def _read_multiple(self, paths: List[str]) -> str:
+        parts = []
+        for path in paths:
+            try:
+                parts.append(f"{path}:\n{self._read(path, None, None)}\n")
+            except Exception as e:
+                parts.append(f"{path}: Error - {e}")
+        return "\n---\n".join(parts)
+
+    def _list_directory(self, path: str) -> str:
+        real_path = self.resolve(path)
+        with os.scandir(real_path) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+            return "\n".join(f"{'[DIR]' if entry.is_dir() else '[FILE]'} {entry.name}" for entry in entries)
+
+    def _directory_tree(self, path: str) -> str:
+        def build(directory: str) -> List[Dict[str, Any]]:
+            tree = []
+            with os.scandir(directory) as it:
+                for entry in sorted(it, key=lambda e: e.name):
+                    if entry.is_dir(follow_symlinks=False):
+                        tree.append({"name": entry.name, "type": "directory", "children": build(entry.path)})
+                    else:
+                        tree.append({"name": entry.name, "type": "file"})
+            return tree
+
+        return json.dumps(build(self.resolve(path)), indent=2)
+
+    def _search(self, path: str, pattern: str, exclude_patterns: List[str]) -> str:
+        root = self.resolve(path)
+        needle = pattern.lower()
+        results: List[str] = []
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except OSError:
+                continue
+            for entry in entries:
+                relative = os.path.relpath(entry.path, root)
+                # A pattern without a slash matches names at any depth, like in the Node server
+                if any(fnmatch.fnmatch(relative if "/" in p else entry.name, p) for p in exclude_patterns):
+                    continue
+                if needle in entry.name.lower():
+                    results.append(entry.path)
+                # Symlinked directories are not followed: they may lead out of the allowed directories
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+        return "\n".join(results) if results else "No matches found"
+
+    def _search_content(
+        self, pattern: str, path: Optional[str], regex: bool, case_sensitive: bool, max_results: int
+    ) -> str:
+        try:
+            compile_query(pattern, regex, case_sensitive)
+        except re.error as e:
+            raise ValueError(f"Invalid regular expression: {e}")
+        roots = [self.resolve(path)] if path else self.allowed_directories
+        hits: List[SearchHit] = []
+        scanned = 0
+        source = "index"
+        for root in roots:
+            remaining = max_results - len(hits)
+            if remaining <= 0:
+                break
+            if os.path.isfile(root):
+                found = scan_file(root, compile_query(pattern, regex, case_sensitive), remaining)
+                count = 1
+                source = "scan"
+            elif self.index is not None and self.index.ready and self.index.covers(root):
+                found, count = self.index.search(pattern, regex, case_sensitive, under=root, max_results=remaining)
+            else:
+                found, count = search_tree(root, pattern, regex, case_sensitive, max_results=remaining)
+                source = "scan"
+            hits.extend(found)
+            scanned += count
+        header = f"{len(hits)} matches in {scanned} files scanned ({source})"
+        if len(hits) >= max_results:
+            header += f"; stopped at maxResults={max_results}"
+        return "\n".join([header, *(f"{hit.path}:{hit.line}:{hit.offset}: {hit.text}" for hit in hits)])
+
+    def _numbered(self, real_path: str, lines: List, total: int, note: str = "") -> str:
+        if not lines:
+            return f"{real_path}: no lines ({total} lines in file){note}"
+        header = f"{real_path}: lines {lines[0][0]}-{lines[-1][0]} of {total}{note}"
+        return "\n".join([header, *(f"{number}: {text}" for number, text in lines)])
+
+    def _read_lines(self, path: str, start_line: int, count: int) -> str:
+        real_path = self.resolve(path)
+        index = self.line_indexes.get(real_path)
+        return self._numbered(real_path, read_line_range(index, start_line, min(count, MAX_LINES_PER_CALL)), index.line_count)
+
+    def _tail_lines(self, path: str, count: int) -> str:
+        real_path = self.resolve(path)
+        index = self.line_indexes.get(real_path)
+        return self._numbered(real_path, tail_lines(index, min(count, MAX_LINES_PER_CALL)), index.line_count)
+
+    def _read_time_window(self, path: str, start: str, end: str, max_lines: int) -> str:
+        try:
+            window_start, window_end = parse_query_time(start), parse_query_time(end)
+        except ValueError as e:
+            raise ValueError(f"start and end must be ISO 8601 times (e.g. 2024-05-01T10:00:00): {e}")
+        real_path = self.resolve(path)
+        index = self.line_indexes.get(real_path)
+        lines, cut = time_window(index, window_start, window_end, min(max_lines, MAX_LINES_PER_CALL))
+        note = f"; more lines follow, continue with read_lines from line {lines[-1][0] + 1}" if cut else ""
+        return self._numbered(real_path, lines, index.line_count, note)
+
+    def _grep_file(
+        self,
+        path: str,
+        pattern: str,
+        regex: bool,
+        case_sensitive: bool,
+        before: int,
+        after: int,
+        max_matches: int,
+        start_line: Optional[int],
+        end_line: Optional[int],
+    ) -> str:
+        try:
+            query = compile_query(pattern, regex, case_sensitive)
+        except re.error as e:
+            raise ValueError(f"Invalid regular expression: {e}")
+        real_path = self.resolve(path)
+        index = self.line_indexes.get(real_path)
+        groups, matches = grep_with_context(index, query, max(before, 0), max(after, 0), max_matches, start_line, end_line)
+        header = f"{real_path}: {matches} matching lines" + (f" (stopped at maxMatches={max_matches})" if matches >= max_matches else "")
+        blocks = ["\n".join(f"{number}{':' if is_match else '-'} {text}" for number, text, is_match in group) for group in groups]
+        return "\n".join([header, "\n--\n".join(blocks)]) if blocks else header
+
+    def _file_info(self, path: str) -> str:
+        info = os.stat(self.resolve(path))
+
+        def iso(timestamp: float) -> str:
+            return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+        return "\n".join([
+            f"size: {info.st_size}",
+            f"created: {iso(getattr(info, 'st_birthtime', info.st_ctime))}",
+            f"modified: {iso(info.st_mtime)}",
+            f"accessed: {iso(info.st_atime)}",
+            f"isDirectory: {str(stat.S_ISDIR(info.st_mode)).lower()}",
+            f"isFile: {str(stat.S_ISREG(info.st_mode)).lower()}",
+            f"permissions: {oct(info.st_mode)[-3:]}",
+        ])
+
+    # ------------------------------------------------------------------
+    # Async API
+    # ------------------------------------------------------------------
+
+    async def read_file(self, path: str, head: Optional[int] = None, tail: Optional[int] = None) -> str:
+        return await asyncio.to_thread(self._read, path, head, tail)
+
+    async def read_multiple_files(self, paths: List[str]) -> str:
+        return await asyncio.to_thread(self._read_multiple, paths)
+
+    async def list_directory(self, path: str) -> str:
+        return await asyncio.to_thread(self._list_directory, path)
+
+    async def directory_tree(self, path: str) -> str:
+        return await asyncio.to_thread(self._directory_tree, path)
+
+    async def search_files(self, path: str, pattern: str, exclude_patterns: Optional[List[str]] = None) -> str:
+        return await asyncio.to_thread(self._search, path, pattern, exclude_patterns or [])
+
+    async def search_content(
+        self,
+        pattern: str,
+        path: Optional[str] = None,
+        regex: bool = False,
+        case_sensitive: bool = False,
+        max_results: int = 100,
+    ) -> str:
+        return await asyncio.to_thread(self._search_content, pattern, path, regex, case_sensitive, max_results)
+
+    async def read_lines(self, path: str, start_line: int, count: int = 200) -> str:
+        return await asyncio.to_thread(self._read_lines, path, start_line, count)
+
+    async def tail_lines(self, path: str, count: int = 100) -> str:
+        return await asyncio.to_thread(self._tail_lines, path, count)
+
+    async def read_time_window(self, path: str, start: str, end: str, max_lines: int = 200) -> str:
+        return await asyncio.to_thread(self._read_time_window, path, start, end, max_lines)
+
+    async def grep_file(
+        self,
+        path: str,
+        pattern: str,
+        regex: bool = False,
+        case_sensitive: bool = False,
+        before: int = 2,
+        after: int = 2,
+        max_matches: int = 50,
+        start_line: Optional[int] = None,
+        end_line: Optional[int] = None,
+    ) -> str:
+        return await asyncio.to_thread(
+            self._grep_file, path, pattern, regex, case_sensitive, before, after, max_matches, start_line, end_line
+        )
+
+    async def get_file_info(self, path: str) -> str:
+        return await asyncio.to_thread(self._file_info, path)
+
+    def list_allowed_directories(self) -> str:
+        return "Allowed directories:\n" + "\n".join(self.allowed_directories)
+
+
+def build_filesystem_server(allowed_directories: Sequence[str], index: Optional[ContentIndex] = None) -> FastMCP:
+    """A FastMCP server exposing `FilesystemTools` under the Node server's tool names."""
+    fs = FilesystemTools(allowed_directories, index=index)
+    server = FastMCP("sherlog-filesystem")
+
+    @server.tool()
+    async def read_file(path: str, head: Optional[int] = None, tail: Optional[int] = None) -> str:
+        """Read the complete contents of a file as text. Use 'head' or 'tail' to read only the
+        first or last N lines. Only works within allowed directories."""
+        return await fs.read_file(path, head, tail)
+
+    @server.tool()
+    async def read_multiple_files(paths: List[str]) -> str:
+        """Read the contents of multiple files at once. Each file's content is returned with its
+        path; a failed read does not stop the others. Only works within allowed directories."""
+        return await fs.read_multiple_files(paths)
+
+    @server.tool()
+    async def list_directory(path: str) -> str:
+        """Get a listing of the files and directories in a path, prefixed with [FILE] or [DIR].
+        Only works within allowed directories."""
+        return await fs.list_directory(path)
+
+    @server.tool()
+    async def directory_tree(path: str) -> str:
+        """Get a recursive tree of files and directories as JSON (name, type, children).
+        Only works within allowed directories."""
+        return await fs.directory_tree(path)
+
+    @server.tool()
+    async def search_files(path: str, pattern: str, excludePatterns: Optional[List[str]] = None) -> str:
+        """Recursively search for files and directories whose name contains 'pattern'
+        (case-insensitive), starting at 'path'. Returns full paths. Only searches within allowed directories."""
+        return await fs.search_files(path, pattern, excludePatterns)
+
+    @server.tool()
+    async def search_content(
+        pattern: str,
+        path: Optional[str] = None,
+        regex: bool = False,
+        caseSensitive: bool = False,
+        maxResults: int = 100,
+    ) -> str:
+        """Search the contents of files for 'pattern' (a substring, or a Python regular expression
+        when 'regex' is true; case-insensitive unless 'caseSensitive'), under 'path' or every allowed
+        directory. Returns one line per matching line: 'path:line:byte_offset: text'. Use the line
+        numbers with read_file instead of reading whole large files."""
+        return await fs.search_content(pattern, path, regex, caseSensitive, maxResults)
+
+    @server.tool()
+    async def read_lines(path: str, startLine: int, count: int = 200) -> str:
+        """Read 'count' lines of a file starting at line 'startLine' (1-based), each prefixed with its
+        line number. Seeks through a line index, so it is fast anywhere in multi-GB files."""
+        return await fs.read_lines(path, startLine, count)
+
+    @server.tool()
+    async def tail_lines(path: str, count: int = 100) -> str:
+        """Read the last 'count' lines of a file, each prefixed with its line number (e.g. the latest
+        log entries)."""
+        return await fs.tail_lines(path, count)
+
+    @server.tool()
+    async def read_time_window(path: str, start: str, end: str, maxLines: int = 200) -> str:
+        """Read the lines of a time-ordered log file logged between 'start' and 'end' (ISO 8601, e.g.
+        2024-05-01T10:00:00; with an offset or Z to compare in UTC). Lines without a timestamp (stack
+        traces) go with the line above. Lines are prefixed with their line number."""
+        return await fs.read_time_window(path, start, end, maxLines)
+
+    @server.tool()
+    async def grep_file(
+        path: str,
+        pattern: str,
+        regex: bool = False,
+        caseSensitive: bool = False,
+        before: int = 2,
+        after: int = 2,
+        maxMatches: int = 50,
+        startLine: Optional[int] = None,
+        endLine: Optional[int] = None,
+    ) -> str:
+        """Find the lines of one file containing 'pattern' (a Python regex when 'regex' is true) and
+        show 'before'/'after' lines around each, like grep -n -B -A: 'N: text' for matches, 'N- text'
+        for context, '--' between groups. 'startLine'/'endLine' restrict the search to a line range."""
+        return await fs.grep_file(path, pattern, regex, caseSensitive, before, after, maxMatches, startLine, endLine)
+
+    @server.tool()
+    async def get_file_info(path: str) -> str:
+        """Get metadata about a file or directory: size, times, type and permissions.
+        Only works within allowed directories."""
+        return await fs.get_file_info(path)
+
+    @server.tool()
+    def list_allowed_directories() -> str:
+        """Returns the list of directories this server is allowed to access."""
+        return fs.list_allowed_directories()
+
+    return server
+
+
+class InProcessMCPServer(MCPServer):
+    """
+    A FastMCP server attached to pydantic-ai agents in this process over memory
+    streams. Allowlisted read-only calls are served from the active ToolCallMemo
+    and the tool list is fetched once per run, as with MemoizingMCPServerStdio.
+    """
+
+    def __init__(self, server: FastMCP, connection_key: str = "default"):
+        self.server = server
+        self._connection_key = connection_key
+        self._tool_definitions: Optional[List[ToolDefinition]] = None
+
+    async def __aenter__(self) -> "InProcessMCPServer":
+        self._tool_definitions = None
+        return await super().__aenter__()
+
+    async def list_tools(self) -> List[ToolDefinition]:
+        if self._tool_definitions is None:
+            self._tool_definitions = await super().list_tools()
+        return list(self._tool_definitions)
+
+    @asynccontextmanager
+    async def client_streams(self) -> AsyncIterator[Any]:
+        low_level = self.server._mcp_server  # FastMCP exposes no public handle on its Server
+        async with create_client_server_memory_streams() as (client_streams, server_streams):
+            async with anyio.create_task_group() as tg:
+                tg.start_soon(
+                    partial(low_level.run, *server_streams, low_level.create_initialization_options(), raise_exceptions=False)
+                )
+                try:
+                    yield client_streams
+                finally:
+                    tg.cancel_scope.cancel()
+
+    def _get_log_level(self) -> None:
+        return None
+
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Any:
+        return await memoized_call_tool(self._connection_key, tool_name, arguments, super().call_tool)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python -m backend.mcp.filesystem_server DIR [DIR ...]", file=sys.stderr)
+        sys.exit(1)
+    build_filesystem_server(sys.argv[1:]).run()
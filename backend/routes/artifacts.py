@@ -0,0 +1,37 @@
+"""
+Routes serving Python output artifacts (plots and DataFrame previews).
+
+Artifact ids are content hashes, so responses never change: they are sent with
+an immutable Cache-Control header and an ETag, and conditional requests get 304.
+"""
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+
+from backend.services.artifact_store import ARTIFACT_ID_RE, MEDIA_TYPES, get_artifact_store
+
+router = APIRouter(tags=["artifacts"])
+
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.get("/{artifact_id}")
+async def get_artifact(artifact_id: str, request: Request, thumbnail: bool = False):
+    """
+    Get a stored artifact: a plot image (``?thumbnail=true`` for its thumbnail)
+    or a DataFrame preview as typed JSON.
+    """
+    match = ARTIFACT_ID_RE.match(artifact_id)
+    if not match:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    path = get_artifact_store().resolve(artifact_id, thumbnail=thumbnail)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+
+    is_thumbnail = path.name.endswith(".thumb.png")
+    etag = f'"{match.group(1)}{"-thumb" if is_thumbnail else ""}"'
+    headers = {"Cache-Control": CACHE_CONTROL, "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    media_type = "image/png" if is_thumbnail else MEDIA_TYPES[match.group(2)]
+    return FileResponse(path, media_type=media_type, headers=headers)
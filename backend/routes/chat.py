@@ -12,11 +12,11 @@ from uuid import uuid4, UUID
 from uuid import uuid4
 from datetime import datetime, timezone
 import sqlite3
-import shutil
 from pathlib import Path as PyPath
 
-from fastapi import APIRouter, Depends, HTTPException, Request, Response, Form, Path, File, UploadFile
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response, Form, Path, File, UploadFile
 from fastapi.responses import StreamingResponse, JSONResponse
+from starlette.requests import ClientDisconnect
 from pydantic import BaseModel, Field
 from pydantic_ai.messages import (
     ModelRequest,
@@ -37,6 +37,17 @@ from backend.db.models import UploadedFile
 from backend.services.notebook_manager import NotebookManager, get_notebook_manager
 from backend.services.connection_manager import ConnectionManager, get_connection_manager
 from backend.services.redis_client import get_redis_client
+from backend.services.upload_blobs import collect_upload_garbage, get_upload_blob_store
+from backend.services.upload_storage import (
+    PendingUpload,
+    UploadChecksumError,
+    UploadOffsetError,
+    UploadTooLargeError,
+    get_upload_store,
+    iter_upload_file,
+    safe_filename,
+    stream_to_file,
+)
 from backend.config import Settings, get_settings
 import redis.asyncio as redis
 from redis.exceptions import RedisError
@@ -609,11 +620,13 @@ async def post_message(
 async def delete_session(
     request: Request, # Need request to access app state
     session_id: str,
+    background_tasks: BackgroundTasks,
     chat_db: ChatDatabase = Depends(get_chat_db),
+    db: AsyncSession = Depends(get_async_db_session),
     redis: redis.Redis = Depends(get_redis_client) # Inject Redis client
 ) -> None:
     """
-    Delete a chat session from DB, Redis, and the agent cache.
+    Delete a chat session from DB, Redis, and the agent cache, and release its uploaded files.
     """
     start_time = time.time()
     
@@ -652,8 +665,15 @@ async def delete_session(
 
         # 4. Clear messages from DB
         await chat_db.clear_session_messages(session_id)
+
+        # 5. Release uploaded files; content still used by other sessions is kept
+        released = await get_upload_blob_store().release_session(db, session_id)
+        if released:
+            await db.commit()
+            chat_logger.info(f"Released {released} uploaded file(s) of session {session_id}")
+            background_tasks.add_task(collect_upload_garbage)
         
-        # 5. Delete session record from DB (if applicable)
+        # 6. Delete session record from DB (if applicable)
         # ... (DB delete_session logic remains the same) ...
 
         process_time = time.time() - start_time
@@ -701,82 +721,73 @@ class FileUploadResponse(BaseModel):
     filepath: str # This will be the relative path as stored in DB
     file_type: Optional[str] = None
     size: Optional[int] = None
+    sha256: Optional[str] = None
+    deduplicated: bool = False # Same content was already stored; no new disk space used
     created_at: datetime
     message: str = "File uploaded successfully"
 
-@router.post("/sessions/{session_id}/files", response_model=FileUploadResponse)
-async def upload_file_to_session(
-    session_id: str = Path(...),
-    file: UploadFile = File(...),
-    notebook_id_str: Optional[str] = Form(None), # Receive as string, convert to UUID later
-    chat_db: ChatDatabase = Depends(get_chat_db), # For session validation
-    db: AsyncSession = Depends(get_async_db_session),
-    settings: Settings = Depends(get_settings)
-):
-    """
-    Upload a file and associate it with a chat session.
-    Optionally, link it to a notebook_id.
-    """
-    correlation_id = str(uuid4())
-    chat_logger.info(
-        f"File upload request for session {session_id}, filename: {file.filename}",
-        extra={'correlation_id': correlation_id}
-    )
-
-    # 1. Validate session
+async def _validate_upload_target(chat_db: ChatDatabase, session_id: str, notebook_id_str: Optional[str], correlation_id: str) -> Optional[UUID]:
+    """Check the chat session exists and parse the optional notebook_id."""
     session_data = await chat_db.get_session(session_id)
     if not session_data:
         chat_logger.warning(f"Session {session_id} not found for file upload.", extra={'correlation_id': correlation_id})
         raise HTTPException(status_code=404, detail=f"Chat session {session_id} not found")
 
-    notebook_uuid: Optional[UUID] = None
-    if notebook_id_str:
-        try:
-            notebook_uuid = UUID(notebook_id_str)
-        except ValueError:
-            chat_logger.warning(f"Invalid notebook_id format: {notebook_id_str}", extra={'correlation_id': correlation_id})
-            raise HTTPException(status_code=400, detail="Invalid notebook_id format.")
-
-    # 2. Define storage path and create directory
-    # Using /app/uploads as discussed
-    base_upload_dir = PyPath("/app/uploads")
-    session_upload_dir = base_upload_dir / session_id
+    if not notebook_id_str:
+        return None
     try:
-        session_upload_dir.mkdir(parents=True, exist_ok=True)
-        chat_logger.info(f"Ensured upload directory exists: {session_upload_dir}", extra={'correlation_id': correlation_id})
-    except Exception as e:
-        chat_logger.error(f"Could not create upload directory {session_upload_dir}: {e}", exc_info=True, extra={'correlation_id': correlation_id})
-        raise HTTPException(status_code=500, detail="Could not create upload directory.")
+        return UUID(notebook_id_str)
+    except ValueError:
+        chat_logger.warning(f"Invalid notebook_id format: {notebook_id_str}", extra={'correlation_id': correlation_id})
+        raise HTTPException(status_code=400, detail="Invalid notebook_id format.")
 
-    file_location = session_upload_dir / (file.filename or f"upload_{uuid4()}") # Handle case where filename might be None
 
-    # 3. Save the file
-    try:
-        with open(file_location, "wb+") as file_object:
-            shutil.copyfileobj(file.file, file_object)
-        file_size = file_location.stat().st_size
-        chat_logger.info(f"File {file.filename} saved to {file_location}, size: {file_size} bytes", extra={'correlation_id': correlation_id})
-    except Exception as e:
-        chat_logger.error(f"Could not save uploaded file {file.filename} to {file_location}: {e}", exc_info=True, extra={'correlation_id': correlation_id})
-        raise HTTPException(status_code=500, detail=f"Could not save file: {file.filename}")
-    finally:
-        await file.close() # Ensure the UploadFile is closed
+async def _record_uploaded_file(
+    db: AsyncSession,
+    session_id: str,
+    notebook_uuid: Optional[UUID],
+    filename: str,
+    content_type: Optional[str],
+    file_size: int,
+    sha256: str,
+    correlation_id: str,
+    staged_path: Optional[PyPath] = None,
+) -> Optional[FileUploadResponse]:
+    """
+    Create the UploadedFile row for content with hash `sha256`, referencing its shared blob.
 
-    # 4. Create database record
+    With `staged_path` the freshly received file becomes the blob (or is dropped if
+    the same content is stored already). Without it an existing blob is reused, and
+    None is returned when no blob with that hash exists.
+    """
+    blob_store = get_upload_blob_store()
     try:
+        if staged_path is not None:
+            blob_path, deduplicated = await blob_store.add_reference(db, staged_path, sha256, file_size)
+        else:
+            blob = await blob_store.reference_existing(db, sha256)
+            if blob is None:
+                return None
+            blob_path, deduplicated = str(blob.storage_path), True
+
         db_uploaded_file = UploadedFile(
             session_id=session_id,
             notebook_id=notebook_uuid,
-            filename=file.filename or "",
-            filepath=str(file_location.relative_to(base_upload_dir)), # Store relative path
-            file_type=file.content_type,
+            filename=filename,
+            filepath=blob_path, # Relative to the upload directory, shared by identical uploads
+            blob_sha256=sha256,
+            file_type=content_type,
             size=file_size,
+            metadata_={"sha256": sha256},
             # created_at and updated_at have defaults
         )
         db.add(db_uploaded_file)
         await db.commit()
         await db.refresh(db_uploaded_file)
-        chat_logger.info(f"Saved file metadata to DB for {file.filename}, ID: {db_uploaded_file.id}", extra={'correlation_id': correlation_id})
+        chat_logger.info(
+            f"Saved file metadata to DB for {filename}, ID: {db_uploaded_file.id}, blob: {blob_path}{' (deduplicated)' if deduplicated else ''}",
+            extra={'correlation_id': correlation_id}
+        )
         
         # Use getattr to avoid static-analysis confusion with SQLAlchemy attributes
         _id = getattr(db_uploaded_file, "id")
@@ -796,18 +807,243 @@ async def upload_file_to_session(
             filepath=str(_fpath),
             file_type=str(_ftype) if _ftype else None,
             size=int(_fsize) if _fsize is not None else None,
+            sha256=sha256,
+            deduplicated=deduplicated,
             created_at=_created,
         )
     except Exception as e:
-        chat_logger.error(f"Database error saving file metadata for {file.filename}: {e}", exc_info=True, extra={'correlation_id': correlation_id})
-        # Attempt to delete the orphaned file if DB save fails
-        try:
-            file_location.unlink(missing_ok=True)
-        except Exception as del_err:
-            chat_logger.error(f"Failed to delete orphaned file {file_location} after DB error: {del_err}", extra={'correlation_id': correlation_id})
+        await db.rollback()
+        chat_logger.error(f"Database error saving file metadata for {filename}: {e}", exc_info=True, extra={'correlation_id': correlation_id})
+        # A staged file not yet moved into the blob store is ours to delete; a blob
+        # without a committed row is swept by the blob garbage collection.
+        if staged_path is not None:
+            try:
+                staged_path.unlink(missing_ok=True)
+            except Exception as del_err:
+                chat_logger.error(f"Failed to delete staged upload {staged_path} after DB error: {del_err}", extra={'correlation_id': correlation_id})
         raise HTTPException(status_code=500, detail="Could not save file metadata to database.")
 
 
+@router.post("/sessions/{session_id}/files", response_model=FileUploadResponse)
+async def upload_file_to_session(
+    request: Request,
+    session_id: str = Path(...),
+    file: UploadFile = File(...),
+    notebook_id_str: Optional[str] = Form(None), # Receive as string, convert to UUID later
+    chat_db: ChatDatabase = Depends(get_chat_db), # For session validation
+    db: AsyncSession = Depends(get_async_db_session),
+    settings: Settings = Depends(get_settings)
+):
+    """
+    Upload a file and associate it with a chat session.
+    Optionally, link it to a notebook_id.
+
+    The file is streamed to disk in chunks (hashing it with SHA-256 on the way)
+    and rejected with 413 above `upload_max_bytes`. Content already uploaded
+    (in any session) is stored only once.
+
+    The multipart form is parsed (and spooled to a temporary file by Starlette)
+    before this handler runs, so an oversized file is rejected only after it
+    has been received. Only the resumable protocol under
+    /sessions/{session_id}/uploads rejects a file before its bytes are sent;
+    use it for very large files.
+    """
+    correlation_id = str(uuid4())
+    chat_logger.info(
+        f"File upload request for session {session_id}, filename: {file.filename}",
+        extra={'correlation_id': correlation_id}
+    )
+
+    # Reject oversized uploads before copying them into the blob store
+    declared_size = file.size if file.size is not None else int(request.headers.get("content-length") or 0)
+    if declared_size > settings.upload_max_bytes:
+        await file.close()
+        raise HTTPException(status_code=413, detail=f"File exceeds the upload limit of {settings.upload_max_bytes} bytes")
+
+    # 1. Validate session
+    try:
+        notebook_uuid = await _validate_upload_target(chat_db, session_id, notebook_id_str, correlation_id)
+    except HTTPException:
+        await file.close()
+        raise
+
+    # 2. Stream the file to a staging path without blocking the event loop; it is
+    # moved into the content-addressed blob store once its hash is known
+    filename = safe_filename(file.filename)
+    try:
+        staged_path = await get_upload_blob_store().new_staging_path()
+        file_size, sha256 = await stream_to_file(
+            iter_upload_file(file, settings.upload_chunk_size_bytes), staged_path, settings.upload_max_bytes
+        )
+        chat_logger.info(f"File {filename} received, size: {file_size} bytes, sha256: {sha256}", extra={'correlation_id': correlation_id})
+    except UploadTooLargeError as e:
+        chat_logger.warning(f"Rejected upload {filename}: {e}", extra={'correlation_id': correlation_id})
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        chat_logger.error(f"Could not save uploaded file {filename}: {e}", exc_info=True, extra={'correlation_id': correlation_id})
+        raise HTTPException(status_code=500, detail=f"Could not save file: {filename}")
+    finally:
+        await file.close() # Ensure the UploadFile is closed
+
+    # 3. Create database record
+    return await _record_uploaded_file(
+        db, session_id, notebook_uuid, filename, file.content_type,
+        file_size, sha256, correlation_id, staged_path=staged_path,
+    )
+
+
+@router.delete("/sessions/{session_id}/files/{file_id}", status_code=204)
+async def delete_uploaded_file(
+    background_tasks: BackgroundTasks,
+    session_id: str = Path(...),
+    file_id: UUID = Path(...),
+    db: AsyncSession = Depends(get_async_db_session),
+):
+    """Remove an uploaded file from a session; its content is deleted once no session uses it."""
+    row = await db.get(UploadedFile, file_id)
+    if row is None or row.session_id != session_id:
+        raise HTTPException(status_code=404, detail=f"File {file_id} not found in session {session_id}")
+    await get_upload_blob_store().release(db, row)
+    await db.commit()
+    background_tasks.add_task(collect_upload_garbage)
+    return Response(status_code=204)
+
+
+# --- Resumable (chunked) uploads ---
+# 1. POST   /sessions/{session_id}/uploads              declare filename + size (413 if too large)
+# 2. PUT    /sessions/{session_id}/uploads/{upload_id}  raw body bytes, `offset` query (or Upload-Offset header) = bytes already sent
+# 3. GET    /sessions/{session_id}/uploads/{upload_id}  current offset, to resume after a dropped connection
+# The PUT that brings the offset to the declared size completes the upload and returns the file record.
+# If the POST declares a sha256 whose content is stored already, it completes at once without any PUT.
+
+class ResumableUploadCreate(BaseModel):
+    filename: str
+    size: int = Field(..., ge=0)
+    content_type: Optional[str] = None
+    notebook_id: Optional[str] = None
+    sha256: Optional[str] = Field(None, pattern=r"^[0-9a-fA-F]{64}$")
+
+
+class ResumableUploadStatus(BaseModel):
+    upload_id: Optional[str] = None # None when completed from already stored content
+    filename: str
+    size: int
+    offset: int
+    max_chunk_bytes: int
+    complete: bool = False
+    file: Optional[FileUploadResponse] = None
+
+
+def _upload_status(upload: PendingUpload, file: Optional[FileUploadResponse] = None) -> ResumableUploadStatus:
+    return ResumableUploadStatus(
+        upload_id=upload.upload_id,
+        filename=upload.filename,
+        size=upload.size,
+        offset=upload.offset,
+        max_chunk_bytes=get_upload_store().max_chunk_bytes,
+        complete=file is not None,
+        file=file,
+    )
+
+
+async def _get_pending_upload(session_id: str, upload_id: str) -> PendingUpload:
+    upload = await get_upload_store().get(upload_id)
+    if upload is None or upload.session_id != session_id:
+        raise HTTPException(status_code=404, detail=f"Upload {upload_id} not found for session {session_id}")
+    return upload
+
+
+@router.post("/sessions/{session_id}/uploads", response_model=ResumableUploadStatus, status_code=201)
+async def create_resumable_upload(
+    params: ResumableUploadCreate,
+    session_id: str = Path(...),
+    chat_db: ChatDatabase = Depends(get_chat_db),
+    db: AsyncSession = Depends(get_async_db_session),
+):
+    """Start a resumable upload; the declared size is checked against the limit before any data is sent."""
+    correlation_id = str(uuid4())
+    notebook_uuid = await _validate_upload_target(chat_db, session_id, params.notebook_id, correlation_id)
+    filename = safe_filename(params.filename)
+    if params.sha256:
+        file_record = await _record_uploaded_file(
+            db, session_id, notebook_uuid, filename, params.content_type,
+            params.size, params.sha256.lower(), correlation_id,
+        )
+        if file_record is not None:
+            chat_logger.info(f"Upload of {filename} completed from stored content {params.sha256}", extra={'correlation_id': correlation_id})
+            return ResumableUploadStatus(
+                filename=filename, size=params.size, offset=params.size,
+                max_chunk_bytes=get_upload_store().max_chunk_bytes, complete=True, file=file_record,
+            )
+    try:
+        upload = await get_upload_store().create(
+            session_id, params.filename, params.size, params.content_type,
+            str(notebook_uuid) if notebook_uuid else None, params.sha256,
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return _upload_status(upload)
+
+
+@router.get("/sessions/{session_id}/uploads/{upload_id}", response_model=ResumableUploadStatus)
+async def get_resumable_upload(session_id: str = Path(...), upload_id: str = Path(...)):
+    """Current offset of a resumable upload (where the next chunk must start)."""
+    return _upload_status(await _get_pending_upload(session_id, upload_id))
+
+
+@router.put("/sessions/{session_id}/uploads/{upload_id}", response_model=ResumableUploadStatus)
+async def append_resumable_upload(
+    request: Request,
+    offset: Optional[int] = None,
+    session_id: str = Path(...),
+    upload_id: str = Path(...),
+    db: AsyncSession = Depends(get_async_db_session),
+):
+    """Append the raw request body at `offset` (or the Upload-Offset header); completes the upload once all bytes arrived."""
+    correlation_id = str(uuid4())
+    if offset is None:
+        try:
+            offset = int(request.headers["upload-offset"])
+        except (KeyError, ValueError):
+            raise HTTPException(status_code=400, detail="An `offset` query parameter or Upload-Offset header is required")
+    upload = await _get_pending_upload(session_id, upload_id)
+    store = get_upload_store()
+    content_length = request.headers.get("content-length")
+    try:
+        upload = await store.append(upload, offset, request.stream(), int(content_length) if content_length else None)
+    except UploadOffsetError as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "offset": e.expected_offset})
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ClientDisconnect:
+        chat_logger.info(f"Client disconnected during upload {upload_id}; it can resume from its last offset", extra={'correlation_id': correlation_id})
+        raise HTTPException(status_code=400, detail="Client disconnected")
+
+    if not upload.complete:
+        return _upload_status(upload)
+
+    try:
+        staged_path = await get_upload_blob_store().new_staging_path()
+        sha256 = await store.finish(upload, staged_path)
+    except UploadChecksumError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    chat_logger.info(f"Resumable upload {upload_id} completed: {upload.filename}, {upload.size} bytes, sha256: {sha256}", extra={'correlation_id': correlation_id})
+    file_record = await _record_uploaded_file(
+        db, session_id, UUID(upload.notebook_id) if upload.notebook_id else None,
+        upload.filename, upload.content_type, upload.size, sha256, correlation_id,
+        staged_path=staged_path,
+    )
+    return _upload_status(upload, file_record)
+
+
+@router.delete("/sessions/{session_id}/uploads/{upload_id}", status_code=204)
+async def abort_resumable_upload(session_id: str = Path(...), upload_id: str = Path(...)):
+    """Abandon a resumable upload and delete the bytes received so far."""
+    await _get_pending_upload(session_id, upload_id)
+    await get_upload_store().abort(upload_id)
+    return Response(status_code=204)
+
+
 @router.get("/sessions/{session_id}/messages")
 async def get_session_messages(
     session_id: str,
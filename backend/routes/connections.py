@@ -37,6 +37,9 @@ from backend.services.connection_handlers.git_repo_handler import (
 )
 # Import function to get registered types and handler getter
 from backend.services.connection_handlers.registry import get_all_handler_types, get_handler
+from backend.services.connection_jobs import enqueue_post_create_actions
+from backend.db.database import get_db_session
+from backend.db.repositories import ConnectionJobRepository
 
 # Initialize logger
 connection_logger = logging.getLogger("routes.connections")
@@ -555,12 +558,16 @@ async def set_default_connection(
 @router.get("/{connection_type}/tools")
 async def get_tools_for_connection_type(
     connection_type: str,
+    refresh: bool = False,
     connection_manager: ConnectionManager = Depends(get_connection_manager)
 ) -> List[MCPToolInfo]:
-    """Get available tools for a specific connection type via its default connection."""
+    """Get available tools for a specific connection type via its default connection.
+
+    Schemas are served from the tool schema cache; `refresh=true` rediscovers them.
+    """
     start_time = time.time()
     try:
-        tools = await connection_manager.get_tools_for_connection_type(connection_type)
+        tools = await connection_manager.get_tools_for_connection_type(connection_type, refresh=refresh)
         process_time = time.time() - start_time
         connection_logger.info(
             f"Retrieved tools for connection type: {connection_type}",
@@ -610,15 +617,18 @@ async def get_tools_for_connection_type(
     "/{connection_id}/reindex", 
     status_code=202, # 202 Accepted for async operation
     summary="Re-index Git Repository Connection",
-    description="Triggers a background re-indexing process for a specific Git repository connection."
+    description="Triggers a background re-indexing process for a specific Git repository connection. "
+                "Only files changed since the last indexed commit are re-embedded unless `full=true`."
 )
 async def reindex_git_repo_connection(
     connection_id: str,
+    full: bool = False,
     connection_manager: ConnectionManager = Depends(get_connection_manager)
 ):
     """
     Triggers a re-indexing process for a specific git_repo connection.
     This fetches the latest data from the Git repository and updates the Qdrant index.
+    The update is incremental (changed/removed files only); pass `full=true` to rebuild the collection.
     """
     # Relying on module-level imports for get_db_session and ConnectionRepository
     
@@ -651,21 +661,23 @@ async def reindex_git_repo_connection(
             connection_logger.error(f"Re-index failed: Could not get GitRepoConnectionHandler for {connection_id}", extra={'correlation_id': correlation_id})
             raise HTTPException(status_code=500, detail="Internal server error: Could not get appropriate handler.")
 
-        # Call post_create_actions as a background task
-        connection_logger.info(f"Scheduling re-indexing task for {connection_id} ('{connection.name}')", extra={'correlation_id': correlation_id})
-        # Pass the SQLAlchemy model instance directly
-        asyncio.create_task(handler.post_create_actions(connection))
+        # Queue post_create_actions as a job; an already active job is returned instead of a duplicate
+        connection_logger.info(f"Queueing {'full' if full else 'incremental'} re-indexing job for {connection_id} ('{connection.name}')", extra={'correlation_id': correlation_id})
+        job = await enqueue_post_create_actions(connection_id, {"full_reindex": full})
         
         process_time = time.time() - start_time
         connection_logger.info(
-            f"Successfully scheduled re-indexing for connection {connection_id}",
+            f"Successfully queued re-indexing job {job.id} for connection {connection_id}",
             extra={
                 'correlation_id': correlation_id,
                 'connection_name': connection.name,
                 'processing_time_ms': round(process_time * 1000, 2)
             }
         )
-        return {"message": f"Re-indexing process started for connection '{connection.name}' ({connection_id})."}
+        return {
+            "message": f"Re-indexing job queued for connection '{connection.name}' ({connection_id}).",
+            "job": job.to_dict(),
+        }
 
     except (ValueError, RuntimeError) as e:
         process_time = time.time() - start_time
@@ -698,3 +710,48 @@ async def reindex_git_repo_connection(
         )
 
 # --- End Re-index Endpoint ---
+
+# --- Connection Job Endpoints ---
+
+@router.get(
+    "/{connection_id}/jobs",
+    summary="List Connection Jobs",
+    description="Recent background jobs (e.g. repository indexing) of a connection, newest first, with their progress."
+)
+async def list_connection_jobs(connection_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+    async with get_db_session() as session:
+        jobs = await ConnectionJobRepository(session).list_for_connection(connection_id, limit=limit)
+    return [job.to_dict() for job in jobs]
+
+
+@router.get(
+    "/{connection_id}/jobs/{job_id}",
+    summary="Get Connection Job",
+    description="Status, progress and error of one background job."
+)
+async def get_connection_job(connection_id: str, job_id: str) -> Dict[str, Any]:
+    async with get_db_session() as session:
+        job = await ConnectionJobRepository(session).get(job_id)
+    if job is None or str(job.connection_id) != connection_id:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found for connection {connection_id}")
+    return job.to_dict()
+
+
+@router.post(
+    "/{connection_id}/jobs/{job_id}/cancel",
+    status_code=202,
+    summary="Cancel Connection Job",
+    description="Cancels a queued job immediately; a running job stops at its next heartbeat and keeps its checkpoint."
+)
+async def cancel_connection_job(connection_id: str, job_id: str) -> Dict[str, Any]:
+    async with get_db_session() as session:
+        repo = ConnectionJobRepository(session)
+        job = await repo.get(job_id)
+        if job is None or str(job.connection_id) != connection_id:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found for connection {connection_id}")
+        if job.status not in ConnectionJobRepository.ACTIVE_STATUSES:
+            raise HTTPException(status_code=409, detail=f"Job {job_id} has already finished with status '{job.status}'")
+        job = await repo.request_cancel(job_id)
+    return job.to_dict()
+
+# --- End Connection Job Endpoints ---
@@ -1,6 +1,7 @@
 import asyncio
 import json
 import os
+import sys
 import time
 from typing import Dict, Set, Tuple
 from uuid import UUID, uuid4
@@ -23,8 +24,14 @@ from backend.routes.connections import router as connections_router
 from backend.routes.notebooks import router as notebooks_router
 from backend.routes.chat import router as chat_router
 from backend.routes.models import router as models_router
-from backend.services.connection_manager import ConnectionManager
+from backend.routes.artifacts import router as artifacts_router
+from backend.services.connection_manager import ConnectionManager, get_connection_manager
 from backend.services.notebook_manager import NotebookManager
+from backend.services.http_client import close_http_client
+from backend.services.git_index_pipeline import shutdown_embedding_executor
+from backend.services.embedding_cache import close_embedding_cache
+from backend.services.python_kernels import get_python_kernel_manager
+from backend.services.content_index import get_content_index_registry
 from backend.db.chat_db import ChatDatabase
 from backend.core.logging import setup_logging, get_logger
 from backend.services.connection_handlers.registry import get_all_handler_types
@@ -119,9 +126,19 @@ async def lifespan(app: FastAPI):
         app.state.redis = None
 
     # --- Correctly Initialize Core Services (Singletons in app.state) ---
-    connection_manager = ConnectionManager()
+    # The process-wide instance, shared with the routes and agents (get_connection_manager)
+    connection_manager = get_connection_manager()
     app.state.connection_manager = connection_manager
+    try:
+        await connection_manager.initialize(redis_client=app.state.redis)
+    except Exception as e:
+        # Connections are loaded on first use instead
+        app_logger.error(f"Failed to load connections at startup: {e}", exc_info=True)
     app_logger.info("ConnectionManager initialized.")
+    # Tool schemas are discovered by starting each MCP server, so this runs behind startup
+    app.state.tool_schema_prewarm_task = None
+    if settings.tool_schema_prewarm:
+        app.state.tool_schema_prewarm_task = asyncio.create_task(connection_manager.prewarm_tool_schemas())
 
     execution_queue = ExecutionQueue()
     app.state.execution_queue = execution_queue # Assign BEFORE using it
@@ -196,6 +213,25 @@ async def lifespan(app: FastAPI):
     app.state.chat_agents = {} 
     app_logger.info("Chat agents cache initialized.")
 
+    # --- Start connection job worker (runs post_create_actions such as repo indexing) ---
+    app.state.connection_job_worker = None
+    if settings.connection_job_worker_autostart:
+        try:
+            app.state.connection_job_worker = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "backend.services.connection_job_worker"
+            )
+            app_logger.info(f"Connection job worker started (pid {app.state.connection_job_worker.pid}).")
+        except Exception as e:
+            app_logger.error(f"Failed to start connection job worker: {e}", exc_info=True)
+
+    # --- Python kernels (one per notebook, evicted when idle) ---
+    app.state.python_kernel_manager = get_python_kernel_manager()
+    app.state.python_kernel_manager.start()
+
+    # --- Filesystem content indexes (built on first use, refreshed by polling) ---
+    app.state.content_index_registry = get_content_index_registry()
+    app.state.content_index_registry.start()
+
     app_logger.info("Application startup fully completed")
 
     yield
@@ -231,6 +267,19 @@ async def lifespan(app: FastAPI):
         except Exception as e:
             app_logger.error(f"Error closing chat database connection: {str(e)}", exc_info=True)
     
+    # --- Cancel a tool schema prewarm still in progress ---
+    prewarm_task = getattr(app.state, "tool_schema_prewarm_task", None)
+    if prewarm_task is not None and not prewarm_task.done():
+        prewarm_task.cancel()
+        await asyncio.gather(prewarm_task, return_exceptions=True)
+
+    # --- Stop connection cache invalidation listener ---
+    if getattr(app.state, "connection_manager", None):
+        try:
+            await app.state.connection_manager.close()
+        except Exception as e:
+            app_logger.error(f"Error closing ConnectionManager: {str(e)}", exc_info=True)
+
     # --- Close Redis connection ---
     if hasattr(app.state, "redis") and app.state.redis:
         app_logger.info("Closing Redis connection pool")
@@ -240,6 +289,54 @@ async def lifespan(app: FastAPI):
         except Exception as e:
             app_logger.error(f"Error closing Redis connection pool: {str(e)}", exc_info=True)
     
+    # --- Close shared outbound HTTP client ---
+    try:
+        await close_http_client()
+    except Exception as e:
+        app_logger.error(f"Error closing shared HTTP client: {str(e)}", exc_info=True)
+
+    # --- Stop Python kernels ---
+    if getattr(app.state, "python_kernel_manager", None):
+        try:
+            await app.state.python_kernel_manager.shutdown()
+            app_logger.info("Python kernels stopped")
+        except Exception as e:
+            app_logger.error(f"Error stopping Python kernels: {str(e)}", exc_info=True)
+
+    # --- Stop content index refreshes ---
+    if getattr(app.state, "content_index_registry", None):
+        try:
+            await app.state.content_index_registry.shutdown()
+        except Exception as e:
+            app_logger.error(f"Error stopping content index refreshes: {str(e)}", exc_info=True)
+
+    # --- Stop connection job worker (a running job is requeued and resumes from its checkpoint) ---
+    worker = getattr(app.state, "connection_job_worker", None)
+    if worker is not None and worker.returncode is None:
+        app_logger.info("Stopping connection job worker...")
+        try:
+            worker.terminate()
+            try:
+                await asyncio.wait_for(worker.wait(), timeout=15)
+            except asyncio.TimeoutError:
+                app_logger.warning("Connection job worker did not stop in time; killing it.")
+                worker.kill()
+                await worker.wait()
+        except ProcessLookupError:
+            pass
+        except Exception as e:
+            app_logger.error(f"Error stopping connection job worker: {e}", exc_info=True)
+
+    # --- Stop git indexing embedding workers ---
+    try:
+        shutdown_embedding_executor()
+    except Exception as e:
+        app_logger.error(f"Error shutting down embedding process pool: {str(e)}", exc_info=True)
+    try:
+        close_embedding_cache()
+    except Exception as e:
+        app_logger.error(f"Error closing embedding cache: {str(e)}", exc_info=True)
+
     # --- Clear agent cache ---
     if hasattr(app.state, "chat_agents"):
          app_logger.info(f"Clearing chat agent cache ({len(app.state.chat_agents)} instances).")
@@ -278,6 +375,7 @@ app.include_router(notebooks_router, prefix="/api/notebooks", tags=["notebooks"]
 app.include_router(connections_router, prefix="/api/connections", tags=["connections"])
 app.include_router(chat_router, prefix="/api/chat", tags=["chat"])
 app.include_router(models_router, prefix="/api/models", tags=["models"])
+app.include_router(artifacts_router, prefix="/api/artifacts", tags=["artifacts"])
 
 # Enhanced request logging middleware
 @app.middleware("http")
@@ -0,0 +1,260 @@
+"""
+Binary artifacts produced by Python cells: plots and DataFrame previews.
+
+Python output used to carry plots inline as ``<PLOT_BASE64>`` text and
+DataFrames as ``--- DataFrame ---`` markdown blocks, so every notebook load,
+websocket update and planner context shipped (and regex-scanned) them.
+`externalize_python_output` moves both out of the text:
+
+  * plots are written as image files, with a server-side thumbnail;
+  * DataFrame blocks are parsed into compact typed JSON
+    (``{"columns": [{"name", "type"}], "rows": [...], "total_rows", "truncated"}``)
+    keeping at most ``dataframe_preview_max_rows`` rows;
+
+and each block is replaced by an ``<ARTIFACT kind="..." id="..."/>`` reference.
+Artifacts are content-addressed (``<sha256>.<ext>``) and immutable, so
+`routes/artifacts.py` serves them with long-lived cache headers. Identical
+plots/tables share one file.
+"""
+
+import base64
+import binascii
+import hashlib
+import io
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from backend.config import get_settings
+from backend.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+PLOT_RE = re.compile(r"<PLOT_BASE64>(.*?)</PLOT_BASE64>", re.DOTALL)
+DATAFRAME_RE = re.compile(r"--- DataFrame ---\n?(.*?)\n?--- End DataFrame ---", re.DOTALL)
+ARTIFACT_REF_RE = re.compile(r'<ARTIFACT kind="(plot|dataframe)" id="([0-9a-f]{64}\.(?:png|jpg|json))"([^>]*)/>')
+ARTIFACT_ID_RE = re.compile(r"^([0-9a-f]{64})\.(png|jpg|json)$")
+
+MEDIA_TYPES = {"png": "image/png", "jpg": "image/jpeg", "json": "application/json"}
+_IMAGE_SIGNATURES = ((b"\x89PNG\r\n\x1a\n", "png"), (b"\xff\xd8\xff", "jpg"))
+_NULL_TOKENS = {"", "nan", "NaN", "None", "NaT", "<NA>", "null"}
+_TABLE_SEPARATOR_RE = re.compile(r"^\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?$")
+_CELL_SPLIT_RE = re.compile(r"(?<!\\)\|")
+
+_artifact_store: Optional["ArtifactStore"] = None
+
+
+def _pillow_available() -> bool:
+    try:
+        import PIL.Image  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def artifact_ref(kind: str, artifact_id: str, **attrs: Any) -> str:
+    extra = "".join(f' {key}="{value}"' for key, value in attrs.items())
+    return f'<ARTIFACT kind="{kind}" id="{artifact_id}"{extra}/>'
+
+
+def _split_row(line: str) -> List[str]:
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|") and not line.endswith("\\|"):
+        line = line[:-1]
+    return [cell.strip().replace("\\|", "|") for cell in _CELL_SPLIT_RE.split(line)]
+
+
+def _parse_value(raw: str, column_type: str) -> Any:
+    if raw in _NULL_TOKENS:
+        return None
+    if column_type == "integer":
+        return int(raw)
+    if column_type == "number":
+        return float(raw)
+    if column_type == "boolean":
+        return raw == "True"
+    return raw
+
+
+def _column_type(values: Sequence[str]) -> str:
+    present = [v for v in values if v not in _NULL_TOKENS]
+    if not present:
+        return "string"
+    if all(v in ("True", "False") for v in present):
+        return "boolean"
+    for column_type, cast in (("integer", int), ("number", float)):
+        try:
+            for v in present:
+                cast(v)
+            return column_type
+        except ValueError:
+            continue
+    return "string"
+
+
+def parse_markdown_table(text: str, max_rows: int) -> Optional[Dict[str, Any]]:
+    """Typed JSON preview of a pipe-style markdown table (as printed by `df.to_markdown()`), or None."""
+    lines = [line for line in text.strip().splitlines() if line.strip()]
+    if len(lines) < 2 or not _TABLE_SEPARATOR_RE.match(lines[1].strip()):
+        return None
+    header = _split_row(lines[0])
+    rows = [_split_row(line) for line in lines[2:]]
+    if any(len(row) != len(header) for row in rows):
+        return None
+    kept = rows[:max_rows]
+    types = [_column_type([row[i] for row in kept]) for i in range(len(header))]
+    return {
+        "columns": [{"name": name, "type": column_type} for name, column_type in zip(header, types)],
+        "rows": [[_parse_value(value, types[i]) for i, value in enumerate(row)] for row in kept],
+        "total_rows": len(rows),
+        "truncated": len(rows) > len(kept),
+    }
+
+
+class ArtifactStore:
+    """Content-addressed artifact files under `base_dir` (``<sha[:2]>/<sha>.<ext>``)."""
+
+    def __init__(self, base_dir: str, thumbnail_px: int = 480, max_preview_rows: int = 200):
+        self.base_dir = Path(base_dir)
+        self.thumbnail_px = thumbnail_px
+        self.max_preview_rows = max_preview_rows
+
+    def path(self, artifact_id: str) -> Optional[Path]:
+        """Path of an artifact id (None if the id is malformed). The file may not exist."""
+        match = ARTIFACT_ID_RE.match(artifact_id)
+        if not match:
+            return None
+        return self.base_dir / match.group(1)[:2] / artifact_id
+
+    def thumbnail_path(self, artifact_id: str) -> Optional[Path]:
+        path = self.path(artifact_id)
+        return path.with_name(path.stem + ".thumb.png") if path is not None else None
+
+    def _write(self, data: bytes, ext: str) -> Tuple[str, Path]:
+        sha256 = hashlib.sha256(data).hexdigest()
+        artifact_id = f"{sha256}.{ext}"
+        path = self.path(artifact_id)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        return artifact_id, path
+
+    def put_image(self, data: bytes, ext: str) -> str:
+        artifact_id, path = self._write(data, ext)
+        thumb = self.thumbnail_path(artifact_id)
+        if not thumb.exists() and _pillow_available():
+            try:
+                self._write_thumbnail(path, thumb)
+            except Exception as e:
+                logger.warning(f"Could not create thumbnail for artifact {artifact_id}: {e}")
+        return artifact_id
+
+    def _write_thumbnail(self, source: Path, thumb: Path) -> None:
+        from PIL import Image
+
+        with Image.open(source) as image:
+            if max(image.size) <= self.thumbnail_px:
+                return  # the original is already thumbnail-sized; it is served instead
+            image.thumbnail((self.thumbnail_px, self.thumbnail_px))
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG", optimize=True)
+        tmp = thumb.with_name(f"{thumb.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(buffer.getvalue())
+        os.replace(tmp, thumb)
+
+    def put_dataframe(self, preview: Dict[str, Any]) -> str:
+        data = json.dumps(preview, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        artifact_id, _ = self._write(data, "json")
+        return artifact_id
+
+    def load_dataframe(self, artifact_id: str) -> Optional[Dict[str, Any]]:
+        path = self.path(artifact_id)
+        if path is None or not artifact_id.endswith(".json"):
+            return None
+        try:
+            return json.loads(path.read_bytes())
+        except (OSError, ValueError):
+            return None
+
+    def resolve(self, artifact_id: str, thumbnail: bool = False) -> Optional[Path]:
+        """File to serve for `artifact_id`; the original when no thumbnail exists."""
+        path = self.path(artifact_id)
+        if path is None or not path.exists():
+            return None
+        if thumbnail:
+            thumb = self.thumbnail_path(artifact_id)
+            if thumb.exists():
+                return thumb
+        return path
+
+
+def _decode_image(encoded: str) -> Optional[Tuple[bytes, str]]:
+    try:
+        data = base64.b64decode("".join(encoded.split()), validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    for signature, ext in _IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return data, ext
+    return None
+
+
+def externalize_python_output(
+    text: str,
+    store: Optional[ArtifactStore] = None,
+    kinds: Sequence[str] = ("plot", "dataframe"),
+) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Replace inline plots / DataFrame blocks of Python output with artifact references.
+    Returns the new text and the stored artifacts (``{"kind", "id", ...}``). Blocks
+    that cannot be decoded or parsed are left as they are. Blocking: call it in a thread.
+    """
+    if not text or ("<PLOT_BASE64>" not in text and "--- DataFrame ---" not in text):
+        return text, []
+    store = store or get_artifact_store()
+    artifacts: List[Dict[str, Any]] = []
+
+    def replace_plot(match: "re.Match") -> str:
+        decoded = _decode_image(match.group(1))
+        if decoded is None:
+            return match.group(0)
+        artifact_id = store.put_image(*decoded)
+        artifacts.append({"kind": "plot", "id": artifact_id})
+        return artifact_ref("plot", artifact_id)
+
+    def replace_dataframe(match: "re.Match") -> str:
+        preview = parse_markdown_table(match.group(1), store.max_preview_rows)
+        if preview is None:
+            return match.group(0)
+        artifact_id = store.put_dataframe(preview)
+        artifacts.append({"kind": "dataframe", "id": artifact_id, "rows": preview["total_rows"], "columns": len(preview["columns"])})
+        return artifact_ref("dataframe", artifact_id, rows=preview["total_rows"], columns=len(preview["columns"]))
+
+    try:
+        if "plot" in kinds:
+            text = PLOT_RE.sub(replace_plot, text)
+        if "dataframe" in kinds:
+            text = DATAFRAME_RE.sub(replace_dataframe, text)
+    except OSError as e:
+        # Storage problems must not lose the output: keep whatever was not replaced yet inline
+        logger.error(f"Could not store Python output artifacts: {e}", exc_info=True)
+    return text, artifacts
+
+
+def get_artifact_store() -> ArtifactStore:
+    """The process-wide artifact store."""
+    global _artifact_store
+    if _artifact_store is None:
+        settings = get_settings()
+        _artifact_store = ArtifactStore(
+            settings.artifact_dir,
+            thumbnail_px=settings.artifact_thumbnail_px,
+            max_preview_rows=settings.dataframe_preview_max_rows,
+        )
+    return _artifact_store
@@ -0,0 +1,244 @@
+"""
+Code-aware chunking of repository files for git_repo indexing.
+
+Embedding a whole file as one document means large files are truncated by the
+embedding model and a code search hit drags the entire file into the prompt.
+`chunk_file` splits a file into chunks that follow definition boundaries:
+
+  * Python: top-level functions/classes from the `ast` (oversized classes are
+    split further by method, e.g. ``Parser.parse``),
+  * JavaScript/TypeScript and Go: top-level declarations found by line patterns,
+  * everything else (and any oversized definition): line windows with overlap.
+
+Small adjacent definitions are packed together up to `max_chars` so tiny
+helpers don't each become a point. Every chunk records its 1-based inclusive
+line range and the symbol name(s) it covers.
+"""
+
+import ast
+import os
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+DEFAULT_MAX_CHUNK_CHARS = 2048
+DEFAULT_OVERLAP_LINES = 5
+
+_LANGUAGE_BY_EXTENSION = {
+    ".py": "python",
+    ".pyi": "python",
+    ".js": "javascript",
+    ".jsx": "javascript",
+    ".mjs": "javascript",
+    ".cjs": "javascript",
+    ".ts": "javascript",
+    ".tsx": "javascript",
+    ".go": "go",
+}
+
+# Declarations at column 0 that start a new top-level definition
+_JS_DECLARATION = re.compile(
+    r"^(?:export\s+(?:default\s+)?)?(?:"
+    r"(?:async\s+)?function\s*\*?\s*(?P<func>[A-Za-z_$][\w$]*)"
+    r"|(?:abstract\s+)?class\s+(?P<cls>[A-Za-z_$][\w$]*)"
+    r"|(?:interface|type|enum)\s+(?P<type>[A-Za-z_$][\w$]*)"
+    r"|(?:const|let|var)\s+(?P<var>[A-Za-z_$][\w$]*)\s*(?::[^=]+)?=\s*(?:async\s+)?(?:function\b|\([^)]*\)\s*(?::[^=]+)?=>|[A-Za-z_$][\w$]*\s*=>)"
+    r")"
+)
+_GO_DECLARATION = re.compile(
+    r"^(?:func\s+(?:\((?P<recv>[^)]*)\)\s*)?(?P<func>[A-Za-z_]\w*)"
+    r"|type\s+(?P<type>[A-Za-z_]\w*)"
+    r"|(?:var|const)\s+\("
+    r")"
+)
+
+
+@dataclass
+class CodeChunk:
+    text: str
+    start_line: int
+    end_line: int
+    symbol: Optional[str] = None
+    chunk_index: int = 0
+
+
+# (start_line, end_line, symbol); 1-based, inclusive
+_Segment = Tuple[int, int, Optional[str]]
+
+
+def detect_language(file_path: str) -> Optional[str]:
+    return _LANGUAGE_BY_EXTENSION.get(os.path.splitext(file_path)[1].lower())
+
+
+def chunk_file(
+    file_path: str,
+    content: str,
+    max_chars: int = DEFAULT_MAX_CHUNK_CHARS,
+    overlap_lines: int = DEFAULT_OVERLAP_LINES,
+) -> List[CodeChunk]:
+    """Split `content` into chunks along definition boundaries, falling back to line windows."""
+    lines = content.splitlines()
+    if not lines:
+        return []
+
+    language = detect_language(file_path)
+    segments: Optional[List[_Segment]] = None
+    if language == "python":
+        segments = _python_segments(content, lines, max_chars)
+    elif language == "javascript":
+        segments = _pattern_segments(lines, _JS_DECLARATION, _js_symbol)
+    elif language == "go":
+        segments = _pattern_segments(lines, _GO_DECLARATION, _go_symbol)
+    if not segments:
+        segments = [(1, len(lines), None)]
+
+    chunks: List[CodeChunk] = []
+    for start, end, symbol in _pack_segments(lines, segments, max_chars):
+        text = "\n".join(lines[start - 1:end])
+        if len(text) <= max_chars:
+            if text.strip():
+                chunks.append(CodeChunk(text=text, start_line=start, end_line=end, symbol=symbol))
+            continue
+        for w_start, w_end, w_text in _line_windows(lines, start, end, max_chars, overlap_lines):
+            if w_text.strip():
+                chunks.append(CodeChunk(text=w_text, start_line=w_start, end_line=w_end, symbol=symbol))
+
+    for index, chunk in enumerate(chunks):
+        chunk.chunk_index = index
+    return chunks
+
+
+def _segment_length(lines: List[str], start: int, end: int) -> int:
+    return sum(len(line) + 1 for line in lines[start - 1:end])
+
+
+def _partition(starts: List[Tuple[int, Optional[str]]], first_line: int, last_line: int) -> List[_Segment]:
+    """Turn sorted definition start lines into contiguous segments covering first..last."""
+    segments: List[_Segment] = []
+    if not starts or starts[0][0] > first_line:
+        head_end = starts[0][0] - 1 if starts else last_line
+        segments.append((first_line, head_end, None))
+    for i, (start, symbol) in enumerate(starts):
+        end = starts[i + 1][0] - 1 if i + 1 < len(starts) else last_line
+        segments.append((start, end, symbol))
+    return segments
+
+
+def _python_segments(content: str, lines: List[str], max_chars: int) -> Optional[List[_Segment]]:
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        return None
+
+    definitions = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+    starts: List[Tuple[int, Optional[str]]] = []
+    class_nodes = {}
+    for node in tree.body:
+        if isinstance(node, definitions):
+            start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+            starts.append((start, node.name))
+            if isinstance(node, ast.ClassDef):
+                class_nodes[start] = node
+    if not starts:
+        return None
+
+    segments: List[_Segment] = []
+    for start, end, symbol in _partition(starts, 1, len(lines)):
+        node = class_nodes.get(start)
+        if node is None or _segment_length(lines, start, end) <= max_chars:
+            segments.append((start, end, symbol))
+            continue
+        # Oversized class: split by method so each chunk names the method it holds
+        method_starts = [
+            (min([m.lineno] + [d.lineno for d in m.decorator_list]), f"{node.name}.{m.name}")
+            for m in node.body
+            if isinstance(m, definitions)
+        ]
+        if not method_starts:
+            segments.append((start, end, symbol))
+            continue
+        for sub_start, sub_end, sub_symbol in _partition(method_starts, start, end):
+            segments.append((sub_start, sub_end, sub_symbol or node.name))
+    return segments
+
+
+def _js_symbol(match: re.Match) -> Optional[str]:
+    return match.group("func") or match.group("cls") or match.group("type") or match.group("var")
+
+
+def _go_symbol(match: re.Match) -> Optional[str]:
+    name = match.group("func") or match.group("type")
+    receiver = match.group("recv")
+    if name and receiver:
+        receiver_type = receiver.split()[-1].lstrip("*")
+        return f"{receiver_type}.{name}"
+    return name
+
+
+def _pattern_segments(lines: List[str], pattern: re.Pattern, symbol_of) -> Optional[List[_Segment]]:
+    starts: List[Tuple[int, Optional[str]]] = []
+    for number, line in enumerate(lines, start=1):
+        match = pattern.match(line)
+        if match:
+            starts.append((_attach_leading_comments(lines, number), symbol_of(match)))
+    if not starts:
+        return None
+    # Comment attachment can move a start onto the previous definition's last line
+    deduped: List[Tuple[int, Optional[str]]] = []
+    for start, symbol in starts:
+        if deduped and start <= deduped[-1][0]:
+            start = deduped[-1][0] + 1
+        deduped.append((start, symbol))
+    return _partition(deduped, 1, len(lines))
+
+
+def _attach_leading_comments(lines: List[str], number: int) -> int:
+    """Move a definition's start up over the doc comment / annotations directly above it."""
+    start = number
+    while start > 1:
+        previous = lines[start - 2].strip()
+        if previous.startswith(("//", "/*", "*", "@")) or previous.endswith("*/"):
+            start -= 1
+        else:
+            break
+    return start
+
+
+def _pack_segments(lines: List[str], segments: List[_Segment], max_chars: int) -> List[_Segment]:
+    """Merge adjacent small segments while they fit in `max_chars` together."""
+    packed: List[Tuple[int, int, List[str]]] = []
+    size = 0
+    for start, end, symbol in segments:
+        length = _segment_length(lines, start, end)
+        if packed and size + length <= max_chars:
+            last_start, _, symbols = packed[-1]
+            packed[-1] = (last_start, end, symbols + ([symbol] if symbol else []))
+            size += length
+        else:
+            packed.append((start, end, [symbol] if symbol else []))
+            size = length
+    return [(start, end, ", ".join(symbols) or None) for start, end, symbols in packed]
+
+
+def _line_windows(lines: List[str], start: int, end: int, max_chars: int, overlap_lines: int) -> List[Tuple[int, int, str]]:
+    """Windows of whole lines up to `max_chars`, each overlapping the previous by `overlap_lines`."""
+    windows: List[Tuple[int, int, str]] = []
+    window_start = start
+    while window_start <= end:
+        window_end = window_start
+        size = len(lines[window_start - 1]) + 1
+        while window_end < end and size + len(lines[window_end]) + 1 <= max_chars:
+            size += len(lines[window_end]) + 1
+            window_end += 1
+
+        if window_end == window_start and size > max_chars:
+            # A single overlong line (minified code, data): split it by characters
+            line = lines[window_start - 1]
+            windows.extend((window_start, window_start, line[i:i + max_chars]) for i in range(0, len(line), max_chars))
+        else:
+            windows.append((window_start, window_end, "\n".join(lines[window_start - 1:window_end])))
+
+        if window_end >= end:
+            break
+        window_start = max(window_end + 1 - overlap_lines, window_start + 1)
+    return windows
@@ -0,0 +1,159 @@
+"""
+Hybrid (sparse + dense) search over git_repo Qdrant collections.
+
+Dense embeddings find code by meaning but routinely miss exact identifiers,
+error strings and config keys that engineers paste into a search. Each indexed
+chunk therefore also gets a BM25-style sparse vector (`SPARSE_VECTOR_NAME`):
+
+  * terms come from a code-aware tokenizer: identifiers are kept whole *and*
+    split into their snake_case/camelCase parts, and dotted/dashed compounds
+    such as ``spring.datasource.url`` are kept as a single term as well;
+  * term weights use BM25 term-frequency saturation; the IDF part is computed
+    by Qdrant itself (the sparse vector is created with ``Modifier.IDF``), so
+    it stays correct as the collection changes;
+  * term indices are stable 32-bit hashes, so no vocabulary has to be stored.
+
+`hybrid_search` runs the dense and the sparse query as prefetches and fuses
+them with reciprocal rank fusion. Collections indexed before sparse vectors
+existed are searched dense-only.
+"""
+
+import asyncio
+import hashlib
+import re
+from collections import Counter
+from typing import Any, Callable, Dict, List, Sequence
+
+from qdrant_client import AsyncQdrantClient, models
+
+from backend.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+SPARSE_VECTOR_NAME = "bm25-code"
+
+# BM25 parameters; the average chunk length is a fixed estimate (chunks are at most ~2k chars)
+BM25_K1 = 1.2
+BM25_B = 0.75
+BM25_AVG_CHUNK_TERMS = 256.0
+
+# Candidates fetched from each of the dense and sparse searches before fusion, per requested hit
+PREFETCH_FACTOR = 4
+
+_IDENTIFIER_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|[0-9]+")
+_COMPOUND_RE = re.compile(r"[A-Za-z0-9_]+(?:[.\-/:][A-Za-z0-9_]+)+")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z0-9])|[A-Z]?[a-z0-9]+|[A-Z]+")
+_MIN_TERM_LEN = 2
+_MAX_TERM_LEN = 64
+
+
+def tokenize_code(text: str) -> List[str]:
+    """Lower-cased search terms of `text` (with repeats, for term frequencies)."""
+    terms: List[str] = []
+    for match in _COMPOUND_RE.finditer(text):
+        terms.append(match.group(0).lower())
+    for match in _IDENTIFIER_RE.finditer(text):
+        identifier = match.group(0)
+        terms.append(identifier.lower())
+        parts = [p.lower() for piece in identifier.split("_") for p in _CAMEL_RE.findall(piece)]
+        if len(parts) > 1:
+            terms.extend(parts)
+    return [t for t in terms if _MIN_TERM_LEN <= len(t) <= _MAX_TERM_LEN]
+
+
+def term_index(term: str) -> int:
+    """Stable 32-bit index of a term in the sparse vector space."""
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=4).digest(), "big")
+
+
+def _sparse_vector(weights: Dict[int, float]) -> models.SparseVector:
+    indices = sorted(weights)
+    return models.SparseVector(indices=indices, values=[weights[i] for i in indices])
+
+
+def encode_sparse_document(text: str) -> models.SparseVector:
+    """BM25 document-side weights (term-frequency saturation with length normalisation)."""
+    counts = Counter(tokenize_code(text))
+    length = sum(counts.values())
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / BM25_AVG_CHUNK_TERMS)
+    weights: Dict[int, float] = {}
+    for term, tf in counts.items():
+        index = term_index(term)
+        # On a (rare) hash collision keep the larger weight
+        weights[index] = max(weights.get(index, 0.0), tf * (BM25_K1 + 1) / (tf + norm))
+    return _sparse_vector(weights)
+
+
+def encode_sparse_documents(texts: Sequence[str]) -> List[models.SparseVector]:
+    return [encode_sparse_document(text) for text in texts]
+
+
+def encode_sparse_query(text: str) -> models.SparseVector:
+    """Query-side vector: each distinct term once; Qdrant applies IDF."""
+    return _sparse_vector({term_index(term): 1.0 for term in set(tokenize_code(text))})
+
+
+def sparse_vectors_config() -> Dict[str, models.SparseVectorParams]:
+    """Sparse vector configuration for new git_repo collections."""
+    return {SPARSE_VECTOR_NAME: models.SparseVectorParams(modifier=models.Modifier.IDF)}
+
+
+async def collection_has_sparse_vectors(client: AsyncQdrantClient, collection_name: str) -> bool:
+    info = await client.get_collection(collection_name=collection_name)
+    return SPARSE_VECTOR_NAME in (info.config.params.sparse_vectors or {})
+
+
+async def hybrid_search(
+    client: AsyncQdrantClient,
+    collection_name: str,
+    query: str,
+    dense_vector_name: str,
+    embed_query: Callable[[str], Any],
+    limit: int = 5,
+) -> List[Dict[str, Any]]:
+    """
+    Search `collection_name` with dense and sparse prefetches fused by RRF.
+    `embed_query(text)` returns (or awaits to) the dense query vector.
+    Returns hits as dicts with the chunk text, location and fused score.
+    """
+    dense = embed_query(query)
+    if asyncio.iscoroutine(dense):
+        dense = await dense
+
+    candidates = max(limit * PREFETCH_FACTOR, limit)
+    if await collection_has_sparse_vectors(client, collection_name):
+        sparse = encode_sparse_query(query)
+        prefetch = [models.Prefetch(query=list(dense), using=dense_vector_name, limit=candidates)]
+        if sparse.indices:
+            prefetch.append(models.Prefetch(query=sparse, using=SPARSE_VECTOR_NAME, limit=candidates))
+        response = await client.query_points(
+            collection_name=collection_name,
+            prefetch=prefetch,
+            query=models.FusionQuery(fusion=models.Fusion.RRF),
+            limit=limit,
+            with_payload=True,
+        )
+    else:
+        logger.info(f"Collection '{collection_name}' has no sparse vectors (indexed before hybrid search); searching dense only")
+        response = await client.query_points(
+            collection_name=collection_name,
+            query=list(dense),
+            using=dense_vector_name,
+            limit=limit,
+            with_payload=True,
+        )
+    return [_hit(point) for point in response.points]
+
+
+def _hit(point: models.ScoredPoint) -> Dict[str, Any]:
+    payload = dict(point.payload or {})
+    hit = {
+        "score": round(point.score, 4),
+        "file_path": payload.get("file_path"),
+        "start_line": payload.get("start_line"),
+        "end_line": payload.get("end_line"),
+        "symbol": payload.get("symbol"),
+        "type": payload.get("type"),
+        "content": payload.get("document"),
+    }
+    return {k: v for k, v in hit.items() if v is not None}
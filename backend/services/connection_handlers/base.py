@@ -7,6 +7,7 @@ from typing import Type, Dict, Tuple, List, Optional, Any
 from pydantic import BaseModel
 
 from mcp import StdioServerParameters
+from backend.ai.tool_memo import MemoizingMCPServerStdio
 from backend.core.types import MCPToolInfo
 
 
@@ -85,6 +86,21 @@ class MCPConnectionHandler(ABC):
         """
         pass
 
+    def create_mcp_server(self, db_config: Dict[str, Any], connection_key: str) -> Any:
+        """
+        The pydantic-ai MCP server agents attach for this connection. By default a
+        (memoizing) stdio server launched from `get_stdio_params`; handlers with a
+        native implementation return an in-process server instead.
+
+        Raises:
+            ValueError: If the configuration is invalid.
+        """
+        stdio_params = self.get_stdio_params(db_config)
+        return MemoizingMCPServerStdio(
+            command=stdio_params.command, args=stdio_params.args, env=stdio_params.env,
+            connection_key=connection_key,
+        )
+
     @abstractmethod
     def get_sensitive_fields(self) -> List[str]:
         """Return a list of top-level keys within the stored DB config that should be redacted."""
@@ -117,10 +133,15 @@ class MCPConnectionHandler(ABC):
     #     # Common logic for stdio_client, initialize, list_tools could go here
     #     pass
 
-    async def post_create_actions(self, connection_config: Any) -> None: # Using Any to avoid circular import with ConnectionConfig from manager
+    async def post_create_actions(self, connection_config: Any, job: Optional[Any] = None, **options: Any) -> None: # Using Any to avoid circular import with ConnectionConfig from manager
         """
         Optional actions to perform after a connection has been successfully created and saved.
         For example, triggering initial data indexing.
         By default, does nothing. Subclasses can override.
+
+        Overrides run as persisted background jobs in the connection job worker
+        (see backend.services.connection_jobs): `job` is the JobContext used to
+        report progress, save checkpoints and observe cancellation, and `options`
+        are the job's params. Raise to mark the job failed (it is retried).
         """
         pass
@@ -1,12 +1,12 @@
 import asyncio
 import os
 import re
+import time
 import logging
-from typing import Dict, Any, Type, Tuple, List, Optional, Literal
-import inspect
+from contextlib import AsyncExitStack
+from typing import AsyncIterator, Dict, Any, Type, Tuple, List, Optional, Literal
 
 # Third-party imports
-from gitingest import ingest_async
 from pydantic import BaseModel, HttpUrl, Field
 from mcp import StdioServerParameters # Import needed for type hint
 from grpc.aio import AioRpcError # Import for specific exception handling
@@ -19,11 +19,29 @@ from qdrant_client import AsyncQdrantClient, models
 from backend.db.models import Connection
 from .base import MCPConnectionHandler # Changed base class
 from backend.core.logging import get_logger
+from backend.config import get_settings
+from backend.services.code_chunker import CodeChunk, chunk_file
+from backend.services.embedding_cache import get_embedding_cache
+from backend.services.git_index_pipeline import EmbeddingUpsertPipeline, IndexDocument
+from backend.services.connection_jobs import JobCancelled, JobContext
+from backend.services.git_repo_source import open_repo_source
+from backend.services.git_index_state import (
+    INDEX_FORMAT_VERSION,
+    GitIndexCheckpoint,
+    GitIndexState,
+    GitIndexStateStore,
+    diff_file_hashes,
+    file_point_id,
+    hash_file_content,
+    resolve_remote_head,
+)
 
 logger = get_logger(__name__)
 
 # Added constant: safe chunk length (~512 tokens ≈ 2 048 chars) for embedding models
 DEFAULT_CHUNK_SIZE_CHARS = 2048
+# Number of file paths per delete-by-filter request during incremental refreshes
+FILE_DELETE_BATCH_SIZE = 256
 
 # Basic sanitization: replace common URL characters with hyphens
 def sanitize_url_for_collection(url: str) -> str:
@@ -42,7 +60,7 @@ class GitRepoConnectionCreate(BaseModel):
     repo_url: HttpUrl = Field(..., description="URL of the Git repository")
 
 class GitRepoConnectionHandler(MCPConnectionHandler): # Changed base class
-    """Handles indexing data from a Git repository using gitingest and Qdrant."""
+    """Handles indexing data from a Git repository (shallow clone, gitingest fallback) into Qdrant."""
 
     # --- Implementation of MCPConnectionHandler ABC ---
 
@@ -75,16 +93,15 @@ class GitRepoConnectionHandler(MCPConnectionHandler): # Changed base class
         return {"repo_url": repo_url, "collection_name": collection_name}
 
     async def test_connection(self, config_to_test: Dict[str, Any]) -> Tuple[bool, str]:
-        """Tests the connection by attempting to run gitingest briefly."""
+        """Tests the connection by resolving the remote HEAD with `git ls-remote`."""
         repo_url = config_to_test.get("repo_url")
         if not repo_url:
             return False, "Missing 'repo_url' in configuration for testing."
         try:
-            # Try a quick ingest - might be slow, consider a lighter check if possible
+            # `git ls-remote` only lists refs, so nothing is downloaded or held in memory
             logger.info(f"Testing connection for {repo_url}...")
-            # We don't need the full result, just check if it runs without error
-            # Note: Removed max_files=1 as it's not a valid parameter for ingest_async
-            await ingest_async(repo_url) # Check if basic call succeeds
+            if await resolve_remote_head(repo_url) is None:
+                return False, f"Could not reach repository {repo_url} (git ls-remote failed)."
             logger.info(f"Connection test successful for {repo_url}")
             return True, "Successfully connected to repository (basic check)."
         except Exception as e:
@@ -155,14 +172,29 @@ class GitRepoConnectionHandler(MCPConnectionHandler): # Changed base class
         raise NotImplementedError("GitRepo handler does not execute tool calls directly.")
 
     # --- Indexing Logic (To be triggered separately after connection creation) ---
-    async def post_create_actions(self, connection_config: Any) -> None:
+    async def post_create_actions(self, connection_config: Any, job: Optional[JobContext] = None, full_reindex: bool = False, **options: Any) -> None:
         """
-        Fetches data using gitingest and indexes it directly into Qdrant
+        Fetches the repository (a temporary shallow clone streamed file by file,
+        or gitingest output as a fallback) and indexes it directly into Qdrant
         using the qdrant-client library.
-        This is called after the connection is successfully created and saved.
+        This is called after the connection is successfully created and saved,
+        and again whenever the connection is re-indexed.
+
+        Indexing is incremental: the indexed commit SHA and a sha256 per file are
+        kept in a GitIndexState manifest. If the remote HEAD is unchanged nothing
+        is done; otherwise only added/changed files are embedded and the points of
+        removed files are deleted. A full rebuild (dropping the collection) happens
+        on first index, when the manifest is missing or incompatible (different
+        repo, collection, embedding model or point layout) or when `full_reindex` is set.
+
+        Runs as a connection job: progress is reported through `job`, the manifest
+        is checkpointed every `connection_job_checkpoint_interval` seconds (with no
+        commit SHA, so a requeued job resumes with the files not indexed yet) and
+        cancellation stops the embedding pipeline after its in-flight batches.
+        Raises on failure so the job can be retried.
         """
-        connection_id = getattr(connection_config, 'id', 'UnknownID')
-        connection_name = getattr(connection_config, 'name', 'UnknownName')
+        job = job or JobContext.detached()
+        connection_id = str(getattr(connection_config, 'id', 'UnknownID'))
         config_dict = getattr(connection_config, 'config', {})
 
         repo_url = config_dict.get("repo_url")
@@ -171,227 +203,221 @@ class GitRepoConnectionHandler(MCPConnectionHandler): # Changed base class
         qdrant_db_url = os.getenv("SHERLOG_QDRANT_DB_URL")
         # Get embedding model from environment or use default
         embedding_model_name = os.getenv("SHERLOG_QDRANT_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
-        embedding_dim = 384  # Dimension for all-MiniLM-L6-v2  # noqa: F841
 
         log_prefix = f"[GitRepoDirectIndexing: {connection_id}]"
-        logger.info(f"{log_prefix} START: Initiating post-create indexing. Repo: {repo_url}, Collection: {collection_name}, Qdrant: {qdrant_db_url}, Model: {embedding_model_name}")
+        logger.info(f"{log_prefix} START: Initiating indexing. Repo: {repo_url}, Collection: {collection_name}, Qdrant: {qdrant_db_url}, Model: {embedding_model_name}, Full: {full_reindex}")
 
         if not repo_url or not collection_name:
             logger.error(f"{log_prefix} ERROR: Missing 'repo_url' ({repo_url}) or 'collection_name' ({collection_name}) in config. Aborting indexing.")
-            # TODO: Update connection status
-            return
+            raise ValueError("git_repo connection config is missing 'repo_url' or 'collection_name'")
 
         if not qdrant_db_url:
             logger.error(f"{log_prefix} ERROR: SHERLOG_QDRANT_DB_URL environment variable not set. Aborting indexing.")
-            # TODO: Update connection status
+            raise ValueError("SHERLOG_QDRANT_DB_URL environment variable is not set")
+
+        settings = get_settings()
+        state_store = GitIndexStateStore(settings.git_index_state_dir)
+        previous_state = None if full_reindex else state_store.load(connection_id)
+        if previous_state and not previous_state.is_compatible_with(repo_url, collection_name, embedding_model_name):
+            logger.info(f"{log_prefix} Index state was built for a different repo/collection/model/format; rebuilding from scratch.")
+            previous_state = None
+
+        job.report_progress("resolving_head")
+        head_sha = await resolve_remote_head(repo_url)
+        if previous_state and head_sha and previous_state.commit_sha == head_sha:
+            logger.info(f"{log_prefix} SUCCESS: Index already at commit {head_sha}; nothing to do.")
+            job.report_progress("done", commit_sha=head_sha, up_to_date=True)
             return
+        # A manifest without commit SHA is a checkpoint of an interrupted (or partly failed) run
+        resuming = previous_state is not None and previous_state.commit_sha is None
 
+        exit_stack = AsyncExitStack()
         try:
             # Initialize Async Qdrant Client
             # Using prefer_grpc=True for potentially faster uploads if gRPC port (6334) is available
             # url parameter handles http/https schemes
             qdrant_client = AsyncQdrantClient(
-                url=qdrant_db_url, 
-                prefer_grpc=True, 
+                url=qdrant_db_url,
+                prefer_grpc=True,
                 timeout=60 # Changed float to int
             )
             logger.info(f"{log_prefix} Qdrant client initialized for URL: {qdrant_db_url}")
 
-            # 1. Ensure fresh collection with correct configuration
-            try:
-                # Attempt to delete collection if exists to ensure fresh parameters
-                await qdrant_client.delete_collection(collection_name=collection_name)
-                logger.info(f"{log_prefix} Deleted existing collection '{collection_name}' to ensure fresh configuration.")
-            except Exception as del_exc:
-                # If collection didn't exist, that's fine; ignore NOT_FOUND errors
-                try:
-                    from grpc.aio import AioRpcError as _DelAioRpcError  # local import to check error type
-                    if isinstance(del_exc, _DelAioRpcError):
-                        if "NOT_FOUND" in str(del_exc.code()).upper():
-                            logger.info(f"{log_prefix} Collection '{collection_name}' did not exist prior to creation.")
-                        else:
-                            logger.warning(f"{log_prefix} Unexpected error deleting collection '{collection_name}': {del_exc}")
-                    else:
-                        logger.info(f"{log_prefix} Collection '{collection_name}' may not exist yet: {del_exc}")
-                except Exception:
-                    logger.debug(f"{log_prefix} Non-gRPC error during collection delete: {del_exc}")
+            if previous_state and not await qdrant_client.collection_exists(collection_name=collection_name):
+                logger.info(f"{log_prefix} Collection '{collection_name}' is gone although index state exists; rebuilding from scratch.")
+                previous_state = None
+
+            # 1. Ensure fresh collection with correct configuration (full rebuilds only)
+            if previous_state is None:
+                state_store.delete(connection_id)
+                await self._drop_collection(qdrant_client, collection_name, log_prefix)
 
             # NOTE: We intentionally do NOT pre-create the collection here.
-            # The FastEmbed mix-in (qdrant_client.add) will automatically create
-            # a collection with the correct **named-vector** configuration that
-            # matches the selected embedding model.  Pre-creating the collection
+            # EmbeddingUpsertPipeline creates it on the first upsert with the
+            # **named-vector** layout FastEmbed uses for the selected model (the
+            # layout mcp-server-qdrant expects). Pre-creating the collection
             # with an *unnamed* vector configuration causes the well-known
-            # "Collection have incompatible vector params" assertion error.  By
-            # letting FastEmbed handle creation we avoid that mismatch entirely.
-
-            # Ensure client knows the embedding model for fastembed
-            try:
-                if hasattr(qdrant_client, "set_model"):
-                    set_model_callable = getattr(qdrant_client, "set_model")  # type: ignore[attr-defined]
-                    if inspect.iscoroutinefunction(set_model_callable):
-                        await set_model_callable(embedding_model_name)
-                    else:
-                        set_model_callable(embedding_model_name)
-                    logger.info(f"{log_prefix} Embedding model set on Qdrant client: {embedding_model_name}")
-            except Exception:
-                # Any issue with setting model is non-fatal for indexing, just continue.
-                logger.debug(f"{log_prefix} qdrant_client.set_model not available or failed; proceeding without explicit model set.")
-
-            # 2. Run gitingest
-            logger.info(f"{log_prefix} Starting gitingest for URL: {repo_url}")
-            summary, tree, content_dict = await ingest_async(repo_url)
-            # Ensure content_dict is processed correctly, handling potential string format
-            logger.info(f"{log_prefix} Gitingest processing completed.") # Simplified log
-
-            # Use a single client instance for all operations
-            # Removed 'async with' as AsyncQdrantClient doesn't support it directly
-
-            # 3. Index Summary and Tree using client.add
-            docs_to_add = []
-            metadata_list = []
-
-            if summary:
-                logger.info(f"{log_prefix} Preparing summary for indexing.")
-                docs_to_add.append(summary)
-                metadata_list.append({'type': 'summary', 'repo_url': repo_url, 'connection_id': connection_id})
-
-            if tree:
-                logger.info(f"{log_prefix} Preparing file tree for indexing.")
-                docs_to_add.append(tree)
-                metadata_list.append({'type': 'tree', 'repo_url': repo_url, 'connection_id': connection_id})
-            
-            if docs_to_add:
-                logger.info(f"{log_prefix} Indexing summary and/or tree ({len(docs_to_add)} items).")
-                await qdrant_client.add(  # Rely on auto-generated IDs
-                    collection_name=collection_name,
-                    documents=docs_to_add,
-                    metadata=metadata_list,
-                )
+            # "Collection have incompatible vector params" assertion error.
+
+            # 2. Fetch the repository: a temporary shallow clone whose files are read one at a time
+            # (gitingest output as a fallback), so memory stays flat regardless of repo size
+            job.raise_if_cancelled()
+            job.report_progress("fetching")
+            logger.info(f"{log_prefix} Fetching repository: {repo_url}")
+            source = await exit_stack.enter_async_context(
+                open_repo_source(repo_url, settings.git_index_max_file_bytes, settings.git_index_clone_dir, log_prefix)
+            )
+            head_sha = source.commit_sha or head_sha
+
+            job.raise_if_cancelled()
+            job.report_progress("hashing")
+            current_hashes = await asyncio.to_thread(source.hash_files, hash_file_content)
+            summary = await asyncio.to_thread(source.summary)
+            tree = await asyncio.to_thread(source.tree)
+            raw_text = source.raw_text()
+            logger.info(f"{log_prefix} Repository fetched: {len(current_hashes)} indexable files.")
+
+            diff = diff_file_hashes(previous_state.file_hashes if previous_state else {}, current_hashes)
+            logger.info(
+                f"{log_prefix} File diff against indexed state: {len(diff.added)} added, {len(diff.changed)} changed, "
+                f"{len(diff.removed)} removed, {diff.unchanged} unchanged."
+            )
 
-            # 4. Process and Index File Contents
-            files_to_index = {} # Initialize an empty dictionary for files
-
-            if isinstance(content_dict, dict) and content_dict:
-                logger.info(f"{log_prefix} Gitingest returned a dictionary with {len(content_dict)} files.")
-                files_to_index = content_dict
-            elif isinstance(content_dict, str) and content_dict.strip():
-                logger.info(f"{log_prefix} Gitingest returned a single string. Attempting to parse files using '=== FILE: ... ===' pattern...")
-                # Attempt parsing based on the user's format. Lines look like:
-                # ======== FILE: path/to/file.py ========
-                # We'll match any line that starts with ≥4 '=' followed by optional spaces, the literal 'FILE:',
-                # then capture the filename until the end of line. Another '=' marker line (any length) follows.
-                file_pattern = re.compile(r"^={4,}\s*FILE:\s*(.+?)\s*\n={4,}.*\n", re.MULTILINE)
-                matches_iter = list(file_pattern.finditer(content_dict))
-                
-                parsed_files_count = 0
-                for idx, match in enumerate(matches_iter):
-                    filename = match.group(1).strip()
-                    start_content = match.end()
-                    end_content = matches_iter[idx + 1].start() if idx + 1 < len(matches_iter) else len(content_dict)
-
-                    content = content_dict[start_content:end_content].strip()
-
-                    if filename and content:
-                        files_to_index[filename] = content
-                        parsed_files_count += 1
-
-                if parsed_files_count > 0:
-                     logger.info(f"{log_prefix} Successfully parsed {parsed_files_count} files from the string content.")
-                else:
-                     logger.warning(
-                         f"{log_prefix} String content found, but failed to parse files using the expected pattern. "
-                         "Falling back to indexing the raw string in chunks."
-                     )
-
-                     # --- Fallback: Index raw string in chunks ---
-                     raw_text: str = content_dict.strip()
-                     if raw_text:
-                         # Split the raw text into safe-sized chunks
-                         chunk_size = DEFAULT_CHUNK_SIZE_CHARS
-                         raw_chunks = [
-                             raw_text[i : i + chunk_size]
-                             for i in range(0, len(raw_text), chunk_size)
-                         ]
-
-                         chunk_metadata = [
-                             {
-                                 "type": "raw_chunk",
-                                 "repo_url": repo_url,
-                                 "connection_id": connection_id,
-                                 "chunk_index": idx,
-                             }
-                             for idx in range(len(raw_chunks))
-                         ]
-
-                         try:
-                             logger.info(
-                                 f"{log_prefix} Indexing {len(raw_chunks)} raw text chunks as fallback."  # noqa: E501
-                             )
-                             await qdrant_client.add(
-                                 collection_name=collection_name,
-                                 documents=raw_chunks,
-                                 metadata=chunk_metadata,
-                             )
-                             logger.info(
-                                 f"{log_prefix} Successfully indexed raw text chunks fallback."
-                             )
-                         except Exception as raw_err:
-                             logger.error(
-                                 f"{log_prefix} Error indexing raw text chunks fallback: {raw_err}",
-                                 exc_info=True,
-                             )
-                     # --- End fallback ---
-            elif not content_dict:
-                 logger.info(f"{log_prefix} No file content found in content_dict (it was empty or None).")
-            else: # Handle other unexpected types
-                 logger.error(f"{log_prefix} ERROR: Expected content_dict to be a dictionary or string, but got {type(content_dict)}. Skipping file content indexing.")
-
-
-            # Proceed with indexing using the files_to_index dictionary
-            if files_to_index:
-                file_items = list(files_to_index.items())
-                file_count = len(file_items)
-                batch_size = 100 # Adjust batch size as needed
-                logger.info(f"{log_prefix} Starting indexing of {file_count} file contents in batches of {batch_size}.")
-
-                for i in range(0, file_count, batch_size):
-                    batch_items = file_items[i:min(i + batch_size, file_count)]
-                    batch_docs = [item[1] for item in batch_items if item[1]] # Ensure content is not empty
-                    if not batch_docs: # Check if the filtered list is empty
-                        logger.warning(f"{log_prefix} Skipping empty or filtered batch {i//batch_size + 1}.")
-                        continue
-
-                    batch_metadata = [
-                        {'type': 'file', 'file_path': item[0], 'repo_url': repo_url, 'connection_id': connection_id}
-                        for item in batch_items if item[1] # Ensure metadata matches filtered docs
-                    ]
+            job.raise_if_cancelled()
+            # When resuming, files not in the checkpoint may have partially written chunks
+            paths_to_clear = (diff.to_embed + diff.removed) if resuming else diff.to_delete
+            if previous_state is not None and paths_to_clear:
+                job.report_progress("deleting", total=len(paths_to_clear))
+                logger.info(f"{log_prefix} Deleting points for {len(paths_to_clear)} changed/removed files.")
+                for i in range(0, len(paths_to_clear), FILE_DELETE_BATCH_SIZE):
+                    paths = paths_to_clear[i:i + FILE_DELETE_BATCH_SIZE]
+                    await self._delete_points(qdrant_client, collection_name, connection_id, models.FieldCondition(key="file_path", match=models.MatchAny(any=paths)))
+            if raw_text and previous_state is not None:
+                await self._delete_points(qdrant_client, collection_name, connection_id, models.FieldCondition(key="type", match=models.MatchValue(value="raw_chunk")))
+
+            # Files untouched by this run keep their manifest entries; indexed files are added as they complete
+            unchanged_hashes = {
+                path: digest for path, digest in current_hashes.items()
+                if path not in diff.to_embed and previous_state is not None and previous_state.file_hashes.get(path) == digest
+            }
+            checkpoint = GitIndexCheckpoint(unchanged_hashes, current_hashes)
+            files_total = len(diff.to_embed)
 
-                    logger.info(f"{log_prefix} Indexing file batch {i//batch_size + 1}/{(file_count + batch_size - 1)//batch_size} ({len(batch_docs)} files)...")
-                    try:
-                        await qdrant_client.add(  # Use qdrant_client directly; auto-generated IDs
-                            collection_name=collection_name,
-                            documents=batch_docs,
-                            metadata=batch_metadata,
+            def save_manifest(commit_sha: Optional[str]) -> None:
+                state_store.save(GitIndexState(
+                    connection_id=connection_id,
+                    repo_url=repo_url,
+                    collection_name=collection_name,
+                    embedding_model=embedding_model_name,
+                    commit_sha=commit_sha,
+                    file_hashes=checkpoint.file_hashes(),
+                    format_version=INDEX_FORMAT_VERSION,
+                ))
+
+            indexed_documents = 0
+            last_checkpoint_at = time.monotonic()
+
+            async def on_batch_done(batch: List[IndexDocument], ok: bool) -> None:
+                nonlocal indexed_documents, last_checkpoint_at
+                checkpoint.record([d.metadata.get('file_path') for d in batch], ok)
+                indexed_documents += len(batch)
+                job.report_progress("embedding", processed=indexed_documents, files_done=len(checkpoint.done), files_total=files_total)
+                if time.monotonic() - last_checkpoint_at >= settings.connection_job_checkpoint_interval:
+                    save_manifest(None)
+                    job.save_checkpoint({"commit_sha": head_sha, "files_done": len(checkpoint.done), "files_total": files_total})
+                    last_checkpoint_at = time.monotonic()
+
+            # 3. Documents are produced lazily: the pipeline pulls them as its bounded queue drains,
+            # so only the files currently being chunked/embedded are held in memory
+            files = source.iter_files(diff.to_embed)
+
+            def next_file_chunks() -> Optional[Tuple[str, List[CodeChunk]]]:
+                item = next(files, None)
+                if item is None:
+                    return None
+                path, content = item
+                return path, chunk_file(path, content, max_chars=settings.git_index_chunk_max_chars, overlap_lines=settings.git_index_chunk_overlap_lines)
+
+            async def iter_documents() -> AsyncIterator[IndexDocument]:
+                if summary:
+                    yield IndexDocument(
+                        id=file_point_id(connection_id, "<summary>"),
+                        text=summary,
+                        metadata={'type': 'summary', 'repo_url': repo_url, 'connection_id': connection_id},
+                    )
+                if tree:
+                    yield IndexDocument(
+                        id=file_point_id(connection_id, "<tree>"),
+                        text=tree,
+                        metadata={'type': 'tree', 'repo_url': repo_url, 'connection_id': connection_id},
+                    )
+                if raw_text:
+                    for document in self._raw_chunk_documents(repo_url, connection_id, raw_text):
+                        yield document
+                # 4. Only the added/changed files are embedded, one point per code-aware chunk
+                while True:
+                    item = await asyncio.to_thread(next_file_chunks)
+                    if item is None:
+                        return
+                    path, chunks = item
+                    # Registered before its chunks are queued, so batches finishing early are accounted for
+                    checkpoint.expect(path, len(chunks))
+                    for chunk in chunks:
+                        yield IndexDocument(
+                            id=file_point_id(connection_id, path, chunk.chunk_index),
+                            text=chunk.text,
+                            metadata={
+                                'type': 'file',
+                                'file_path': path,
+                                'start_line': chunk.start_line,
+                                'end_line': chunk.end_line,
+                                'symbol': chunk.symbol,
+                                'chunk_index': chunk.chunk_index,
+                                'repo_url': repo_url,
+                                'connection_id': connection_id,
+                            },
                         )
-                        logger.info(f"{log_prefix} Successfully indexed file batch {i//batch_size + 1}.")
-                    except Exception as batch_err:
-                        logger.error(f"{log_prefix} Error indexing file batch {i//batch_size + 1}: {batch_err}", exc_info=True)
-                        # Optionally: Decide whether to continue with next batch or stop
 
-                    await asyncio.sleep(0.1) # Small delay between batches
-
-                logger.info(f"{log_prefix} Finished indexing {file_count} file contents.")
-            # This case now covers when no files were found or parsed successfully
+            # 5. Embed (process pool) and upsert (bounded concurrency)
+            failed_paths: List[str] = []
+            if summary or tree or raw_text or diff.to_embed:
+                logger.info(f"{log_prefix} Starting streaming indexing of {files_total} files.")
+                job.report_progress("embedding", processed=0, files_done=0, files_total=files_total)
+                pipeline = EmbeddingUpsertPipeline(
+                    qdrant_client, collection_name, embedding_model_name,
+                    cache=get_embedding_cache(),
+                    on_batch_done=on_batch_done,
+                    cancel_event=job.cancel_event,
+                    log_prefix=log_prefix,
+                )
+                stats = await pipeline.run(iter_documents())
+                if stats.cancelled:
+                    save_manifest(None)
+                    job.save_checkpoint({"commit_sha": head_sha, "files_done": len(checkpoint.done), "files_total": files_total})
+                    job.raise_if_cancelled()
+                # Files that vanished or became unreadable between hashing and chunking count as failed
+                failed_paths = sorted(checkpoint.failed | (set(diff.to_embed) - checkpoint.expected))
+            # This case now covers when nothing changed or no files were found or parsed successfully
             else:
-                 logger.info(f"{log_prefix} No file contents available for indexing after processing content_dict.")
+                 logger.info(f"{log_prefix} No new or changed file contents to index.")
 
-            logger.info(f"{log_prefix} SUCCESS: Successfully completed all indexing operations for connection {connection_id} into collection {collection_name}")
+            # Files that failed to embed are left out of the manifest so the next refresh retries them.
+            # Keep the commit SHA unset in that case, otherwise the refresh would be skipped.
+            save_manifest(None if failed_paths else head_sha)
+            job.report_progress("done", commit_sha=head_sha, files_indexed=len(checkpoint.done), files_failed=len(failed_paths))
+
+            logger.info(f"{log_prefix} SUCCESS: Successfully completed all indexing operations for connection {connection_id} into collection {collection_name} (commit {head_sha or 'unknown'})")
             # TODO: Update connection status to indicate successful indexing
 
+        except JobCancelled:
+            logger.info(f"{log_prefix} CANCELLED: Indexing stopped on request; progress is checkpointed.")
+            raise
         except Exception as e:
-            logger.exception(f"{log_prefix} FAIL: Error during post-create indexing for connection {connection_id} (Repo URL: {repo_url}): {e}")
-            # TODO: Update connection status to indicate indexing failure
+            logger.exception(f"{log_prefix} FAIL: Error during indexing for connection {connection_id} (Repo URL: {repo_url}): {e}")
+            raise
         finally:
+            # Removes the temporary clone
+            await exit_stack.aclose()
             # Ensure client is closed if initialized
             if 'qdrant_client' in locals() and qdrant_client:
                 try:
@@ -400,6 +426,56 @@ class GitRepoConnectionHandler(MCPConnectionHandler): # Changed base class
                 except Exception as e_close:
                     logger.error(f"{log_prefix} Error closing Qdrant client: {e_close}", exc_info=True)
 
+    @staticmethod
+    async def _drop_collection(qdrant_client: AsyncQdrantClient, collection_name: str, log_prefix: str) -> None:
+        """Delete the collection if it exists so FastEmbed recreates it with fresh parameters."""
+        try:
+            await qdrant_client.delete_collection(collection_name=collection_name)
+            logger.info(f"{log_prefix} Deleted existing collection '{collection_name}' to ensure fresh configuration.")
+        except Exception as del_exc:
+            # If collection didn't exist, that's fine; ignore NOT_FOUND errors
+            if isinstance(del_exc, AioRpcError):
+                if "NOT_FOUND" in str(del_exc.code()).upper():
+                    logger.info(f"{log_prefix} Collection '{collection_name}' did not exist prior to creation.")
+                else:
+                    logger.warning(f"{log_prefix} Unexpected error deleting collection '{collection_name}': {del_exc}")
+            else:
+                logger.info(f"{log_prefix} Collection '{collection_name}' may not exist yet: {del_exc}")
+
+    @staticmethod
+    async def _delete_points(qdrant_client: AsyncQdrantClient, collection_name: str, connection_id: str, condition: models.FieldCondition) -> None:
+        """Delete this connection's points matching `condition`."""
+        await qdrant_client.delete(
+            collection_name=collection_name,
+            points_selector=models.FilterSelector(
+                filter=models.Filter(
+                    must=[
+                        models.FieldCondition(key="connection_id", match=models.MatchValue(value=connection_id)),
+                        condition,
+                    ]
+                )
+            ),
+        )
+
+    @staticmethod
+    def _raw_chunk_documents(repo_url: str, connection_id: str, raw_text: str) -> List[IndexDocument]:
+        """Split unparseable gitingest output into fixed-size chunk documents."""
+        # Split the raw text into safe-sized chunks
+        chunk_size = DEFAULT_CHUNK_SIZE_CHARS
+        return [
+            IndexDocument(
+                id=file_point_id(connection_id, "<raw>", idx),
+                text=raw_text[start : start + chunk_size],
+                metadata={
+                    "type": "raw_chunk",
+                    "repo_url": repo_url,
+                    "connection_id": connection_id,
+                    "chunk_index": idx,
+                },
+            )
+            for idx, start in enumerate(range(0, len(raw_text), chunk_size))
+        ]
+
 
     async def delete_connection_data(self, connection: Connection) -> None:
         """
@@ -470,6 +546,7 @@ class GitRepoConnectionHandler(MCPConnectionHandler): # Changed base class
                 points_selector=points_selector
             )
             logger.info(f"{log_prefix} Successfully submitted request to delete points for connection_id '{connection_id_str}' from collection '{collection_name}'.")
+            GitIndexStateStore(get_settings().git_index_state_dir).delete(connection_id_str)
             # Note: Deletion is async in Qdrant. For immediate confirmation, one might need to check point counts or use `wait=True` if available.
 
         except Exception as e:
@@ -0,0 +1,161 @@
+"""
+Worker process that executes queued connection jobs.
+
+Run it with ``python -m backend.services.connection_job_worker``. The API
+starts one automatically when `connection_job_worker_autostart` is enabled;
+several workers (or API replicas each with their own worker) can share the
+same database because jobs are claimed with a conditional UPDATE.
+"""
+
+import asyncio
+import os
+import signal
+import socket
+import sys
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional
+
+from backend.config import get_settings
+from backend.core.logging import get_logger, setup_logging
+from backend.db.database import get_db_session, init_db
+from backend.db.models import ConnectionJob
+from backend.db.repositories import ConnectionJobRepository, ConnectionRepository
+from backend.services.connection_handlers.registry import get_handler
+from backend.services.connection_jobs import (
+    POST_CREATE_ACTIONS_JOB,
+    JobCancelled,
+    JobContext,
+    retry_delay,
+    stale_cutoff,
+)
+
+logger = get_logger(__name__)
+
+
+class ConnectionJobRunner:
+    """Claims and executes jobs one at a time."""
+
+    def __init__(
+        self,
+        worker_id: Optional[str] = None,
+        session_factory: Callable[[], Any] = get_db_session,
+        handler_lookup: Callable[[str], Any] = get_handler,
+    ):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.session_factory = session_factory
+        self.handler_lookup = handler_lookup
+        self.stop_event = asyncio.Event()
+
+    async def run_forever(self) -> None:
+        settings = get_settings()
+        logger.info(f"Connection job worker {self.worker_id} started")
+        while not self.stop_event.is_set():
+            try:
+                await self.recover_stale_jobs()
+                ran = await self.run_next()
+            except Exception as e:
+                logger.error(f"Connection job worker loop error: {e}", exc_info=True)
+                ran = False
+            if not ran:
+                try:
+                    await asyncio.wait_for(self.stop_event.wait(), timeout=settings.connection_job_poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        logger.info(f"Connection job worker {self.worker_id} stopped")
+
+    async def recover_stale_jobs(self) -> int:
+        async with self.session_factory() as session:
+            return await ConnectionJobRepository(session).requeue_stale(stale_cutoff())
+
+    async def run_next(self) -> bool:
+        """Claim and execute one due job. Returns False if the queue was empty."""
+        async with self.session_factory() as session:
+            job = await ConnectionJobRepository(session).claim_next(self.worker_id)
+        if job is None:
+            return False
+        await self.execute(job)
+        return True
+
+    async def execute(self, job: ConnectionJob) -> None:
+        job_id = str(job.id)
+        log_prefix = f"[ConnectionJob: {job_id} ({job.job_type}, attempt {job.attempts}/{job.max_attempts})]"
+        logger.info(f"{log_prefix} Starting for connection {job.connection_id}")
+
+        async with self.session_factory() as session:
+            connection = await ConnectionRepository(session).get_by_id(str(job.connection_id))
+        if connection is None:
+            await self._finish(job_id, "failed", f"Connection {job.connection_id} no longer exists")
+            return
+        if job.job_type != POST_CREATE_ACTIONS_JOB:
+            await self._finish(job_id, "failed", f"Unknown job type '{job.job_type}'")
+            return
+
+        context = JobContext(job_id=job_id, checkpoint=job.checkpoint, session_factory=self.session_factory)
+        await context.start()
+        try:
+            handler = self.handler_lookup(str(connection.type))
+            await handler.post_create_actions(connection, job=context, **(job.params or {}))
+        except JobCancelled:
+            await context.stop()
+            await self._finish(job_id, "cancelled")
+            return
+        except asyncio.CancelledError:
+            # Worker shutting down: hand the job back without charging an attempt
+            await context.stop()
+            async with self.session_factory() as session:
+                await ConnectionJobRepository(session).requeue(job_id, datetime.utcnow(), "Worker stopped; will resume", refund_attempt=True)
+            raise
+        except Exception as e:
+            await context.stop()
+            if context.cancelled:
+                await self._finish(job_id, "cancelled")
+            elif job.attempts < job.max_attempts:
+                delay = retry_delay(job.attempts)
+                logger.warning(f"{log_prefix} Failed ({e}); retrying in {delay:.0f}s")
+                async with self.session_factory() as session:
+                    await ConnectionJobRepository(session).requeue(job_id, datetime.utcnow() + timedelta(seconds=delay), str(e))
+            else:
+                logger.error(f"{log_prefix} Failed permanently: {e}", exc_info=True)
+                await self._finish(job_id, "failed", str(e))
+            return
+
+        await context.stop()
+        await self._finish(job_id, "succeeded")
+
+    async def _finish(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        async with self.session_factory() as session:
+            await ConnectionJobRepository(session).finish(job_id, status, error)
+
+
+async def _main() -> None:
+    await init_db()
+    # Importing the handler modules registers them
+    from backend.services.connection_handlers import github_handler, jira_handler, filesystem_handler, git_repo_handler  # noqa: F401
+
+    runner = ConnectionJobRunner()
+    loop = asyncio.get_running_loop()
+    main_task = asyncio.current_task()
+
+    def _request_stop() -> None:
+        runner.stop_event.set()
+        # Interrupt a running job; it is requeued and resumes from its checkpoint
+        if main_task is not None:
+            main_task.cancel()
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, _request_stop)
+        except NotImplementedError:
+            pass
+
+    try:
+        await runner.run_forever()
+    except asyncio.CancelledError:
+        logger.info("Connection job worker interrupted")
+
+
+if __name__ == "__main__":
+    setup_logging()
+    asyncio.run(_main())
+    sys.exit(0)
@@ -0,0 +1,147 @@
+"""
+Persisted background jobs for long-running connection tasks.
+
+`post_create_actions` (e.g. indexing a git repository) used to run as a bare
+`asyncio.create_task` inside the API process: no progress, no cancellation and
+a crash meant starting over. Instead the API now queues a ConnectionJob row and
+a separate worker process (`backend.services.connection_job_worker`) runs it.
+
+While a job runs, its JobContext:
+  * sends a heartbeat every `connection_job_heartbeat_interval` seconds, which
+    also persists the latest progress and checkpoint and picks up cancellation
+    requests made through the API;
+  * exposes `cancel_event`, which handlers pass down to their work loops.
+
+Jobs whose worker disappears stop heartbeating and are requeued by the next
+worker; handlers resume from their own checkpoints (the git indexer resumes
+from its partially written index manifest). Failed jobs are retried with
+exponential backoff up to `connection_job_max_attempts` times.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from backend.config import get_settings
+from backend.core.logging import get_logger
+from backend.db.database import get_db_session
+from backend.db.models import ConnectionJob
+from backend.db.repositories import ConnectionJobRepository
+from backend.services.connection_handlers.base import MCPConnectionHandler
+
+logger = get_logger(__name__)
+
+POST_CREATE_ACTIONS_JOB = "post_create_actions"
+
+
+class JobCancelled(Exception):
+    """Raised by a handler when it stopped because its job was cancelled."""
+
+
+def handler_has_post_create_actions(handler: MCPConnectionHandler) -> bool:
+    """True if the handler overrides the (no-op) default post_create_actions."""
+    return type(handler).post_create_actions is not MCPConnectionHandler.post_create_actions
+
+
+async def enqueue_post_create_actions(connection_id: str, params: Optional[Dict[str, Any]] = None) -> ConnectionJob:
+    """
+    Queue post_create_actions for a connection. If one is already queued or
+    running for it, that job is returned instead of queueing a duplicate.
+    """
+    async with get_db_session() as session:
+        repo = ConnectionJobRepository(session)
+        active = await repo.get_active(connection_id, POST_CREATE_ACTIONS_JOB)
+        if active is not None:
+            logger.info(f"Connection {connection_id} already has an active {POST_CREATE_ACTIONS_JOB} job {active.id}")
+            return active
+        return await repo.create(
+            connection_id,
+            POST_CREATE_ACTIONS_JOB,
+            params=params,
+            max_attempts=get_settings().connection_job_max_attempts,
+        )
+
+
+class JobContext:
+    """Progress reporting, checkpointing and cancellation for one running job."""
+
+    def __init__(
+        self,
+        job_id: Optional[str] = None,
+        checkpoint: Optional[Dict[str, Any]] = None,
+        session_factory: Optional[Callable[[], Any]] = None,
+        heartbeat_interval: Optional[float] = None,
+    ):
+        self.job_id = job_id
+        self.progress: Dict[str, Any] = {}
+        self.checkpoint: Optional[Dict[str, Any]] = checkpoint
+        self.cancel_event = asyncio.Event()
+        self._session_factory = session_factory or get_db_session
+        self._heartbeat_interval = heartbeat_interval if heartbeat_interval is not None else get_settings().connection_job_heartbeat_interval
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def detached(cls) -> "JobContext":
+        """A context that is not backed by a job row (inline runs, tests): reports go nowhere."""
+        return cls(job_id=None)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled:
+            raise JobCancelled(f"Job {self.job_id} was cancelled")
+
+    def report_progress(self, phase: str, processed: Optional[int] = None, total: Optional[int] = None, **extra: Any) -> None:
+        """Update progress; persisted with the next heartbeat."""
+        self.progress = {"phase": phase, "processed": processed, "total": total, **extra}
+
+    def save_checkpoint(self, data: Dict[str, Any]) -> None:
+        """Record resume information; persisted with the next heartbeat."""
+        self.checkpoint = data
+
+    async def start(self) -> None:
+        if self.job_id is not None and self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self) -> None:
+        """Stop heartbeating and persist the final progress/checkpoint."""
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        if self.job_id is None:
+            return
+        async with self._session_factory() as session:
+            cancel_requested = await ConnectionJobRepository(session).heartbeat(self.job_id, self.progress, self.checkpoint)
+        if cancel_requested and not self.cancel_event.is_set():
+            logger.info(f"Cancellation requested for job {self.job_id}")
+            self.cancel_event.set()
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._heartbeat_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                # A missed heartbeat is tolerated; the stale timeout is several intervals long
+                logger.warning(f"Heartbeat for job {self.job_id} failed: {e}")
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds to wait before retrying a job that has failed `attempts` times."""
+    base = get_settings().connection_job_retry_backoff
+    return base * (2 ** max(0, attempts - 1))
+
+
+def stale_cutoff(now: Optional[datetime] = None) -> datetime:
+    """Running jobs whose last heartbeat is older than this are considered abandoned."""
+    now = now or datetime.utcnow()
+    return now - timedelta(seconds=get_settings().connection_job_stale_after)
@@ -7,13 +7,14 @@ Manages connections to data sources via MCP servers
 import json
 import logging
 import os
+import time
 from typing import Dict, List, Optional, Tuple, Union, Any
 from uuid import uuid4
 import asyncio
-from asyncio import Lock  # For Log-AI tool list cache locking
 
 from pydantic import BaseModel, Field, ValidationError
 import aiofiles
+import redis.asyncio as redis
 
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
@@ -23,21 +24,29 @@ from backend.db.database import get_db_session
 from backend.db.repositories import ConnectionRepository
 
 from backend.core.types import MCPToolInfo
+from backend.services.content_index import get_content_index_registry
+from backend.services.tool_schema_cache import get_tool_schema_cache
 
-# Cache for expensive Log-AI tool discovery
+LOG_AI_MCP_IMAGE = "ghcr.io/navneet-mkr/logai-mcp:0.1.3"
+# Connection types whose tools are defined here rather than discovered from an MCP server
+STATIC_TOOL_CONNECTION_TYPES = {"python", "git_repo"}
+
+# Tool schemas of MCP-backed connection types (Log-AI included) are cached by
+# backend.services.tool_schema_cache, so listing them does not start the server.
+
+# Connection cache invalidation
 # --------------------------------------------------
-#   We keep the discovered tool list in-memory for the
-#   lifetime of the process so subsequent requests can be
-#   served instantly without spinning up the docker image
-#   again.  A very small async Lock is used to ensure only
-#   one coroutine performs the initial discovery.
+#   Every worker keeps all connection configs and defaults
+#   in memory. A worker that creates, updates or deletes a
+#   connection (or changes a default) publishes on this
+#   channel and the other workers reload on next access.
 # --------------------------------------------------
 
-_logai_tools_cache: Optional[list['MCPToolInfo']] = None  # Populated lazily
-_logai_tools_cache_lock: Lock = Lock()
+CONNECTION_CACHE_CHANNEL = "connections:changed"
 
 # Import handler registry functions
 from backend.services.connection_handlers.registry import get_handler, get_all_handler_types
+from backend.services.connection_jobs import enqueue_post_create_actions, handler_has_post_create_actions
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -85,31 +94,140 @@ class ConnectionManager:
         self.connections: Dict[str, ConnectionConfig] = {}
         self.default_connections: Dict[str, str] = {}
         self.settings = get_settings()
+        # Cache coherence: reloaded from the DB when invalidated (by this or another worker) or after the TTL
+        self._cache_lock = asyncio.Lock()
+        self._loaded_at: Optional[float] = None  # monotonic time of the last full load, None when invalidated
+        self._cache_generation = 0  # bumped on invalidation, so a load racing with one is not trusted
+        self._instance_id = uuid4().hex
+        self._redis: Optional[redis.Redis] = None
+        self._listener_task: Optional[asyncio.Task] = None
         # Handler registration should happen automatically when handler modules are imported.
         # If doing explicit registration, it should ideally occur during app startup (e.g., in main.py).
         logger.info(f"ConnectionManager initialized. Registered handlers: {get_all_handler_types()}")
     
-    async def initialize(self) -> None:
-        """Initialize and load connections"""
+    async def initialize(self, redis_client: Optional[redis.Redis] = None) -> None:
+        """Load connections into the cache and, with Redis, follow invalidations from other workers"""
         correlation_id = str(uuid4())
         logger.info("Initializing ConnectionManager", extra={'correlation_id': correlation_id})
+        self._redis = redis_client
         await self._load_connections()
+        if self._redis is not None and (self._listener_task is None or self._listener_task.done()):
+            self._listener_task = asyncio.create_task(self._invalidation_listener())
         logger.info(f"ConnectionManager initialized successfully with {len(self.connections)} connections loaded.", extra={'correlation_id': correlation_id})
     
     async def close(self) -> None:
         """Close all connections and cleanup resources"""
         correlation_id = str(uuid4())
         logger.info("Closing ConnectionManager", extra={'correlation_id': correlation_id})
-        # Add cleanup logic here if necessary (e.g., closing MCP processes)
+        if self._listener_task is not None:
+            self._listener_task.cancel()
+            await asyncio.gather(self._listener_task, return_exceptions=True)
+            self._listener_task = None
         logger.info("ConnectionManager closed successfully", extra={'correlation_id': correlation_id})
+
+    # --- Connection cache ---
+
+    def _cache_is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.settings.connection_cache_ttl
+
+    async def _ensure_loaded(self) -> None:
+        """Load all connections and defaults unless the cache is current. Raises on DB errors."""
+        if self._cache_is_fresh():
+            return
+        async with self._cache_lock:
+            if self._cache_is_fresh():
+                return
+            generation = self._cache_generation
+            connections, default_connections = await self._load_connections_from_db()
+            # A local write or an invalidation during the load may postdate this snapshot:
+            # keep the current dicts, and reload on the next access
+            if generation == self._cache_generation:
+                self.connections = connections
+                self.default_connections = default_connections
+                self._loaded_at = time.monotonic()
+
+    def invalidate_cache(self) -> None:
+        """Reload connections from the DB on next access"""
+        self._cache_generation += 1
+        self._loaded_at = None
+
+    def _mark_local_change(self) -> None:
+        """Record a write to the cache dicts, so a load already in flight does not overwrite it"""
+        self._cache_generation += 1
+
+    def _release_connection_state(self, connection_id: str) -> None:
+        """Free state built from a connection's old config (its filesystem content index)"""
+        get_content_index_registry().drop(f"filesystem:{connection_id}")
+
+    async def _publish_change(self, connection_id: str, config_changed: bool = False) -> None:
+        """Tell the other workers that a connection (or a default) changed"""
+        if self._redis is None:
+            return
+        try:
+            message = json.dumps({"origin": self._instance_id, "connection_id": connection_id, "config_changed": config_changed})
+            await self._redis.publish(CONNECTION_CACHE_CHANNEL, message)
+        except Exception as e:
+            # Other workers catch up when their cache TTL expires
+            logger.warning(f"Could not publish connection cache invalidation for {connection_id}: {e}")
+
+    def _on_invalidation_message(self, data: Any) -> None:
+        try:
+            payload = json.loads(data)
+        except (TypeError, ValueError):
+            payload = {}
+        if payload.get("origin") == self._instance_id:
+            return  # Our own change, already applied to this cache
+        logger.info(f"Connection {payload.get('connection_id', '?')} changed in another worker; invalidating connection cache")
+        self.invalidate_cache()
+        if payload.get("config_changed") and payload.get("connection_id"):
+            self._release_connection_state(payload["connection_id"])
+
+    async def _invalidation_listener(self) -> None:
+        """Invalidate the cache on changes published by other workers"""
+        pubsub = None
+        resubscribing = False
+        try:
+            while True:
+                try:
+                    if pubsub is None:
+                        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                        await pubsub.subscribe(CONNECTION_CACHE_CHANNEL)
+                        if resubscribing:
+                            self.invalidate_cache()  # Changes may have been missed while unsubscribed
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        self._on_invalidation_message(message.get("data"))
+                except redis.RedisError as e:
+                    logger.error(f"Redis error in connection cache listener: {e}. Resubscribing in 5s.")
+                    if pubsub is not None:
+                        try:
+                            await pubsub.close()
+                        except Exception:
+                            pass
+                        pubsub = None
+                    resubscribing = True
+                    await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            if pubsub is not None:
+                try:
+                    await pubsub.unsubscribe()
+                    await pubsub.close()
+                except Exception as e:
+                    logger.error(f"Error closing connection cache PubSub: {e}")
     
     async def get_connection(self, connection_id: str) -> Optional[ConnectionConfig]:
         """Get a connection by ID (logic remains mostly the same)"""
         logger.info(f"Getting connection {connection_id}")
+        try:
+            await self._ensure_loaded()
+        except Exception as e:
+            logger.error(f"Error loading connections into cache: {str(e)}", exc_info=True)
         # Prioritize cache
         if connection_id in self.connections:
             return self.connections[connection_id]
-        # Fallback to DB
+        # Fallback to DB (e.g. created by another worker whose invalidation has not arrived yet)
         try:
             async with get_db_session() as session:
                 repo = ConnectionRepository(session)
@@ -129,140 +247,72 @@ class ConnectionManager:
             return None # Propagate None on error
 
     async def get_connections_by_type(self, connection_type: str) -> List[ConnectionConfig]:
-        """Get all connections for a specific type (logic remains mostly the same)"""
+        """Get all connections for a specific type (served from the connection cache)"""
         try:
-            # Query the database directly
-            async with get_db_session() as session:
-                repo = ConnectionRepository(session)
-                db_connections = await repo.get_by_type(connection_type)
-                
-                connections = []
-                for db_conn in db_connections:
-                    conn_dict = db_conn.to_dict()
-                    # Use simplified ConnectionConfig
-                    connection = ConnectionConfig(**conn_dict)
-                    # Update cache as we load
-                    self.connections[conn_dict["id"]] = connection
-                    connections.append(connection)
-                
-                return connections
+            await self._ensure_loaded()
         except Exception as e:
             logger.error(f"Error retrieving connections by type '{connection_type}' from database: {str(e)}", exc_info=True)
-            return [] # Return empty list on error
+            logger.warning("Falling back to cached connections due to DB error.")
+        return [conn for conn in self.connections.values() if conn.type == connection_type]
 
     async def get_all_connections(self) -> List[Dict]:
         """Get all connections (uses _redact_sensitive_fields which now uses handlers)"""
         try:
-            # Always fetch fresh from DB to get current state including `is_default`
-            async with get_db_session() as session:
-                repo = ConnectionRepository(session)
-                db_connections = await repo.get_all()
-                
-                # Update cache with any changes/new connections
-                for db_conn in db_connections:
-                    conn_dict = db_conn.to_dict()
-                    # Use simplified ConnectionConfig
-                    self.connections[conn_dict["id"]] = ConnectionConfig(**conn_dict)
-                
-                # Prepare response DTOs
-                response_list = []
-                for conn in db_connections:
-                    try:
-                        conn_dict = conn.to_dict()
-                        # Redaction uses handler via _redact_sensitive_fields (updated call)
-                        redacted_config = self._redact_sensitive_fields(conn_dict["config"], str(conn_dict["type"]))
-                        response_list.append({
-                            "id": conn_dict["id"],
-                            "name": conn_dict["name"],
-                            "type": conn_dict["type"],
-                            # Check against the cached default connections
-                            "is_default": self.default_connections.get(conn_dict["type"]) == conn_dict["id"],
-                            "config": redacted_config
-                        })
-                    except Exception as redact_err:
-                         logger.error(f"Error redacting config for connection {conn.id} ({conn.type}): {redact_err}", exc_info=True)
-                         # Also use the cache logic here for consistency
-                         response_list.append({
-                             "id": conn.id, "name": conn.name, "type": conn.type, 
-                             "is_default": self.default_connections.get(str(conn.type)) == conn.id,
-                             "config": {"error": "Failed to redact configuration"}
-                         })
-
-                return response_list
+            await self._ensure_loaded()
         except Exception as e:
             logger.error(f"Error retrieving all connections from database: {str(e)}", exc_info=True)
-            # Fallback uses cache
             logger.warning("Falling back to cached connections due to DB error.")
-            response_list = []
-            for conn in self.connections.values(): # Iterate over cached ConnectionConfig objects
-                 try:
-                      # Use simplified ConnectionConfig format
-                      redacted_config = self._redact_sensitive_fields(conn.config, str(conn.type))
-                      response_list.append({
-                          "id": conn.id, "name": conn.name, "type": conn.type,
-                          "is_default": self.default_connections.get(str(conn.type)) == conn.id,
-                          "config": redacted_config
-                      })
-                 except Exception as redact_err:
-                      logger.error(f"Error redacting cached config for connection {conn.id} ({conn.type}): {redact_err}", exc_info=True)
-                      response_list.append({
-                          "id": conn.id, "name": conn.name, "type": conn.type,
-                          "is_default": self.default_connections.get(str(conn.type)) == conn.id,
-                          "config": {"error": "Failed to redact configuration"}
-                      })
-            return response_list
+
+        response_list = []
+        for conn in list(self.connections.values()): # Iterate over cached ConnectionConfig objects
+            try:
+                redacted_config = self._redact_sensitive_fields(conn.config, str(conn.type))
+                response_list.append({
+                    "id": conn.id, "name": conn.name, "type": conn.type,
+                    "is_default": self.default_connections.get(str(conn.type)) == conn.id,
+                    "config": redacted_config
+                })
+            except Exception as redact_err:
+                logger.error(f"Error redacting config for connection {conn.id} ({conn.type}): {redact_err}", exc_info=True)
+                response_list.append({
+                    "id": conn.id, "name": conn.name, "type": conn.type,
+                    "is_default": self.default_connections.get(str(conn.type)) == conn.id,
+                    "config": {"error": "Failed to redact configuration"}
+                })
+        return response_list
 
 
     async def get_default_connection(self, connection_type: str) -> Optional[ConnectionConfig]:
-        """Get the default connection for a given type (logic remains mostly the same)"""
+        """Get the default connection for a given type (served from the connection cache)"""
+        try:
+            await self._ensure_loaded()
+        except Exception as e:
+            logger.error(f"Error retrieving default connection for {connection_type} from database: {str(e)}", exc_info=True)
+
         # Check environment variable override first
         env_var_name = f"SHERLOG_CONNECTION_DEFAULT_{connection_type.upper()}"
         default_conn_name = os.environ.get(env_var_name)
         
         if default_conn_name:
             logger.info(f"Attempting to find default {connection_type} connection named '{default_conn_name}' from env var.")
-            try:
-                async with get_db_session() as session:
-                    repo = ConnectionRepository(session)
-                    db_connection = await repo.get_by_name_and_type(default_conn_name, connection_type)
-                    if db_connection:
-                        conn_dict = db_connection.to_dict()
-                        # Use simplified ConnectionConfig
-                        connection = ConnectionConfig(**conn_dict)
-                        self.connections[conn_dict["id"]] = connection # Update cache
-                        logger.info(f"Found default connection via env var: {connection.id}")
-                        return connection
-                    else:
-                         logger.warning(f"Default connection name '{default_conn_name}' from env var not found in DB for type {connection_type}.")
-            except Exception as e:
-                logger.error(f"Error finding default connection by name '{default_conn_name}': {str(e)}", exc_info=True)
-        
-        # Then check DB flag
-        try:
-            async with get_db_session() as session:
-                repo = ConnectionRepository(session)
-                db_connection = await repo.get_default_connection(connection_type)
-                if db_connection:
-                    conn_dict = db_connection.to_dict()
-                    # Use simplified ConnectionConfig
-                    connection = ConnectionConfig(**conn_dict)
-                    # Update cache and in-memory default tracking
-                    self.connections[conn_dict["id"]] = connection
-                    self.default_connections[connection_type] = conn_dict["id"]
-                    logger.info(f"Found default connection via DB flag: {connection.id}")
+            for connection in self.connections.values():
+                if connection.type == connection_type and connection.name == default_conn_name:
+                    logger.info(f"Found default connection via env var: {connection.id}")
                     return connection
-                    
-                # Fallback: if no default is set, return the *first* connection of the type found
-                logger.info(f"No explicit default found for {connection_type}, checking for any connection of this type.")
-                # Use the already defined method which queries DB
-                connections = await self.get_connections_by_type(connection_type)
-                if connections:
-                     first_connection = connections[0]
-                     logger.warning(f"Returning first available connection '{first_connection.name}' ({first_connection.id}) as implicit default for {connection_type}.")
-                     return first_connection
-        except Exception as e:
-            logger.error(f"Error retrieving default connection for {connection_type} from database: {str(e)}", exc_info=True)
+            logger.warning(f"Default connection name '{default_conn_name}' from env var not found for type {connection_type}.")
         
+        # Then the default set in the DB
+        default_id = self.default_connections.get(connection_type)
+        if default_id and default_id in self.connections:
+            return self.connections[default_id]
+
+        # Fallback: if no default is set, return the *first* connection of the type found
+        connections = [conn for conn in self.connections.values() if conn.type == connection_type]
+        if connections:
+            first_connection = connections[0]
+            logger.warning(f"Returning first available connection '{first_connection.name}' ({first_connection.id}) as implicit default for {connection_type}.")
+            return first_connection
+
         logger.warning(f"No connection of type '{connection_type}' found.")
         return None # No connection found
 
@@ -333,17 +383,18 @@ class ConnectionManager:
                       raise ValueError(f"Database error: A connection with similar properties might already exist.")
                  raise ValueError(f"Database error creating connection: {str(db_e)}") from db_e
 
-        # Add to in-memory cache
+        # Add to in-memory cache and tell the other workers
         self.connections[connection.id] = connection
+        self._mark_local_change()
+        await self._publish_change(connection.id)
 
         # Perform post-creation actions (like indexing for git_repo)
         try:
-            logger.info(f"Executing post-create actions for connection {connection.id} of type {type}", extra={'correlation_id': correlation_id})
-            # Schedule as a background task so it doesn't block the API response
-            asyncio.create_task(handler.post_create_actions(connection))
-            # If direct await is needed and acceptable for API response time:
-            # await handler.post_create_actions(connection) 
-            logger.info(f"Successfully scheduled/executed post-create actions for {connection.id}", extra={'correlation_id': correlation_id})
+            # Queued as a persisted job and run by the connection job worker, so the API
+            # response isn't blocked and progress survives restarts
+            if handler_has_post_create_actions(handler):
+                job = await enqueue_post_create_actions(str(connection.id))
+                logger.info(f"Queued post-create actions job {job.id} for connection {connection.id} of type {type}", extra={'correlation_id': correlation_id})
         except Exception as post_create_err:
             # Log error but don't let it fail the connection creation response
             logger.error(f"Error during post-create actions for connection {connection.id}: {post_create_err}", extra={'correlation_id': correlation_id}, exc_info=True)
@@ -460,6 +511,10 @@ class ConnectionManager:
 
         # Update the in-memory cache with the potentially updated object
         self.connections[connection_id] = updated_connection
+        self._mark_local_change()
+        if updated_connection is not existing_connection:
+            self._release_connection_state(connection_id)
+            await self._publish_change(connection_id, config_changed=True)
 
         logger.info(f"Successfully updated connection {final_name} ({connection_id})", extra={'correlation_id': correlation_id})
         return updated_connection
@@ -490,6 +545,7 @@ class ConnectionManager:
         if connection_id in self.connections:
             del self.connections[connection_id]
             logger.info(f"Removed connection {connection_id} from cache.")
+        self._mark_local_change()
         
         # Update default connections if needed (check memory first)
         if self.default_connections.get(connection_type_deleted) == connection_id:
@@ -512,6 +568,7 @@ class ConnectionManager:
                         await repo.set_default_connection(connection_type_deleted, new_default_id)
                         # Update memory tracking as well
                         self.default_connections[connection_type_deleted] = new_default_id
+                        self._mark_local_change()
                     except Exception as set_default_err:
                          logger.error(f"Failed to set new default connection {new_default_id} after deleting {connection_id}: {set_default_err}", exc_info=True)
                          # State might be inconsistent here
@@ -521,6 +578,8 @@ class ConnectionManager:
                     # Assuming repo.set_default_connection handles clearing if ID is invalid/None or a dedicated method exists
                     # For now, we rely on the fact that no connection has the flag set.
         
+        self._release_connection_state(connection_id)
+        await self._publish_change(connection_id, config_changed=True)
         logger.info(f"Successfully deleted connection {connection_id}")
 
 
@@ -545,7 +604,9 @@ class ConnectionManager:
 
         # Update in-memory default tracking AFTER successful DB operation
         self.default_connections[connection_type] = connection_id
+        self._mark_local_change()
         logger.info(f"Updated in-memory default for {connection_type} to {connection_id}")
+        await self._publish_change(connection_id)
 
     
     async def test_connection(self, connection_type: str, config_data: BaseModel) -> Tuple[bool, str]:
@@ -678,7 +739,8 @@ class ConnectionManager:
         correlation_id = str(uuid4())
         try:
             logger.info("Loading connections from database storage", extra={'correlation_id': correlation_id})
-            await self._load_connections_from_db()
+            self.invalidate_cache()
+            await self._ensure_loaded()
             logger.info(f"Successfully loaded {len(self.connections)} connections from DB.", extra={'correlation_id': correlation_id})
         except Exception as e:
             logger.error(f"Error loading connections from DB: {str(e)}", extra={'correlation_id': correlation_id}, exc_info=True)
@@ -686,37 +748,28 @@ class ConnectionManager:
             # For now, let the error propagate if needed by the caller (initialize)
             raise
     
-    async def _load_connections_from_db(self) -> None:
-        """Load connections from database into cache"""
+    async def _load_connections_from_db(self) -> Tuple[Dict[str, ConnectionConfig], Dict[str, str]]:
+        """Read all connections and the default connection ids from the database"""
         async with get_db_session() as session:
             repo = ConnectionRepository(session)
             db_connections = await repo.get_all()
+            loaded_defaults = await repo.get_default_connection_ids()
             
             loaded_connections: Dict[str, ConnectionConfig] = {}
-            loaded_defaults: Dict[str, str] = {}
-
             for conn in db_connections:
                 conn_dict = conn.to_dict()
                 # Use simplified ConnectionConfig
                 connection_obj = ConnectionConfig(**conn_dict)
                 loaded_connections[connection_obj.id] = connection_obj
-                if conn_dict['is_default']: # Use dict value for bool check
-                     conn_type_from_dict = conn_dict['type'] # Use dict value
-                     conn_id_from_dict = conn_dict['id'] # Use dict value
-                     if conn_type_from_dict in loaded_defaults:
-                         logger.error(f"Multiple defaults found for type {conn_type_from_dict} in DB! Using {conn_id_from_dict} over {loaded_defaults[conn_type_from_dict]}")
-                     loaded_defaults[conn_type_from_dict] = conn_id_from_dict # Assign str ID
-
-            # Atomically update the cache and defaults
-            self.connections = loaded_connections
-            self.default_connections = loaded_defaults
-            logger.debug(f"Loaded {len(self.connections)} connections and {len(self.default_connections)} defaults into memory.")
-
-    # --- Tool Discovery (Uses Handler) --- 
-    async def get_tools_for_connection_type(self, connection_type: str) -> List[MCPToolInfo]:
+
+            logger.debug(f"Loaded {len(loaded_connections)} connections and {len(loaded_defaults)} defaults from the database.")
+            return loaded_connections, loaded_defaults
+
+    async def get_tools_for_connection_type(self, connection_type: str, refresh: bool = False) -> List[MCPToolInfo]:
         """
         List available tools for a given connection type using its default connection and handler,
         or provide predefined tools for special types like "python".
+        MCP-discovered schemas come from the tool schema cache unless `refresh` is set.
         """
         correlation_id = str(uuid4())
         logger.info(f"Fetching tools for connection type: {connection_type}", extra={'correlation_id': correlation_id})
@@ -838,105 +891,12 @@ class ConnectionManager:
                 extra={'correlation_id': correlation_id}
             )
 
-            # If we've already fetched the LogAI tool list once during the
-            # lifetime of this process just return the cached copy straight
-            # away – no need to spin up the Docker container again.
-            global _logai_tools_cache
-            global _logai_tools_cache_lock
-            if _logai_tools_cache is not None:
-                logger.debug(
-                    "Returning cached list of %d Log-AI tools.",
-                    len(_logai_tools_cache),
-                    extra={'correlation_id': correlation_id},
-                )
-                return _logai_tools_cache
-
-            # Ensure only one coroutine performs the expensive discovery the
-            # first time while others wait on the result.
-            async with _logai_tools_cache_lock:
-                # Another coroutine might have already populated the cache
-                # while we were waiting for the lock.
-                if _logai_tools_cache is not None:
-                    logger.debug(
-                        "Log-AI tools cache was populated by another task while waiting for lock.",
-                        extra={'correlation_id': correlation_id},
-                    )
-                    return _logai_tools_cache
-
-            try:
-                # Prepare Docker arguments
-                docker_args = [
-                    "run",
-                    "--rm",
-                    "-i",  # attach STDIN for stdio transport,
-                    "--volume=/var/run/docker.sock:/var/run/docker.sock",
-                ]
-                
-                # Add volume mount if SHERLOG_HOST_FS_ROOT is set
-                host_fs_root = os.environ.get("SHERLOG_HOST_FS_ROOT")
-                if host_fs_root:
-                    docker_args.append(f"-v")
-                    docker_args.append(f"{host_fs_root}:{host_fs_root}:ro")
-
-                docker_args.append("ghcr.io/navneet-mkr/logai-mcp:0.1.3")
-
-                # Run the Log-AI MCP via published Docker image instead of building it on the fly
-                server_params = StdioServerParameters(
-                    command="docker",
-                    args=docker_args,
-                    env=os.environ.copy(),
-                )
-
-                async with stdio_client(server_params) as (read, write):
-                    async with ClientSession(read, write) as session:
-                        logger.info(
-                            "Initializing MCP session for Log-AI list_tools…",
-                            extra={'correlation_id': correlation_id},
-                        )
-                        await asyncio.wait_for(session.initialize(), timeout=90.0)
-                        response = await asyncio.wait_for(session.list_tools(), timeout=30.0)
-
-                        parsed_tools: List[MCPToolInfo] = []
-                        for mcp_tool in getattr(response, "tools", []) or []:
-                            try:
-                                parsed_tools.append(
-                                    MCPToolInfo(
-                                        name=getattr(mcp_tool, "name", "unknown"),
-                                        description=getattr(mcp_tool, "description", None),
-                                        inputSchema=getattr(mcp_tool, "inputSchema", {}) or {},
-                                    )
-                                )
-                            except Exception as tool_parse_err:
-                                logger.error(
-                                    "Failed parsing tool from Log-AI list_tools response: %s",
-                                    tool_parse_err,
-                                    extra={'correlation_id': correlation_id},
-                                    exc_info=True,
-                                )
-                                continue
-
-                        logger.info(
-                            "Retrieved %d Log-AI tools via MCP list_tools.",
-                            len(parsed_tools),
-                            extra={'correlation_id': correlation_id},
-                        )
-
-                        # Populate the cache so the next call is instantaneous.
-                        _logai_tools_cache = parsed_tools
-
-                        return parsed_tools
-            except asyncio.TimeoutError:
-                raise ValueError("Timeout communicating with Log-AI MCP server while listing tools.")
-            except FileNotFoundError as e:
-                raise ValueError(f"Log-AI MCP server command not found: {e}")
-            except Exception as e:
-                logger.error(
-                    "Unexpected error during Log-AI MCP list_tools: %s",
-                    e,
-                    extra={'correlation_id': correlation_id},
-                    exc_info=True,
-                )
-                raise ValueError(f"Failed to communicate with Log-AI MCP server: {e}")
+            return await get_tool_schema_cache().get(
+                connection_type,
+                {"image": LOG_AI_MCP_IMAGE, "host_fs_root": os.environ.get("SHERLOG_HOST_FS_ROOT")},
+                lambda: self._discover_log_ai_tools(correlation_id),
+                refresh=refresh,
+            )
 
         # Existing logic for MCP-based connections:
         default_conn = await self.get_default_connection(connection_type)
@@ -952,6 +912,105 @@ class ConnectionManager:
              # Raise an error as this is an internal inconsistency
              raise ValueError(f"Invalid config format for default connection {default_conn.id}") 
 
+        return await get_tool_schema_cache().get(
+            connection_type,
+            config_dict,
+            lambda: self._discover_tools_via_stdio(connection_type, config_dict, correlation_id),
+            refresh=refresh,
+        )
+
+    async def prewarm_tool_schemas(self) -> None:
+        """Discover the tool schemas that are missing or expired, one connection type at a time"""
+        try:
+            connection_types = {connection["type"] for connection in await self.get_all_connections()}
+        except Exception as e:
+            logger.warning(f"Tool schema prewarm skipped, connections unavailable: {e}")
+            return
+        # Types without connections (Log-AI) are rewarmed when they were used before
+        connection_types |= set(get_tool_schema_cache().cached_types())
+        for connection_type in sorted(connection_types - STATIC_TOOL_CONNECTION_TYPES):
+            try:
+                await self.get_tools_for_connection_type(connection_type)
+            except Exception as e:
+                logger.warning(f"Could not prewarm tool schemas for {connection_type}: {e}")
+        logger.info(f"Tool schemas prewarmed for {len(connection_types)} connection types")
+
+    async def _discover_log_ai_tools(self, correlation_id: str) -> List[MCPToolInfo]:
+        """Start the Log-AI MCP container and list its tools"""
+        try:
+            # Prepare Docker arguments
+            docker_args = [
+                "run",
+                "--rm",
+                "-i",  # attach STDIN for stdio transport,
+                "--volume=/var/run/docker.sock:/var/run/docker.sock",
+            ]
+            
+            # Add volume mount if SHERLOG_HOST_FS_ROOT is set
+            host_fs_root = os.environ.get("SHERLOG_HOST_FS_ROOT")
+            if host_fs_root:
+                docker_args.append(f"-v")
+                docker_args.append(f"{host_fs_root}:{host_fs_root}:ro")
+
+            docker_args.append(LOG_AI_MCP_IMAGE)
+
+            # Run the Log-AI MCP via published Docker image instead of building it on the fly
+            server_params = StdioServerParameters(
+                command="docker",
+                args=docker_args,
+                env=os.environ.copy(),
+            )
+
+            async with stdio_client(server_params) as (read, write):
+                async with ClientSession(read, write) as session:
+                    logger.info(
+                        "Initializing MCP session for Log-AI list_tools…",
+                        extra={'correlation_id': correlation_id},
+                    )
+                    await asyncio.wait_for(session.initialize(), timeout=90.0)
+                    response = await asyncio.wait_for(session.list_tools(), timeout=30.0)
+
+                    parsed_tools: List[MCPToolInfo] = []
+                    for mcp_tool in getattr(response, "tools", []) or []:
+                        try:
+                            parsed_tools.append(
+                                MCPToolInfo(
+                                    name=getattr(mcp_tool, "name", "unknown"),
+                                    description=getattr(mcp_tool, "description", None),
+                                    inputSchema=getattr(mcp_tool, "inputSchema", {}) or {},
+                                )
+                            )
+                        except Exception as tool_parse_err:
+                            logger.error(
+                                "Failed parsing tool from Log-AI list_tools response: %s",
+                                tool_parse_err,
+                                extra={'correlation_id': correlation_id},
+                                exc_info=True,
+                            )
+                            continue
+
+                    logger.info(
+                        "Retrieved %d Log-AI tools via MCP list_tools.",
+                        len(parsed_tools),
+                        extra={'correlation_id': correlation_id},
+                    )
+
+                    return parsed_tools
+        except asyncio.TimeoutError:
+            raise ValueError("Timeout communicating with Log-AI MCP server while listing tools.")
+        except FileNotFoundError as e:
+            raise ValueError(f"Log-AI MCP server command not found: {e}")
+        except Exception as e:
+            logger.error(
+                "Unexpected error during Log-AI MCP list_tools: %s",
+                e,
+                extra={'correlation_id': correlation_id},
+                exc_info=True,
+            )
+            raise ValueError(f"Failed to communicate with Log-AI MCP server: {e}")
+
+    async def _discover_tools_via_stdio(self, connection_type: str, config_dict: Dict[str, Any], correlation_id: str) -> List[MCPToolInfo]:
+        """Start the connection type's MCP server over stdio and list its tools"""
         try:
             # Get handler and stdio parameters
             handler = get_handler(connection_type)
@@ -0,0 +1,527 @@
+"""
+Trigram content index over the directories of a filesystem connection.
+
+Without an index, every content search walks the whole tree and scans every
+file. A `ContentIndex` keeps, for each distinct 3-byte sequence (trigram) of the
+lower-cased file contents, the list of files containing it. A search first
+narrows the files down to those containing every trigram of the literal parts
+of the query, then scans only those (memory-mapped) to report the matching
+lines with their line numbers and byte offsets.
+
+The index lives in memory and is built in a worker thread when a connection
+with ``content_index`` enabled is first used; `ContentIndexRegistry` then
+re-walks the roots every ``filesystem_index_poll_interval`` seconds and
+re-indexes the files whose size or mtime changed. Files modified shortly before
+the last refresh (e.g. logs being appended to) are always scanned, so recent
+lines are found before the next refresh indexes them.
+"""
+
+import asyncio
+import mmap
+import os
+import re
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from backend.config import get_settings
+from backend.core.logging import get_logger
+
+try:  # Python 3.11+
+    import re._parser as sre_parse  # type: ignore[import-not-found]
+    from re._constants import BRANCH, LITERAL, SUBPATTERN  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - older interpreters
+    import sre_parse  # type: ignore[no-redef]
+    from sre_constants import BRANCH, LITERAL, SUBPATTERN  # type: ignore[no-redef]
+
+logger = get_logger(__name__)
+
+READ_CHUNK_BYTES = 8 * 1024 * 1024  # files are read (and their trigrams extracted) this much at a time
+BINARY_SNIFF_BYTES = 8192  # files with a NUL byte in their first bytes are not indexed
+TRIGRAM_BITMAP_MIN_BYTES = 128 * 1024  # smaller files sort their trigrams instead of filling a 2^24 bitmap
+MAX_LINE_CHARS = 500  # matching lines are cut to this length in hits
+INDEX_BATCH_FILES = 256  # files whose trigrams are merged into the postings at once
+INDEX_BATCH_BYTES = 256 * 1024 * 1024
+
+_registry: Optional["ContentIndexRegistry"] = None
+
+
+@dataclass
+class SearchHit:
+    """A matching line."""
+    path: str
+    line: int  # 1-based
+    offset: int  # byte offset of the match in the file
+    text: str
+
+
+@dataclass
+class _IndexedFile:
+    file_id: int
+    size: int
+    mtime_ns: int
+
+
+# ---------------------------------------------------------------------------
+# Trigrams
+# ---------------------------------------------------------------------------
+
+
+def _trigram_codes(data: bytes) -> np.ndarray:
+    """The trigram at each position of lower-cased `data`, as 24-bit values."""
+    values = np.frombuffer(data.lower(), dtype=np.uint8).astype(np.uint32)
+    if len(values) < 3:
+        return np.empty(0, dtype=np.uint32)
+    return (values[:-2] << 16) | (values[1:-1] << 8) | values[2:]
+
+
+def file_trigrams(path: str) -> Optional[np.ndarray]:
+    """Distinct trigrams of a file (ascending); None for binary files."""
+    with open(path, "rb") as f:
+        chunk = f.read(READ_CHUNK_BYTES)
+        if b"\0" in chunk[:BINARY_SNIFF_BYTES]:
+            return None
+        if len(chunk) < TRIGRAM_BITMAP_MIN_BYTES:
+            # The whole file: sorting its few positions beats clearing and scanning 16 MB
+            return np.unique(_trigram_codes(chunk))
+        # A presence bitmap over all 2^24 trigrams is cheaper than sorting the positions of a large file
+        present = np.zeros(1 << 24, dtype=np.bool_)
+        carry = b""
+        while chunk:
+            present[_trigram_codes(carry + chunk)] = True
+            carry = chunk[-2:]  # trigrams spanning two chunks
+            chunk = f.read(READ_CHUNK_BYTES)
+    return np.flatnonzero(present).astype(np.uint32)
+
+
+def _literal_trigrams(literal: bytes) -> Set[int]:
+    literal = literal.lower()
+    return {(literal[i] << 16) | (literal[i + 1] << 8) | literal[i + 2] for i in range(len(literal) - 2)}
+
+
+def _literal_runs(items: Iterable) -> List[bytes]:
+    """Runs of consecutive ASCII literal characters in a parsed regex sequence."""
+    runs: List[bytes] = []
+    current = bytearray()
+    for op, arg in items:
+        if op == LITERAL and arg < 128:
+            current.append(arg)
+            continue
+        if op == SUBPATTERN and not any(sub_op == BRANCH for sub_op, _ in arg[-1]):
+            # An unquantified group: its literals are required too, but do not join the run
+            runs.extend(_literal_runs(arg[-1]))
+        if len(current) >= 3:
+            runs.append(bytes(current))
+        current = bytearray()
+    if len(current) >= 3:
+        runs.append(bytes(current))
+    return [run for run in runs if len(run) >= 3]
+
+
+def required_literals(pattern: str, regex: bool) -> Optional[List[List[bytes]]]:
+    """
+    Alternatives of literals for a query: a matching file contains every literal
+    of at least one alternative. None when the query gives no usable literal
+    (then every file has to be scanned).
+    """
+    if not regex:
+        encoded = pattern.encode("utf-8")
+        return [[encoded]] if len(encoded) >= 3 else None
+    try:
+        parsed = list(sre_parse.parse(pattern))
+    except re.error:
+        return None
+    if len(parsed) == 1 and parsed[0][0] == BRANCH:
+        alternatives = [_literal_runs(branch) for branch in parsed[0][1][1]]
+    else:
+        alternatives = [_literal_runs(parsed)]
+    if not alternatives or any(not literals for literals in alternatives):
+        return None
+    return alternatives
+
+
+# ---------------------------------------------------------------------------
+# Scanning
+# ---------------------------------------------------------------------------
+
+
+def compile_query(pattern: str, regex: bool, case_sensitive: bool) -> "re.Pattern[bytes]":
+    """The pattern as searched over whole files: `^` and `$` anchor at line boundaries."""
+    source = pattern.encode("utf-8") if regex else re.escape(pattern.encode("utf-8"))
+    flags = re.MULTILINE
+    if not case_sensitive:
+        flags |= re.IGNORECASE
+    return re.compile(source, flags)
+
+
+def scan_file(path: str, query: "re.Pattern[bytes]", limit: int) -> List[SearchHit]:
+    """Up to `limit` matching lines of a file (one hit per line)."""
+    hits: List[SearchHit] = []
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return hits
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                line = 1
+                counted_to = 0
+                position = 0
+                while len(hits) < limit:
+                    match = query.search(mm, position)
+                    if match is None:
+                        break
+                    start = match.start()
+                    line += mm[counted_to:start].count(b"\n")
+                    counted_to = start
+                    line_start = mm.rfind(b"\n", 0, start) + 1
+                    line_end = mm.find(b"\n", start)
+                    if line_end == -1:
+                        line_end = size
+                    text = mm[line_start:min(line_end, line_start + MAX_LINE_CHARS * 4)].decode("utf-8", errors="replace")
+                    hits.append(SearchHit(path=path, line=line, offset=start, text=text[:MAX_LINE_CHARS]))
+                    if line_end >= size:
+                        break
+                    position = line_end + 1  # next line
+    except (OSError, ValueError) as e:
+        logger.debug(f"Could not scan {path}: {e}")
+    return hits
+
+
+def walk_files(root: str) -> Iterator[os.DirEntry]:
+    """Regular files under `root`; symlinked directories are not followed."""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        subdirectories = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+                elif entry.is_file():
+                    yield entry
+            except OSError:
+                continue
+        stack.extend(reversed(subdirectories))
+
+
+def _is_binary(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return b"\0" in f.read(BINARY_SNIFF_BYTES)
+    except OSError:
+        return True
+
+
+def search_tree(
+    root: str,
+    pattern: str,
+    regex: bool = False,
+    case_sensitive: bool = False,
+    max_results: int = 100,
+    max_file_bytes: int = 2 * 1024 ** 3,
+) -> Tuple[List[SearchHit], int]:
+    """Index-less search: scans every text file under `root`. Blocking."""
+    query = compile_query(pattern, regex, case_sensitive)
+    hits: List[SearchHit] = []
+    scanned = 0
+    for entry in walk_files(root):
+        if len(hits) >= max_results:
+            break
+        try:
+            if entry.stat().st_size > max_file_bytes or _is_binary(entry.path):
+                continue
+        except OSError:
+            continue
+        scanned += 1
+        hits.extend(scan_file(entry.path, query, max_results - len(hits)))
+    return hits, scanned
+
+
+# ---------------------------------------------------------------------------
+# Index
+# ---------------------------------------------------------------------------
+
+
+class ContentIndex:
+    """In-memory trigram index of the text files under `roots`."""
+
+    def __init__(self, roots: Sequence[str], max_file_bytes: int = 2 * 1024 ** 3, hot_seconds: float = 60.0):
+        self.roots = [os.path.realpath(root) for root in roots]
+        self.max_file_bytes = max_file_bytes
+        self.hot_seconds = hot_seconds  # files modified this recently before a refresh are always scanned
+        self._lock = threading.Lock()  # guards the structures below against concurrent searches
+        self._refresh_lock = threading.Lock()  # one refresh (the only writer) at a time
+        self._files: Dict[str, _IndexedFile] = {}
+        self._paths: List[Optional[str]] = []  # file id -> path (None once replaced or deleted)
+        self._postings: Dict[int, array] = {}  # trigram -> ascending file ids
+        self._hot: Set[str] = set()
+        self._dead = 0
+        self.ready = False
+        self.last_refresh: Optional[float] = None
+        self.indexed_bytes = 0
+
+    @property
+    def file_count(self) -> int:
+        return len(self._paths) - self._dead
+
+    def covers(self, path: str) -> bool:
+        return any(path == root or path.startswith(root.rstrip(os.sep) + os.sep) for root in self.roots)
+
+    def refresh(self) -> Tuple[int, int]:
+        """Re-index new and changed files and drop deleted ones. Blocking. Returns (indexed, removed)."""
+        with self._refresh_lock:
+            return self._refresh()
+
+    def _refresh(self) -> Tuple[int, int]:
+        started = time.time()
+        seen: Dict[str, os.stat_result] = {}
+        for root in self.roots:
+            for entry in walk_files(root):
+                try:
+                    info = entry.stat()
+                except OSError:
+                    continue
+                if info.st_size <= self.max_file_bytes:
+                    seen[entry.path] = info
+
+        with self._lock:
+            known = dict(self._files)
+        changed = [
+            path for path, info in seen.items()
+            if path not in known or known[path].size != info.st_size or known[path].mtime_ns != info.st_mtime_ns
+        ]
+        removed = [path for path in known if path not in seen]
+
+        indexed = 0
+        batch: List[Tuple[str, os.stat_result, Optional[np.ndarray]]] = []
+        batch_bytes = 0
+        for path in changed:
+            try:
+                trigrams = file_trigrams(path)
+            except OSError as e:
+                logger.debug(f"Could not index {path}: {e}")
+                continue
+            batch.append((path, seen[path], trigrams))
+            batch_bytes += seen[path].st_size
+            if trigrams is not None:
+                indexed += 1
+            if len(batch) >= INDEX_BATCH_FILES or batch_bytes >= INDEX_BATCH_BYTES:
+                self._add(batch)
+                batch, batch_bytes = [], 0
+        if batch:
+            self._add(batch)
+
+        with self._lock:
+            for path in removed:
+                self._forget(path)
+            self._hot = {path for path, info in seen.items() if started - info.st_mtime < self.hot_seconds}
+            compact = self._dead > self.file_count
+        if compact:
+            self._compact()
+        with self._lock:
+            self.ready = True
+            self.last_refresh = started
+        if indexed or removed:
+            logger.info(
+                f"Content index of {self.roots}: {indexed} files indexed, {len(removed)} removed, "
+                f"{self.file_count} files / {len(self._postings)} trigrams in {time.time() - started:.1f}s"
+            )
+        return indexed, len(removed)
+
+    def _add(self, batch: List[Tuple[str, os.stat_result, Optional[np.ndarray]]]) -> None:
+        """Index a batch of (re-)read files, replacing their previous entries."""
+        ids: List[np.ndarray] = []
+        trigrams: List[np.ndarray] = []
+        with self._lock:
+            for path, info, file_trigram_values in batch:
+                self._forget(path)
+                if file_trigram_values is None:  # binary: remembered so it is not re-read until it changes
+                    self._files[path] = _IndexedFile(file_id=-1, size=info.st_size, mtime_ns=info.st_mtime_ns)
+                    continue
+                file_id = len(self._paths)
+                self._paths.append(path)
+                self._files[path] = _IndexedFile(file_id=file_id, size=info.st_size, mtime_ns=info.st_mtime_ns)
+                self.indexed_bytes += info.st_size
+                ids.append(np.full(len(file_trigram_values), file_id, dtype=np.uint32))
+                trigrams.append(file_trigram_values)
+            if not trigrams:
+                return
+            # Group the batch by trigram so each posting list is extended once (ids stay ascending)
+            all_trigrams = np.concatenate(trigrams)
+            order = np.argsort(all_trigrams, kind="stable")
+            all_trigrams, all_ids = all_trigrams[order], np.concatenate(ids)[order]
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(all_trigrams)) + 1))
+            for trigram, group in zip(all_trigrams[starts].tolist(), np.split(all_ids, starts[1:])):
+                postings = self._postings.get(trigram)
+                if postings is None:
+                    self._postings[trigram] = array("I", group.tobytes())
+                else:
+                    postings.frombytes(group.tobytes())
+
+    def _forget(self, path: str) -> None:
+        entry = self._files.pop(path, None)
+        if entry is not None and entry.file_id >= 0:
+            self._paths[entry.file_id] = None
+            self.indexed_bytes -= entry.size
+            self._dead += 1
+
+    def _compact(self) -> None:
+        """
+        Renumber live files and drop the postings of replaced/deleted ones. Called by
+        refresh, the only writer, so the new lists are built without the lock (searches
+        keep using the old ones) and swapped in under it.
+        """
+        live = np.fromiter((path is not None for path in self._paths), dtype=bool, count=len(self._paths))
+        remap = np.full(len(self._paths), -1, dtype=np.int64)
+        remap[live] = np.arange(np.count_nonzero(live))
+        postings: Dict[int, array] = {}
+        for trigram, ids in self._postings.items():
+            renumbered = np.take(remap, np.frombuffer(ids, dtype=np.uint32))
+            kept = renumbered[renumbered >= 0]
+            if kept.size:
+                postings[trigram] = array("I", kept.astype(np.uint32).tobytes())
+        paths: List[Optional[str]] = [path for path in self._paths if path is not None]
+        with self._lock:
+            for file_id, path in enumerate(paths):
+                self._files[path].file_id = file_id
+            self._paths, self._postings, self._dead = paths, postings, 0
+
+    def candidates(self, alternatives: Optional[List[List[bytes]]], under: Optional[str] = None) -> List[str]:
+        """Indexed files that may match (plus recently modified files), optionally under a directory."""
+        with self._lock:
+            if alternatives is None:
+                paths = {path for path, entry in self._files.items() if entry.file_id >= 0}
+            else:
+                ids: Set[int] = set()
+                for literals in alternatives:
+                    trigrams = set().union(*(_literal_trigrams(literal) for literal in literals))
+                    lists = sorted((self._postings.get(t, array("I")) for t in trigrams), key=len)
+                    if not lists or not lists[0]:
+                        continue
+                    found = set(lists[0])
+                    for postings in lists[1:]:
+                        found.intersection_update(postings)
+                        if not found:
+                            break
+                    ids |= found
+                paths = {self._paths[i] for i in ids if self._paths[i] is not None}
+            paths |= self._hot
+        if under is not None:
+            prefix = under.rstrip(os.sep) + os.sep
+            paths = {p for p in paths if p == under or p.startswith(prefix)}
+        return sorted(paths)
+
+    def search(
+        self,
+        pattern: str,
+        regex: bool = False,
+        case_sensitive: bool = False,
+        under: Optional[str] = None,
+        max_results: int = 100,
+    ) -> Tuple[List[SearchHit], int]:
+        """Matching lines (at most `max_results`) and the number of files scanned. Blocking."""
+        query = compile_query(pattern, regex, case_sensitive)
+        hits: List[SearchHit] = []
+        candidates = self.candidates(required_literals(pattern, regex), under)
+        for path in candidates:
+            if len(hits) >= max_results:
+                break
+            hits.extend(scan_file(path, query, max_results - len(hits)))
+        return hits, len(candidates)
+
+
+class ContentIndexRegistry:
+    """The content indexes of this process, one per filesystem connection, refreshed by polling."""
+
+    def __init__(self, poll_interval: float = 30.0, max_file_bytes: int = 2 * 1024 ** 3, idle_seconds: float = 3600.0):
+        self.poll_interval = poll_interval
+        self.max_file_bytes = max_file_bytes
+        self.idle_seconds = idle_seconds
+        self._indexes: Dict[str, ContentIndex] = {}
+        self._last_requested: Dict[str, float] = {}  # monotonic time of the last get() per connection
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._poll_task: Optional[asyncio.Task] = None
+
+    def get(self, connection_key: str, roots: Sequence[str]) -> ContentIndex:
+        """The index of a connection, starting its first build in the background when new."""
+        self._last_requested[connection_key] = time.monotonic()
+        index = self._indexes.get(connection_key)
+        wanted = [os.path.realpath(root) for root in roots]
+        if index is None or index.roots != wanted:
+            index = ContentIndex(wanted, max_file_bytes=self.max_file_bytes, hot_seconds=2 * self.poll_interval)
+            self._indexes[connection_key] = index
+            self._schedule_refresh(connection_key, index)
+        return index
+
+    def drop(self, connection_key: str) -> None:
+        """Stop refreshing a connection's index and free it (deleted, reconfigured or unused connection)."""
+        self._last_requested.pop(connection_key, None)
+        if self._indexes.pop(connection_key, None) is None:
+            return
+        running = self._refreshing.pop(connection_key, None)
+        if running is not None:
+            running.cancel()  # a refresh already in its thread finishes on the orphaned index
+        logger.info(f"Dropped the content index of {connection_key}")
+
+    def _schedule_refresh(self, connection_key: str, index: ContentIndex) -> None:
+        running = self._refreshing.get(connection_key)
+        if running is not None and not running.done():
+            return
+        try:
+            self._refreshing[connection_key] = asyncio.get_running_loop().create_task(self._refresh(connection_key, index))
+        except RuntimeError:
+            pass  # no event loop (e.g. a synchronous caller); the poll loop will build it
+
+    async def _refresh(self, connection_key: str, index: ContentIndex) -> None:
+        try:
+            await asyncio.to_thread(index.refresh)
+        except Exception as e:
+            logger.error(f"Refreshing the content index of {connection_key} failed: {e}", exc_info=True)
+
+    def start(self) -> None:
+        if self._poll_task is None:
+            self._poll_task = asyncio.create_task(self._poll_loop())
+
+    async def shutdown(self) -> None:
+        tasks = [t for t in [self._poll_task, *self._refreshing.values()] if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._poll_task = None
+        self._refreshing.clear()
+
+    async def _poll_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            self._drop_idle()
+            for connection_key, index in list(self._indexes.items()):
+                self._schedule_refresh(connection_key, index)
+
+    def _drop_idle(self) -> None:
+        """Drop the indexes no agent has requested for `idle_seconds`, instead of re-walking them forever."""
+        now = time.monotonic()
+        for connection_key, requested_at in list(self._last_requested.items()):
+            if now - requested_at > self.idle_seconds:
+                self.drop(connection_key)
+
+
+def get_content_index_registry() -> ContentIndexRegistry:
+    """The process-wide content index registry."""
+    global _registry
+    if _registry is None:
+        settings = get_settings()
+        _registry = ContentIndexRegistry(
+            poll_interval=settings.filesystem_index_poll_interval,
+            max_file_bytes=settings.filesystem_index_max_file_mb * 1024 * 1024,
+            idle_seconds=settings.filesystem_index_idle_seconds,
+        )
+    return _registry
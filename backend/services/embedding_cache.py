@@ -0,0 +1,269 @@
+"""
+Local embedding cache shared by all git_repo indexing runs.
+
+Forks and branches of the same code produce identical chunks, and refreshing a
+connection re-embeds chunks that only moved between files. EmbeddingCache keys
+vectors by (embedding model, sha256 of the chunk text) so any collection can
+reuse a vector computed for another one.
+
+Layout under `embedding_cache_dir`:
+  * ``index.sqlite`` – maps (model, chunk hash) to a slot in the model's vector
+    file, with a last-used timestamp for LRU eviction and a free-slot list;
+  * ``<model>.f32`` – one fixed-size float32 row per slot, read through a
+    memory map.
+
+The total size of live vectors is kept under `embedding_cache_max_mb`; evicted
+slots are reused by later inserts so vector files do not grow past the peak.
+All methods are blocking and thread-safe; call them via `asyncio.to_thread`.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from backend.config import get_settings
+from backend.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+_VECTOR_DTYPE = np.float32
+_SQLITE_MAX_PARAMS = 500
+# Evict down to this fraction of the limit so eviction doesn't run on every insert
+_EVICT_TARGET_RATIO = 0.9
+
+_shared_cache: Optional["EmbeddingCache"] = None
+_shared_cache_lock = threading.Lock()
+
+
+def chunk_hash(text: str) -> str:
+    """Cache key of a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+
+class EmbeddingCache:
+    """(model, chunk hash) -> vector store backed by SQLite and memory-mapped vector files."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            os.path.join(directory, "index.sqlite"),
+            check_same_thread=False,
+            isolation_level=None,  # explicit transactions
+            timeout=30,
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS models (
+                model TEXT PRIMARY KEY,
+                dim INTEGER NOT NULL,
+                next_slot INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                model TEXT NOT NULL,
+                chunk_hash TEXT NOT NULL,
+                slot INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, chunk_hash)
+            );
+            CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+            CREATE TABLE IF NOT EXISTS free_slots (
+                model TEXT NOT NULL,
+                slot INTEGER NOT NULL,
+                PRIMARY KEY (model, slot)
+            );
+            """
+        )
+
+    def _vector_path(self, model: str) -> str:
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "-", model).strip("-")[:64]
+        digest = hashlib.sha1(model.encode("utf-8")).hexdigest()[:8]
+        return os.path.join(self.directory, f"{slug}-{digest}.f32")
+
+    def _model_dim(self, model: str) -> Optional[int]:
+        row = self._db.execute("SELECT dim FROM models WHERE model = ?", (model,)).fetchone()
+        return row[0] if row else None
+
+    def get_many(self, model: str, hashes: Sequence[str]) -> Dict[str, List[float]]:
+        """Vectors found for `hashes` (missing hashes are simply absent from the result)."""
+        unique = list(dict.fromkeys(hashes))
+        if not unique:
+            return {}
+        with self._lock:
+            dim = self._model_dim(model)
+            if dim is None:
+                return {}
+            slots: Dict[str, int] = {}
+            for i in range(0, len(unique), _SQLITE_MAX_PARAMS):
+                part = unique[i:i + _SQLITE_MAX_PARAMS]
+                placeholders = ",".join("?" * len(part))
+                rows = self._db.execute(
+                    f"SELECT chunk_hash, slot FROM entries WHERE model = ? AND chunk_hash IN ({placeholders})",
+                    (model, *part),
+                ).fetchall()
+                slots.update(rows)
+            if not slots:
+                return {}
+
+            path = self._vector_path(model)
+            try:
+                vectors = np.memmap(path, dtype=_VECTOR_DTYPE, mode="r").reshape(-1, dim)
+            except (FileNotFoundError, ValueError) as e:
+                logger.warning(f"Embedding cache vector file for {model} is unreadable ({e}); dropping its entries")
+                self._drop_model(model)
+                return {}
+
+            found = {h: vectors[slot].tolist() for h, slot in slots.items() if slot < len(vectors)}
+            del vectors
+
+            now = time.time()
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "UPDATE entries SET last_used = ? WHERE model = ? AND chunk_hash = ?",
+                [(now, model, h) for h in found],
+            )
+            self._db.execute("COMMIT")
+            return found
+
+    def put_many(self, model: str, items: Dict[str, Sequence[float]]) -> None:
+        """Store vectors for chunk hashes that are not cached yet, then evict if over the size limit."""
+        if not items:
+            return
+        dim = len(next(iter(items.values())))
+        with self._lock:
+            known_dim = self._model_dim(model)
+            if known_dim is not None and known_dim != dim:
+                logger.warning(f"Embedding dimension of {model} changed ({known_dim} -> {dim}); resetting its cache")
+                self._drop_model(model)
+                known_dim = None
+
+            path = self._vector_path(model)
+            now = time.time()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                if known_dim is None:
+                    self._db.execute("INSERT OR IGNORE INTO models (model, dim, next_slot) VALUES (?, ?, 0)", (model, dim))
+                existing = set(self._existing_hashes(model, list(items)))
+                with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+                    for h, vector in items.items():
+                        if h in existing or len(vector) != dim:
+                            continue
+                        slot = self._allocate_slot(model)
+                        f.seek(slot * dim * np.dtype(_VECTOR_DTYPE).itemsize)
+                        f.write(np.asarray(vector, dtype=_VECTOR_DTYPE).tobytes())
+                        self._db.execute(
+                            "INSERT INTO entries (model, chunk_hash, slot, last_used) VALUES (?, ?, ?, ?)",
+                            (model, h, slot, now),
+                        )
+                        existing.add(h)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._evict_if_needed()
+
+    def size_bytes(self) -> int:
+        """Bytes taken by live (non-evicted) vectors across all models."""
+        with self._lock:
+            return self._size_bytes()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _size_bytes(self) -> int:
+        row = self._db.execute(
+            "SELECT COALESCE(SUM(m.dim), 0) FROM entries e JOIN models m ON m.model = e.model"
+        ).fetchone()
+        return row[0] * np.dtype(_VECTOR_DTYPE).itemsize
+
+    def _existing_hashes(self, model: str, hashes: List[str]) -> Iterable[str]:
+        for i in range(0, len(hashes), _SQLITE_MAX_PARAMS):
+            part = hashes[i:i + _SQLITE_MAX_PARAMS]
+            placeholders = ",".join("?" * len(part))
+            for (h,) in self._db.execute(
+                f"SELECT chunk_hash FROM entries WHERE model = ? AND chunk_hash IN ({placeholders})",
+                (model, *part),
+            ):
+                yield h
+
+    def _allocate_slot(self, model: str) -> int:
+        row = self._db.execute("SELECT slot FROM free_slots WHERE model = ? ORDER BY slot LIMIT 1", (model,)).fetchone()
+        if row:
+            self._db.execute("DELETE FROM free_slots WHERE model = ? AND slot = ?", (model, row[0]))
+            return row[0]
+        slot = self._db.execute("SELECT next_slot FROM models WHERE model = ?", (model,)).fetchone()[0]
+        self._db.execute("UPDATE models SET next_slot = ? WHERE model = ?", (slot + 1, model))
+        return slot
+
+    def _evict_if_needed(self) -> None:
+        size = self._size_bytes()
+        if size <= self.max_bytes:
+            return
+        target = int(self.max_bytes * _EVICT_TARGET_RATIO)
+        evicted = 0
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._db.execute(
+                "SELECT e.model, e.chunk_hash, e.slot, m.dim FROM entries e JOIN models m ON m.model = e.model ORDER BY e.last_used"
+            )
+            victims = []
+            for model, h, slot, dim in rows:
+                if size <= target:
+                    break
+                victims.append((model, h, slot))
+                size -= dim * np.dtype(_VECTOR_DTYPE).itemsize
+            self._db.executemany("DELETE FROM entries WHERE model = ? AND chunk_hash = ?", [(m, h) for m, h, _ in victims])
+            self._db.executemany("INSERT OR IGNORE INTO free_slots (model, slot) VALUES (?, ?)", [(m, s) for m, _, s in victims])
+            evicted = len(victims)
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+        logger.info(f"Embedding cache evicted {evicted} vectors to stay under {self.max_bytes} bytes")
+
+    def _drop_model(self, model: str) -> None:
+        self._db.execute("BEGIN IMMEDIATE")
+        self._db.execute("DELETE FROM entries WHERE model = ?", (model,))
+        self._db.execute("DELETE FROM free_slots WHERE model = ?", (model,))
+        self._db.execute("DELETE FROM models WHERE model = ?", (model,))
+        self._db.execute("COMMIT")
+        try:
+            os.remove(self._vector_path(model))
+        except FileNotFoundError:
+            pass
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """The process-wide embedding cache, or None if disabled or it cannot be opened."""
+    global _shared_cache
+    settings = get_settings()
+    if not settings.embedding_cache_enabled:
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            try:
+                _shared_cache = EmbeddingCache(settings.embedding_cache_dir, settings.embedding_cache_max_mb * 1024 * 1024)
+                logger.info(f"Embedding cache opened at {settings.embedding_cache_dir} (limit {settings.embedding_cache_max_mb} MB)")
+            except Exception as e:
+                logger.warning(f"Embedding cache unavailable, indexing without it: {e}")
+                return None
+        return _shared_cache
+
+
+def close_embedding_cache() -> None:
+    """Close the process-wide embedding cache (application shutdown)."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is not None:
+            _shared_cache.close()
+            _shared_cache = None
@@ -0,0 +1,283 @@
+"""
+Pipelined embedding and upsert of documents into a git_repo Qdrant collection.
+
+FastEmbed inference is CPU bound. Running it through `qdrant_client.add` on the
+event loop's thread stalls every other request while a repository is indexed,
+and batches were embedded and uploaded strictly one after another.
+
+EmbeddingUpsertPipeline instead:
+  * groups incoming documents into batches (producer),
+  * reuses vectors from the shared EmbeddingCache where it can,
+  * embeds the remaining texts in a shared process pool (so the API stays responsive),
+  * computes a BM25 sparse vector per document for hybrid search (see code_search),
+  * upserts embedded batches while the next ones are still being embedded,
+with at most `max_in_flight` batches being embedded or upserted at a time.
+
+Points are written in the same layout `qdrant_client.add` uses (a named
+`fast-<model>` vector and the text under the `document` payload key) so the
+stdio `mcp-server-qdrant` used by agents can query the collection unchanged.
+"""
+
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Union
+
+from qdrant_client import AsyncQdrantClient, models
+
+from backend.config import get_settings
+from backend.core.logging import get_logger
+from backend.services.code_search import SPARSE_VECTOR_NAME, encode_sparse_documents, sparse_vectors_config
+from backend.services.embedding_cache import EmbeddingCache, chunk_hash
+
+logger = get_logger(__name__)
+
+EmbedFn = Callable[[str, Sequence[str]], List[List[float]]]
+BatchCallback = Callable[[List["IndexDocument"], bool], Awaitable[None]]
+
+_embedding_executor: Optional[ProcessPoolExecutor] = None
+
+# Embedding models loaded inside a pool worker process, keyed by model name
+_worker_models: Dict[str, Any] = {}
+
+
+def fastembed_vector_name(model_name: str) -> str:
+    """Name of the vector FastEmbed (and mcp-server-qdrant) use for `model_name`."""
+    return f"fast-{model_name.split('/')[-1].lower()}"
+
+
+def embed_documents(model_name: str, texts: Sequence[str]) -> List[List[float]]:
+    """Embed `texts` with FastEmbed. Runs inside a pool worker; the model is loaded once per process."""
+    model = _worker_models.get(model_name)
+    if model is None:
+        from fastembed import TextEmbedding
+        model = TextEmbedding(model_name=model_name)
+        _worker_models[model_name] = model
+    return [vector.tolist() for vector in model.embed(list(texts))]
+
+
+def get_embedding_executor() -> ProcessPoolExecutor:
+    """Process pool shared by all indexing runs (created lazily)."""
+    global _embedding_executor
+    if _embedding_executor is None:
+        workers = max(1, get_settings().git_index_embed_workers)
+        # spawn: forking a process that runs an event loop and threads is unsafe
+        _embedding_executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        logger.info(f"Started embedding process pool with {workers} workers")
+    return _embedding_executor
+
+
+def shutdown_embedding_executor() -> None:
+    """Stop the shared embedding process pool (application shutdown)."""
+    global _embedding_executor
+    if _embedding_executor is not None:
+        _embedding_executor.shutdown(wait=False, cancel_futures=True)
+        _embedding_executor = None
+        logger.info("Embedding process pool shut down")
+
+
+@dataclass
+class IndexDocument:
+    """One point to write: its deterministic ID, the text to embed and the payload metadata."""
+    id: str
+    text: str
+    metadata: Dict[str, Any]
+
+
+@dataclass
+class IndexingStats:
+    documents: int = 0
+    batches: int = 0
+    failed: List[IndexDocument] = field(default_factory=list)
+    elapsed: float = 0.0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    cancelled: bool = False
+
+    @property
+    def docs_per_sec(self) -> float:
+        return self.documents / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def cache_hit_ratio(self) -> float:
+        lookups = self.cache_hits + self.cache_misses
+        return self.cache_hits / lookups if lookups else 0.0
+
+
+class EmbeddingUpsertPipeline:
+    """Embeds documents in a process pool and upserts them with bounded concurrency."""
+
+    def __init__(
+        self,
+        qdrant_client: AsyncQdrantClient,
+        collection_name: str,
+        model_name: str,
+        batch_size: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        embed_fn: EmbedFn = embed_documents,
+        executor: Optional[Executor] = None,
+        cache: Optional[EmbeddingCache] = None,
+        on_batch_done: Optional["BatchCallback"] = None,
+        cancel_event: Optional[asyncio.Event] = None,
+        sparse: bool = True,
+        log_prefix: str = "",
+    ):
+        settings = get_settings()
+        self.qdrant_client = qdrant_client
+        self.collection_name = collection_name
+        self.model_name = model_name
+        self.vector_name = fastembed_vector_name(model_name)
+        self.batch_size = max(1, batch_size or settings.git_index_batch_size)
+        self.max_in_flight = max(1, max_in_flight or settings.git_index_max_in_flight)
+        self.embed_fn = embed_fn
+        self.executor = executor
+        self.cache = cache
+        self.on_batch_done = on_batch_done
+        self.cancel_event = cancel_event
+        self.sparse = sparse
+        self.log_prefix = log_prefix
+        self._collection_ready = False
+        self._collection_lock = asyncio.Lock()
+
+    async def run(self, documents: Union[Iterable[IndexDocument], AsyncIterable[IndexDocument]]) -> IndexingStats:
+        """
+        Embed and upsert all `documents`; failed batches are reported in the stats, not raised.
+        `on_batch_done(batch, ok)` is awaited after each batch. Once `cancel_event` is set no
+        further batches are started; in-flight ones finish and `stats.cancelled` is set.
+        """
+        stats = IndexingStats()
+        started = time.monotonic()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_in_flight)
+
+        async def producer() -> None:
+            batch: List[IndexDocument] = []
+            try:
+                async for document in _aiter(documents):
+                    if self.cancel_event is not None and self.cancel_event.is_set():
+                        stats.cancelled = True
+                        return
+                    batch.append(document)
+                    if len(batch) >= self.batch_size:
+                        await queue.put(batch)
+                        batch = []
+                if batch:
+                    await queue.put(batch)
+            finally:
+                for _ in range(self.max_in_flight):
+                    await queue.put(None)
+
+        async def worker() -> None:
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    return
+                ok = True
+                try:
+                    await self._embed_and_upsert(batch, stats)
+                    stats.documents += len(batch)
+                except Exception as e:
+                    logger.error(f"{self.log_prefix} Failed to index batch of {len(batch)} documents: {e}", exc_info=True)
+                    stats.failed.extend(batch)
+                    ok = False
+                stats.batches += 1
+                if self.on_batch_done is not None:
+                    # A dead worker would leave the producer blocked on the bounded queue
+                    try:
+                        await self.on_batch_done(batch, ok)
+                    except Exception as e:
+                        logger.error(f"{self.log_prefix} Batch completion callback failed: {e}", exc_info=True)
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.max_in_flight)]
+        try:
+            await producer()
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+
+        stats.elapsed = time.monotonic() - started
+        logger.info(
+            f"{self.log_prefix} Indexed {stats.documents} documents in {stats.batches} batches "
+            f"({len(stats.failed)} failed) in {stats.elapsed:.1f}s ({stats.docs_per_sec:.1f} docs/sec)"
+            + (f", embedding cache hit ratio {stats.cache_hit_ratio:.0%} ({stats.cache_hits}/{stats.cache_hits + stats.cache_misses})" if self.cache else "")
+        )
+        return stats
+
+    async def _embed_and_upsert(self, batch: List[IndexDocument], stats: IndexingStats) -> None:
+        if self.sparse:
+            vectors, sparse_vectors = await asyncio.gather(
+                self._embed(batch, stats),
+                asyncio.to_thread(encode_sparse_documents, [d.text for d in batch]),
+            )
+        else:
+            vectors, sparse_vectors = await self._embed(batch, stats), [None] * len(batch)
+        if vectors:
+            await self._ensure_collection(len(vectors[0]))
+        points = []
+        for document, vector, sparse_vector in zip(batch, vectors, sparse_vectors):
+            named_vectors: Dict[str, Any] = {self.vector_name: vector}
+            if sparse_vector is not None and sparse_vector.indices:
+                named_vectors[SPARSE_VECTOR_NAME] = sparse_vector
+            points.append(models.PointStruct(
+                id=document.id,
+                vector=named_vectors,
+                payload={"document": document.text, **document.metadata},
+            ))
+        await self.qdrant_client.upsert(collection_name=self.collection_name, points=points)
+
+    async def _embed(self, batch: List[IndexDocument], stats: IndexingStats) -> List[List[float]]:
+        """Vectors for `batch`, from the cache where possible; only misses go to the process pool."""
+        loop = asyncio.get_running_loop()
+        executor = self.executor if self.executor is not None else get_embedding_executor()
+        texts = [d.text for d in batch]
+        if self.cache is None:
+            return await loop.run_in_executor(executor, self.embed_fn, self.model_name, texts)
+
+        hashes = [chunk_hash(text) for text in texts]
+        try:
+            cached = await asyncio.to_thread(self.cache.get_many, self.model_name, hashes)
+        except Exception as e:
+            logger.warning(f"{self.log_prefix} Embedding cache lookup failed: {e}")
+            cached = {}
+        missing = [i for i, h in enumerate(hashes) if h not in cached]
+        stats.cache_hits += len(batch) - len(missing)
+        stats.cache_misses += len(missing)
+
+        if missing:
+            embedded = await loop.run_in_executor(executor, self.embed_fn, self.model_name, [texts[i] for i in missing])
+            fresh = {hashes[i]: vector for i, vector in zip(missing, embedded)}
+            try:
+                await asyncio.to_thread(self.cache.put_many, self.model_name, fresh)
+            except Exception as e:
+                logger.warning(f"{self.log_prefix} Failed to store embeddings in cache: {e}")
+            cached = {**cached, **fresh}
+        return [cached[h] for h in hashes]
+
+    async def _ensure_collection(self, dimension: int) -> None:
+        """Create the collection with FastEmbed's named-vector layout (plus the sparse vector) if it does not exist yet."""
+        if self._collection_ready:
+            return
+        async with self._collection_lock:
+            if self._collection_ready:
+                return
+            if not await self.qdrant_client.collection_exists(collection_name=self.collection_name):
+                await self.qdrant_client.create_collection(
+                    collection_name=self.collection_name,
+                    vectors_config={
+                        self.vector_name: models.VectorParams(size=dimension, distance=models.Distance.COSINE)
+                    },
+                    sparse_vectors_config=sparse_vectors_config() if self.sparse else None,
+                )
+                logger.info(f"{self.log_prefix} Created collection '{self.collection_name}' ({self.vector_name}, dim={dimension})")
+            self._collection_ready = True
+
+
+async def _aiter(items: Union[Iterable[Any], AsyncIterable[Any]]):
+    if hasattr(items, "__aiter__"):
+        async for item in items:  # type: ignore[union-attr]
+            yield item
+    else:
+        for item in items:  # type: ignore[union-attr]
+            yield item
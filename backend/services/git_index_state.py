@@ -0,0 +1,217 @@
+"""
+Index state for incremental re-indexing of git_repo connections.
+
+Each git_repo connection keeps a small JSON manifest next to the other local
+data files recording what was last written to its Qdrant collection: the commit
+SHA that was indexed, the embedding model used and a sha256 per file path. On a
+refresh the indexer compares the freshly ingested files against the manifest and
+only re-embeds files whose hash changed, deletes the points of removed files and
+leaves everything else untouched.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from backend.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Namespace for deterministic Qdrant point IDs of indexed git content
+GIT_INDEX_POINT_NAMESPACE = uuid.UUID("5b6f0e0c-9a1d-4c1e-8f43-2f1b7d0a6c11")
+
+# Bump when the point layout changes (e.g. chunking) so existing indexes are rebuilt
+# 1: one point per file; 2: code-aware chunks; 3: BM25 sparse vectors for hybrid search
+INDEX_FORMAT_VERSION = 3
+
+
+def hash_file_content(content: str) -> str:
+    """sha256 hex digest of a file's text content."""
+    return hashlib.sha256(content.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+
+def file_point_id(connection_id: str, file_path: str, chunk_index: int = 0) -> str:
+    """Deterministic point ID for a chunk of a file, so re-adding it overwrites in place."""
+    return str(uuid.uuid5(GIT_INDEX_POINT_NAMESPACE, f"{connection_id}:{file_path}:{chunk_index}"))
+
+
+class GitIndexState(BaseModel):
+    """What was last indexed into a git_repo connection's collection."""
+    connection_id: str
+    repo_url: str
+    collection_name: str
+    embedding_model: str
+    commit_sha: Optional[str] = None
+    file_hashes: Dict[str, str] = Field(default_factory=dict)
+    indexed_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    format_version: int = 1
+
+    def is_compatible_with(self, repo_url: str, collection_name: str, embedding_model: str) -> bool:
+        """False if the connection was re-pointed, the embedding model or the point layout changed (needs a full rebuild)."""
+        return (
+            self.format_version == INDEX_FORMAT_VERSION
+            and self.repo_url == repo_url
+            and self.collection_name == collection_name
+            and self.embedding_model == embedding_model
+        )
+
+
+@dataclass
+class GitIndexDiff:
+    """Per-file differences between the indexed manifest and the current repository contents."""
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def to_embed(self) -> List[str]:
+        return self.added + self.changed
+
+    @property
+    def to_delete(self) -> List[str]:
+        """Files whose existing points must be dropped before (re)adding."""
+        return self.changed + self.removed
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.added or self.changed or self.removed)
+
+
+def diff_file_hashes(previous: Dict[str, str], current: Dict[str, str]) -> GitIndexDiff:
+    """Compare two {file_path: sha256} maps."""
+    diff = GitIndexDiff()
+    for path, digest in current.items():
+        old_digest = previous.get(path)
+        if old_digest is None:
+            diff.added.append(path)
+        elif old_digest != digest:
+            diff.changed.append(path)
+        else:
+            diff.unchanged += 1
+    diff.removed = [path for path in previous if path not in current]
+    diff.added.sort()
+    diff.changed.sort()
+    diff.removed.sort()
+    return diff
+
+
+class GitIndexCheckpoint:
+    """
+    Tracks which files of a running index have all their chunks upserted, so a
+    partial manifest can be written as a resume point. Chunks of one file may be
+    spread over several batches that finish out of order. Files are registered
+    with `expect` as they are chunked, before their chunks are queued.
+    """
+
+    def __init__(self, base_hashes: Dict[str, str], current_hashes: Dict[str, str], chunks_per_file: Optional[Dict[str, int]] = None):
+        self._base = dict(base_hashes)
+        self._current = current_hashes
+        self._remaining: Dict[str, int] = {}
+        self.expected: set = set()
+        self.done: set = set()
+        self.failed: set = set()
+        for path, count in (chunks_per_file or {}).items():
+            self.expect(path, count)
+
+    def expect(self, file_path: str, chunk_count: int) -> None:
+        """Register a file about to be indexed with `chunk_count` chunks."""
+        self.expected.add(file_path)
+        if chunk_count > 0:
+            self._remaining[file_path] = chunk_count
+        else:
+            # Files without chunks (e.g. whitespace only) are complete right away
+            self.done.add(file_path)
+
+    def record(self, file_paths: List[Optional[str]], ok: bool) -> None:
+        """Account for one finished batch given the file_path of each of its documents."""
+        for path in file_paths:
+            if path is None or path not in self._remaining:
+                continue
+            if not ok:
+                self.failed.add(path)
+            self._remaining[path] -= 1
+            if self._remaining[path] == 0:
+                del self._remaining[path]
+                if path not in self.failed:
+                    self.done.add(path)
+
+    def file_hashes(self) -> Dict[str, str]:
+        """Manifest hashes: the untouched base plus every fully indexed file."""
+        hashes = dict(self._base)
+        hashes.update({path: self._current[path] for path in self.done if path in self._current})
+        return hashes
+
+
+class GitIndexStateStore:
+    """Stores one GitIndexState JSON file per connection under `base_dir`."""
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+
+    def _path(self, connection_id: str) -> str:
+        safe_id = "".join(c for c in str(connection_id) if c.isalnum() or c in "-_")
+        return os.path.join(self.base_dir, f"{safe_id}.json")
+
+    def load(self, connection_id: str) -> Optional[GitIndexState]:
+        path = self._path(connection_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return GitIndexState.model_validate(json.load(f))
+        except Exception as e:
+            # A corrupt manifest only costs a full re-index
+            logger.warning(f"Ignoring unreadable git index state at {path}: {e}")
+            return None
+
+    def save(self, state: GitIndexState) -> None:
+        os.makedirs(self.base_dir, exist_ok=True)
+        path = self._path(state.connection_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(state.model_dump_json())
+        os.replace(tmp_path, path)
+
+    def delete(self, connection_id: str) -> None:
+        try:
+            os.remove(self._path(connection_id))
+        except FileNotFoundError:
+            pass
+
+
+async def resolve_remote_head(repo_url: str, timeout: float = 30.0) -> Optional[str]:
+    """Commit SHA of the remote's HEAD via `git ls-remote`, or None if it cannot be determined."""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            "git", "ls-remote", repo_url, "HEAD",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env={**os.environ, "GIT_TERMINAL_PROMPT": "0"},
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            logger.warning(f"git ls-remote timed out for {repo_url}")
+            return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not run git ls-remote for {repo_url}: {e}")
+        return None
+
+    if proc.returncode != 0:
+        logger.warning(f"git ls-remote failed for {repo_url}: {stderr.decode(errors='replace').strip()}")
+        return None
+    first_line = stdout.decode(errors="replace").strip().splitlines()[:1]
+    if not first_line:
+        return None
+    sha = first_line[0].split()[0]
+    return sha if len(sha) >= 40 else None
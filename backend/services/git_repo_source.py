@@ -0,0 +1,293 @@
+"""
+Streaming access to the files of a git repository for indexing.
+
+`gitingest.ingest_async` returns the whole repository as one string (summary,
+tree and every file body), so indexing a large repository held all of it in
+memory at once, several times over while it was split into files.
+
+A RepoSource instead yields files one at a time:
+  * CloneRepoSource walks a shallow `git clone` on disk; file bodies are read
+    only when they are hashed or chunked and dropped right after.
+  * IngestedRepoSource wraps gitingest output and is only used when cloning is
+    not possible (no git binary, unusual URL). Its string form is parsed
+    line by line instead of with a whole-text regex.
+
+Both apply the same filters: files above `git_index_max_file_bytes`, binary
+files and the usual vendored/build directories are skipped.
+"""
+
+import asyncio
+import os
+import shutil
+import tempfile
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+from gitingest import ingest_async
+
+from backend.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Directories never worth indexing (VCS metadata, dependencies, build output)
+EXCLUDED_DIRS: FrozenSet[str] = frozenset({
+    ".git", ".hg", ".svn", "node_modules", "bower_components", "vendor", "__pycache__",
+    ".venv", "venv", ".tox", ".mypy_cache", ".pytest_cache", "dist", "build", "target", ".next",
+})
+
+# Bytes sniffed at the start of a file to decide whether it is binary
+_BINARY_SNIFF_BYTES = 8192
+_TEXT_CONTROL_BYTES = {7, 8, 9, 10, 12, 13, 27}
+
+
+def is_probably_binary(sample: bytes) -> bool:
+    """Heuristic used by git and most editors: NUL bytes or mostly non-text control bytes."""
+    if not sample:
+        return False
+    if b"\x00" in sample:
+        return True
+    control = sum(1 for b in sample if b < 32 and b not in _TEXT_CONTROL_BYTES)
+    return control / len(sample) > 0.3
+
+
+def read_text_file(path: str, max_bytes: int) -> Optional[str]:
+    """The file's text, or None if it is too large, binary or unreadable."""
+    try:
+        if os.path.getsize(path) > max_bytes:
+            return None
+        with open(path, "rb") as f:
+            data = f.read(max_bytes + 1)
+    except OSError:
+        return None
+    if len(data) > max_bytes or is_probably_binary(data[:_BINARY_SNIFF_BYTES]):
+        return None
+    return data.decode("utf-8", errors="replace")
+
+
+def iter_repo_paths(root: str, max_bytes: int, excluded_dirs: FrozenSet[str] = EXCLUDED_DIRS) -> Iterator[str]:
+    """Relative POSIX paths of regular files under `root` within the size limit, in a stable order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in excluded_dirs and not os.path.islink(os.path.join(dirpath, d)))
+        for name in sorted(filenames):
+            full_path = os.path.join(dirpath, name)
+            try:
+                if os.path.islink(full_path) or not os.path.isfile(full_path) or os.path.getsize(full_path) > max_bytes:
+                    continue
+            except OSError:
+                continue
+            yield os.path.relpath(full_path, root).replace(os.sep, "/")
+
+
+def iter_gitingest_files(lines: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """
+    Parse gitingest's text digest line by line, yielding (path, content) per file.
+    A file starts after a header of a '====' rule, a 'FILE: <path>' line and
+    another rule (or a '==== FILE: <path>' line followed by a rule).
+    """
+    path: Optional[str] = None
+    body: List[str] = []
+    window: List[str] = []  # trailing lines that may still turn out to be a header
+
+    for line in lines:
+        window.append(line)
+        header_len, header_path = _match_header(window)
+        if header_len:
+            body.extend(window[:-header_len])
+            content = "".join(body).strip()
+            if path and content:
+                yield path, content
+            path, body, window = header_path, [], []
+        elif len(window) > 2:
+            body.append(window.pop(0))
+
+    body.extend(window)
+    content = "".join(body).strip()
+    if path and content:
+        yield path, content
+
+
+def _is_rule(text: str) -> bool:
+    text = text.strip()
+    return len(text) >= 4 and set(text) == {"="}
+
+
+def _match_header(window: List[str]) -> Tuple[int, Optional[str]]:
+    """(number of header lines, path) if `window` ends with a file header, else (0, None)."""
+    if len(window) >= 3 and _is_rule(window[-3]) and window[-2].strip().startswith("FILE:") and _is_rule(window[-1]):
+        return 3, window[-2].strip()[len("FILE:"):].strip() or None
+    if len(window) >= 2 and _is_rule(window[-1]):
+        prefix, sep, rest = window[-2].strip().partition("FILE:")
+        path = rest.strip().rstrip("=").strip()
+        if sep and _is_rule(prefix) and path:
+            return 2, path
+    return 0, None
+
+
+def render_tree(paths: Iterable[str]) -> str:
+    """Indented directory listing of `paths` (sorted), in the spirit of gitingest's tree."""
+    lines: List[str] = []
+    previous: List[str] = []
+    for path in sorted(paths):
+        parts = path.split("/")
+        common = 0
+        while common < min(len(previous), len(parts) - 1) and previous[common] == parts[common]:
+            common += 1
+        for depth in range(common, len(parts) - 1):
+            lines.append(f"{'    ' * depth}{parts[depth]}/")
+        lines.append(f"{'    ' * (len(parts) - 1)}{parts[-1]}")
+        previous = parts[:-1]
+    return "\n".join(lines)
+
+
+class RepoSource:
+    """Files of one repository revision, readable one at a time."""
+
+    commit_sha: Optional[str] = None
+
+    def iter_paths(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def read_file(self, path: str) -> Optional[str]:
+        """Text of `path`, or None if it is filtered out (binary, too large) or missing."""
+        raise NotImplementedError
+
+    def iter_files(self, paths: Iterable[str]) -> Iterator[Tuple[str, str]]:
+        """(path, content) for each of `paths` that is indexable."""
+        for path in sorted(set(paths)):
+            content = self.read_file(path)
+            if content:
+                yield path, content
+
+    def hash_files(self, hash_fn: Callable[[str], str]) -> Dict[str, str]:
+        """{path: hash_fn(content)} for every indexable file, reading one file at a time."""
+        return {path: hash_fn(content) for path, content in self.iter_files(self.iter_paths()) if content.strip()}
+
+    def summary(self) -> str:
+        raise NotImplementedError
+
+    def tree(self) -> str:
+        raise NotImplementedError
+
+    def raw_text(self) -> Optional[str]:
+        """Digest text that could not be split into files, to be indexed as raw chunks."""
+        return None
+
+
+class CloneRepoSource(RepoSource):
+    """A shallow clone on disk."""
+
+    def __init__(self, root: str, repo_url: str, commit_sha: Optional[str], max_file_bytes: int):
+        self.root = root
+        self.repo_url = repo_url
+        self.commit_sha = commit_sha
+        self.max_file_bytes = max_file_bytes
+
+    def iter_paths(self) -> Iterator[str]:
+        return iter_repo_paths(self.root, self.max_file_bytes)
+
+    def read_file(self, path: str) -> Optional[str]:
+        full_path = os.path.realpath(os.path.join(self.root, path))
+        if not full_path.startswith(os.path.realpath(self.root) + os.sep):
+            return None
+        return read_text_file(full_path, self.max_file_bytes)
+
+    def summary(self) -> str:
+        count = sum(1 for _ in self.iter_paths())
+        return f"Repository: {self.repo_url}\nCommit: {self.commit_sha or 'unknown'}\nFiles analyzed: {count}\n"
+
+    def tree(self) -> str:
+        return render_tree(self.iter_paths())
+
+
+class IngestedRepoSource(RepoSource):
+    """Fallback over gitingest output: a dict of files or its text digest."""
+
+    def __init__(self, summary: str, tree: str, content: Any, max_file_bytes: int):
+        self._summary = summary
+        self._tree = tree
+        self.content = content
+        self.max_file_bytes = max_file_bytes
+
+    def _iter_all(self) -> Iterator[Tuple[str, str]]:
+        if isinstance(self.content, dict):
+            items: Iterable[Tuple[str, str]] = self.content.items()
+        elif isinstance(self.content, str):
+            items = iter_gitingest_files(self.content.splitlines(keepends=True))
+        else:
+            items = ()
+        for path, text in items:
+            if text and len(text.encode("utf-8", errors="replace")) <= self.max_file_bytes and "\x00" not in text[:_BINARY_SNIFF_BYTES]:
+                yield path, text
+
+    def iter_paths(self) -> Iterator[str]:
+        return (path for path, _ in self._iter_all())
+
+    def read_file(self, path: str) -> Optional[str]:
+        return next((text for p, text in self._iter_all() if p == path), None)
+
+    def iter_files(self, paths: Iterable[str]) -> Iterator[Tuple[str, str]]:
+        # One pass over the digest instead of one parse per file
+        wanted = set(paths)
+        return ((path, text) for path, text in self._iter_all() if path in wanted)
+
+    def summary(self) -> str:
+        return self._summary or ""
+
+    def tree(self) -> str:
+        return self._tree or ""
+
+    def raw_text(self) -> Optional[str]:
+        if isinstance(self.content, str) and self.content.strip() and next(self.iter_paths(), None) is None:
+            return self.content.strip()
+        return None
+
+
+async def clone_repository(repo_url: str, dest: str, timeout: float = 600.0) -> Optional[str]:
+    """Shallow-clone the default branch of `repo_url` into `dest`. Returns the HEAD SHA; raises on failure."""
+    env = {**os.environ, "GIT_TERMINAL_PROMPT": "0", "GIT_LFS_SKIP_SMUDGE": "1"}
+    await _run_git(["clone", "--depth", "1", "--single-branch", "--no-tags", "--quiet", repo_url, dest], env, timeout)
+    stdout = await _run_git(["-C", dest, "rev-parse", "HEAD"], env, 30.0)
+    sha = stdout.strip()
+    return sha if len(sha) >= 40 else None
+
+
+async def _run_git(args: List[str], env: Dict[str, str], timeout: float) -> str:
+    proc = await asyncio.create_subprocess_exec(
+        "git", *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        env=env,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise RuntimeError(f"git {args[0]} timed out after {timeout:.0f}s")
+    if proc.returncode != 0:
+        raise RuntimeError(f"git {args[0]} failed: {stderr.decode(errors='replace').strip()}")
+    return stdout.decode(errors="replace")
+
+
+@asynccontextmanager
+async def open_repo_source(repo_url: str, max_file_bytes: int, work_dir: Optional[str] = None, log_prefix: str = "") -> AsyncIterator[RepoSource]:
+    """
+    A RepoSource for the current default branch of `repo_url`: a temporary
+    shallow clone (removed on exit), or gitingest output if cloning fails.
+    """
+    if work_dir:
+        os.makedirs(work_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix="git-index-", dir=work_dir)
+    try:
+        clone_dir = os.path.join(tmp_dir, "repo")
+        try:
+            commit_sha = await clone_repository(repo_url, clone_dir)
+            logger.info(f"{log_prefix} Cloned {repo_url} at {commit_sha} for streaming ingestion")
+            source: RepoSource = CloneRepoSource(clone_dir, repo_url, commit_sha, max_file_bytes)
+        except (OSError, RuntimeError) as e:
+            logger.warning(f"{log_prefix} Shallow clone failed ({e}); falling back to gitingest")
+            summary, tree, content = await ingest_async(repo_url, max_file_size=max_file_bytes)
+            source = IngestedRepoSource(summary, tree, content, max_file_bytes)
+        yield source
+    finally:
+        await asyncio.to_thread(shutil.rmtree, tmp_dir, True)
@@ -0,0 +1,195 @@
+"""
+Shared HTTP Client
+
+Provides a single, process-wide pooled ``httpx.AsyncClient`` used for every
+outbound LLM request (OpenRouter via pydantic-ai providers and the raw media
+describer calls). Re-using one client keeps TLS sessions and keep-alive
+connections warm across agents, steps and investigations instead of paying
+a fresh handshake for every model construction.
+
+The transport adds:
+  * retries with exponential, jittered backoff for failures that cannot have
+    reached the server (connect errors, 429) and, for idempotent methods only,
+    for dropped connections and transient status codes (502 / 503 / 504). A
+    POST that may have been processed (e.g. a chat completion) is not re-sent.
+    Clients built on top of this transport (see ``get_openrouter_provider``)
+    disable their own retries so attempts do not multiply.
+  * a per-host concurrency cap so one busy upstream cannot monopolise the pool
+"""
+
+import asyncio
+import logging
+import random
+from typing import Dict, Optional
+
+import httpx
+
+from backend.config import get_settings
+
+http_client_logger = logging.getLogger("services.http_client")
+
+RETRYABLE_STATUS_CODES = frozenset({429, 502, 503, 504})
+# Statuses and errors meaning the request was not processed: retried for every method
+UNPROCESSED_STATUS_CODES = frozenset({429})
+PRE_SEND_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout)
+RETRYABLE_EXCEPTIONS = PRE_SEND_EXCEPTIONS + (
+    httpx.RemoteProtocolError,  # Typically a stale keep-alive connection closed by the server
+)
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE"})
+MAX_BACKOFF_SECONDS = 10.0
+
+_shared_client: Optional[httpx.AsyncClient] = None
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Wraps a response stream so the per-host slot is released once the body is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, semaphore: asyncio.Semaphore):
+        self._stream = stream
+        self._semaphore = semaphore
+        self._released = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._semaphore.release()
+
+
+class RetryingTransport(httpx.AsyncBaseTransport):
+    """
+    Async transport adding jittered retries and per-host concurrency limits
+    on top of a pooled ``httpx.AsyncHTTPTransport``.
+    """
+
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        per_host_concurrency: int = 16,
+    ):
+        self._transport = transport
+        self._max_retries = max(0, max_retries)
+        self._backoff_base = backoff_base
+        self._per_host_concurrency = max(1, per_host_concurrency)
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore_for(self, host: str) -> asyncio.Semaphore:
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self._per_host_concurrency)
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    def _backoff_delay(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """Full-jitter exponential backoff, honouring a numeric Retry-After header when present."""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return min(float(retry_after), MAX_BACKOFF_SECONDS)
+                except ValueError:
+                    pass
+        ceiling = min(self._backoff_base * (2 ** attempt), MAX_BACKOFF_SECONDS)
+        return random.uniform(0, ceiling)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        semaphore = self._semaphore_for(request.url.host)
+        await semaphore.acquire()
+        idempotent = request.method in IDEMPOTENT_METHODS
+        retryable_exceptions = RETRYABLE_EXCEPTIONS if idempotent else PRE_SEND_EXCEPTIONS
+        retryable_statuses = RETRYABLE_STATUS_CODES if idempotent else UNPROCESSED_STATUS_CODES
+        try:
+            attempt = 0
+            while True:
+                try:
+                    response = await self._transport.handle_async_request(request)
+                except retryable_exceptions as e:
+                    if attempt >= self._max_retries:
+                        raise
+                    delay = self._backoff_delay(attempt)
+                    http_client_logger.warning(
+                        f"{type(e).__name__} calling {request.url.host}; retrying in {delay:.2f}s "
+                        f"(attempt {attempt + 1}/{self._max_retries})"
+                    )
+                else:
+                    if response.status_code not in retryable_statuses or attempt >= self._max_retries:
+                        if response.is_closed:
+                            # Body was already fully read (e.g. in-memory responses); free the slot now.
+                            semaphore.release()
+                        else:
+                            response.stream = _ReleasingStream(response.stream, semaphore)
+                        return response
+                    delay = self._backoff_delay(attempt, response)
+                    await response.aclose()
+                    http_client_logger.warning(
+                        f"HTTP {response.status_code} from {request.url.host}; retrying in {delay:.2f}s "
+                        f"(attempt {attempt + 1}/{self._max_retries})"
+                    )
+                attempt += 1
+                await asyncio.sleep(delay)
+        except BaseException:
+            semaphore.release()
+            raise
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _build_client() -> httpx.AsyncClient:
+    settings = get_settings()
+    http2 = settings.http2_enabled and _http2_available()
+    if settings.http2_enabled and not http2:
+        http_client_logger.warning("HTTP/2 requested but the 'h2' package is not installed; falling back to HTTP/1.1.")
+
+    limits = httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry,
+    )
+    transport = RetryingTransport(
+        httpx.AsyncHTTPTransport(http2=http2, limits=limits),
+        max_retries=settings.http_max_retries,
+        backoff_base=settings.http_retry_backoff_base,
+        per_host_concurrency=settings.http_per_host_concurrency,
+    )
+    http_client_logger.info(
+        f"Created shared HTTP client (http2={http2}, max_connections={settings.http_max_connections}, "
+        f"per_host_concurrency={settings.http_per_host_concurrency}, max_retries={settings.http_max_retries})"
+    )
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(settings.http_timeout, connect=10.0),
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the shared pooled AsyncClient, creating it on first use."""
+    global _shared_client
+    if _shared_client is None or _shared_client.is_closed:
+        _shared_client = _build_client()
+    return _shared_client
+
+
+async def close_http_client() -> None:
+    """Close the shared client and its pooled connections (called on app shutdown)."""
+    global _shared_client
+    if _shared_client is not None and not _shared_client.is_closed:
+        await _shared_client.aclose()
+        http_client_logger.info("Shared HTTP client closed")
+    _shared_client = None
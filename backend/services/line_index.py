@@ -0,0 +1,424 @@
+"""
+Line-offset index for large (log) files.
+
+Reading line N of a multi-GB log, or the lines logged between two times, should
+not mean reading the file from the top. A `LineIndex` records the byte offset of
+every ``stride``-th line start, so any line is one seek plus at most ``stride``
+lines of scanning away. Indexes of large files are saved under
+``filesystem_line_index_dir`` and survive restarts. A file that only grew since
+(a log being appended to) has its index extended from where it stopped. A
+rotated, truncated or rewritten file is indexed again.
+
+The functions below use it for the filesystem tools: a line range, the last N
+lines, the lines between two timestamps (binary search over the indexed lines)
+and regex matches with surrounding lines.
+"""
+
+import hashlib
+import mmap
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from backend.config import get_settings
+from backend.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+READ_CHUNK_BYTES = 8 * 1024 * 1024
+HEAD_CHECK_BYTES = 4096  # a file whose first bytes changed was replaced, not appended to
+MAX_LINE_CHARS = 500  # longer lines are cut in tool output
+TIMESTAMP_SCAN_LINES = 256  # lines read after an indexed line to find a timestamp
+
+_line_index_cache: Optional["LineIndexCache"] = None
+
+_MONTHS = {m: i for i, m in enumerate(["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], 1)}
+_ISO_TIMESTAMP = re.compile(
+    rb"(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:[.,](\d{1,9}))?\s?(Z|[+-]\d{2}:?\d{2})?"
+)
+_CLF_TIMESTAMP = re.compile(rb"(\d{2})/([A-Za-z]{3})/(\d{4}):(\d{2}):(\d{2}):(\d{2})(?: ([+-]\d{4}))?")  # access logs
+
+
+@dataclass
+class LineIndex:
+    """Offsets of lines 1, 1 + stride, 1 + 2 * stride, ... of a file, as of `size` bytes."""
+    path: str
+    stride: int
+    inode: int = 0
+    size: int = 0  # bytes indexed
+    mtime_ns: int = 0
+    head_sha: str = ""
+    newlines: int = 0  # newline characters in the indexed bytes
+    ends_with_newline: bool = True
+    checkpoints: np.ndarray = field(default_factory=lambda: np.zeros(1, dtype=np.uint64))
+
+    @property
+    def line_count(self) -> int:
+        return self.newlines + (0 if self.ends_with_newline or self.size == 0 else 1)
+
+    def seek_point(self, line: int) -> Tuple[int, int]:
+        """(line number, offset) of the indexed line at or before `line` (1-based)."""
+        slot = min((max(line, 1) - 1) // self.stride, len(self.checkpoints) - 1)
+        return slot * self.stride + 1, int(self.checkpoints[slot])
+
+
+def _head_sha(f, length: int) -> str:
+    f.seek(0)
+    return hashlib.sha256(f.read(min(length, HEAD_CHECK_BYTES))).hexdigest()
+
+
+def _extend(index: LineIndex, f, size: int) -> None:
+    """Index the bytes between `index.size` and `size`."""
+    f.seek(index.size)
+    position = index.size
+    new_checkpoints: List[np.ndarray] = []
+    last_byte = b"\n" if index.ends_with_newline else b""
+    while position < size:
+        chunk = f.read(min(READ_CHUNK_BYTES, size - position))
+        if not chunk:
+            break
+        newline_positions = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == 10)
+        if len(newline_positions):
+            # The newline numbered n (1-based) starts line n + 1, a checkpoint when n is a multiple of stride
+            numbers = np.arange(index.newlines + 1, index.newlines + 1 + len(newline_positions))
+            at_stride = (numbers % index.stride) == 0
+            if at_stride.any():
+                new_checkpoints.append(newline_positions[at_stride].astype(np.uint64) + np.uint64(position + 1))
+            index.newlines += len(newline_positions)
+        position += len(chunk)
+        last_byte = chunk[-1:]
+    if new_checkpoints:
+        index.checkpoints = np.concatenate([index.checkpoints, *new_checkpoints])
+    index.size = position
+    index.ends_with_newline = last_byte == b"\n"
+
+
+class LineIndexCache:
+    """Line indexes of recently used files, in memory and (for large files) on disk."""
+
+    def __init__(self, base_dir: str, stride: int = 1024, persist_min_bytes: int = 16 * 1024 * 1024, memory_entries: int = 64):
+        self.base_dir = Path(base_dir)
+        self.stride = stride
+        self.persist_min_bytes = persist_min_bytes
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, LineIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._path_locks: Dict[str, threading.Lock] = {}
+
+    def _disk_path(self, real_path: str) -> Path:
+        key = hashlib.sha256(real_path.encode("utf-8")).hexdigest()
+        return self.base_dir / key[:2] / f"{key}.npz"
+
+    def get(self, path: str) -> LineIndex:
+        """An up-to-date index of `path`. Blocking (it may read the file)."""
+        real_path = os.path.realpath(path)
+        with self._lock:
+            path_lock = self._path_locks.setdefault(real_path, threading.Lock())
+        with path_lock:
+            with open(real_path, "rb") as f:
+                info = os.fstat(f.fileno())
+                index = self._memory.get(real_path) or self._load(real_path)
+                if index is not None and not self._still_valid(index, f, info):
+                    index = None
+                if index is None:
+                    index = LineIndex(path=real_path, stride=self.stride, inode=info.st_ino)
+                if index.size != info.st_size or index.mtime_ns != info.st_mtime_ns:
+                    index = replace(index)  # callers may still be reading the previous one
+                    _extend(index, f, info.st_size)
+                    index.mtime_ns = info.st_mtime_ns
+                    index.head_sha = _head_sha(f, index.size)
+                    if index.size >= self.persist_min_bytes:
+                        self._save(index)
+            with self._lock:
+                self._memory[real_path] = index
+                self._memory.move_to_end(real_path)
+                while len(self._memory) > self.memory_entries:
+                    self._memory.popitem(last=False)
+        return index
+
+    def _still_valid(self, index: LineIndex, f, info: os.stat_result) -> bool:
+        """Whether `index` still describes the start of the file (appends are fine)."""
+        if index.stride != self.stride or index.inode != info.st_ino or info.st_size < index.size:
+            return False
+        if info.st_size == index.size and info.st_mtime_ns == index.mtime_ns:
+            return True
+        return _head_sha(f, index.size) == index.head_sha
+
+    def _load(self, real_path: str) -> Optional[LineIndex]:
+        disk_path = self._disk_path(real_path)
+        if not disk_path.exists():
+            return None
+        try:
+            with np.load(disk_path, allow_pickle=False) as data:
+                meta = data["meta"]
+                return LineIndex(
+                    path=real_path,
+                    stride=int(meta[0]),
+                    inode=int(meta[1]),
+                    size=int(meta[2]),
+                    mtime_ns=int(meta[3]),
+                    newlines=int(meta[4]),
+                    ends_with_newline=bool(meta[5]),
+                    head_sha=str(data["head_sha"]),
+                    checkpoints=data["checkpoints"],
+                )
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable line index {disk_path}: {e}")
+            return None
+
+    def _save(self, index: LineIndex) -> None:
+        disk_path = self._disk_path(index.path)
+        try:
+            disk_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = disk_path.with_name(f"{disk_path.stem}.{os.getpid()}.tmp.npz")
+            meta = np.array(
+                [index.stride, index.inode, index.size, index.mtime_ns, index.newlines, int(index.ends_with_newline)],
+                dtype=np.int64,
+            )
+            np.savez(tmp, meta=meta, head_sha=np.array(index.head_sha), checkpoints=index.checkpoints)
+            os.replace(tmp, disk_path)
+        except OSError as e:
+            logger.warning(f"Could not save the line index of {index.path}: {e}")
+
+
+def get_line_index_cache() -> LineIndexCache:
+    """The process-wide line index cache."""
+    global _line_index_cache
+    if _line_index_cache is None:
+        settings = get_settings()
+        _line_index_cache = LineIndexCache(
+            settings.filesystem_line_index_dir,
+            stride=settings.filesystem_line_index_stride,
+            persist_min_bytes=settings.filesystem_line_index_min_mb * 1024 * 1024,
+        )
+    return _line_index_cache
+
+
+# ---------------------------------------------------------------------------
+# Reading
+# ---------------------------------------------------------------------------
+
+
+def _decode(line: bytes) -> str:
+    text = line.rstrip(b"\r\n").decode("utf-8", errors="replace")
+    return text if len(text) <= MAX_LINE_CHARS else text[:MAX_LINE_CHARS] + " [...]"
+
+
+def _iter_lines(mm: mmap.mmap, line: int, offset: int, end: Optional[int] = None) -> Iterator[Tuple[int, int, bytes]]:
+    """(line number, offset, raw line) from the line starting at `offset` up to byte `end`."""
+    end = len(mm) if end is None else end
+    while offset < end:
+        newline = mm.find(b"\n", offset, end)
+        stop = end if newline == -1 else newline + 1
+        yield line, offset, mm[offset:stop]
+        line += 1
+        offset = stop
+
+
+def _line_offset(index: LineIndex, mm: mmap.mmap, line: int) -> int:
+    """Byte offset where `line` starts (the end of the indexed bytes when past the last line)."""
+    number, offset = index.seek_point(line)
+    while number < line and offset < index.size:
+        newline = mm.find(b"\n", offset, index.size)
+        if newline == -1:
+            return index.size
+        offset = newline + 1
+        number += 1
+    return offset
+
+
+@contextmanager
+def _mapped(path: str) -> Iterator[Optional[mmap.mmap]]:
+    """The file memory-mapped (None when empty)."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield None
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
+def _count_newlines(mm: mmap.mmap, start: int, end: int) -> int:
+    count = 0
+    for chunk_start in range(start, end, READ_CHUNK_BYTES):
+        count += mm[chunk_start:min(chunk_start + READ_CHUNK_BYTES, end)].count(b"\n")
+    return count
+
+
+def read_line_range(index: LineIndex, start: int, count: int) -> List[Tuple[int, str]]:
+    """Lines `start` to `start + count - 1` (1-based)."""
+    with _mapped(index.path) as mm:
+        if mm is None:
+            return []
+        offset = _line_offset(index, mm, start)
+        lines = []
+        for number, _, raw in _iter_lines(mm, max(start, 1), offset, index.size):
+            if len(lines) >= count:
+                break
+            lines.append((number, _decode(raw)))
+        return lines
+
+
+def tail_lines(index: LineIndex, count: int) -> List[Tuple[int, str]]:
+    """The last `count` lines."""
+    return read_line_range(index, max(index.line_count - count + 1, 1), count)
+
+
+# ---------------------------------------------------------------------------
+# Timestamps
+# ---------------------------------------------------------------------------
+
+
+def parse_log_timestamp(line: bytes) -> Optional[datetime]:
+    """
+    The timestamp near the start of a log line (ISO 8601 or access-log format),
+    as naive UTC when it has an offset and as written otherwise.
+    """
+    head = line[:80]
+    match = _ISO_TIMESTAMP.search(head)
+    try:
+        if match:
+            year, month, day, hour, minute, second, fraction, zone = match.groups()
+            micro = int((fraction or b"0").decode()[:6].ljust(6, "0"))
+            parsed = datetime(int(year), int(month), int(day), int(hour), int(minute), int(second), micro)
+            offset = None if zone is None else ("+00:00" if zone == b"Z" else zone.decode())
+        else:
+            match = _CLF_TIMESTAMP.search(head)
+            if not match:
+                return None
+            day, month_name, year, hour, minute, second, zone = match.groups()
+            month = _MONTHS.get(month_name.decode().lower())
+            if month is None:
+                return None
+            parsed = datetime(int(year), month, int(day), int(hour), int(minute), int(second))
+            offset = zone.decode() if zone else None
+    except ValueError:
+        return None
+    if offset is None:
+        return parsed
+    if ":" not in offset:
+        offset = f"{offset[:3]}:{offset[3:]}"
+    return parsed.replace(tzinfo=datetime.fromisoformat(f"2000-01-01T00:00:00{offset}").tzinfo).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def parse_query_time(value: str) -> datetime:
+    """An ISO 8601 time given to a tool, normalised like `parse_log_timestamp`."""
+    parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo is None else parsed.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _timestamp_after(mm: mmap.mmap, line: int, offset: int, end: int) -> Optional[datetime]:
+    for number, _, raw in _iter_lines(mm, line, offset, end):
+        timestamp = parse_log_timestamp(raw)
+        if timestamp is not None or number - line >= TIMESTAMP_SCAN_LINES:
+            return timestamp
+    return None
+
+
+def time_window(index: LineIndex, start: datetime, end: datetime, max_lines: int) -> Tuple[List[Tuple[int, str]], bool]:
+    """
+    Lines logged between `start` and `end` (inclusive), assuming the file is in
+    time order; lines without a timestamp (e.g. stack traces) belong to the
+    previous line's. Returns the lines and whether `max_lines` cut them off.
+    """
+    with _mapped(index.path) as mm:
+        if mm is None:
+            return [], False
+        # Last indexed line logged before `start` (lines without a timestamp nearby are skipped over)
+        low, high = 0, len(index.checkpoints) - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            timestamp = _timestamp_after(mm, middle * index.stride + 1, int(index.checkpoints[middle]), index.size)
+            if timestamp is not None and timestamp >= start:
+                high = middle - 1
+            else:
+                low = middle
+        lines: List[Tuple[int, str]] = []
+        current: Optional[datetime] = None
+        for number, _, raw in _iter_lines(mm, low * index.stride + 1, int(index.checkpoints[low]), index.size):
+            current = parse_log_timestamp(raw) or current
+            if current is None or current < start:
+                continue
+            if current > end:
+                break
+            if len(lines) >= max_lines:
+                return lines, True
+            lines.append((number, _decode(raw)))
+        return lines, False
+
+
+# ---------------------------------------------------------------------------
+# Grep
+# ---------------------------------------------------------------------------
+
+
+def grep_with_context(
+    index: LineIndex,
+    query: "re.Pattern[bytes]",
+    before: int,
+    after: int,
+    max_matches: int,
+    start_line: Optional[int] = None,
+    end_line: Optional[int] = None,
+) -> Tuple[List[List[Tuple[int, str, bool]]], int]:
+    """
+    Groups of (line number, text, is_match) around the lines matching `query`,
+    overlapping groups merged, within lines `start_line`..`end_line`. Returns the
+    groups and the number of matching lines (at most `max_matches`). `query` must
+    be compiled with re.MULTILINE (see compile_query): the lines are searched as
+    one buffer first, then one at a time after each match, and anchors have to
+    mean the same in both.
+    """
+    with _mapped(index.path) as mm:
+        if mm is None:
+            return [], 0
+        first = max(start_line or 1, 1)
+        begin = _line_offset(index, mm, first)
+        stop = index.size if end_line is None else _line_offset(index, mm, end_line + 1)
+        groups: List[List[Tuple[int, str, bool]]] = []
+        matches = 0
+        line, counted_to, position = first, begin, begin
+        printed_through = first - 1  # last line number already in a group
+        while matches < max_matches and position < stop:
+            match = query.search(mm, position, stop)
+            if match is None:
+                break
+            line += _count_newlines(mm, counted_to, match.start())
+            counted_to = match.start()
+            line_start = max(mm.rfind(b"\n", begin, match.start()) + 1, begin)
+            matches += 1
+
+            # Up to `before` lines back, but not into the previous group
+            context_line, context_start = line, line_start
+            while context_line > max(line - before, printed_through + 1):
+                context_start = max(mm.rfind(b"\n", begin, context_start - 1) + 1, begin)
+                context_line -= 1
+            if groups and context_line == printed_through + 1:
+                group = groups[-1]
+            else:
+                group = []
+                groups.append(group)
+
+            # The matching line, then `after` lines (extended while they match too)
+            last_line = line + after
+            position = stop
+            for number, offset, raw in _iter_lines(mm, context_line, context_start, stop):
+                is_match = number == line or (number > line and matches < max_matches and query.search(raw) is not None)
+                if number > line and is_match:
+                    matches += 1
+                    last_line = number + after
+                group.append((number, _decode(raw), is_match))
+                printed_through = number
+                if number >= last_line:
+                    position = offset + len(raw)
+                    break
+            line, counted_to = printed_through + 1, position
+        return groups, matches
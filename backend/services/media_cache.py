@@ -0,0 +1,354 @@
+"""
+On-disk cache of bug-report media, their keyframes and vision-model descriptions.
+
+`MediaDescriberAgent` used to hand every media URL to the vision model on every
+run, so re-analysing the same bug video re-uploaded and re-described all of
+it. Media is now downloaded once and reused:
+
+  * ``urls/<sha256(url)>.json`` maps a URL to the SHA-256 of its content, so
+    two URLs serving the same file share everything below;
+  * ``media/<sha[:2]>/<sha>.<ext>`` holds the downloaded file (videos through
+    ``yt-dlp``, images and direct links through the shared HTTP client);
+  * ``frames/<sha[:2]>/<sha>.jpg`` holds video keyframes taken every
+    ``media_frame_interval`` seconds with ``ffmpeg``; the list of frames of a
+    video (per interval) is kept in ``frames/<video sha>-<interval>.json``;
+  * ``descriptions/<key>.json`` holds the description of a frame or image, keyed
+    by its content hash and the model/prompt that produced it.
+
+Videos whose frames cannot be extracted (``ffmpeg`` missing, unsupported
+format) are described from their URL as before. All files are written
+atomically, so concurrent workers at worst download the same file twice.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import aiofiles
+
+from backend.config import get_settings
+from backend.core.logging import get_logger
+from backend.services.http_client import get_http_client
+
+logger = get_logger(__name__)
+
+HASH_CHUNK_BYTES = 1024 * 1024
+FRAME_MAX_WIDTH = 1280  # keyframes are scaled down to at most this width
+
+_media_cache: Optional["MediaCache"] = None
+
+
+@dataclass
+class CachedFrame:
+    """A keyframe of a cached video."""
+    index: int
+    timestamp: float  # seconds from the start of the video
+    sha256: str
+    path: Path
+    size: int = 0
+
+
+@dataclass
+class CachedMedia:
+    """A downloaded media file and, for videos, its keyframes."""
+    url: str
+    sha256: str
+    path: Path
+    size: int
+    frames: List[CachedFrame] = field(default_factory=list)
+
+
+def _ytdlp_available() -> bool:
+    try:
+        import yt_dlp  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_json(path: Path, data: Any) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _read_json(path: Path) -> Optional[Any]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def format_timestamp(seconds: float) -> str:
+    """``mm:ss`` (or ``h:mm:ss``) for a frame timestamp."""
+    total = int(seconds)
+    hours, rest = divmod(total, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes:02d}:{secs:02d}"
+
+
+class MediaCache:
+    """Downloaded media, keyframes and descriptions under `base_dir`."""
+
+    def __init__(
+        self,
+        base_dir: str,
+        frame_interval: float = 5.0,
+        max_frames: int = 40,
+        max_download_bytes: int = 500 * 1024 * 1024,
+        frame_extraction_timeout: float = 300.0,
+    ):
+        self.base_dir = Path(base_dir)
+        self.frame_interval = frame_interval
+        self.max_frames = max_frames
+        self.max_download_bytes = max_download_bytes
+        self.frame_extraction_timeout = frame_extraction_timeout
+        # One download/extraction per URL at a time within this process
+        self._url_locks: Dict[str, asyncio.Lock] = {}
+
+    # ------------------------------------------------------------------
+    # Paths
+    # ------------------------------------------------------------------
+
+    def _url_manifest_path(self, url: str) -> Path:
+        return self.base_dir / "urls" / f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}.json"
+
+    def _media_path(self, sha256: str, ext: str) -> Path:
+        return self.base_dir / "media" / sha256[:2] / f"{sha256}.{ext}"
+
+    def _frame_path(self, sha256: str) -> Path:
+        return self.base_dir / "frames" / sha256[:2] / f"{sha256}.jpg"
+
+    def _frames_manifest_path(self, video_sha256: str) -> Path:
+        return self.base_dir / "frames" / f"{video_sha256}-{self.frame_interval:g}.json"
+
+    def _description_path(self, key: str) -> Path:
+        return self.base_dir / "descriptions" / key[:2] / f"{key}.json"
+
+    # ------------------------------------------------------------------
+    # Media
+    # ------------------------------------------------------------------
+
+    async def get_media(self, url: str, is_video: bool) -> Optional[CachedMedia]:
+        """
+        The cached media for `url`, downloading it (and extracting keyframes for
+        videos) on first use. None when the media cannot be downloaded.
+        """
+        lock = self._url_locks.setdefault(url, asyncio.Lock())
+        async with lock:
+            media = await asyncio.to_thread(self._load_media, url)
+            if media is None:
+                media = await self._download(url, is_video)
+                if media is None:
+                    return None
+            if is_video and not media.frames:
+                media.frames = await self._get_frames(media)
+            return media
+
+    def _load_media(self, url: str) -> Optional[CachedMedia]:
+        manifest = _read_json(self._url_manifest_path(url))
+        if not manifest:
+            return None
+        path = self._media_path(manifest["sha256"], manifest["ext"])
+        if not path.exists():
+            return None
+        return CachedMedia(url=url, sha256=manifest["sha256"], path=path, size=manifest["size"])
+
+    async def _download(self, url: str, is_video: bool) -> Optional[CachedMedia]:
+        staging = self.base_dir / "staging"
+        staging.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(dir=staging))
+        try:
+            downloaded: Optional[Path] = None
+            if is_video and _ytdlp_available():
+                try:
+                    downloaded = await asyncio.to_thread(self._download_with_ytdlp, url, tmp_dir)
+                except Exception as e:
+                    logger.info(f"yt-dlp could not download {url}, fetching it directly: {e}")
+            if downloaded is None:
+                downloaded = await self._download_direct(url, tmp_dir)
+            if downloaded is None:
+                return None
+            return await asyncio.to_thread(self._store_download, url, downloaded)
+        except Exception as e:
+            logger.warning(f"Could not cache media {url}: {e}")
+            return None
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _download_with_ytdlp(self, url: str, tmp_dir: Path) -> Optional[Path]:
+        import yt_dlp
+
+        options = {
+            "outtmpl": str(tmp_dir / "media.%(ext)s"),
+            "format": "best[ext=mp4]/best",  # a single file, so no ffmpeg merge is needed
+            "max_filesize": self.max_download_bytes,
+            "noplaylist": True,
+            "quiet": True,
+            "no_warnings": True,
+            "noprogress": True,
+        }
+        with yt_dlp.YoutubeDL(options) as ydl:
+            ydl.extract_info(url, download=True)
+        files = [p for p in tmp_dir.iterdir() if p.is_file() and not p.name.endswith(".part")]
+        return files[0] if files else None
+
+    async def _download_direct(self, url: str, tmp_dir: Path) -> Optional[Path]:
+        ext = Path(url.split("?", 1)[0]).suffix.lstrip(".").lower() or "bin"
+        target = tmp_dir / f"media.{ext[:8]}"
+        size = 0
+        async with get_http_client().stream("GET", url, follow_redirects=True, timeout=120.0) as response:
+            if response.status_code != 200:
+                logger.warning(f"Downloading {url} failed with status {response.status_code}")
+                return None
+            async with aiofiles.open(target, "wb") as f:
+                async for chunk in response.aiter_bytes(HASH_CHUNK_BYTES):
+                    size += len(chunk)
+                    if size > self.max_download_bytes:
+                        logger.warning(f"{url} is larger than {self.max_download_bytes} bytes; not caching it")
+                        return None
+                    await f.write(chunk)
+        return target
+
+    def _store_download(self, url: str, downloaded: Path) -> CachedMedia:
+        sha256 = _sha256_file(downloaded)
+        ext = downloaded.suffix.lstrip(".").lower() or "bin"
+        path = self._media_path(sha256, ext)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(downloaded, path)
+        size = path.stat().st_size
+        _write_json(self._url_manifest_path(url), {"url": url, "sha256": sha256, "ext": ext, "size": size})
+        logger.info(f"Cached media {url} as {sha256} ({size} bytes)")
+        return CachedMedia(url=url, sha256=sha256, path=path, size=size)
+
+    # ------------------------------------------------------------------
+    # Keyframes
+    # ------------------------------------------------------------------
+
+    async def _get_frames(self, media: CachedMedia) -> List[CachedFrame]:
+        manifest_path = self._frames_manifest_path(media.sha256)
+        manifest = await asyncio.to_thread(_read_json, manifest_path)
+        if manifest is not None:
+            frames = [
+                CachedFrame(
+                    index=f["index"],
+                    timestamp=f["timestamp"],
+                    sha256=f["sha256"],
+                    path=self._frame_path(f["sha256"]),
+                    size=f.get("size", 0),
+                )
+                for f in manifest
+            ]
+            if all(frame.path.exists() for frame in frames):
+                return frames
+        frames = await self._extract_frames(media)
+        if frames:
+            await asyncio.to_thread(
+                _write_json,
+                manifest_path,
+                [{"index": f.index, "timestamp": f.timestamp, "sha256": f.sha256, "size": f.size} for f in frames],
+            )
+        return frames
+
+    async def _extract_frames(self, media: CachedMedia) -> List[CachedFrame]:
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg is None:
+            logger.info("ffmpeg is not installed; videos are described from their URL")
+            return []
+        staging = self.base_dir / "staging"
+        staging.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(dir=staging))
+        try:
+            process = await asyncio.create_subprocess_exec(
+                ffmpeg, "-hide_banner", "-loglevel", "error", "-nostdin",
+                "-i", str(media.path),
+                "-vf", f"fps=1/{self.frame_interval:g},scale='min({FRAME_MAX_WIDTH},iw)':-2",
+                "-frames:v", str(self.max_frames),
+                "-q:v", "3",
+                str(tmp_dir / "%05d.jpg"),
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            try:
+                _, stderr = await asyncio.wait_for(process.communicate(), timeout=self.frame_extraction_timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                logger.warning(f"ffmpeg took longer than {self.frame_extraction_timeout:g}s to extract frames from {media.url}; killed it")
+                return []
+            if process.returncode != 0:
+                logger.warning(f"ffmpeg could not extract frames from {media.url}: {stderr.decode(errors='replace')[-500:]}")
+                return []
+            return await asyncio.to_thread(self._store_frames, tmp_dir)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _store_frames(self, tmp_dir: Path) -> List[CachedFrame]:
+        frames: List[CachedFrame] = []
+        previous_sha: Optional[str] = None
+        for position, source in enumerate(sorted(tmp_dir.glob("*.jpg"))):
+            sha256 = _sha256_file(source)
+            if sha256 == previous_sha:
+                continue  # a static screen yields identical frames; one is enough
+            previous_sha = sha256
+            path = self._frame_path(sha256)
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(source, path)
+            frames.append(
+                CachedFrame(
+                    index=len(frames),
+                    timestamp=position * self.frame_interval,
+                    sha256=sha256,
+                    path=path,
+                    size=path.stat().st_size,
+                )
+            )
+        return frames
+
+    # ------------------------------------------------------------------
+    # Descriptions
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def description_key(content_sha256: str, variant: str) -> str:
+        """Cache key of a description of some content by a given model/prompt (`variant`)."""
+        return hashlib.sha256(f"{variant}\0{content_sha256}".encode("utf-8")).hexdigest()
+
+    def get_description(self, key: str) -> Optional[str]:
+        data = _read_json(self._description_path(key))
+        return data.get("description") if isinstance(data, dict) else None
+
+    def put_description(self, key: str, description: str) -> None:
+        _write_json(self._description_path(key), {"description": description})
+
+
+def get_media_cache() -> MediaCache:
+    """The process-wide media cache."""
+    global _media_cache
+    if _media_cache is None:
+        settings = get_settings()
+        _media_cache = MediaCache(
+            settings.media_cache_dir,
+            frame_interval=settings.media_frame_interval,
+            max_frames=settings.media_max_frames,
+            max_download_bytes=settings.media_max_download_mb * 1024 * 1024,
+            frame_extraction_timeout=settings.media_frame_extraction_timeout,
+        )
+    return _media_cache
@@ -188,7 +188,8 @@ class NotebookManager:
                     settings: Optional[Dict] = None,
                     dependencies: Optional[List[UUID]] = None,
                     result: Optional[CellResult] = None,
-                    status: Optional[CellStatus] = None
+                    status: Optional[CellStatus] = None,
+                    cell_id: Optional[UUID] = None
                     ) -> Cell:
         """Create a new cell in a notebook (async)"""
         repository = NotebookRepository(db)
@@ -215,7 +216,8 @@ class NotebookManager:
             result_content=result.content if result else None, # TODO: Uncomment when repository updated
             result_error=result.error if result else None, # TODO: Uncomment when repository updated
             result_execution_time=result.execution_time if result else None, # TODO: Uncomment when repository updated
-            status=status.value if status else None # TODO: Uncomment when repository updated
+            status=status.value if status else None, # TODO: Uncomment when repository updated
+            cell_id=str(cell_id) if cell_id else None
         )
         
         if not db_cell:
@@ -241,6 +243,11 @@ class NotebookManager:
         logger.info(f"Created cell {cell.id} in notebook {notebook_id}")
         return cell
     
+    async def publish_cell_preview(self, notebook_id: UUID, cell_data: Dict[str, Any]) -> None:
+        """Notify clients about a cell state that is not persisted (e.g. a streaming preview)"""
+        if self.notify_callback:
+            await self.notify_callback(notebook_id, cell_data)
+
     async def get_cell(self, db: AsyncSession, notebook_id: UUID, cell_id: UUID) -> Cell:
         """Get a cell by ID (async)"""
         repository = NotebookRepository(db)
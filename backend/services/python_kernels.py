@@ -0,0 +1,350 @@
+"""
+Long-lived, resource-limited Python kernels, one per notebook.
+
+Every Python cell and every PythonAgent run used to start its own
+`mcp-server-data-exploration` (mcp-server-ds) stdio process, so each of them
+reloaded its CSVs and recomputed intermediates. A `PythonKernel` keeps one such
+process per notebook alive instead: DataFrames loaded with `load-csv` or saved
+by `run-script` (``save_to_memory``) stay in memory across cells and steps.
+
+Limits (from settings):
+  * ``python_cell_timeout`` – a call that runs longer is abandoned and the
+    kernel process restarted (its variables are lost, which the error says);
+  * ``python_cell_max_memory`` – the process' data segment (heap and private
+    mappings, so not memory-mapped files) is capped with RLIMIT_DATA by
+    re-executing the server through this module's ``__main__``;
+  * ``python_kernel_idle_timeout`` / ``python_kernel_max_kernels`` – idle
+    kernels are shut down, and the least recently used one is evicted when
+    the limit is reached.
+
+The MCP client session lives in a dedicated task per kernel: the stdio client
+and session are anyio contexts that must be entered and exited by the same
+task, while kernels are called from many (cell executions, agent runs).
+"""
+
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from mcp.shared.exceptions import McpError
+from pydantic import ValidationError
+
+from backend.config import get_settings
+from backend.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+MCP_SERVER_DS_DIR = "/opt/mcp-server-data-exploration"
+UV_BIN = "/root/.local/bin/uv"
+IDLE_CHECK_INTERVAL_SECONDS = 60
+
+# Executed by mcp-server-ds' run-script; its top-level locals are the kernel's DataFrames
+_LIST_VARIABLES_SCRIPT = """
+import json as _json
+_vars = {k: v for k, v in dict(locals()).items() if not k.startswith("_")}
+_out = []
+for _name, _value in _vars.items():
+    _entry = {"name": _name, "type": type(_value).__name__}
+    if hasattr(_value, "shape"):
+        _entry["shape"] = list(_value.shape)
+    if hasattr(_value, "columns"):
+        _entry["columns"] = [str(c) for c in list(_value.columns)[:50]]
+    if hasattr(_value, "memory_usage"):
+        try:
+            _entry["memory_bytes"] = int(_value.memory_usage(deep=False).sum())
+        except Exception:
+            pass
+    _out.append(_entry)
+print("<VARIABLES>" + _json.dumps(_out) + "</VARIABLES>")
+"""
+_VARIABLES_RE = re.compile(r"<VARIABLES>(.*?)</VARIABLES>", re.DOTALL)
+
+_kernel_manager: Optional["PythonKernelManager"] = None
+
+
+class KernelTimeoutError(RuntimeError):
+    """A kernel call exceeded python_cell_timeout; the kernel was restarted."""
+
+
+class KernelDiedError(RuntimeError):
+    """The kernel process exited (e.g. it hit the memory limit) during a call."""
+
+
+def mcp_server_ds_params(max_memory_mb: int) -> StdioServerParameters:
+    """How to start mcp-server-ds with its data segment capped at `max_memory_mb`."""
+    return StdioServerParameters(
+        command=sys.executable,
+        args=[
+            "-m", "backend.services.python_kernels", str(max_memory_mb),
+            UV_BIN, "--directory", MCP_SERVER_DS_DIR, "run", "mcp-server-ds",
+        ],
+        env=os.environ.copy(),
+    )
+
+
+def _result_text(result: Any) -> str:
+    """Text of an MCP CallToolResult (mcp-server-ds reports errors as text too)."""
+    content = getattr(result, "content", None)
+    if content is None:
+        return str(result)
+    return "\n".join(getattr(item, "text", str(item)) for item in content)
+
+
+class PythonKernel:
+    """One long-lived mcp-server-ds process for a notebook, called one request at a time."""
+
+    def __init__(self, notebook_id: str, server_params: StdioServerParameters, timeout: float):
+        self.notebook_id = notebook_id
+        self.server_params = server_params
+        self.timeout = timeout
+        self.last_used = time.monotonic()
+        self.restarts = 0  # times the process had to be (re)started after the first start
+        self._lock = asyncio.Lock()
+        self._requests: "asyncio.Queue" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._started_once = False
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pending_restart(self) -> bool:
+        """True if the process was stopped (timeout, crash, eviction) and the next call will restart it."""
+        return self._started_once and not self.running
+
+    def idle_seconds(self) -> float:
+        return time.monotonic() - self.last_used
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any]) -> str:
+        """Call an mcp-server-ds tool (`run-script`, `load-csv`) and return its text output."""
+        async with self._lock:
+            try:
+                await self._ensure_running()
+                future = asyncio.get_running_loop().create_future()
+                await self._requests.put((name, arguments, future))
+                try:
+                    result = await asyncio.wait_for(future, timeout=self.timeout)
+                except asyncio.TimeoutError:
+                    logger.warning(f"Python kernel for notebook {self.notebook_id}: '{name}' exceeded {self.timeout}s; restarting kernel")
+                    await self._stop()
+                    raise KernelTimeoutError(
+                        f"Python execution exceeded the {self.timeout}s limit and was stopped. "
+                        f"The notebook's Python kernel was restarted, so previously loaded DataFrames must be loaded again."
+                    )
+                except KernelDiedError:
+                    await self._stop()
+                    raise
+                return _result_text(result)
+            finally:
+                self.last_used = time.monotonic()
+
+    async def run_script(self, script: str, save_to_memory: Optional[List[str]] = None) -> str:
+        arguments: Dict[str, Any] = {"script": script}
+        if save_to_memory:
+            arguments["save_to_memory"] = save_to_memory
+        return await self.call_tool("run-script", arguments)
+
+    async def load_csv(self, csv_path: str, df_name: Optional[str] = None) -> str:
+        arguments: Dict[str, Any] = {"csv_path": csv_path}
+        if df_name:
+            arguments["df_name"] = df_name
+        return await self.call_tool("load-csv", arguments)
+
+    async def list_variables(self) -> List[Dict[str, Any]]:
+        """Name, type, shape, columns and memory of every variable held by the kernel."""
+        if not self.running:
+            return []
+        output = await self.run_script(_LIST_VARIABLES_SCRIPT)
+        match = _VARIABLES_RE.search(output)
+        if not match:
+            raise RuntimeError(f"Could not list kernel variables: {output[:500]}")
+        return json.loads(match.group(1))
+
+    async def close(self) -> None:
+        async with self._lock:
+            await self._stop()
+
+    async def _ensure_running(self) -> None:
+        if self.running:
+            return
+        if self._started_once:
+            self.restarts += 1
+            logger.info(f"Restarting Python kernel for notebook {self.notebook_id} (its previous variables are gone)")
+        ready = asyncio.get_running_loop().create_future()
+        self._requests = asyncio.Queue()
+        self._task = asyncio.create_task(self._serve(ready), name=f"python-kernel-{self.notebook_id}")
+        self._started_once = True
+        try:
+            await asyncio.wait_for(ready, timeout=max(self.timeout, 60))
+        except BaseException:
+            await self._stop()
+            raise
+        logger.info(f"Python kernel started for notebook {self.notebook_id}")
+
+    async def _serve(self, ready: asyncio.Future) -> None:
+        """Owns the MCP session: start it, then answer queued requests until cancelled or the process dies."""
+        pending: Optional[asyncio.Future] = None
+        try:
+            async with stdio_client(self.server_params) as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    ready.set_result(None)
+                    while True:
+                        name, arguments, pending = await self._requests.get()
+                        if pending.done():
+                            continue
+                        try:
+                            result = await session.call_tool(name, arguments)
+                        except (McpError, ValidationError) as e:
+                            # An error response or malformed result fails this request only; the process is fine
+                            if not pending.done():
+                                pending.set_exception(e)
+                        else:
+                            if not pending.done():
+                                pending.set_result(result)
+                        pending = None
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            logger.error(f"Python kernel for notebook {self.notebook_id} stopped: {e}", exc_info=True)
+            error = KernelDiedError(f"The Python kernel stopped unexpectedly ({e}); it will be restarted on the next call.")
+            if not ready.done():
+                ready.set_exception(error)
+            if pending is not None and not pending.done():
+                pending.set_exception(error)
+
+    async def _stop(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        if not task.done():
+            task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning(f"Error stopping Python kernel for notebook {self.notebook_id}: {e}")
+
+
+class PythonKernelManager:
+    """Kernels by notebook id, with idle eviction and an upper bound on live kernels."""
+
+    def __init__(
+        self,
+        timeout: float,
+        max_memory_mb: int,
+        idle_timeout: float,
+        max_kernels: int,
+        server_params: Optional[StdioServerParameters] = None,
+    ):
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_kernels = max_kernels
+        self.server_params = server_params or mcp_server_ds_params(max_memory_mb)
+        self._kernels: Dict[str, PythonKernel] = {}
+        self._eviction_task: Optional[asyncio.Task] = None
+        self._closing: Set[asyncio.Task] = set()  # evicted kernels shutting down in the background
+
+    def get_kernel(self, notebook_id: str) -> PythonKernel:
+        """The notebook's kernel (its process starts on the first call)."""
+        kernel = self._kernels.get(notebook_id)
+        if kernel is None:
+            self._make_room()
+            kernel = PythonKernel(notebook_id, self.server_params, self.timeout)
+            self._kernels[notebook_id] = kernel
+        return kernel
+
+    def _make_room(self) -> None:
+        live = [k for k in self._kernels.values() if k.running]
+        if len(live) < self.max_kernels:
+            return
+        candidates = [k for k in live if not k.busy]
+        if not candidates:
+            return  # every kernel is working; allow going over the limit rather than failing the cell
+        victim = max(candidates, key=lambda k: k.idle_seconds())
+        logger.info(f"Evicting Python kernel of notebook {victim.notebook_id} (kernel limit {self.max_kernels} reached)")
+        self._kernels.pop(victim.notebook_id, None)
+        task = asyncio.create_task(victim.close(), name=f"python-kernel-close-{victim.notebook_id}")
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def evict_idle(self) -> int:
+        """Shut down kernels unused for longer than idle_timeout. Returns how many were closed."""
+        idle = [
+            k for k in self._kernels.values()
+            if not k.busy and k.idle_seconds() > self.idle_timeout
+        ]
+        for kernel in idle:
+            self._kernels.pop(kernel.notebook_id, None)
+            if kernel.running:
+                logger.info(f"Shutting down Python kernel of notebook {kernel.notebook_id} after {int(kernel.idle_seconds())}s idle")
+            await kernel.close()
+        return len(idle)
+
+    async def shutdown_kernel(self, notebook_id: str) -> None:
+        kernel = self._kernels.pop(notebook_id, None)
+        if kernel is not None:
+            await kernel.close()
+
+    def start(self) -> None:
+        if self._eviction_task is None:
+            self._eviction_task = asyncio.create_task(self._eviction_loop(), name="python-kernel-eviction")
+
+    async def shutdown(self) -> None:
+        if self._eviction_task is not None:
+            self._eviction_task.cancel()
+            try:
+                await self._eviction_task
+            except asyncio.CancelledError:
+                pass
+            self._eviction_task = None
+        kernels, self._kernels = list(self._kernels.values()), {}
+        await asyncio.gather(*(k.close() for k in kernels), *self._closing, return_exceptions=True)
+
+    async def _eviction_loop(self) -> None:
+        while True:
+            await asyncio.sleep(min(IDLE_CHECK_INTERVAL_SECONDS, self.idle_timeout))
+            try:
+                await self.evict_idle()
+            except Exception as e:
+                logger.error(f"Python kernel idle eviction failed: {e}", exc_info=True)
+
+
+def get_python_kernel_manager() -> PythonKernelManager:
+    """The process-wide Python kernel manager."""
+    global _kernel_manager
+    if _kernel_manager is None:
+        settings = get_settings()
+        _kernel_manager = PythonKernelManager(
+            timeout=settings.python_cell_timeout,
+            max_memory_mb=settings.python_cell_max_memory,
+            idle_timeout=settings.python_kernel_idle_timeout,
+            max_kernels=settings.python_kernel_max_kernels,
+        )
+    return _kernel_manager
+
+
+def _exec_with_memory_limit(argv: List[str]) -> None:
+    """`python -m backend.services.python_kernels <max_mb> <command...>`: cap memory, then exec the command."""
+    max_memory_mb, command = int(argv[0]), argv[1:]
+    if max_memory_mb > 0:
+        import resource
+        limit = max_memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+    os.execvp(command[0], command)
+
+
+if __name__ == "__main__":
+    _exec_with_memory_limit(sys.argv[1:])
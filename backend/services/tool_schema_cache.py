@@ -0,0 +1,130 @@
+"""
+Cache of MCP tool schemas per connection type and configuration.
+
+Discovering the tools of a connection type starts its MCP server (a Docker
+container for Log-AI, a subprocess for the others) just to call ``list_tools``.
+The schemas only change when the server or its configuration does, so they are
+kept here keyed by connection type and a hash of the connection config, written
+to ``tool_schema_cache_path`` so they survive restarts, and refetched once older
+than ``tool_schema_cache_ttl``. A failed refetch keeps serving the previous
+schemas. `ConnectionManager.prewarm_tool_schemas` fills the cache in the
+background at startup.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from backend.config import get_settings
+from backend.core.logging import get_logger
+from backend.core.types import MCPToolInfo
+
+logger = get_logger(__name__)
+
+_tool_schema_cache: Optional["ToolSchemaCache"] = None
+
+
+def config_hash(config: Optional[Dict[str, Any]]) -> str:
+    """Stable hash of a connection config (secrets never leave this function)."""
+    canonical = json.dumps(config or {}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+
+class ToolSchemaCache:
+    """Tool schemas by (connection type, config hash), in memory and in a JSON file."""
+
+    def __init__(self, path: str, ttl: float = 24 * 3600):
+        self.path = Path(path)
+        self.ttl = ttl
+        self._entries: Dict[str, Dict[str, Any]] = self._read()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    @staticmethod
+    def _key(connection_type: str, config: Optional[Dict[str, Any]]) -> str:
+        return f"{connection_type}:{config_hash(config)}"
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable tool schema cache {self.path}: {e}")
+            return {}
+
+    def _write(self) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(self._entries), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save the tool schema cache to {self.path}: {e}")
+
+    def is_fresh(self, connection_type: str, config: Optional[Dict[str, Any]]) -> bool:
+        entry = self._entries.get(self._key(connection_type, config))
+        return entry is not None and time.time() - entry["fetched_at"] < self.ttl
+
+    def cached_types(self) -> List[str]:
+        return sorted({key.split(":", 1)[0] for key in self._entries})
+
+    async def get(
+        self,
+        connection_type: str,
+        config: Optional[Dict[str, Any]],
+        fetch: Callable[[], Awaitable[List[MCPToolInfo]]],
+        refresh: bool = False,
+    ) -> List[MCPToolInfo]:
+        """
+        The cached schemas, or `fetch()`ed (once, however many callers wait) when
+        missing, expired or `refresh` is set. Fetch errors propagate only when
+        there is nothing cached to fall back on.
+        """
+        key = self._key(connection_type, config)
+        entry = self._entries.get(key)
+        if entry is not None and not refresh and time.time() - entry["fetched_at"] < self.ttl:
+            return [MCPToolInfo(**tool) for tool in entry["tools"]]
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        seen = entry
+        async with lock:
+            entry = self._entries.get(key)
+            # Fetched by another caller while this one waited
+            if entry is not None and entry is not seen:
+                return [MCPToolInfo(**tool) for tool in entry["tools"]]
+            try:
+                tools = await fetch()
+            except Exception as e:
+                if entry is None:
+                    raise
+                logger.warning(f"Refreshing {connection_type} tool schemas failed ({e}); serving the cached ones")
+                return [MCPToolInfo(**tool) for tool in entry["tools"]]
+            self._entries[key] = {"fetched_at": time.time(), "tools": [tool.model_dump() for tool in tools]}
+            # Older configs of this type are superseded
+            for stale_key in [k for k in self._entries if k != key and k.split(":", 1)[0] == connection_type]:
+                del self._entries[stale_key]
+            await asyncio.to_thread(self._write)
+            logger.info(f"Cached {len(tools)} tool schemas for {connection_type}")
+            return tools
+
+    def invalidate(self, connection_type: Optional[str] = None) -> None:
+        """Forget the schemas of one connection type (or all)."""
+        self._entries = {
+            key: entry for key, entry in self._entries.items()
+            if connection_type is not None and key.split(":", 1)[0] != connection_type
+        }
+        self._write()
+
+
+def get_tool_schema_cache() -> ToolSchemaCache:
+    """The process-wide tool schema cache."""
+    global _tool_schema_cache
+    if _tool_schema_cache is None:
+        settings = get_settings()
+        _tool_schema_cache = ToolSchemaCache(settings.tool_schema_cache_path, ttl=settings.tool_schema_cache_ttl)
+    return _tool_schema_cache
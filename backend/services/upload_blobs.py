@@ -0,0 +1,240 @@
+"""
+Content-addressed storage for files uploaded to chat sessions.
+
+Every upload used to land in ``<upload_dir>/<session_id>/<filename>``: the same
+log bundle attached to ten sessions was stored ten times, and two files with
+the same name in one session overwrote each other. Uploaded content is now
+stored once per SHA-256 under ``<upload_dir>/blobs/<sha[:2]>/<sha>`` and each
+`UploadedFile` row points at the shared blob (`filepath`, `blob_sha256`).
+Blob paths carry no extension (one blob serves every name the content was
+uploaded under): use the row's `filename` wherever the file type matters.
+
+`UploadBlob.ref_count` counts the rows using a blob; it is changed in the same
+transaction as the row itself. Blobs whose count dropped to zero are deleted by
+`collect_garbage`, which first renames the file aside so an upload of the same
+content racing with the collection simply writes the blob again. It also
+removes staged uploads (``.partial/*.upload``) abandoned by a crashed request.
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Tuple
+
+import aiofiles.os
+from sqlalchemy import and_, delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.config import get_settings
+from backend.core.logging import get_logger
+from backend.db.database import get_db_session
+from backend.db.models import UploadBlob, UploadedFile
+from backend.services.upload_storage import PARTIAL_DIR_NAME
+
+logger = get_logger(__name__)
+
+BLOB_DIR_NAME = "blobs"
+
+_blob_store: Optional["UploadBlobStore"] = None
+
+
+class UploadBlobStore:
+    """Shared upload blobs under `<base_dir>/blobs`, reference-counted in the `upload_blobs` table."""
+
+    def __init__(self, base_dir: str, orphan_grace_seconds: int = 3600):
+        self.base_dir = Path(base_dir)
+        self.blob_dir = self.base_dir / BLOB_DIR_NAME
+        self.staging_dir = self.base_dir / PARTIAL_DIR_NAME
+        # Blob files without a row are only swept once this old: an upload writes
+        # its file before the transaction adding the row commits.
+        self.orphan_grace_seconds = orphan_grace_seconds
+        # Serialises collection runs within this process
+        self._gc_lock = asyncio.Lock()
+
+    @staticmethod
+    def blob_relpath(sha256: str) -> str:
+        return f"{BLOB_DIR_NAME}/{sha256[:2]}/{sha256}"
+
+    def blob_path(self, sha256: str) -> Path:
+        return self.base_dir / self.blob_relpath(sha256)
+
+    async def new_staging_path(self) -> Path:
+        """Temporary location to stream an upload to before it is added as a blob."""
+        await aiofiles.os.makedirs(self.staging_dir, exist_ok=True)
+        return self.staging_dir / f"{uuid.uuid4().hex}.upload"
+
+    async def add_reference(self, db: AsyncSession, staged_path: Path, sha256: str, size: int) -> Tuple[str, bool]:
+        """
+        Take one reference on the blob for `sha256`, moving `staged_path` into
+        place unless the blob already exists (then the staged copy is dropped).
+        Does not commit: the caller adds its UploadedFile row and commits both.
+        Returns (blob relative path, whether the content was already stored).
+        """
+        await self._increment(db, sha256, size)
+        dest = self.blob_path(sha256)
+        if await aiofiles.os.path.exists(dest):
+            await asyncio.to_thread(_unlink_quietly, staged_path)
+            return self.blob_relpath(sha256), True
+        await aiofiles.os.makedirs(dest.parent, exist_ok=True)
+        await aiofiles.os.replace(staged_path, dest)
+        return self.blob_relpath(sha256), False
+
+    async def reference_existing(self, db: AsyncSession, sha256: str) -> Optional[UploadBlob]:
+        """
+        Take one reference on an already stored blob, or return None if the
+        content is not stored. Lets a client that declared the hash skip sending
+        the bytes. Does not commit.
+        """
+        blob = await db.get(UploadBlob, sha256)
+        if blob is None or not await aiofiles.os.path.exists(self.blob_path(sha256)):
+            return None
+        await self._increment(db, sha256, blob.size)
+        return blob
+
+    async def release(self, db: AsyncSession, uploaded_file: UploadedFile) -> None:
+        """Delete an UploadedFile row and drop its blob reference. Does not commit."""
+        sha256 = uploaded_file.blob_sha256
+        await db.delete(uploaded_file)
+        if sha256 is None:
+            # Legacy upload stored per session: the file belongs to this row alone
+            await asyncio.to_thread(_unlink_quietly, self.base_dir / str(uploaded_file.filepath))
+            return
+        await db.execute(
+            update(UploadBlob)
+            .where(UploadBlob.sha256 == sha256)
+            .values(ref_count=UploadBlob.ref_count - 1, released_at=datetime.utcnow())
+        )
+
+    async def release_session(self, db: AsyncSession, session_id: str) -> int:
+        """Release every upload of a chat session. Does not commit."""
+        rows = (await db.execute(select(UploadedFile).where(UploadedFile.session_id == session_id))).scalars().all()
+        for row in rows:
+            await self.release(db, row)
+        return len(rows)
+
+    async def collect_garbage(self, db: AsyncSession) -> int:
+        """Delete blobs nobody references any more (and stale orphan files). Returns the number removed."""
+        async with self._gc_lock:
+            removed = 0
+            unreferenced = (await db.execute(select(UploadBlob.sha256).where(UploadBlob.ref_count <= 0))).scalars().all()
+            for sha256 in unreferenced:
+                if await self._collect_blob(db, sha256):
+                    removed += 1
+            removed += await self._sweep_orphans(db)
+            if removed:
+                logger.info(f"Upload blob garbage collection removed {removed} blob(s)")
+            staged = await self._sweep_stale_staging()
+            if staged:
+                logger.info(f"Upload blob garbage collection removed {staged} abandoned staged upload(s)")
+            return removed
+
+    async def _collect_blob(self, db: AsyncSession, sha256: str) -> bool:
+        path = self.blob_path(sha256)
+        tombstone = path.with_name(f"{sha256}.{uuid.uuid4().hex}.deleting")
+        # Move the file aside first: a concurrent upload of the same content then
+        # finds the blob missing and writes it again instead of losing it to us.
+        try:
+            await aiofiles.os.rename(path, tombstone)
+        except FileNotFoundError:
+            tombstone = None
+        result = await db.execute(
+            delete(UploadBlob).where(and_(UploadBlob.sha256 == sha256, UploadBlob.ref_count <= 0))
+        )
+        await db.commit()
+        if result.rowcount == 1:
+            if tombstone is not None:
+                await asyncio.to_thread(_unlink_quietly, tombstone)
+            return True
+        # Referenced again in the meantime: put the file back unless it was re-uploaded already
+        if tombstone is not None:
+            if await aiofiles.os.path.exists(path):
+                await asyncio.to_thread(_unlink_quietly, tombstone)
+            else:
+                await aiofiles.os.rename(tombstone, path)
+        return False
+
+    async def _sweep_orphans(self, db: AsyncSession) -> int:
+        """Blob files without a row, left behind when the upload's transaction failed."""
+        cutoff = time.time() - self.orphan_grace_seconds
+        candidates = await asyncio.to_thread(_list_old_files, self.blob_dir, cutoff)
+        if not candidates:
+            return 0
+        known = set(
+            (await db.execute(select(UploadBlob.sha256).where(UploadBlob.sha256.in_(list(candidates))))).scalars().all()
+        )
+        removed = 0
+        for name, path in candidates.items():
+            if name not in known:
+                await asyncio.to_thread(_unlink_quietly, path)
+                removed += 1
+        return removed
+
+    async def _sweep_stale_staging(self) -> int:
+        """Staged uploads not written to within the grace period: their request died before adding them."""
+        cutoff = time.time() - self.orphan_grace_seconds
+        candidates = await asyncio.to_thread(_list_old_files, self.staging_dir, cutoff)
+        # Resumable uploads share the directory (.part/.json) and expire on their own terms
+        stale = [path for name, path in candidates.items() if name.endswith(".upload")]
+        for path in stale:
+            await asyncio.to_thread(_unlink_quietly, path)
+        return len(stale)
+
+    async def _increment(self, db: AsyncSession, sha256: str, size: int) -> None:
+        stmt = (
+            update(UploadBlob)
+            .where(UploadBlob.sha256 == sha256)
+            .values(ref_count=UploadBlob.ref_count + 1, released_at=None)
+        )
+        if (await db.execute(stmt)).rowcount == 1:
+            return
+        try:
+            async with db.begin_nested():
+                db.add(UploadBlob(sha256=sha256, storage_path=self.blob_relpath(sha256), size=size, ref_count=1))
+        except IntegrityError:
+            # Another upload of the same content created the row first
+            await db.execute(stmt)
+
+
+def _unlink_quietly(path: Path) -> None:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _list_old_files(root: Path, cutoff: float) -> dict:
+    """name -> path of files under `root` last modified before `cutoff` (tombstones included)."""
+    found = {}
+    if not root.is_dir():
+        return found
+    for dirpath, _dirnames, filenames in os.walk(root):
+        for name in filenames:
+            path = Path(dirpath) / name
+            try:
+                if path.stat().st_mtime < cutoff:
+                    found[name] = path
+            except FileNotFoundError:
+                continue
+    return found
+
+
+async def collect_upload_garbage() -> None:
+    """Run blob garbage collection in its own session (scheduled after uploads are released)."""
+    try:
+        async with get_db_session() as db:
+            await get_upload_blob_store().collect_garbage(db)
+    except Exception as e:
+        logger.error(f"Upload blob garbage collection failed: {e}", exc_info=True)
+
+
+def get_upload_blob_store() -> UploadBlobStore:
+    """The process-wide upload blob store."""
+    global _blob_store
+    if _blob_store is None:
+        settings = get_settings()
+        _blob_store = UploadBlobStore(settings.upload_dir, orphan_grace_seconds=settings.upload_orphan_grace_seconds)
+    return _blob_store
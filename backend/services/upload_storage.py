@@ -0,0 +1,278 @@
+"""
+Streaming storage for files uploaded to chat sessions.
+
+Uploads used to be copied with a blocking `shutil.copyfileobj` inside the
+request handler, stalling the event loop for the whole copy of a multi-GB log
+bundle. Files are now streamed to disk in `upload_chunk_size_bytes` pieces with
+aiofiles while a SHA-256 is computed on the fly, and bodies larger than
+`upload_max_bytes` are rejected as soon as that is known.
+
+Large files can also be sent with a resumable protocol (see routes/chat.py):
+the client declares the file, then PUTs consecutive byte ranges. Progress is
+kept in a small JSON record next to the partial file under
+``<upload_dir>/.partial`` so an interrupted upload continues from the last
+byte received, even across server restarts.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterable, AsyncIterator, Dict, Optional, Tuple
+
+import aiofiles
+import aiofiles.os
+from pydantic import BaseModel, Field
+
+from backend.config import get_settings
+from backend.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+PARTIAL_DIR_NAME = ".partial"
+_UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+_upload_store: Optional["ResumableUploadStore"] = None
+
+
+class UploadTooLargeError(ValueError):
+    """The upload (or one of its chunks) exceeds the configured size limit."""
+
+
+class UploadOffsetError(ValueError):
+    """A chunk does not start where the partial upload currently ends."""
+
+    def __init__(self, message: str, expected_offset: int):
+        super().__init__(message)
+        self.expected_offset = expected_offset
+
+
+class UploadChecksumError(ValueError):
+    """The completed upload does not match the SHA-256 the client declared."""
+
+
+def safe_filename(filename: Optional[str]) -> str:
+    """Basename of a client-supplied filename, never empty and never a path."""
+    name = Path((filename or "").replace("\\", "/")).name.strip()
+    if name in ("", ".", ".."):
+        return f"upload_{uuid.uuid4().hex}"
+    return name
+
+
+async def iter_upload_file(upload_file, chunk_size: int) -> AsyncIterator[bytes]:
+    """Read a Starlette UploadFile in chunks without blocking the event loop."""
+    while True:
+        chunk = await upload_file.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def stream_to_file(
+    chunks: AsyncIterable[bytes],
+    dest: Path,
+    max_bytes: int,
+    hasher=None,
+    append: bool = False,
+) -> Tuple[int, str]:
+    """
+    Write `chunks` to `dest`, updating `hasher` (a new sha256 if None) on the fly.
+    Returns (bytes written, hex digest). Raises UploadTooLargeError as soon as more
+    than `max_bytes` arrive; a file being created (not appended to) is removed then.
+    """
+    hasher = hasher if hasher is not None else hashlib.sha256()
+    written = 0
+    try:
+        async with aiofiles.open(dest, "ab" if append else "wb") as out:
+            async for chunk in chunks:
+                written += len(chunk)
+                if written > max_bytes:
+                    raise UploadTooLargeError(f"Upload exceeds the limit of {max_bytes} bytes")
+                hasher.update(chunk)
+                await out.write(chunk)
+    except Exception:
+        if not append:
+            await asyncio.to_thread(_unlink_quietly, dest)
+        raise
+    return written, hasher.hexdigest()
+
+
+def _unlink_quietly(path: Path) -> None:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _hash_file_prefix(path: Path, length: int, chunk_size: int = 1024 * 1024):
+    """sha256 object over the first `length` bytes of `path` (resuming after a restart)."""
+    hasher = hashlib.sha256()
+    remaining = length
+    with open(path, "rb") as f:
+        while remaining > 0:
+            data = f.read(min(chunk_size, remaining))
+            if not data:
+                break
+            hasher.update(data)
+            remaining -= len(data)
+    return hasher
+
+
+class PendingUpload(BaseModel):
+    """A resumable upload in progress."""
+    upload_id: str
+    session_id: str
+    notebook_id: Optional[str] = None
+    filename: str
+    content_type: Optional[str] = None
+    size: int
+    offset: int = 0
+    sha256: Optional[str] = None  # expected digest, if the client declared one
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    @property
+    def complete(self) -> bool:
+        return self.offset >= self.size
+
+
+class ResumableUploadStore:
+    """Partial uploads under `<base_dir>/.partial`: a `.part` data file and a `.json` record each."""
+
+    def __init__(self, base_dir: str, max_bytes: int, max_chunk_bytes: int, read_chunk_bytes: int):
+        self.base_dir = Path(base_dir)
+        self.partial_dir = self.base_dir / PARTIAL_DIR_NAME
+        self.max_bytes = max_bytes
+        self.max_chunk_bytes = max_chunk_bytes
+        self.read_chunk_bytes = read_chunk_bytes
+        # Running hash per upload while its process stays up: upload_id -> (offset, sha256)
+        self._hashers: Dict[str, Tuple[int, "hashlib._Hash"]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _record_path(self, upload_id: str) -> Path:
+        return self.partial_dir / f"{upload_id}.json"
+
+    def part_path(self, upload_id: str) -> Path:
+        return self.partial_dir / f"{upload_id}.part"
+
+    async def create(
+        self,
+        session_id: str,
+        filename: Optional[str],
+        size: int,
+        content_type: Optional[str] = None,
+        notebook_id: Optional[str] = None,
+        sha256: Optional[str] = None,
+    ) -> PendingUpload:
+        """Start an upload of `size` bytes; rejected up front if it exceeds the limit."""
+        if size < 0:
+            raise ValueError("Upload size must not be negative")
+        if size > self.max_bytes:
+            raise UploadTooLargeError(f"Upload of {size} bytes exceeds the limit of {self.max_bytes} bytes")
+        upload = PendingUpload(
+            upload_id=uuid.uuid4().hex,
+            session_id=session_id,
+            notebook_id=notebook_id,
+            filename=safe_filename(filename),
+            content_type=content_type,
+            size=size,
+            sha256=sha256.lower() if sha256 else None,
+        )
+        await aiofiles.os.makedirs(self.partial_dir, exist_ok=True)
+        async with aiofiles.open(self.part_path(upload.upload_id), "wb"):
+            pass
+        await self._save(upload)
+        self._hashers[upload.upload_id] = (0, hashlib.sha256())
+        logger.info(f"Started resumable upload {upload.upload_id} ({upload.filename}, {size} bytes) for session {session_id}")
+        return upload
+
+    async def get(self, upload_id: str) -> Optional[PendingUpload]:
+        if not _UPLOAD_ID_RE.match(upload_id):
+            return None
+        try:
+            async with aiofiles.open(self._record_path(upload_id), "r") as f:
+                return PendingUpload.model_validate_json(await f.read())
+        except FileNotFoundError:
+            return None
+
+    async def append(self, upload: PendingUpload, offset: int, chunks: AsyncIterable[bytes], content_length: Optional[int]) -> PendingUpload:
+        """
+        Append a chunk starting at `offset`. `content_length` (the request's header)
+        is checked before any byte is read; the body is still capped while streaming.
+        """
+        lock = self._locks.setdefault(upload.upload_id, asyncio.Lock())
+        async with lock:
+            current = await self.get(upload.upload_id) or upload
+            if offset != current.offset:
+                raise UploadOffsetError(f"Chunk starts at {offset} but the upload is at {current.offset}", current.offset)
+            remaining = current.size - current.offset
+            limit = min(remaining, self.max_chunk_bytes)
+            if content_length is not None and content_length > limit:
+                raise UploadTooLargeError(f"Chunk of {content_length} bytes exceeds the {limit} bytes accepted at this offset")
+
+            hasher = await self._hasher_at(current)
+            part_path = self.part_path(current.upload_id)
+            try:
+                written, _ = await stream_to_file(chunks, part_path, limit, hasher=hasher, append=True)
+            except Exception:
+                # Drop whatever part of the chunk got written; the client resends it from `offset`
+                await asyncio.to_thread(os.truncate, part_path, current.offset)
+                self._hashers.pop(current.upload_id, None)
+                raise
+            current.offset += written
+            current.updated_at = datetime.now(timezone.utc)
+            self._hashers[current.upload_id] = (current.offset, hasher)
+            await self._save(current)
+            return current
+
+    async def finish(self, upload: PendingUpload, dest: Path) -> str:
+        """Move a complete upload to `dest` and forget it. Returns its SHA-256."""
+        hasher = await self._hasher_at(upload)
+        digest = hasher.hexdigest()
+        if upload.sha256 and upload.sha256 != digest:
+            await self.abort(upload.upload_id)
+            raise UploadChecksumError(f"SHA-256 mismatch: expected {upload.sha256}, received {digest}")
+        await aiofiles.os.makedirs(dest.parent, exist_ok=True)
+        await aiofiles.os.replace(self.part_path(upload.upload_id), dest)
+        await self._forget(upload.upload_id)
+        return digest
+
+    async def abort(self, upload_id: str) -> None:
+        await asyncio.to_thread(_unlink_quietly, self.part_path(upload_id))
+        await self._forget(upload_id)
+
+    async def _forget(self, upload_id: str) -> None:
+        await asyncio.to_thread(_unlink_quietly, self._record_path(upload_id))
+        self._hashers.pop(upload_id, None)
+        self._locks.pop(upload_id, None)
+
+    async def _hasher_at(self, upload: PendingUpload):
+        cached = self._hashers.get(upload.upload_id)
+        if cached is not None and cached[0] == upload.offset:
+            return cached[1]
+        # First chunk after a restart (or a failed chunk): re-hash what is on disk
+        return await asyncio.to_thread(_hash_file_prefix, self.part_path(upload.upload_id), upload.offset, self.read_chunk_bytes)
+
+    async def _save(self, upload: PendingUpload) -> None:
+        path = self._record_path(upload.upload_id)
+        tmp_path = path.with_suffix(".json.tmp")
+        async with aiofiles.open(tmp_path, "w") as f:
+            await f.write(upload.model_dump_json())
+        await aiofiles.os.replace(tmp_path, path)
+
+
+def get_upload_store() -> ResumableUploadStore:
+    """The process-wide resumable upload store."""
+    global _upload_store
+    if _upload_store is None:
+        settings = get_settings()
+        _upload_store = ResumableUploadStore(
+            settings.upload_dir,
+            max_bytes=settings.upload_max_bytes,
+            max_chunk_bytes=settings.upload_max_chunk_bytes,
+            read_chunk_bytes=settings.upload_chunk_size_bytes,
+        )
+    return _upload_store
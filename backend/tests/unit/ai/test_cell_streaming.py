@@ -0,0 +1,105 @@
+import pytest
+from pydantic import BaseModel, ValidationError
+
+from backend.ai.cell_streaming import StreamingCellPreview, stream_partial_outputs
+from backend.core.cell import CellStatus, CellType
+
+pytestmark = pytest.mark.asyncio
+
+NOTEBOOK_ID = "00000000-0000-0000-0000-000000000001"
+
+
+class RecordingNotebookManager:
+    def __init__(self):
+        self.previews = []
+
+    async def publish_cell_preview(self, notebook_id, cell_data):
+        self.previews.append(cell_data)
+
+
+async def test_preview_updates_are_throttled_and_flushable():
+    manager = RecordingNotebookManager()
+    preview = StreamingCellPreview(manager, NOTEBOOK_ID, CellType.MARKDOWN, min_interval=60.0)
+
+    assert await preview.update("# Ti") is True
+    assert await preview.update("# Title") is False
+    assert await preview.update("# Title\n\nBody") is False
+    assert len(manager.previews) == 1
+
+    assert await preview.flush() is True
+    assert len(manager.previews) == 2
+    latest = manager.previews[-1]
+    assert latest["content"] == "# Title\n\nBody"
+    assert latest["status"] == CellStatus.STREAMING.value
+    assert latest["id"] == str(preview.cell_id)
+    assert latest["cell_metadata"]["streaming"] is True
+
+
+async def test_preview_complete_publishes_final_state_with_same_id():
+    manager = RecordingNotebookManager()
+    preview = StreamingCellPreview(manager, NOTEBOOK_ID, CellType.MARKDOWN, metadata={"step_id": "s1"}, min_interval=0.0)
+
+    await preview.update("partial")
+    await preview.complete("final")
+
+    assert [p["status"] for p in manager.previews] == [CellStatus.STREAMING.value, CellStatus.SUCCESS.value]
+    assert {p["id"] for p in manager.previews} == {str(preview.cell_id)}
+    assert manager.previews[-1]["cell_metadata"] == {"step_id": "s1", "streaming": False}
+
+
+async def test_persisted_preview_publishes_nothing_more():
+    manager = RecordingNotebookManager()
+    preview = StreamingCellPreview(manager, NOTEBOOK_ID, CellType.MARKDOWN, min_interval=60.0)
+
+    await preview.update("# Ti")
+    await preview.update("# Title")  # throttled, still pending
+    preview.persisted()
+    await preview.flush()
+    await preview.fail("interrupted")
+
+    assert [p["content"] for p in manager.previews] == ["# Ti"]
+    assert preview.completed
+
+
+async def test_preview_fail_keeps_streamed_content_and_is_a_no_op_once_completed():
+    manager = RecordingNotebookManager()
+    preview = StreamingCellPreview(manager, NOTEBOOK_ID, CellType.MARKDOWN, min_interval=60.0)
+
+    await preview.update("# Ti")
+    await preview.update("# Title")  # throttled, still pending
+    await preview.fail("Markdown generation failed: boom")
+    assert manager.previews[-1]["status"] == CellStatus.ERROR.value
+    assert manager.previews[-1]["content"] == "# Title"
+    assert manager.previews[-1]["result"]["error"] == "Markdown generation failed: boom"
+
+    published = len(manager.previews)
+    await preview.fail("again")
+    assert len(manager.previews) == published and preview.completed
+
+
+class _Output(BaseModel):
+    title: str
+
+
+class FakeStreamedRun:
+    def __init__(self, messages):
+        self._messages = messages
+
+    async def stream_structured(self, debounce_by=None):
+        for i, message in enumerate(self._messages):
+            yield message, i == len(self._messages) - 1
+
+    async def validate_structured_output(self, message, allow_partial=False):
+        return _Output.model_validate(message)
+
+
+async def test_stream_partial_outputs_skips_unvalidatable_chunks():
+    run = FakeStreamedRun([{}, {"title": "Dra"}, {"title": "Draft"}])
+    outputs = [(o.title, last) async for o, last in stream_partial_outputs(run)]
+    assert outputs == [("Dra", False), ("Draft", True)]
+
+
+async def test_stream_partial_outputs_raises_if_final_chunk_is_invalid():
+    run = FakeStreamedRun([{"title": "ok"}, {}])
+    with pytest.raises(ValidationError):
+        [o async for o in stream_partial_outputs(run)]
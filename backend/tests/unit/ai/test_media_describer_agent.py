@@ -0,0 +1,105 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from backend.ai.media_agent import MediaUrl, UrlType
+from backend.ai.media_describer_agent import MediaDescriberAgent, _MediaItem
+
+
+def _image(n, size=1000):
+    return _MediaItem(identifier=f"https://example.com/{n}.png", media=MediaUrl(url=f"https://example.com/{n}.png", type=UrlType.IMAGE), size=size)
+
+
+def _frame(video, second):
+    media = MediaUrl(url=video, type=UrlType.VIDEO)
+    return _MediaItem(identifier=f"{video}#t={second}", media=media, frame_path=Path("/nonexistent.jpg"), timestamp=second, size=1000)
+
+
+def _video(url):
+    return _MediaItem(identifier=url, media=MediaUrl(url=url, type=UrlType.VIDEO))
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    agent = MediaDescriberAgent()
+    agent.settings = agent.settings.model_copy(
+        update={
+            "media_shard_max_items": 3,
+            "media_shard_max_bytes": 3000,
+            "media_describe_concurrency": 2,
+            "media_shard_timeout": 0.5,
+            "media_item_timeout": 0.2,
+        }
+    )
+
+    async def no_media(urls):
+        return [_image(media.url.rsplit("/", 1)[1].split(".")[0]) for media in urls]
+
+    monkeypatch.setattr(agent, "_prepare_items", no_media)
+    monkeypatch.setattr(agent, "_cached_descriptions", lambda items: {})
+    agent.stored = {}
+    monkeypatch.setattr(
+        agent, "_store_descriptions",
+        lambda items, descriptions: agent.stored.update({i.identifier: descriptions[i.identifier] for i in items if descriptions.get(i.identifier)}),
+    )
+    return agent
+
+
+def test_shards_by_group_count_and_size(agent):
+    items = [
+        _image(1), _image(2), _frame("https://v/a.mp4", 0), _image(3, size=2000),
+        _video("https://v/b.mp4"), _video("https://v/c.mp4"), _frame("https://v/a.mp4", 5),
+        _image(4), _frame("https://v/a.mp4", 10), _frame("https://v/a.mp4", 15),
+    ]
+    shards = [[item.identifier.rsplit("/", 1)[1] for item in shard] for shard in agent._shard_items(items)]
+    assert shards == [
+        ["1.png", "2.png"],  # 3.png would exceed the byte cap
+        ["a.mp4#t=0", "a.mp4#t=5", "a.mp4#t=10"],
+        ["3.png", "4.png"],
+        ["b.mp4"],
+        ["c.mp4"],
+        ["a.mp4#t=15"],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_shards_run_concurrently_and_failures_fall_back_per_item(agent, monkeypatch):
+    in_flight, peak = 0, 0
+
+    async def bulk(original_query, items):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            await asyncio.sleep(0.05)
+            if any(item.identifier.endswith("/3.png") for item in items):
+                raise RuntimeError("context length exceeded")
+            # The model skips some items of a shard
+            skipped = ("/5.png", "/8.png")
+            return "\n".join(f"{item.identifier}:\nshard description" for item in items if not item.identifier.endswith(skipped))
+        finally:
+            in_flight -= 1
+
+    async def single(item, original_query):
+        if item.identifier.endswith("/8.png"):
+            await asyncio.sleep(1)  # exceeds media_item_timeout
+        return "single description"
+
+    monkeypatch.setattr(agent, "_describe_bulk", bulk)
+    monkeypatch.setattr(agent, "_describe_single", single)
+    urls = [MediaUrl(url=f"https://example.com/{n}.png", type=UrlType.IMAGE) for n in range(1, 9)]
+
+    payload = await agent.describe_media("login fails", urls)
+
+    descriptions = {event.image_identifier.rsplit("/", 1)[1]: event.description for event in payload.timeline_events}
+    assert list(descriptions) == [f"{n}.png" for n in range(1, 9)]  # merged in input order
+    # Shards: [1, 2, 3] fails as a whole, [4, 5, 6] and [7, 8] each skip one item
+    assert [descriptions[f"{n}.png"] for n in (1, 2, 3, 5)] == ["single description"] * 4
+    assert [descriptions[f"{n}.png"] for n in (4, 6, 7)] == ["shard description"] * 3
+    assert descriptions["8.png"] == "(No description returned)"  # timed out alone; the rest still returned
+    assert peak == 2
+    # Descriptions recovered by the per-item fallback are cached too
+    stored = {identifier.rsplit("/", 1)[1]: description for identifier, description in agent.stored.items()}
+    assert sorted(stored) == [f"{n}.png" for n in range(1, 8)]
+    assert stored["3.png"] == "single description"
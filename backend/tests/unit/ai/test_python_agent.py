@@ -4,7 +4,7 @@ import uuid
 from unittest.mock import patch, mock_open, MagicMock
 import tempfile
 
-from backend.ai.python_agent import PythonAgent, IMPORTED_DATA_BASE_PATH
+from backend.ai.python_agent import PythonAgent, PythonRetryState, IMPORTED_DATA_BASE_PATH
 from backend.ai.models import FileDataRef
 from backend.services.notebook_manager import NotebookManager
 
@@ -342,3 +342,31 @@ async def test_prepare_local_file_content_string(mock_open, mock_makedirs, pytho
 
 # Consider adding a similar test for "local_staged_path" if not already present,
 # ensuring it checks for file existence and returns the path.
+
+
+def test_retry_state_tracks_loaded_dataframes_and_failing_step():
+    state = PythonRetryState()
+    started_at = state.begin_attempt()
+    state.record_tool_result(
+        "load_csv", {"csv_path": "/data/a.csv", "df_name": "sales"},
+        {"status": "success", "stdout": "Successfully loaded CSV into dataframe 'sales'"},
+    )
+    state.record_tool_result("run_script", {"script": "print(1)"}, {"status": "success", "stdout": "1"})
+    state.record_tool_result(
+        "run_script", {"script": "sales.foo()"},
+        {"status": "success", "stdout": "Error: AttributeError: 'DataFrame' object has no attribute 'foo'"},
+    )
+    state.record_attempt(1, started_at, False, "UnexpectedModelBehavior")
+
+    assert state.loaded_dataframes == {"sales": "/data/a.csv"}
+    assert state.successful_scripts == 1
+    assert state.attempt_timings[0]["attempt"] == 1
+    assert state.attempt_timings[0]["succeeded"] is False
+
+    prompt = state.build_retry_prompt("Base instructions", 1, "UnexpectedModelBehavior")
+    assert prompt.startswith("Base instructions")
+    assert "sales (from /data/a.csv)" in prompt
+    assert "AttributeError" in prompt
+
+    state.begin_attempt()
+    assert state.last_failed_tool is None
@@ -0,0 +1,28 @@
+import json
+
+import pytest
+from pydantic_ai.messages import ModelResponse, ToolCallPart
+from pydantic_ai.models.function import AgentInfo, DeltaToolCall, FunctionModel
+
+from backend.ai.models import InvestigationStepModel, StepType
+from backend.ai.step_agents import MarkdownStepAgent
+from backend.core.query_result import MarkdownQueryResult
+
+
+async def _invalid_stream(messages, info: AgentInfo):
+    yield {0: DeltaToolCall(name=info.output_tools[0].name, json_args='{"query": "q", "data": 5}')}
+
+
+def _valid_run(messages, info: AgentInfo):
+    return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name, json.dumps({"query": "q", "data": "# Fixed"}))])
+
+
+@pytest.mark.asyncio
+async def test_markdown_step_reruns_without_streaming_when_the_streamed_output_is_invalid():
+    agent = MarkdownStepAgent("nb", FunctionModel(_valid_run, stream_function=_invalid_stream), None)
+    step = InvestigationStepModel(step_id="s1", description="Summarize", step_type=StepType.MARKDOWN)
+
+    events = [event async for event in agent.execute(step, "Summarize", "session", {})]
+    final = [e for e in events if isinstance(e, dict) and e.get("type") == "final_step_result"]
+    assert len(final) == 1
+    assert isinstance(final[0]["result"], MarkdownQueryResult) and final[0]["result"].data == "# Fixed"
@@ -0,0 +1,107 @@
+from backend.ai.models import InvestigationStepModel, StepType
+from backend.ai.step_context import (
+    StepContextBuilder,
+    allocate_token_budget,
+    estimate_tokens,
+    render_step_output,
+    truncate_to_tokens,
+)
+from backend.ai.step_result import StepResult
+
+
+def _executed(step_id: str, description: str, step_type: StepType = StepType.GITHUB) -> dict:
+    return {
+        "step": InvestigationStepModel(step_id=step_id, step_type=step_type, description=description).model_dump(),
+        "error": None,
+    }
+
+
+def test_estimate_and_truncate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+    text = "x" * 1000
+    truncated = truncate_to_tokens(text, 50)
+    assert estimate_tokens(truncated) <= 50
+    assert truncated.endswith("...[truncated]")
+    assert truncate_to_tokens("short", 50) == "short"
+
+
+def test_allocate_budget_redistributes_surplus():
+    allocation = allocate_token_budget({"small": 10, "big": 1000}, {"small": 1.0, "big": 1.0}, 500)
+    assert allocation["small"] == 10
+    assert allocation["big"] == 490
+
+
+def test_allocate_budget_respects_weights():
+    allocation = allocate_token_budget({"a": 1000, "b": 1000}, {"a": 3.0, "b": 1.0}, 400)
+    assert allocation["a"] == 300
+    assert allocation["b"] == 100
+
+
+def test_allocate_budget_fits_all_when_budget_is_large():
+    allocation = allocate_token_budget({"a": 10, "b": 20}, {"a": 1.0, "b": 1.0}, 1000)
+    assert allocation == {"a": 10, "b": 20}
+
+
+def test_rendered_outputs_are_cached_per_step_result():
+    result = StepResult("dep", StepType.GITHUB)
+    result.add_output({"path": "a.py", "content": "print(1)"})
+    calls = []
+
+    def renderer(output):
+        calls.append(output)
+        return render_step_output(output)
+
+    first = result.get_rendered_outputs(renderer)
+    second = result.get_rendered_outputs(renderer)
+    assert first is second
+    assert len(calls) == 1
+    assert first == ["(file: a.py): print(1)"]
+
+    result.add_output("more")
+    assert result.get_rendered_outputs(renderer) == ["(file: a.py): print(1)", "more"]
+
+
+def test_builder_stays_within_budget_and_favours_relevant_dependency():
+    relevant = StepResult("dep_relevant", StepType.GITHUB)
+    relevant.add_output("timeout error in payment service " * 500)
+    unrelated = StepResult("dep_other", StepType.GITHUB)
+    unrelated.add_output("lorem ipsum dolor sit amet " * 500)
+
+    step = InvestigationStepModel(
+        step_id="current",
+        step_type=StepType.MARKDOWN,
+        description="Explain the payment service timeout error",
+        dependencies=["dep_relevant", "dep_other"],
+    )
+    executed = {
+        "dep_relevant": _executed("dep_relevant", "Search payment service for timeout handling"),
+        "dep_other": _executed("dep_other", "List repository files"),
+    }
+
+    builder = StepContextBuilder(token_budget=1000)
+    lines, tokens_used = builder.build_dependency_context(
+        step, executed, {"dep_relevant": relevant, "dep_other": unrelated}
+    )
+
+    assert len(lines) == 2
+    assert lines[0].startswith("- Dependency 'dep_relevant'")
+    assert sum(tokens_used.values()) <= 1000 + 10  # Small slack for prefixes/markers
+    assert tokens_used["dep_relevant"] > tokens_used["dep_other"]
+
+
+def test_builder_reports_failed_dependency_without_outputs():
+    failed = StepResult("dep_failed", StepType.FILESYSTEM)
+    failed.add_error("boom")
+    step = InvestigationStepModel(
+        step_id="current", step_type=StepType.MARKDOWN, description="Summarize", dependencies=["dep_failed"]
+    )
+    executed = {"dep_failed": _executed("dep_failed", "Read logs", StepType.FILESYSTEM)}
+
+    lines, tokens_used = StepContextBuilder(token_budget=1000).build_dependency_context(
+        step, executed, {"dep_failed": failed}
+    )
+
+    assert "Failed: boom" in lines[0]
+    assert tokens_used["dep_failed"] == estimate_tokens(lines[0])
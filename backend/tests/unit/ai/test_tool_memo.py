@@ -0,0 +1,111 @@
+import pytest
+from pydantic_ai.mcp import MCPServer
+
+from backend.ai.tool_memo import (
+    MemoizingMCPServerStdio,
+    ToolCallMemo,
+    canonicalize_args,
+    get_current_tool_memo,
+    tool_memo_scope,
+)
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def upstream_calls(monkeypatch):
+    calls = []
+
+    async def fake_call_tool(self, tool_name, arguments):
+        calls.append((tool_name, arguments))
+        return {"tool": tool_name, "args": arguments, "n": len(calls)}
+
+    monkeypatch.setattr(MCPServer, "call_tool", fake_call_tool)
+    return calls
+
+
+def _server(connection_key="filesystem:1"):
+    return MemoizingMCPServerStdio(command="unused", args=[], connection_key=connection_key)
+
+
+async def test_canonicalize_args_ignores_key_order():
+    assert canonicalize_args({"b": 1, "a": [1, 2]}) == canonicalize_args({"a": [1, 2], "b": 1})
+    assert canonicalize_args(None) == canonicalize_args({})
+
+
+async def test_read_only_calls_are_served_from_memo(upstream_calls):
+    server = _server()
+    with tool_memo_scope() as memo:
+        first = await server.call_tool("read_file", {"path": "/tmp/a.log"})
+        second = await server.call_tool("read_file", {"path": "/tmp/a.log"})
+        await server.call_tool("read_file", {"path": "/tmp/b.log"})
+
+    assert first == second
+    assert len(upstream_calls) == 2
+    assert (memo.hits, memo.misses) == (1, 2)
+    assert get_current_tool_memo() is None
+
+
+async def test_non_allowlisted_and_unscoped_calls_always_reach_server(upstream_calls):
+    server = _server()
+    with tool_memo_scope():
+        await server.call_tool("write_file", {"path": "/tmp/a.log", "content": "x"})
+        await server.call_tool("write_file", {"path": "/tmp/a.log", "content": "x"})
+    await server.call_tool("read_file", {"path": "/tmp/a.log"})
+    await server.call_tool("read_file", {"path": "/tmp/a.log"})
+
+    assert len(upstream_calls) == 4
+
+
+
+async def test_mutating_calls_invalidate_their_connections_memo(upstream_calls):
+    github, filesystem = _server("github:1"), _server("filesystem:1")
+    with tool_memo_scope():
+        await github.call_tool("get_file_contents", {"path": "README.md"})
+        await filesystem.call_tool("read_file", {"path": "/tmp/a.log"})
+        await github.call_tool("create_or_update_file", {"path": "README.md", "content": "new"})
+        after_write = await github.call_tool("get_file_contents", {"path": "README.md"})
+        await filesystem.call_tool("read_file", {"path": "/tmp/a.log"})
+
+    assert after_write["n"] == 4  # fetched again, not the pre-write result
+    assert len(upstream_calls) == 4  # the other connection's memo is untouched
+
+
+async def test_indexed_filesystem_reads_keep_the_memo(upstream_calls):
+    filesystem = _server("filesystem:1")
+    with tool_memo_scope():
+        await filesystem.call_tool("read_file", {"path": "/tmp/a.log"})
+        await filesystem.call_tool("grep_file", {"path": "/tmp/a.log", "pattern": "ERROR"})
+        await filesystem.call_tool("grep_file", {"path": "/tmp/a.log", "pattern": "ERROR"})
+        await filesystem.call_tool("read_file", {"path": "/tmp/a.log"})
+
+    assert len(upstream_calls) == 2
+
+
+async def test_memo_is_keyed_by_connection(upstream_calls):
+    with tool_memo_scope():
+        await _server("github:1").call_tool("search_code", {"q": "timeout"})
+        await _server("github:2").call_tool("search_code", {"q": "timeout"})
+
+    assert len(upstream_calls) == 2
+
+
+async def test_cached_results_are_isolated_copies(upstream_calls):
+    server = _server()
+    with tool_memo_scope():
+        first = await server.call_tool("list_directory", {"path": "/"})
+        first["mutated"] = True
+        second = await server.call_tool("list_directory", {"path": "/"})
+
+    assert "mutated" not in second
+
+
+async def test_cached_marker_is_consumed_once_per_hit():
+    memo = ToolCallMemo()
+    memo.store("fs:1", "read_file", {"path": "a"}, "content")
+    assert memo.consume_cached_marker("read_file", {"path": "a"}) is False
+
+    found, _ = memo.lookup("fs:1", "read_file", {"path": "a"})
+    assert found
+    assert memo.consume_cached_marker("read_file", {"path": "a"}) is True
+    assert memo.consume_cached_marker("read_file", {"path": "a"}) is False
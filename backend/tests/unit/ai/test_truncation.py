@@ -0,0 +1,43 @@
+import json
+
+from backend.ai.utils.truncation import render_tool_output, truncate_structure, truncate_text, truncate_tool_output
+
+
+def test_text_keeps_head_and_tail_lines():
+    text = "\n".join(f"line {i:04d}" for i in range(1000))
+    truncated = truncate_text(text, limit=200)
+
+    head, marker_and_tail = truncated.split("\n\n...[output truncated", 1)
+    assert head.startswith("line 0000\n") and head.endswith("line 0019")
+    assert f"original length {len(text)} characters, 1000 lines" in marker_and_tail
+    assert marker_and_tail.rstrip().endswith("line 0999")
+    assert len(truncated) < 400
+
+
+def test_structures_that_fit_are_returned_unchanged():
+    result = {"path": "/var/log/app.log", "matches": [1, 2, 3]}
+    assert truncate_tool_output(result, limit=1000) is result
+    assert truncate_tool_output(42, limit=1) == 42
+
+
+def test_large_nested_result_is_elided_structurally():
+    result = {
+        "path": "/var/log/app.log",
+        "content": "\n".join(f"2024-01-01T00:00:{i % 60:02d} GET /health 200" for i in range(200_000)),
+        "matches": [{"line": i, "text": f"match {i}"} for i in range(5_000)],
+        "raw": b"\x00" * 1_000_000,
+    }
+    for key in range(50):
+        result[f"extra_{key}"] = "x" * 500
+
+    elided = truncate_structure(result, budget=4000)
+    rendered = json.dumps(elided)
+
+    assert len(rendered) < 6000
+    assert elided["path"] == "/var/log/app.log"
+    assert "...[output truncated" in elided["content"] and elided["content"].rstrip().endswith("GET /health 200")
+    assert any(isinstance(item, str) and "items elided" in item for item in elided["matches"])
+    assert elided["matches"][-1] == {"line": 4999, "text": "match 4999"}
+    assert elided["raw"] == "<1000000 bytes>"
+    assert "more keys elided" in elided["..."]
+    assert json.loads(render_tool_output(result, limit=4000)) == elided
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from backend.core import tabular_staging
+from backend.core.tabular_staging import describe_tabular_file, detect_delimiter
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tabular_staging, "DATASET_CACHE_DIR", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
+
+def _write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_detect_delimiter():
+    assert detect_delimiter("a,b,c\n1,2,3\n4,5,6\n") == ","
+    assert detect_delimiter("host\tstatus\nweb-1\t200\nweb-2\t503\n") == "\t"
+    assert detect_delimiter("2024-01-01 ERROR something broke\n2024-01-01 INFO fine, really\n") is None
+    assert detect_delimiter("just one line") is None
+
+
+def test_description_is_cached_until_the_file_changes(tmp_path, monkeypatch):
+    path = _write(tmp_path / "requests.csv", "host,status,latency_ms\nweb-1,200,12.5\nweb-2,503,\nweb-1,200,9.0\n")
+
+    info = describe_tabular_file(path)
+    assert info.row_count == 3
+    assert [c["name"] for c in info.columns] == ["host", "status", "latency_ms"]
+    assert info.sample[1]["host"] == "web-2"
+    assert info.sample[1]["latency_ms"] is None
+
+    # A second call is served from the sidecar without parsing the file again
+    with monkeypatch.context() as m:
+        m.setattr(tabular_staging, "detect_delimiter", lambda sample: pytest.fail("file was re-parsed"))
+        assert describe_tabular_file(path) == info
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("web-3,200,7.0\n")
+    os.utime(path, ns=(info.source_mtime_ns + 10**9, info.source_mtime_ns + 10**9))
+    assert describe_tabular_file(path).row_count == 4
+
+
+def test_non_tabular_file_is_not_described(tmp_path):
+    assert describe_tabular_file(_write(tmp_path / "app.log", "started\nlistening on :8080\n")) is None
+
+
+def test_parquet_copy_is_written_with_pyarrow(tmp_path):
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("pyarrow")
+    path = _write(tmp_path / "data.tsv", "id\tname\n1\ta\n2\tb\n")
+
+    info = describe_tabular_file(path)
+    assert info.format == "parquet"
+    assert os.path.exists(info.columnar_path)
+    assert info.load_hint().startswith("pd.read_parquet(")
+    assert pd.read_parquet(info.columnar_path)["name"].tolist() == ["a", "b"]
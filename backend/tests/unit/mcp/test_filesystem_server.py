@@ -0,0 +1,72 @@
+import os
+
+import pytest
+from pydantic_ai.exceptions import ModelRetry
+
+from backend.mcp.filesystem_server import AccessDeniedError, FilesystemTools, InProcessMCPServer, build_filesystem_server
+from backend.services.connection_handlers.filesystem_handler import FileSystemConnectionHandler
+
+
+@pytest.fixture
+def roots(tmp_path):
+    logs, src, secret = tmp_path / "logs", tmp_path / "src", tmp_path / "secret"
+    for directory in (logs, src / "node_modules" / "pkg", secret):
+        directory.mkdir(parents=True)
+    (logs / "app.log").write_text("".join(f"line {i}\n" for i in range(1, 101)))
+    (src / "app_main.py").write_text("print('hi')\n")
+    (src / "node_modules" / "pkg" / "app.js").write_text("")
+    (secret / "token.txt").write_text("s3cr3t")
+    os.symlink(secret / "token.txt", logs / "escape.txt")
+    return logs, src, secret
+
+
+@pytest.mark.asyncio
+async def test_reads_and_confinement_cover_every_allowed_directory(roots):
+    logs, src, secret = roots
+    fs = FilesystemTools([str(logs), str(src)])
+
+    assert (await fs.read_file(str(logs / "app.log"), head=2)) == "line 1\nline 2\n"
+    assert (await fs.read_file(str(logs / "app.log"), tail=2)) == "line 99\nline 100\n"
+    assert (await fs.read_file("app_main.py")) == "print('hi')\n"  # relative to the allowed directory holding it
+    assert (await fs.list_directory(str(logs))) == "[FILE] app.log\n[FILE] escape.txt"
+
+    for outside in (str(secret / "token.txt"), str(logs / "escape.txt"), str(logs / ".." / "secret" / "token.txt")):
+        with pytest.raises(AccessDeniedError):
+            await fs.read_file(outside)
+
+    found = await fs.search_files(str(src), "APP", ["node_modules"])
+    assert found == str(src / "app_main.py")
+
+    small = FilesystemTools([str(logs)], read_max_bytes=10)
+    with pytest.raises(ValueError, match="head or tail"):
+        await small.read_file(str(logs / "app.log"))
+
+
+@pytest.mark.asyncio
+async def test_in_process_server_speaks_mcp(roots):
+    logs, src, _ = roots
+    server = InProcessMCPServer(build_filesystem_server([str(logs), str(src)]), connection_key="filesystem:test")
+
+    async with server:
+        tools = {tool.name: tool for tool in await server.list_tools()}
+        assert {"read_file", "search_files", "list_directory", "get_file_info", "list_allowed_directories"} <= set(tools)
+        assert "excludePatterns" in tools["search_files"].parameters_json_schema["properties"]
+        client, server._client = server._client, None  # listed once per run: no second round trip
+        assert [tool.name for tool in await server.list_tools()] == list(tools)
+        server._client = client
+
+        assert await server.call_tool("read_file", {"path": str(src / "app_main.py")}) == "print('hi')\n"
+        info = await server.call_tool("get_file_info", {"path": str(logs / "app.log")})
+        assert "isFile: true" in info and "size: " in info
+        with pytest.raises(ModelRetry, match="Access denied"):
+            await server.call_tool("read_file", {"path": str(logs / "escape.txt")})
+
+
+def test_handler_passes_every_allowed_directory(roots):
+    logs, src, _ = roots
+    handler = FileSystemConnectionHandler()
+    params = handler.get_stdio_params({"allowed_directories": [str(logs), str(src), "/does/not/exist"]})
+    assert params.args == ["-m", "backend.mcp.filesystem_server", str(logs), str(src)]
+    assert isinstance(handler.create_mcp_server({"allowed_directories": [str(logs)]}, "filesystem:1"), InProcessMCPServer)
+    with pytest.raises(ValueError):
+        handler.get_stdio_params({"allowed_directories": ["relative/path"]})
@@ -0,0 +1,72 @@
+import base64
+import io
+import json
+
+import pytest
+
+from backend.services.artifact_store import (
+    ARTIFACT_REF_RE,
+    ArtifactStore,
+    externalize_python_output,
+    parse_markdown_table,
+)
+
+TABLE = """| host   | status | latency_ms | healthy |
+|:-------|-------:|-----------:|:--------|
+| web-1  |    200 |       12.5 | True    |
+| web-2  |    503 |        nan | False   |
+| a\\|b   |    200 |          9 | True    |"""
+
+
+def _png(size=(800, 600)):
+    Image = pytest.importorskip("PIL.Image")
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_markdown_table_becomes_typed_rows():
+    preview = parse_markdown_table(TABLE, max_rows=2)
+    assert preview["columns"] == [
+        {"name": "host", "type": "string"},
+        {"name": "status", "type": "integer"},
+        {"name": "latency_ms", "type": "number"},
+        {"name": "healthy", "type": "boolean"},
+    ]
+    assert preview["rows"] == [["web-1", 200, 12.5, True], ["web-2", 503, None, False]]
+    assert (preview["total_rows"], preview["truncated"]) == (3, True)
+    assert parse_markdown_table("just some text\nmore text", max_rows=10) is None
+
+
+def test_output_keeps_references_only(tmp_path):
+    store = ArtifactStore(str(tmp_path), thumbnail_px=100, max_preview_rows=10)
+    plot = base64.b64encode(_png()).decode()
+    output = f"Summary\n--- DataFrame ---\n{TABLE}\n--- End DataFrame ---\n<PLOT_BASE64>{plot}</PLOT_BASE64>\ndone"
+
+    text, artifacts = externalize_python_output(output, store)
+
+    assert plot not in text and "--- DataFrame ---" not in text
+    assert text.startswith("Summary\n") and text.endswith("\ndone")
+    refs = {m.group(1): m.group(2) for m in ARTIFACT_REF_RE.finditer(text)}
+    assert sorted(refs) == ["dataframe", "plot"] == sorted(a["kind"] for a in artifacts)
+
+    preview = store.load_dataframe(refs["dataframe"])
+    assert preview["total_rows"] == 3 and preview["rows"][2][0] == "a|b"
+    assert json.loads(store.resolve(refs["dataframe"]).read_bytes()) == preview
+
+    original = store.resolve(refs["plot"])
+    thumbnail = store.resolve(refs["plot"], thumbnail=True)
+    assert original.read_bytes() == base64.b64decode(plot)
+    assert thumbnail != original and thumbnail.stat().st_size < original.stat().st_size
+
+    # Same output again: same ids, no new files
+    files = sorted(p for p in tmp_path.rglob("*") if p.is_file())
+    assert externalize_python_output(output, store)[0] == text
+    assert sorted(p for p in tmp_path.rglob("*") if p.is_file()) == files
+
+
+def test_undecodable_blocks_stay_inline(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    output = "<PLOT_BASE64>not-an-image</PLOT_BASE64>\n--- DataFrame ---\nno table here\n--- End DataFrame ---"
+    assert externalize_python_output(output, store) == (output, [])
+    assert store.resolve("../../etc/passwd") is None
@@ -0,0 +1,105 @@
+from backend.services.code_chunker import chunk_file, detect_language
+
+PYTHON_SOURCE = '''import os
+
+
+def small_helper():
+    return 1
+
+
+@decorator
+def decorated():
+    return 2
+
+
+class Parser:
+    """Parses things."""
+
+    def parse(self, text):
+{parse_body}
+
+    def reset(self):
+        self.state = None
+'''
+
+
+def test_detect_language():
+    assert detect_language("a/b.py") == "python"
+    assert detect_language("web/App.TSX") == "javascript"
+    assert detect_language("cmd/main.go") == "go"
+    assert detect_language("README.md") is None
+
+
+def test_python_small_definitions_are_packed_with_symbols():
+    source = PYTHON_SOURCE.format(parse_body="        return text")
+    chunks = chunk_file("mod.py", source, max_chars=4096)
+
+    assert len(chunks) == 1
+    assert chunks[0].start_line == 1
+    assert chunks[0].symbol == "small_helper, decorated, Parser"
+
+
+def test_python_oversized_class_is_split_by_method():
+    body = "\n".join(f"        value_{i} = text.strip() + 'padding padding padding'" for i in range(20))
+    source = PYTHON_SOURCE.format(parse_body=body)
+    chunks = chunk_file("mod.py", source, max_chars=600, overlap_lines=2)
+
+    symbols = [c.symbol for c in chunks]
+    assert "decorated" in symbols[0]
+    assert "Parser.parse" in symbols
+    assert symbols[-1].endswith("Parser.reset")
+    decorated = next(c for c in chunks if "decorated" in (c.symbol or ""))
+    assert "@decorator" in decorated.text
+    # Oversized method falls back to overlapping line windows
+    parse_chunks = [c for c in chunks if c.symbol == "Parser.parse"]
+    assert len(parse_chunks) > 1
+    assert parse_chunks[1].start_line <= parse_chunks[0].end_line
+    assert all(len(c.text) <= 600 for c in chunks)
+    assert [c.chunk_index for c in chunks] == list(range(len(chunks)))
+
+
+def test_line_ranges_match_text():
+    source = PYTHON_SOURCE.format(parse_body="        return text")
+    lines = source.splitlines()
+    for chunk in chunk_file("mod.py", source, max_chars=120, overlap_lines=1):
+        assert chunk.text == "\n".join(lines[chunk.start_line - 1:chunk.end_line])
+
+
+def test_javascript_and_go_boundaries():
+    js = "\n".join([
+        "import x from 'x';",
+        "",
+        "/** Adds. */",
+        "export function add(a, b) {",
+        "  return a + b;",
+        "}",
+        "export const mul = (a, b) => {",
+        "  return a * b;",
+        "};",
+        "class Calc {}",
+    ])
+    chunks = chunk_file("calc.js", js, max_chars=60)
+    assert [c.symbol for c in chunks] == [None, "add", "mul", "Calc"]
+    assert chunks[1].start_line == 3
+
+    go = "package main\n\ntype Server struct{}\n\nfunc (s *Server) Start() error {\n\treturn nil\n}\n"
+    # The package clause is packed together with the small type declaration
+    assert [c.symbol for c in chunk_file("main.go", go, max_chars=50)] == ["Server", "Server.Start"]
+
+
+def test_unknown_language_and_invalid_python_use_line_windows():
+    text = "\n".join(f"line {i}" for i in range(100))
+    chunks = chunk_file("notes.txt", text, max_chars=100, overlap_lines=3)
+    assert len(chunks) > 1
+    assert all(c.symbol is None for c in chunks)
+    assert chunks[1].start_line == chunks[0].end_line - 2
+    assert chunks[-1].end_line == 100
+
+    assert chunk_file("broken.py", "def oops(:\n    pass\n")[0].symbol is None
+    assert chunk_file("empty.py", "") == []
+
+
+def test_overlong_single_line_is_split_by_characters():
+    chunks = chunk_file("bundle.min.js", "x" * 250, max_chars=100)
+    assert [len(c.text) for c in chunks] == [100, 100, 50]
+    assert all(c.start_line == c.end_line == 1 for c in chunks)
@@ -0,0 +1,81 @@
+import pytest
+from qdrant_client import AsyncQdrantClient, models
+
+from backend.services.code_search import (
+    SPARSE_VECTOR_NAME,
+    encode_sparse_document,
+    encode_sparse_query,
+    hybrid_search,
+    sparse_vectors_config,
+    term_index,
+    tokenize_code,
+)
+
+DENSE = "fast-test"
+
+CHUNKS = {
+    1: "def load_config(path):\n    return yaml.safe_load(open(path))",
+    2: "class RetryPolicy:\n    MAX_RETRY_COUNT = 5\n    backoff_seconds = 2",
+    3: "raise ConnectionError('connection reset by peer')",
+    4: "spring.datasource.url=jdbc:postgresql://db/app",
+}
+
+
+def test_tokenizer_keeps_identifiers_and_their_parts():
+    terms = tokenize_code("getUserById(user_id); spring.datasource.url")
+    assert "getuserbyid" in terms
+    assert {"get", "user", "by", "id"} <= set(terms)
+    assert {"user_id", "user"} <= set(terms)
+    assert "spring.datasource.url" in terms
+    assert "datasource" in terms
+
+
+def test_sparse_encoding_is_deterministic_and_saturates():
+    vector = encode_sparse_document("retry retry retry timeout")
+    assert vector == encode_sparse_document("retry retry retry timeout")
+    weights = dict(zip(vector.indices, vector.values))
+    assert weights[term_index("retry")] > weights[term_index("timeout")]
+    assert weights[term_index("retry")] < 3 * weights[term_index("timeout")]
+    assert encode_sparse_query("retry retry").values == [1.0]
+
+
+async def _collection(sparse=True):
+    client = AsyncQdrantClient(":memory:")
+    await client.create_collection(
+        "code",
+        vectors_config={DENSE: models.VectorParams(size=2, distance=models.Distance.COSINE)},
+        sparse_vectors_config=sparse_vectors_config() if sparse else None,
+    )
+    points = []
+    for point_id, text in CHUNKS.items():
+        vector = {DENSE: [1.0, float(point_id)]}
+        if sparse:
+            vector[SPARSE_VECTOR_NAME] = encode_sparse_document(text)
+        points.append(models.PointStruct(id=point_id, vector=vector, payload={"document": text, "file_path": f"f{point_id}.py", "start_line": 1}))
+    await client.upsert("code", points=points)
+    return client
+
+
+@pytest.mark.asyncio
+async def test_exact_identifier_is_found_first_despite_dense_ranking():
+    client = await _collection()
+
+    # The dense query vector favours chunk 1; the pasted identifier only occurs in chunk 2
+    hits = await hybrid_search(client, "code", "MAX_RETRY_COUNT", DENSE, embed_query=lambda q: [1.0, 1.0], limit=2)
+    assert hits[0]["file_path"] == "f2.py"
+    assert hits[0]["content"].startswith("class RetryPolicy")
+    assert hits[0]["start_line"] == 1
+
+    hits = await hybrid_search(client, "code", "spring.datasource.url", DENSE, embed_query=lambda q: [1.0, 1.0], limit=1)
+    assert hits[0]["file_path"] == "f4.py"
+
+
+@pytest.mark.asyncio
+async def test_collections_without_sparse_vectors_fall_back_to_dense():
+    client = await _collection(sparse=False)
+
+    async def embed(query):
+        return [1.0, 3.0]
+
+    hits = await hybrid_search(client, "code", "MAX_RETRY_COUNT", DENSE, embed_query=embed, limit=1)
+    assert hits[0]["file_path"] == "f3.py"
@@ -0,0 +1,172 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from backend.db.models import Base, Connection, ConnectionJob
+from backend.db.repositories import ConnectionJobRepository
+from backend.services.connection_job_worker import ConnectionJobRunner
+from backend.services.connection_jobs import POST_CREATE_ACTIONS_JOB
+from backend.services.git_index_state import GitIndexCheckpoint
+
+
+@pytest_asyncio.fixture
+async def session_factory():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[Connection.__table__, ConnectionJob.__table__])
+    maker = async_sessionmaker(engine, expire_on_commit=False)
+
+    @asynccontextmanager
+    async def factory():
+        async with maker() as session:
+            yield session
+
+    async with factory() as session:
+        session.add(Connection(id="c1", name="repo", type="git_repo", config={}))
+        await session.commit()
+    yield factory
+    await engine.dispose()
+
+
+async def _queue(session_factory, max_attempts=3, params=None):
+    async with session_factory() as session:
+        job = await ConnectionJobRepository(session).create("c1", POST_CREATE_ACTIONS_JOB, params=params, max_attempts=max_attempts)
+    return str(job.id)
+
+
+async def _get(session_factory, job_id):
+    async with session_factory() as session:
+        return await ConnectionJobRepository(session).get(job_id)
+
+
+class FakeHandler:
+    def __init__(self, behaviour):
+        self.behaviour = behaviour
+        self.calls = []
+
+    async def post_create_actions(self, connection_config, job=None, **options):
+        self.calls.append(options)
+        await self.behaviour(job)
+
+
+def _runner(session_factory, handler):
+    return ConnectionJobRunner(worker_id="w1", session_factory=session_factory, handler_lookup=lambda _type: handler)
+
+
+@pytest.mark.asyncio
+async def test_claim_is_exclusive_and_counts_attempts(session_factory):
+    job_id = await _queue(session_factory)
+    async with session_factory() as session:
+        repo = ConnectionJobRepository(session)
+        claimed = await repo.claim_next("w1")
+        assert str(claimed.id) == job_id
+        assert (claimed.status, claimed.attempts, claimed.worker_id) == ("running", 1, "w1")
+        assert await repo.claim_next("w2") is None
+        assert str((await repo.get_active("c1", POST_CREATE_ACTIONS_JOB)).id) == job_id
+
+
+@pytest.mark.asyncio
+async def test_runner_passes_params_and_succeeds(session_factory):
+    async def work(job):
+        job.report_progress("embedding", processed=3, total=3)
+
+    handler = FakeHandler(work)
+    job_id = await _queue(session_factory, params={"full_reindex": True})
+    assert await _runner(session_factory, handler).run_next()
+
+    job = await _get(session_factory, job_id)
+    assert job.status == "succeeded"
+    assert job.progress == {"phase": "embedding", "processed": 3, "total": 3}
+    assert handler.calls == [{"full_reindex": True}]
+    assert not await _runner(session_factory, handler).run_next()
+
+
+@pytest.mark.asyncio
+async def test_failed_job_is_retried_then_marked_failed(session_factory):
+    async def fail(job):
+        raise RuntimeError("qdrant down")
+
+    handler = FakeHandler(fail)
+    job_id = await _queue(session_factory, max_attempts=2)
+    runner = _runner(session_factory, handler)
+
+    await runner.run_next()
+    job = await _get(session_factory, job_id)
+    assert (job.status, job.error) == ("queued", "qdrant down")
+    assert job.run_after > datetime.utcnow()
+
+    # Make the retry due now
+    async with session_factory() as session:
+        await ConnectionJobRepository(session).requeue(job_id, datetime.utcnow())
+    await runner.run_next()
+    job = await _get(session_factory, job_id)
+    assert (job.status, job.attempts) == ("failed", 2)
+
+
+@pytest.mark.asyncio
+async def test_cancel_queued_and_running_jobs(session_factory):
+    queued_id = await _queue(session_factory)
+    async with session_factory() as session:
+        job = await ConnectionJobRepository(session).request_cancel(queued_id)
+    assert job.status == "cancelled"
+
+    running_id = await _queue(session_factory)
+
+    async def wait_for_cancel(job):
+        async with session_factory() as session:
+            await ConnectionJobRepository(session).request_cancel(running_id)
+        await job.flush()  # normally done by the heartbeat loop
+        job.save_checkpoint({"files_done": 1})
+        job.raise_if_cancelled()
+
+    await _runner(session_factory, FakeHandler(wait_for_cancel)).run_next()
+    job = await _get(session_factory, running_id)
+    assert job.status == "cancelled"
+    assert job.checkpoint == {"files_done": 1}
+
+
+@pytest.mark.asyncio
+async def test_worker_shutdown_requeues_without_charging_attempt(session_factory):
+    started = asyncio.Event()
+
+    async def block(job):
+        started.set()
+        await asyncio.Event().wait()
+
+    job_id = await _queue(session_factory)
+    task = asyncio.create_task(_runner(session_factory, FakeHandler(block)).run_next())
+    await started.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    job = await _get(session_factory, job_id)
+    assert (job.status, job.attempts) == ("queued", 0)
+
+
+@pytest.mark.asyncio
+async def test_stale_running_jobs_are_requeued(session_factory):
+    job_id = await _queue(session_factory)
+    async with session_factory() as session:
+        repo = ConnectionJobRepository(session)
+        await repo.claim_next("crashed-worker")
+        assert await repo.requeue_stale(datetime.utcnow() - timedelta(minutes=5)) == 0
+        assert await repo.requeue_stale(datetime.utcnow() + timedelta(seconds=1)) == 1
+    job = await _get(session_factory, job_id)
+    assert (job.status, job.worker_id) == ("queued", None)
+
+
+def test_git_index_checkpoint_tracks_complete_files():
+    current = {"a.py": "ha", "b.py": "hb", "c.py": "hc", "empty.py": "he"}
+    checkpoint = GitIndexCheckpoint({"old.py": "ho"}, current, {"a.py": 2, "b.py": 1, "c.py": 1, "empty.py": 0})
+
+    checkpoint.record(["a.py", "b.py"], ok=True)
+    assert checkpoint.done == {"b.py", "empty.py"}
+    checkpoint.record(["a.py", "c.py", None], ok=False)
+    assert checkpoint.done == {"b.py", "empty.py"}
+    assert checkpoint.failed == {"a.py", "c.py"}
+    assert checkpoint.file_hashes() == {"old.py": "ho", "b.py": "hb", "empty.py": "he"}
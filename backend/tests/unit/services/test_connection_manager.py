@@ -0,0 +1,144 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+import pytest
+import pytest_asyncio
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from backend.db.models import Base, Connection, DefaultConnection
+from backend.services import connection_manager as connection_manager_module
+from backend.services.connection_handlers.base import MCPConnectionHandler
+from backend.services.connection_manager import CONNECTION_CACHE_CHANNEL, ConnectionManager
+
+
+class RecordingRedis:
+    def __init__(self):
+        self.published = []
+
+    async def publish(self, channel, message):
+        self.published.append((channel, json.loads(message)))
+
+
+
+class LokiConfig(BaseModel):
+    url: str = "http://loki:3100"
+
+
+class ConfigOnlyHandler:
+    post_create_actions = MCPConnectionHandler.post_create_actions
+
+    async def prepare_config(self, connection_id, input_data, existing_config):
+        return {}
+
+@pytest_asyncio.fixture
+async def sessions(monkeypatch):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[Connection.__table__, DefaultConnection.__table__])
+    maker = async_sessionmaker(engine, expire_on_commit=False)
+    opened = []
+
+    @asynccontextmanager
+    async def get_db_session():
+        opened.append(1)
+        async with maker() as session:
+            yield session
+            await session.commit()
+
+    async with maker() as session:
+        session.add_all([
+            Connection(id="g1", name="gh-a", type="github", config={"token": "a"}),
+            Connection(id="g2", name="gh-b", type="github", config={"token": "b"}),
+            Connection(id="j1", name="jira", type="jira", config={}),
+            DefaultConnection(connection_type="github", connection_id="g2"),
+        ])
+        await session.commit()
+    monkeypatch.setattr(connection_manager_module, "get_db_session", get_db_session)
+    yield maker, opened
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_reads_are_served_from_one_load(sessions):
+    _, opened = sessions
+    manager = ConnectionManager()
+
+    assert (await manager.get_default_connection("github")).id == "g2"
+    assert [c.id for c in await manager.get_connections_by_type("github")] == ["g1", "g2"]
+    assert (await manager.get_connection("j1")).name == "jira"
+    assert (await manager.get_default_connection("jira")).id == "j1"  # the only one of its type
+    listed = {c["id"]: c for c in await manager.get_all_connections()}
+    assert listed["g2"]["is_default"] and not listed["g1"]["is_default"]
+    assert len(opened) == 1
+
+
+@pytest.mark.asyncio
+async def test_changes_from_other_workers_invalidate_the_cache(sessions):
+    maker, opened = sessions
+    writer, reader = ConnectionManager(), ConnectionManager()
+    writer._redis = RecordingRedis()
+    await reader.get_connections_by_type("github")
+
+    await writer.set_default_connection("g1")
+    channel, message = writer._redis.published[-1]
+    assert channel == CONNECTION_CACHE_CHANNEL and message["connection_id"] == "g1"
+    assert (await writer.get_default_connection("github")).id == "g1"
+
+    assert (await reader.get_default_connection("github")).id == "g2"  # not told yet
+    reader._on_invalidation_message(json.dumps(message))
+    assert (await reader.get_default_connection("github")).id == "g1"
+
+    # A worker ignores its own messages: its cache already has the change
+    loads = len(opened)
+    writer._on_invalidation_message(json.dumps(message))
+    await writer.get_connection("g1")
+    assert len(opened) == loads
+
+
+@pytest.mark.asyncio
+async def test_cache_expires_after_ttl(sessions, monkeypatch):
+    maker, opened = sessions
+    manager = ConnectionManager()
+    manager.settings = manager.settings.model_copy(update={"connection_cache_ttl": 60.0})
+    clock = [1000.0]
+    monkeypatch.setattr(connection_manager_module.time, "monotonic", lambda: clock[0])
+
+    await manager.get_connections_by_type("jira")
+    async with maker() as session:
+        session.add(Connection(id="j2", name="jira-2", type="jira", config={}))
+        await session.commit()
+    assert len(await manager.get_connections_by_type("jira")) == 1
+
+    clock[0] += 61
+    assert len(await manager.get_connections_by_type("jira")) == 2
+    assert len(opened) == 2
+
+
+@pytest.mark.asyncio
+async def test_a_reload_in_flight_does_not_undo_a_local_write(sessions, monkeypatch):
+    manager = ConnectionManager()
+    snapshot_taken, release = asyncio.Event(), asyncio.Event()
+    read_defaults = connection_manager_module.ConnectionRepository.get_default_connection_ids
+
+    async def slow_read(repo):
+        defaults = await read_defaults(repo)
+        snapshot_taken.set()
+        await release.wait()
+        return defaults
+
+    monkeypatch.setattr(connection_manager_module.ConnectionRepository, "get_default_connection_ids", slow_read)
+    monkeypatch.setattr(connection_manager_module, "get_handler", lambda connection_type: ConfigOnlyHandler())
+
+    reader = asyncio.create_task(manager.get_connections_by_type("jira"))
+    await snapshot_taken.wait()
+    creating = asyncio.create_task(manager.create_connection("loki", "loki", LokiConfig()))
+    await asyncio.sleep(0.05)  # written to the DB and the cache, now waiting for the load
+    release.set()
+    await reader
+    created = await creating
+
+    # The first connection of its type became the default, not lost to the older snapshot
+    assert [c.id for c in await manager.get_connections_by_type("loki")] == [created.id]
+    assert (await manager.get_default_connection("loki")).id == created.id
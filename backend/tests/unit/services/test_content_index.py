@@ -0,0 +1,133 @@
+import os
+import time
+
+import pytest
+
+from backend.mcp.filesystem_server import FilesystemTools
+from backend.services.content_index import TRIGRAM_BITMAP_MIN_BYTES, ContentIndex, ContentIndexRegistry, file_trigrams, required_literals
+
+
+@pytest.fixture
+def logs(tmp_path):
+    (tmp_path / "api").mkdir()
+    (tmp_path / "api" / "app.log").write_text(
+        "2024-05-01 INFO started\n2024-05-01 ERROR Timeout talking to db\n2024-05-01 INFO done\n"
+    )
+    (tmp_path / "worker.log").write_text("job 17 ok\njob 18 FAILED: disk full\n")
+    (tmp_path / "core.bin").write_bytes(b"\0\1\2 Timeout in a binary")
+    return tmp_path
+
+
+def _old(path):
+    past = time.time() - 3600
+    os.utime(path, (past, past))
+
+
+def test_required_literals():
+    assert required_literals("Timeout", regex=False) == [[b"Timeout"]]
+    assert required_literals("ab", regex=False) is None
+    assert required_literals(r"job \d+ FAILED", regex=True) == [[b"job ", b" FAILED"]]
+    assert required_literals(r"Timeout|disk full", regex=True) == [[b"Timeout"], [b"disk full"]]
+    assert required_literals(r"Timeout|\d+", regex=True) is None  # one alternative matches anything
+    assert required_literals(r"(", regex=True) is None
+
+
+
+def test_small_and_large_files_yield_the_same_trigrams(tmp_path):
+    line = b"2024-05-01 ERROR disk full on /var/log\n"
+    small, large = tmp_path / "small.log", tmp_path / "large.log"
+    small.write_bytes(line * 10)
+    large.write_bytes(line * (TRIGRAM_BITMAP_MIN_BYTES // len(line) + 1))
+    binary = tmp_path / "blob.bin"
+    binary.write_bytes(b"\0abc")
+
+    assert file_trigrams(str(small)).tolist() == file_trigrams(str(large)).tolist()
+    assert file_trigrams(str(small)).dtype == file_trigrams(str(large)).dtype
+    assert file_trigrams(str(binary)) is None
+
+def test_search_scans_only_candidate_files_and_reports_lines_and_offsets(logs):
+    for path in logs.rglob("*"):
+        _old(path)
+    index = ContentIndex([str(logs)], hot_seconds=60)
+    assert index.refresh() == (2, 0)  # the binary file is not indexed
+
+    hits, scanned = index.search("timeout")
+    assert scanned == 1
+    assert [(os.path.basename(h.path), h.line, h.text) for h in hits] == [
+        ("app.log", 2, "2024-05-01 ERROR Timeout talking to db")
+    ]
+    content = (logs / "api" / "app.log").read_bytes()
+    assert hits[0].offset == content.index(b"Timeout")
+
+    hits, _ = index.search(r"job \d+ FAILED", regex=True)
+    assert [(h.line, h.text) for h in hits] == [(2, "job 18 FAILED: disk full")]
+    assert index.search("timeout", case_sensitive=True) == ([], 1)
+    assert index.search("INFO", under=str(logs / "api"))[0][1].line == 3
+
+
+def test_refresh_picks_up_changes_and_recent_files_are_always_scanned(logs):
+    for path in logs.rglob("*"):
+        _old(path)
+    index = ContentIndex([str(logs)], hot_seconds=60)
+    index.refresh()
+
+    (logs / "worker.log").unlink()
+    (logs / "api" / "app.log").write_text("2024-05-02 ERROR out of memory\n")
+    assert index.refresh() == (1, 1)
+    assert index.search("disk full")[0] == []
+    assert index.search("out of memory")[0][0].line == 1
+
+    # Appended after the refresh: found anyway, since the file was recently modified
+    with open(logs / "api" / "app.log", "a") as f:
+        f.write("2024-05-02 ERROR Timeout again\n")
+    assert [h.line for h in index.search("Timeout again")[0]] == [2]
+
+    for _ in range(3):  # replacements leave dead ids until compaction
+        (logs / "api" / "app.log").write_text(f"rev {time.time_ns()}\n")
+        index.refresh()
+    assert index.file_count == 1 and len([p for p in index._paths if p]) == 1
+    posted = {i for ids in index._postings.values() for i in ids}
+    assert {index._paths[i] for i in posted} - {None} == {str(logs / "api" / "app.log")}  # ids renumbered by compaction
+
+
+@pytest.mark.asyncio
+async def test_search_content_tool_with_and_without_index(logs):
+    plain = FilesystemTools([str(logs)])
+    indexed = FilesystemTools([str(logs)], index=ContentIndex([str(logs)]))
+    indexed.index.refresh()
+
+    for fs in (plain, indexed):
+        result = await fs.search_content("FAILED", max_results=10)
+        header, *lines = result.splitlines()
+        assert header.startswith("1 matches in")
+        assert lines == [f"{logs / 'worker.log'}:2:17: job 18 FAILED: disk full"]
+    assert "(scan)" in (await plain.search_content("FAILED"))
+    assert "(index)" in (await indexed.search_content("FAILED"))
+    with pytest.raises(ValueError):
+        await plain.search_content("(", regex=True)
+
+
+@pytest.mark.asyncio
+async def test_anchors_match_at_line_boundaries(tmp_path):
+    (tmp_path / "app.log").write_text("INFO a\nERROR b\nINFO c\nERROR b\n")
+    for index in (None, ContentIndex([str(tmp_path)], hot_seconds=0)):
+        if index is not None:
+            index.refresh()
+        fs = FilesystemTools([str(tmp_path)], index=index)
+        for pattern in ("^ERROR", "b$"):
+            header, *lines = (await fs.search_content(pattern, regex=True)).splitlines()
+            assert [line.split(":")[1] for line in lines] == ["2", "4"], (pattern, header)
+
+
+@pytest.mark.asyncio
+async def test_registry_drops_released_and_idle_indexes(logs):
+    registry = ContentIndexRegistry(idle_seconds=60)
+    used, idle, _ = (registry.get(f"filesystem:{n}", [str(logs)]) for n in (1, 2, 3))
+    assert registry.get("filesystem:1", [str(logs)]) is used
+
+    registry.drop("filesystem:3")
+    registry._last_requested["filesystem:2"] -= 120
+    registry._drop_idle()
+    assert sorted(registry._indexes) == ["filesystem:1"]
+    assert registry.get("filesystem:2", [str(logs)]) is not idle  # rebuilt when requested again
+    await registry.shutdown()
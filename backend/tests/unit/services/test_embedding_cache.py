@@ -0,0 +1,60 @@
+import pytest
+
+from backend.services.embedding_cache import EmbeddingCache, chunk_hash
+
+MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def test_round_trip_is_keyed_by_model_and_hash(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_bytes=1 << 20)
+    cache.put_many(MODEL, {chunk_hash("a"): [1.0, 2.0], chunk_hash("b"): [3.0, 4.0]})
+
+    found = cache.get_many(MODEL, [chunk_hash("a"), chunk_hash("b"), chunk_hash("c")])
+    assert found == {chunk_hash("a"): [1.0, 2.0], chunk_hash("b"): [3.0, 4.0]}
+    assert cache.get_many("other-model", [chunk_hash("a")]) == {}
+    assert cache.size_bytes() == 2 * 2 * 4
+    cache.close()
+
+    # Persisted across instances (e.g. after a restart)
+    reopened = EmbeddingCache(str(tmp_path), max_bytes=1 << 20)
+    assert reopened.get_many(MODEL, [chunk_hash("b")]) == {chunk_hash("b"): [3.0, 4.0]}
+    reopened.close()
+
+
+def test_existing_entries_are_not_overwritten(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_bytes=1 << 20)
+    cache.put_many(MODEL, {"h": [1.0]})
+    cache.put_many(MODEL, {"h": [9.0]})
+    assert cache.get_many(MODEL, ["h"]) == {"h": [1.0]}
+    assert cache.size_bytes() == 4
+
+
+def test_lru_eviction_reuses_slots(tmp_path):
+    # Room for 4 vectors of dim 4 (16 bytes each)
+    cache = EmbeddingCache(str(tmp_path), max_bytes=64)
+    cache.put_many(MODEL, {f"h{i}": [float(i)] * 4 for i in range(4)})
+    cache.get_many(MODEL, ["h0"])  # h0 becomes most recently used
+
+    cache.put_many(MODEL, {"h4": [4.0] * 4})
+
+    assert cache.size_bytes() <= 64 * 0.9
+    remaining = cache.get_many(MODEL, [f"h{i}" for i in range(5)])
+    assert "h0" in remaining and "h4" in remaining
+    assert "h1" not in remaining
+    assert remaining["h4"] == [4.0] * 4
+    vector_files = list(tmp_path.glob("*.f32"))
+    assert len(vector_files) == 1
+    assert vector_files[0].stat().st_size <= 5 * 16
+
+
+def test_dimension_change_resets_model(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_bytes=1 << 20)
+    cache.put_many(MODEL, {"a": [1.0, 2.0]})
+    cache.put_many(MODEL, {"b": [1.0, 2.0, 3.0]})
+    assert cache.get_many(MODEL, ["a", "b"]) == {"b": [1.0, 2.0, 3.0]}
+
+
+@pytest.mark.parametrize("text", ["", "déjà vu", "x" * 10_000])
+def test_chunk_hash_is_stable(text):
+    assert chunk_hash(text) == chunk_hash(text)
+    assert len(chunk_hash(text)) == 64
@@ -0,0 +1,136 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend.services.code_search import SPARSE_VECTOR_NAME, encode_sparse_document
+from backend.services.embedding_cache import EmbeddingCache
+from backend.services.git_index_pipeline import (
+    EmbeddingUpsertPipeline,
+    IndexDocument,
+    fastembed_vector_name,
+)
+
+pytestmark = pytest.mark.asyncio
+
+
+def _fake_embed(model_name, texts):
+    if any(t == "boom" for t in texts):
+        raise RuntimeError("embedding failed")
+    return [[float(len(t)), 0.5] for t in texts]
+
+
+class RecordingQdrantClient:
+    def __init__(self, upsert_delay=0.01):
+        self.upsert_delay = upsert_delay
+        self.points = {}
+        self.created = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def collection_exists(self, collection_name):
+        return bool(self.created)
+
+    async def create_collection(self, collection_name, vectors_config, sparse_vectors_config=None):
+        self.created.append(vectors_config)
+
+    async def upsert(self, collection_name, points):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.upsert_delay)
+        self.in_flight -= 1
+        for point in points:
+            self.points[point.id] = point
+
+
+def _docs(n, poison=None):
+    return [
+        IndexDocument(id=f"00000000-0000-0000-0000-{i:012d}", text="boom" if i == poison else f"doc {i}", metadata={"file_path": f"f{i}.py"})
+        for i in range(n)
+    ]
+
+
+def _pipeline(client, **kwargs):
+    return EmbeddingUpsertPipeline(
+        client, "col", "sentence-transformers/all-MiniLM-L6-v2",
+        embed_fn=_fake_embed, executor=ThreadPoolExecutor(4), **kwargs,
+    )
+
+
+async def test_pipeline_upserts_all_documents_in_fastembed_layout():
+    client = RecordingQdrantClient()
+    stats = await _pipeline(client, batch_size=3, max_in_flight=2).run(_docs(10))
+
+    assert stats.documents == 10
+    assert stats.batches == 4
+    assert not stats.failed
+    assert stats.docs_per_sec > 0
+    assert len(client.created) == 1
+    vector_name = fastembed_vector_name("sentence-transformers/all-MiniLM-L6-v2")
+    assert vector_name == "fast-all-minilm-l6-v2"
+    assert list(client.created[0]) == [vector_name]
+    point = client.points["00000000-0000-0000-0000-000000000004"]
+    assert point.payload == {"document": "doc 4", "file_path": "f4.py"}
+    assert point.vector[vector_name] == [5.0, 0.5]
+    assert point.vector[SPARSE_VECTOR_NAME] == encode_sparse_document("doc 4")
+
+
+async def test_pipeline_bounds_in_flight_batches():
+    client = RecordingQdrantClient(upsert_delay=0.02)
+    await _pipeline(client, batch_size=1, max_in_flight=3).run(_docs(12))
+
+    assert 1 < client.max_in_flight <= 3
+
+
+async def test_pipeline_reports_failed_batches_and_accepts_async_input():
+    async def stream():
+        for doc in _docs(6, poison=4):
+            yield doc
+
+    client = RecordingQdrantClient()
+    stats = await _pipeline(client, batch_size=2, max_in_flight=2).run(stream())
+
+    assert stats.documents == 4
+    assert sorted(d.metadata["file_path"] for d in stats.failed) == ["f4.py", "f5.py"]
+    assert len(client.points) == 4
+
+
+
+async def test_pipeline_survives_a_failing_batch_callback():
+    async def on_batch_done(batch, ok):
+        raise OSError("manifest save failed")
+
+    client = RecordingQdrantClient(upsert_delay=0)
+    pipeline = _pipeline(client, batch_size=1, max_in_flight=2, on_batch_done=on_batch_done)
+    stats = await pipeline.run(_docs(8))  # used to hang once every worker had died
+
+    assert stats.documents == 8 and stats.batches == 8
+
+async def test_pipeline_reuses_cached_embeddings(tmp_path):
+    embedded = []
+
+    def counting_embed(model_name, texts):
+        embedded.extend(texts)
+        return _fake_embed(model_name, texts)
+
+    cache = EmbeddingCache(str(tmp_path), max_bytes=1 << 20)
+
+    def pipeline(client):
+        return EmbeddingUpsertPipeline(
+            client, "col", "m", batch_size=4, max_in_flight=2,
+            embed_fn=counting_embed, executor=ThreadPoolExecutor(2), cache=cache,
+        )
+
+    first = await pipeline(RecordingQdrantClient()).run(_docs(6))
+    assert (first.cache_hits, first.cache_misses) == (0, 6)
+
+    # A fork with the same content plus one new document only embeds the new one
+    embedded.clear()
+    client = RecordingQdrantClient()
+    docs = _docs(6) + [IndexDocument(id="00000000-0000-0000-0000-000000000099", text="new", metadata={})]
+    second = await pipeline(client).run(docs)
+
+    assert embedded == ["new"]
+    assert (second.cache_hits, second.cache_misses) == (6, 1)
+    assert second.cache_hit_ratio == pytest.approx(6 / 7)
+    assert client.points["00000000-0000-0000-0000-000000000003"].vector["fast-m"] == [5.0, 0.5]
@@ -0,0 +1,180 @@
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from backend.services import git_repo_source
+from backend.services.connection_handlers import git_repo_handler
+from backend.services.connection_handlers.git_repo_handler import GitRepoConnectionHandler
+from backend.services.git_index_pipeline import EmbeddingUpsertPipeline
+from backend.services.git_index_state import (
+    INDEX_FORMAT_VERSION,
+    GitIndexState,
+    GitIndexStateStore,
+    diff_file_hashes,
+    file_point_id,
+    hash_file_content,
+)
+
+
+def test_diff_file_hashes_classifies_files():
+    previous = {"a.py": "1", "b.py": "2", "c.py": "3"}
+    current = {"a.py": "1", "b.py": "20", "d.py": "4"}
+
+    diff = diff_file_hashes(previous, current)
+
+    assert diff.added == ["d.py"]
+    assert diff.changed == ["b.py"]
+    assert diff.removed == ["c.py"]
+    assert diff.unchanged == 1
+    assert diff.to_embed == ["d.py", "b.py"]
+    assert diff.to_delete == ["b.py", "c.py"]
+    assert diff_file_hashes(current, current).is_empty
+
+
+def test_point_ids_are_deterministic_per_connection_and_chunk():
+    assert file_point_id("c1", "a.py") == file_point_id("c1", "a.py")
+    assert file_point_id("c1", "a.py") != file_point_id("c2", "a.py")
+    assert file_point_id("c1", "a.py", 0) != file_point_id("c1", "a.py", 1)
+
+
+def test_state_store_round_trip_and_corrupt_file(tmp_path):
+    store = GitIndexStateStore(str(tmp_path))
+    state = GitIndexState(
+        connection_id="c1", repo_url="https://x/r", collection_name="col",
+        embedding_model="m", commit_sha="a" * 40, file_hashes={"a.py": hash_file_content("x")},
+        format_version=INDEX_FORMAT_VERSION,
+    )
+    store.save(state)
+
+    loaded = store.load("c1")
+    assert loaded is not None
+    assert loaded.file_hashes == state.file_hashes
+    assert loaded.is_compatible_with("https://x/r", "col", "m")
+    assert not loaded.is_compatible_with("https://x/r", "col", "other-model")
+    assert not loaded.model_copy(update={"format_version": 1}).is_compatible_with("https://x/r", "col", "m")
+
+    (tmp_path / "c1.json").write_text("{not json")
+    assert store.load("c1") is None
+
+    store.delete("c1")
+    store.delete("c1")
+    assert store.load("c1") is None
+
+
+class FakeQdrantClient:
+    instances = []
+
+    def __init__(self, **kwargs):
+        self.added = []
+        self.deleted = []
+        self.dropped = False
+        FakeQdrantClient.instances.append(self)
+
+    async def collection_exists(self, collection_name):
+        return True
+
+    async def delete_collection(self, collection_name):
+        self.dropped = True
+
+    async def create_collection(self, collection_name, vectors_config, sparse_vectors_config=None):
+        pass
+
+    async def upsert(self, collection_name, points):
+        self.added.extend(p.payload.get("file_path", p.payload["type"]) for p in points)
+
+    async def delete(self, collection_name, points_selector):
+        self.deleted.append(points_selector.filter.must[1].match)
+
+    async def close(self):
+        pass
+
+
+def _fake_embed(model_name, texts):
+    return [[float(len(t)), 1.0] for t in texts]
+
+
+@pytest.fixture
+def indexing_env(monkeypatch, tmp_path):
+    FakeQdrantClient.instances = []
+    repo = {"head": "a" * 40, "files": {}, "state_dir": str(tmp_path)}
+
+    async def fake_clone(url, dest, timeout=600.0):
+        for path, content in repo["files"].items():
+            os.makedirs(os.path.dirname(os.path.join(dest, path)) or dest, exist_ok=True)
+            with open(os.path.join(dest, path), "w") as f:
+                f.write(content)
+        return repo["head"]
+
+    async def fake_head(url):
+        return repo["head"]
+
+    monkeypatch.setenv("SHERLOG_QDRANT_DB_URL", "http://qdrant:6333")
+    monkeypatch.setattr(git_repo_handler, "AsyncQdrantClient", FakeQdrantClient)
+    monkeypatch.setattr(git_repo_source, "clone_repository", fake_clone)
+    monkeypatch.setattr(git_repo_handler, "resolve_remote_head", fake_head)
+    monkeypatch.setattr(git_repo_handler, "get_embedding_cache", lambda: None)
+    monkeypatch.setattr(git_repo_handler, "get_settings", lambda: SimpleNamespace(
+        git_index_state_dir=str(tmp_path), git_index_chunk_max_chars=2048, git_index_chunk_overlap_lines=5,
+        connection_job_checkpoint_interval=30.0, git_index_max_file_bytes=1024, git_index_clone_dir=str(tmp_path / "clones"),
+    ))
+    monkeypatch.setattr(
+        git_repo_handler, "EmbeddingUpsertPipeline",
+        functools.partial(EmbeddingUpsertPipeline, batch_size=2, max_in_flight=2, embed_fn=_fake_embed, executor=ThreadPoolExecutor(2)),
+    )
+    return repo
+
+
+@pytest.mark.asyncio
+async def test_refresh_only_reindexes_changed_files(indexing_env):
+    handler = GitRepoConnectionHandler()
+    connection = SimpleNamespace(id="c1", config={"repo_url": "https://x/r", "collection_name": "col"})
+
+    indexing_env["files"] = {"a.py": "a", "b.py": "b", "c.py": "c"}
+    await handler.post_create_actions(connection)
+    first = FakeQdrantClient.instances[-1]
+    assert first.dropped
+    assert sorted(first.added) == ["a.py", "b.py", "c.py", "summary", "tree"]
+
+    # Same commit: no client is even created
+    await handler.post_create_actions(connection)
+    assert len(FakeQdrantClient.instances) == 1
+
+    indexing_env["head"] = "b" * 40
+    indexing_env["files"] = {"a.py": "a", "b.py": "b2", "d.py": "d"}
+    await handler.post_create_actions(connection)
+    second = FakeQdrantClient.instances[-1]
+    assert not second.dropped
+    assert sorted(second.added) == ["b.py", "d.py", "summary", "tree"]
+    assert second.deleted[0].any == ["b.py", "c.py"]
+
+    await handler.post_create_actions(connection, full_reindex=True)
+    third = FakeQdrantClient.instances[-1]
+    assert third.dropped
+    assert sorted(third.added) == ["a.py", "b.py", "d.py", "summary", "tree"]
+
+
+
+@pytest.mark.asyncio
+async def test_resumes_from_checkpoint_manifest(indexing_env):
+    handler = GitRepoConnectionHandler()
+    connection = SimpleNamespace(id="c1", config={"repo_url": "https://x/r", "collection_name": "col"})
+    indexing_env["files"] = {"a.py": "a", "b.py": "b", "c.py": "c"}
+    # An interrupted run checkpointed a.py only (no commit SHA)
+    GitIndexStateStore(indexing_env["state_dir"]).save(GitIndexState(
+        connection_id="c1", repo_url="https://x/r", collection_name="col",
+        embedding_model="sentence-transformers/all-MiniLM-L6-v2", commit_sha=None,
+        file_hashes={"a.py": hash_file_content("a")}, format_version=INDEX_FORMAT_VERSION,
+    ))
+
+    await handler.post_create_actions(connection)
+    client = FakeQdrantClient.instances[-1]
+    assert not client.dropped
+    # Files missing from the checkpoint may have partial chunks, so they are cleared first
+    assert client.deleted[0].any == ["b.py", "c.py"]
+    assert sorted(client.added) == ["b.py", "c.py", "summary", "tree"]
+    state = GitIndexStateStore(indexing_env["state_dir"]).load("c1")
+    assert state.commit_sha == "a" * 40
+    assert sorted(state.file_hashes) == ["a.py", "b.py", "c.py"]
@@ -0,0 +1,84 @@
+import os
+
+from backend.services.git_index_state import hash_file_content
+from backend.services.git_repo_source import (
+    CloneRepoSource,
+    IngestedRepoSource,
+    is_probably_binary,
+    iter_gitingest_files,
+    render_tree,
+)
+
+
+def _write(root, path, data):
+    full_path = os.path.join(root, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "wb") as f:
+        f.write(data)
+
+
+def test_binary_detection():
+    assert is_probably_binary(b"\x89PNG\r\n\x1a\n\x00\x00")
+    assert is_probably_binary(bytes(range(1, 7)) * 10)
+    assert not is_probably_binary("def f():\n\treturn 'é'\n".encode())
+    assert not is_probably_binary(b"")
+
+
+def test_clone_source_applies_size_binary_and_directory_filters(tmp_path):
+    root = str(tmp_path)
+    _write(root, "src/app.py", b"print('hi')\n")
+    _write(root, "README.md", b"# readme\n")
+    _write(root, "logo.png", b"\x89PNG\x00\x00data")
+    _write(root, "big.sql", b"x" * 200)
+    _write(root, "node_modules/lib/index.js", b"module.exports = 1\n")
+    _write(root, ".git/config", b"[core]\n")
+    _write(root, "empty.txt", b"   \n")
+
+    source = CloneRepoSource(root, "https://x/r", "a" * 40, max_file_bytes=100)
+    hashes = source.hash_files(hash_file_content)
+    assert sorted(hashes) == ["README.md", "src/app.py"]
+    assert hashes["src/app.py"] == hash_file_content("print('hi')\n")
+    assert list(source.iter_files(["src/app.py", "logo.png", "missing.py"])) == [("src/app.py", "print('hi')\n")]
+    assert source.read_file("../outside.py") is None
+    assert "Files analyzed: 4" in source.summary()
+
+
+def test_gitingest_digest_is_parsed_line_by_line():
+    digest = (
+        "================================================\n"
+        "FILE: a.py\n"
+        "================================================\n"
+        "def a():\n"
+        "    return '===='\n"
+        "\n"
+        "======== FILE: dir/b.md ========\n"
+        "================================================\n"
+        "# B\n"
+        "================================================\n"
+        "FILE: empty.txt\n"
+        "================================================\n"
+    )
+    assert list(iter_gitingest_files(digest.splitlines(keepends=True))) == [
+        ("a.py", "def a():\n    return '===='"),
+        ("dir/b.md", "# B"),
+    ]
+
+
+def test_ingested_source_falls_back_to_raw_text():
+    source = IngestedRepoSource("summary", "tree", "no file markers here", max_file_bytes=1024)
+    assert source.hash_files(hash_file_content) == {}
+    assert source.raw_text() == "no file markers here"
+
+    source = IngestedRepoSource("summary", "tree", {"a.py": "a", "b.bin": "\x00\x01", "c.py": "c" * 2000}, max_file_bytes=1024)
+    assert list(source.iter_paths()) == ["a.py"]
+    assert source.raw_text() is None
+
+
+def test_render_tree():
+    assert render_tree(["src/b.py", "README.md", "src/pkg/a.py"]) == (
+        "README.md\n"
+        "src/\n"
+        "    b.py\n"
+        "    pkg/\n"
+        "        a.py"
+    )
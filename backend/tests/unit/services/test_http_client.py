@@ -0,0 +1,117 @@
+import httpx
+import pytest
+
+from backend.services.http_client import RetryingTransport
+
+pytestmark = pytest.mark.asyncio
+
+
+def _client(handler, **kwargs) -> httpx.AsyncClient:
+    transport = RetryingTransport(httpx.MockTransport(handler), backoff_base=0.0, **kwargs)
+    return httpx.AsyncClient(transport=transport)
+
+
+async def test_retries_transient_status_then_succeeds():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if len(calls) < 3:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"ok": True})
+
+    async with _client(handler, max_retries=3) as client:
+        response = await client.put("https://example.com/api/v1/items/1", json={"a": 1})
+
+    assert response.status_code == 200
+    assert response.json() == {"ok": True}
+    assert len(calls) == 3
+    # The request body must be re-sent intact on every attempt
+    assert all(c.content == calls[0].content for c in calls)
+
+
+async def test_post_is_only_retried_when_it_was_not_processed():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if len(calls) == 1:
+            raise httpx.ConnectError("boom", request=request)
+        if len(calls) == 2:
+            return httpx.Response(429)
+        return httpx.Response(503)
+
+    async with _client(handler, max_retries=5) as client:
+        response = await client.post("https://openrouter.ai/api/v1/chat/completions", json={"a": 1})
+
+    # The connect error and the 429 are retried; the 503 may have been processed and is returned
+    assert response.status_code == 503
+    assert len(calls) == 3
+
+
+async def test_post_is_not_resent_after_a_dropped_connection():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        raise httpx.RemoteProtocolError("Server disconnected", request=request)
+
+    async with _client(handler, max_retries=3) as client:
+        with pytest.raises(httpx.RemoteProtocolError):
+            await client.post("https://openrouter.ai/api/v1/chat/completions", json={"a": 1})
+
+    assert len(calls) == 1
+
+
+async def test_gives_up_after_max_retries():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(429)
+
+    async with _client(handler, max_retries=2) as client:
+        response = await client.get("https://openrouter.ai/api/v1/models")
+
+    assert response.status_code == 429
+    assert len(calls) == 3
+
+
+async def test_retries_connect_errors():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if len(calls) == 1:
+            raise httpx.ConnectError("boom", request=request)
+        return httpx.Response(200)
+
+    async with _client(handler, max_retries=1) as client:
+        response = await client.get("https://openrouter.ai/api/v1/models")
+
+    assert response.status_code == 200
+    assert len(calls) == 2
+
+
+async def test_non_retryable_status_is_returned_immediately():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(400)
+
+    async with _client(handler, max_retries=3) as client:
+        response = await client.get("https://openrouter.ai/api/v1/models")
+
+    assert response.status_code == 400
+    assert len(calls) == 1
+
+
+async def test_per_host_slot_released_after_response():
+    transport = RetryingTransport(httpx.MockTransport(lambda r: httpx.Response(200)), per_host_concurrency=1)
+    async with httpx.AsyncClient(transport=transport) as client:
+        for _ in range(3):
+            response = await client.get("https://openrouter.ai/api/v1/models")
+            assert response.status_code == 200
+
+    assert transport._semaphore_for("openrouter.ai")._value == 1
@@ -0,0 +1,115 @@
+import os
+import re
+from datetime import datetime
+
+import pytest
+
+from backend.mcp.filesystem_server import FilesystemTools
+from backend.services.line_index import (
+    LineIndexCache,
+    grep_with_context,
+    parse_log_timestamp,
+    read_line_range,
+    tail_lines,
+    time_window,
+)
+
+
+def _log_line(n):
+    minute, second = divmod(n, 60)
+    return f"2024-05-01T10:{minute:02d}:{second:02d}.123Z INFO request {n}\n"
+
+
+@pytest.fixture
+def log(tmp_path):
+    path = tmp_path / "app.log"
+    lines = [_log_line(n) for n in range(1, 1001)]
+    lines.insert(500, "Traceback (most recent call last):\n")  # line 501, no timestamp
+    path.write_text("".join(lines))
+    return path
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return LineIndexCache(str(tmp_path / "index"), stride=16, persist_min_bytes=0)
+
+
+def test_line_ranges_and_tail(log, cache):
+    index = cache.get(str(log))
+    assert index.line_count == 1001
+    assert read_line_range(index, 1, 2) == [(1, _log_line(1).rstrip()), (2, _log_line(2).rstrip())]
+    assert read_line_range(index, 501, 2) == [(501, "Traceback (most recent call last):"), (502, _log_line(501).rstrip())]
+    assert read_line_range(index, 1000, 5) == [(1000, _log_line(999).rstrip()), (1001, _log_line(1000).rstrip())]
+    assert read_line_range(index, 2000, 5) == []
+    assert [n for n, _ in tail_lines(index, 3)] == [999, 1000, 1001]
+
+
+def test_index_is_persisted_extended_on_append_and_rebuilt_on_rewrite(log, cache, tmp_path):
+    cache.get(str(log))
+    assert list((tmp_path / "index").rglob("*.npz"))
+
+    with open(log, "a") as f:
+        f.write("appended line\nno newline")
+    reloaded = LineIndexCache(str(tmp_path / "index"), stride=16, persist_min_bytes=0)
+    index = reloaded.get(str(log))
+    assert index.line_count == 1003
+    assert tail_lines(index, 2) == [(1002, "appended line"), (1003, "no newline")]
+
+    log.write_text("fresh\nfile\n")
+    index = reloaded.get(str(log))
+    assert index.line_count == 2 and read_line_range(index, 2, 1) == [(2, "file")]
+
+
+def test_timestamps():
+    assert parse_log_timestamp(b"2024-05-01 10:00:00,5 ERROR x") == datetime(2024, 5, 1, 10, 0, 0, 500000)
+    assert parse_log_timestamp(b"[2024-05-01T12:00:00+02:00] x") == datetime(2024, 5, 1, 10, 0, 0)
+    assert parse_log_timestamp(b'1.2.3.4 - - [01/May/2024:10:00:00 +0000] "GET /"') == datetime(2024, 5, 1, 10, 0, 0)
+    assert parse_log_timestamp(b"    at com.example.Main") is None
+
+
+def test_time_window_binary_searches_and_keeps_untimestamped_lines(log, cache):
+    index = cache.get(str(log))
+    lines, cut = time_window(index, datetime(2024, 5, 1, 10, 8, 19), datetime(2024, 5, 1, 10, 8, 21), max_lines=10)
+    assert not cut
+    assert [n for n, _ in lines] == [499, 500, 501]  # requests 499 and 500, then the traceback
+    lines, cut = time_window(index, datetime(2024, 5, 1, 10, 0, 1), datetime(2024, 5, 1, 11, 0, 0), max_lines=5)
+    assert cut and [n for n, _ in lines] == [1, 2, 3, 4, 5]
+    assert time_window(index, datetime(2024, 5, 2), datetime(2024, 5, 3), max_lines=5) == ([], False)
+
+
+def test_grep_with_context_merges_overlapping_groups(log, cache):
+    index = cache.get(str(log))
+    groups, matches = grep_with_context(index, re.compile(rb"request (10|12|40)\n"), before=1, after=1, max_matches=10)
+    assert matches == 3
+    assert [[(n, is_match) for n, _, is_match in group] for group in groups] == [
+        [(9, False), (10, True), (11, False), (12, True), (13, False)],
+        [(39, False), (40, True), (41, False)],
+    ]
+    groups, matches = grep_with_context(index, re.compile(rb"INFO"), before=0, after=0, max_matches=3, start_line=600, end_line=700)
+    assert matches == 3 and [n for n, _, _ in groups[0]] == [600, 601, 602]
+
+
+@pytest.mark.asyncio
+async def test_line_tools(log, cache):
+    fs = FilesystemTools([str(log.parent)], line_indexes=cache)
+    assert (await fs.tail_lines(str(log), 1)).splitlines() == [f"{log}: lines 1001-1001 of 1001", f"1001: {_log_line(1000).rstrip()}"]
+    assert (await fs.read_lines("app.log", 501, 1)).splitlines()[1] == "501: Traceback (most recent call last):"
+    window = await fs.read_time_window(str(log), "2024-05-01T10:00:01Z", "2024-05-01T10:00:10Z", max_lines=3)
+    assert "continue with read_lines from line 4" in window.splitlines()[0]
+    grep = (await fs.grep_file(str(log), "traceback", before=1, after=0)).splitlines()
+    assert grep == [f"{log}: 1 matching lines", f"500- {_log_line(500).rstrip()}", "501: Traceback (most recent call last):"]
+    with pytest.raises(ValueError):
+        await fs.read_time_window(str(log), "yesterday", "today")
+    assert os.path.basename((await fs.read_lines(str(log), 1, 1)).split(":")[0]) == "app.log"
+
+
+@pytest.mark.asyncio
+async def test_grep_anchors_match_at_line_boundaries(tmp_path, cache):
+    path = tmp_path / "anchors.log"
+    path.write_text("INFO a\nERROR b\nERROR b\nINFO c\nERROR b")
+    fs = FilesystemTools([str(tmp_path)], line_indexes=cache)
+    for pattern in ("^ERROR", "b$"):
+        # line 3 is found by the after-context pass, line 5 has no trailing newline
+        lines = (await fs.grep_file(str(path), pattern, regex=True, before=0, after=1)).splitlines()
+        assert lines[0] == f"{path}: 3 matching lines"
+        assert [line.split(" ")[0] for line in lines[1:]] == ["2:", "3:", "4-", "5:"], pattern
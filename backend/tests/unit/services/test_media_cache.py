@@ -0,0 +1,108 @@
+import asyncio
+import shutil
+import subprocess
+
+import pytest
+
+from backend.ai.media_agent import MediaUrl, UrlType
+from backend.ai.media_describer_agent import MediaDescriberAgent
+from backend.services.media_cache import MediaCache
+
+SCREENSHOT = b"\x89PNG\r\n\x1a\n" + b"fake screenshot" * 100
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = MediaCache(str(tmp_path), frame_interval=1.0, max_frames=10)
+    downloads = []
+
+    async def fake_download(self, url, tmp_dir):
+        downloads.append(url)
+        target = tmp_dir / "media.png"
+        target.write_bytes(SCREENSHOT)
+        return target
+
+    monkeypatch.setattr(MediaCache, "_download_direct", fake_download)
+    cache.downloads = downloads
+    return cache
+
+
+@pytest.mark.asyncio
+async def test_media_is_downloaded_once_and_shared_by_content(cache):
+    first = await cache.get_media("https://example.com/a.png", is_video=False)
+    again = await cache.get_media("https://example.com/a.png", is_video=False)
+    mirror = await cache.get_media("https://mirror.example.com/a.png?v=2", is_video=False)
+
+    assert cache.downloads == ["https://example.com/a.png", "https://mirror.example.com/a.png?v=2"]
+    assert first.sha256 == again.sha256 == mirror.sha256
+    assert first.path == mirror.path and first.path.read_bytes() == SCREENSHOT
+    assert len(list((cache.base_dir / "media").rglob("*.png"))) == 1
+
+
+@pytest.mark.asyncio
+async def test_descriptions_are_reused_across_runs(cache, monkeypatch):
+    agent = MediaDescriberAgent()
+    agent._media_cache = cache
+    calls = []
+
+    async def fake_bulk(self, original_query, items):
+        calls.append([item.identifier for item in items])
+        return "\n".join(f"{item.identifier}:\n# Summary\nLogin form with an error banner" for item in items)
+
+    monkeypatch.setattr(MediaDescriberAgent, "_describe_bulk", fake_bulk)
+    urls = [MediaUrl(url="https://example.com/a.png", type=UrlType.IMAGE)]
+
+    first = await agent.describe_media("login fails", urls)
+    # Same screenshot under another URL: described from the cache, no model call
+    second = await agent.describe_media("login still fails", [MediaUrl(url="https://cdn.example.com/a.png", type=UrlType.IMAGE)])
+
+    assert calls == [["https://example.com/a.png"]]
+    assert first.timeline_events[0].description == second.timeline_events[0].description
+    assert "error banner" in second.timeline_events[0].description
+    assert second.timeline_events[0].image_identifier == "https://cdn.example.com/a.png"
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+async def test_video_keyframes_are_extracted_and_cached(tmp_path, monkeypatch):
+    video = tmp_path / "bug.mp4"
+    subprocess.run(
+        ["ffmpeg", "-loglevel", "error", "-f", "lavfi", "-i", "testsrc=duration=3:size=320x240:rate=10", str(video)],
+        check=True,
+    )
+    cache = MediaCache(str(tmp_path / "cache"), frame_interval=1.0, max_frames=10)
+
+    async def fake_download(self, url, tmp_dir):
+        target = tmp_dir / "media.mp4"
+        shutil.copy(video, target)
+        return target
+
+    monkeypatch.setattr(MediaCache, "_download_direct", fake_download)
+    monkeypatch.setattr("backend.services.media_cache._ytdlp_available", lambda: False)
+
+    media = await cache.get_media("https://example.com/bug.mp4", is_video=True)
+    assert [frame.timestamp for frame in media.frames][:3] == [0.0, 1.0, 2.0]
+    assert all(frame.path.exists() for frame in media.frames)
+
+    reloaded = await MediaCache(str(tmp_path / "cache"), frame_interval=1.0).get_media("https://example.com/bug.mp4", True)
+    assert [frame.sha256 for frame in reloaded.frames] == [frame.sha256 for frame in media.frames]
+
+
+@pytest.mark.asyncio
+async def test_a_hanging_ffmpeg_is_killed(tmp_path, monkeypatch):
+    hanging_ffmpeg = tmp_path / "ffmpeg"
+    hanging_ffmpeg.write_text("#!/bin/sh\nexec sleep 30\n")
+    hanging_ffmpeg.chmod(0o755)
+    monkeypatch.setattr("backend.services.media_cache.shutil.which", lambda name: str(hanging_ffmpeg))
+    cache = MediaCache(str(tmp_path / "cache"), frame_extraction_timeout=0.5)
+
+    async def fake_download(self, url, tmp_dir):
+        target = tmp_dir / "media.mp4"
+        target.write_bytes(b"not really a video")
+        return target
+
+    monkeypatch.setattr(MediaCache, "_download_direct", fake_download)
+    monkeypatch.setattr("backend.services.media_cache._ytdlp_available", lambda: False)
+
+    media = await asyncio.wait_for(cache.get_media("https://example.com/bug.mp4", is_video=True), timeout=10)
+    assert media is not None and media.frames == []
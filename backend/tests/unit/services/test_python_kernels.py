@@ -0,0 +1,171 @@
+import asyncio
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import pytest
+from mcp import ClientSession, StdioServerParameters
+from mcp.shared.exceptions import McpError
+from mcp.types import ErrorData
+
+from backend.ai.python_agent import PythonRetryState
+from backend.services.python_kernels import KernelTimeoutError, PythonKernelManager
+
+# Stand-in for mcp-server-ds: same tool names, state kept in a module-level dict
+FAKE_SERVER = textwrap.dedent('''
+    import contextlib, io
+    from mcp.server.fastmcp import FastMCP
+
+    server = FastMCP("fake-ds")
+    data = {}
+
+    @server.tool(name="load-csv")
+    def load_csv(csv_path: str, df_name: str = None) -> str:
+        name = df_name or f"df_{len(data) + 1}"
+        data[name] = [line.split(",") for line in open(csv_path).read().splitlines()]
+        return f"Successfully loaded CSV into dataframe '{name}'"
+
+    @server.tool(name="run-script")
+    def run_script(script: str, save_to_memory: list = None) -> str:
+        local_dict = dict(data)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            exec(script, {}, local_dict)
+        for name in save_to_memory or []:
+            data[name] = local_dict[name]
+        return out.getvalue()
+
+    server.run()
+''')
+
+
+@pytest.fixture
+def manager(tmp_path):
+    server = tmp_path / "fake_ds.py"
+    server.write_text(FAKE_SERVER)
+    params = StdioServerParameters(command=sys.executable, args=[str(server)])
+    return PythonKernelManager(timeout=10, max_memory_mb=0, idle_timeout=60, max_kernels=2, server_params=params)
+
+
+@pytest.mark.asyncio
+async def test_variables_persist_across_calls(tmp_path, manager):
+    csv_path = tmp_path / "hosts.csv"
+    csv_path.write_text("web-1,200\nweb-2,503\n")
+    kernel = manager.get_kernel("nb-1")
+    try:
+        assert await kernel.list_variables() == []  # not started yet
+        await kernel.load_csv(str(csv_path), "hosts")
+        await kernel.run_script("errors = [r for r in hosts if r[1] != '200']", save_to_memory=["errors"])
+        assert (await kernel.run_script("print(len(hosts), errors[0][0])")).strip() == "2 web-2"
+
+        variables = {v["name"]: v for v in await kernel.list_variables()}
+        assert set(variables) == {"hosts", "errors"}
+        assert variables["hosts"]["type"] == "list"
+        assert manager.get_kernel("nb-1") is kernel
+        assert manager.get_kernel("nb-2") is not kernel
+    finally:
+        await manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_timeout_restarts_the_kernel(manager):
+    manager.timeout = 1
+    kernel = manager.get_kernel("nb-1")
+    kernel.timeout = 1
+    try:
+        await kernel.run_script("x = 1", save_to_memory=["x"])
+        with pytest.raises(KernelTimeoutError):
+            await kernel.run_script("import time; time.sleep(30)")
+        assert not kernel.running
+        # The next call starts a fresh process without the old variables
+        assert (await kernel.run_script("print('x' in dir())")).strip() == "False"
+        assert kernel.restarts == 1
+    finally:
+        await manager.shutdown()
+
+
+
+@pytest.mark.asyncio
+async def test_a_failed_request_does_not_stop_the_kernel(monkeypatch, manager):
+    original_call_tool = ClientSession.call_tool
+
+    async def call_tool(self, name, arguments=None, *args, **kwargs):
+        if name == "rejected-tool":
+            raise McpError(ErrorData(code=-32602, message="Invalid params"))
+        return await original_call_tool(self, name, arguments, *args, **kwargs)
+
+    monkeypatch.setattr(ClientSession, "call_tool", call_tool)
+    kernel = manager.get_kernel("nb-1")
+    try:
+        await kernel.run_script("x = 1", save_to_memory=["x"])
+        with pytest.raises(McpError):
+            await kernel.call_tool("rejected-tool", {})
+        assert kernel.running
+        assert (await kernel.run_script("print(x)")).strip() == "1"
+        assert kernel.restarts == 0
+    finally:
+        await manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_retry_after_a_timeout_asks_to_reload_data(tmp_path, manager):
+    csv_path = tmp_path / "hosts.csv"
+    csv_path.write_text("web-1,200\n")
+    kernel = manager.get_kernel("nb-1")
+    kernel.timeout = 1
+    state = PythonRetryState()
+    try:
+        # Attempt 1 loads data, then a script times out
+        started_at = state.begin_attempt(kernel)
+        output = await kernel.load_csv(str(csv_path), "hosts")
+        state.record_tool_result("load_csv", {"csv_path": str(csv_path), "df_name": "hosts"}, {"status": "success", "stdout": output})
+        with pytest.raises(KernelTimeoutError) as timeout:
+            await kernel.run_script("import time; time.sleep(30)")
+        state.record_attempt(1, started_at, False, str(timeout.value))
+
+        prompt = state.build_retry_prompt("Base instructions", 1, str(timeout.value))
+        assert "session was restarted" in prompt and "do NOT call load_csv" not in prompt
+        assert state.loaded_dataframes == {}
+
+        # Attempt 2 reloads on the new process; a later failure keeps that state
+        started_at = state.begin_attempt(kernel)
+        output = await kernel.load_csv(str(csv_path), "hosts")
+        state.record_tool_result("load_csv", {"csv_path": str(csv_path), "df_name": "hosts"}, {"status": "success", "stdout": output})
+        state.record_attempt(2, started_at, False, "UnexpectedModelBehavior")
+        prompt = state.build_retry_prompt("Base instructions", 2, "UnexpectedModelBehavior")
+        assert "still running" in prompt and "hosts (from" in prompt
+    finally:
+        await manager.shutdown()
+
+@pytest.mark.asyncio
+async def test_idle_and_excess_kernels_are_evicted(manager):
+    try:
+        first = manager.get_kernel("nb-1")
+        second = manager.get_kernel("nb-2")
+        await first.run_script("pass")
+        await second.run_script("pass")
+
+        # The limit is two live kernels: a third evicts the least recently used one
+        third = manager.get_kernel("nb-3")
+        await asyncio.sleep(0.5)
+        assert not first.running and second.running
+        assert manager.get_kernel("nb-1") is not first
+
+        await third.run_script("pass")
+        manager.idle_timeout = 0
+        await asyncio.sleep(0.01)
+        assert await manager.evict_idle() == 3
+        assert not second.running and not third.running
+    finally:
+        await manager.shutdown()
+
+
+def test_memory_limit_is_applied_to_the_server_process():
+    allocate = "x = bytearray(512 * 1024 * 1024)"
+    result = subprocess.run(
+        [sys.executable, "-m", "backend.services.python_kernels", "256", sys.executable, "-c", allocate],
+        capture_output=True, text=True, cwd=Path(__file__).parents[4],
+    )
+    assert result.returncode != 0
+    assert "MemoryError" in result.stderr
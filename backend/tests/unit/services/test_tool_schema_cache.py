@@ -0,0 +1,74 @@
+import pytest
+
+from backend.core.types import MCPToolInfo
+from backend.services import tool_schema_cache as tool_schema_cache_module
+from backend.services.tool_schema_cache import ToolSchemaCache
+
+
+class Discovery:
+    def __init__(self, *names):
+        self.names = names
+        self.calls = 0
+        self.error = None
+
+    async def __call__(self):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return [MCPToolInfo(name=name, inputSchema={"type": "object"}) for name in self.names]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(tool_schema_cache_module.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.mark.asyncio
+async def test_schemas_are_fetched_once_and_survive_a_restart(tmp_path, clock):
+    path = str(tmp_path / "schemas.json")
+    discover = Discovery("search_code", "get_issue")
+    cache = ToolSchemaCache(path, ttl=60)
+
+    first = await cache.get("github", {"token": "a"}, discover)
+    again = await cache.get("github", {"token": "a"}, discover)
+    assert [t.name for t in first] == [t.name for t in again] == ["search_code", "get_issue"]
+    assert discover.calls == 1
+
+    restarted = ToolSchemaCache(path, ttl=60)
+    assert restarted.is_fresh("github", {"token": "a"})
+    assert [t.name for t in await restarted.get("github", {"token": "a"}, discover)] == ["search_code", "get_issue"]
+    assert discover.calls == 1 and restarted.cached_types() == ["github"]
+
+
+@pytest.mark.asyncio
+async def test_ttl_refresh_and_config_changes_trigger_discovery(tmp_path, clock):
+    cache = ToolSchemaCache(str(tmp_path / "schemas.json"), ttl=60)
+    discover = Discovery("read_file")
+
+    await cache.get("filesystem", {"allowed_directories": ["/a"]}, discover)
+    await cache.get("filesystem", {"allowed_directories": ["/a"]}, discover, refresh=True)
+    assert discover.calls == 2
+    clock[0] += 61
+    await cache.get("filesystem", {"allowed_directories": ["/a"]}, discover)
+    assert discover.calls == 3
+
+    await cache.get("filesystem", {"allowed_directories": ["/b"]}, discover)
+    assert discover.calls == 4
+    assert not cache.is_fresh("filesystem", {"allowed_directories": ["/a"]})  # superseded by the new config
+
+    cache.invalidate("filesystem")
+    assert cache.cached_types() == []
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_serves_previous_schemas(tmp_path, clock):
+    cache = ToolSchemaCache(str(tmp_path / "schemas.json"), ttl=60)
+    discover = Discovery("search_code")
+    await cache.get("github", {}, discover)
+
+    discover.error = ValueError("Timeout listing tools via MCP for github")
+    assert [t.name for t in await cache.get("github", {}, discover, refresh=True)] == ["search_code"]
+    with pytest.raises(ValueError):
+        await cache.get("jira", {}, discover)
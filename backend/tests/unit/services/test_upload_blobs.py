@@ -0,0 +1,110 @@
+import hashlib
+import os
+import time
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from backend.db.models import Base, UploadBlob, UploadedFile
+from backend.services.upload_blobs import UploadBlobStore
+
+
+@pytest_asyncio.fixture
+async def db():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[UploadBlob.__table__, UploadedFile.__table__])
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        yield session
+    await engine.dispose()
+
+
+async def _upload(store, db, session_id, filename, data):
+    staged = await store.new_staging_path()
+    staged.write_bytes(data)
+    sha256 = hashlib.sha256(data).hexdigest()
+    blob_path, deduplicated = await store.add_reference(db, staged, sha256, len(data))
+    row = UploadedFile(session_id=session_id, filename=filename, filepath=blob_path, blob_sha256=sha256, size=len(data))
+    db.add(row)
+    await db.commit()
+    assert not staged.exists()
+    return row, deduplicated
+
+
+async def _ref_count(db, sha256):
+    return (await db.execute(select(UploadBlob.ref_count).where(UploadBlob.sha256 == sha256))).scalar_one_or_none()
+
+
+@pytest.mark.asyncio
+async def test_identical_uploads_share_one_blob(tmp_path, db):
+    store = UploadBlobStore(str(tmp_path))
+    first, dedup_first = await _upload(store, db, "s1", "app.log", b"same bytes")
+    second, dedup_second = await _upload(store, db, "s2", "app.log", b"same bytes")
+    # Same name in one session no longer overwrites the earlier file
+    third, _ = await _upload(store, db, "s1", "app.log", b"other bytes")
+
+    assert (dedup_first, dedup_second) == (False, True)
+    assert first.filepath == second.filepath != third.filepath
+    assert (tmp_path / first.filepath).read_bytes() == b"same bytes"
+    assert (tmp_path / third.filepath).read_bytes() == b"other bytes"
+    assert await _ref_count(db, first.blob_sha256) == 2
+
+    blob = await store.reference_existing(db, first.blob_sha256)
+    assert blob is not None and blob.size == len(b"same bytes")
+    assert await store.reference_existing(db, "f" * 64) is None
+    await db.rollback()
+
+
+@pytest.mark.asyncio
+async def test_blob_is_collected_after_last_reference(tmp_path, db):
+    store = UploadBlobStore(str(tmp_path))
+    first, _ = await _upload(store, db, "s1", "a.log", b"shared")
+    await _upload(store, db, "s2", "b.log", b"shared")
+    blob_file = tmp_path / first.filepath
+
+    assert await store.release_session(db, "s1") == 1
+    await db.commit()
+    assert await store.collect_garbage(db) == 0
+    assert blob_file.exists()
+
+    await store.release_session(db, "s2")
+    await db.commit()
+    assert await store.collect_garbage(db) == 1
+    assert not blob_file.exists()
+    assert await _ref_count(db, first.blob_sha256) is None
+    assert [p for p in tmp_path.rglob("*") if p.is_file()] == []
+
+
+@pytest.mark.asyncio
+async def test_orphan_blob_files_are_swept_after_grace(tmp_path, db):
+    store = UploadBlobStore(str(tmp_path), orphan_grace_seconds=60)
+    sha256 = "ab" * 32
+    orphan = store.blob_path(sha256)
+    orphan.parent.mkdir(parents=True)
+    orphan.write_bytes(b"left behind by a failed transaction")
+
+    assert await store.collect_garbage(db) == 0
+    old = time.time() - 120
+    os.utime(orphan, (old, old))
+    assert await store.collect_garbage(db) == 1
+    assert not orphan.exists()
+
+
+@pytest.mark.asyncio
+async def test_abandoned_staged_uploads_are_swept_after_grace(tmp_path, db):
+    store = UploadBlobStore(str(tmp_path), orphan_grace_seconds=60)
+    staged = await store.new_staging_path()
+    staged.write_bytes(b"request died mid-upload")
+    resumable = store.staging_dir / "abc.part"
+    resumable.write_bytes(b"resumable upload data")
+
+    await store.collect_garbage(db)
+    assert staged.exists()
+    old = time.time() - 120
+    os.utime(staged, (old, old))
+    os.utime(resumable, (old, old))
+    await store.collect_garbage(db)
+    assert not staged.exists()
+    assert resumable.exists()
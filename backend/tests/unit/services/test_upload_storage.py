@@ -0,0 +1,99 @@
+import hashlib
+
+import pytest
+
+from backend.services.upload_storage import (
+    ResumableUploadStore,
+    UploadChecksumError,
+    UploadOffsetError,
+    UploadTooLargeError,
+    safe_filename,
+    stream_to_file,
+)
+
+
+async def _chunks(*parts):
+    for part in parts:
+        yield part
+
+
+def _store(tmp_path, max_bytes=100, max_chunk_bytes=10):
+    return ResumableUploadStore(str(tmp_path), max_bytes=max_bytes, max_chunk_bytes=max_chunk_bytes, read_chunk_bytes=4)
+
+
+def test_safe_filename():
+    assert safe_filename("../../etc/passwd") == "passwd"
+    assert safe_filename("C:\\logs\\app.log") == "app.log"
+    assert safe_filename("..").startswith("upload_")
+    assert safe_filename(None).startswith("upload_")
+
+
+@pytest.mark.asyncio
+async def test_stream_to_file_hashes_and_enforces_limit(tmp_path):
+    dest = tmp_path / "out.bin"
+    written, digest = await stream_to_file(_chunks(b"abc", b"def"), dest, max_bytes=6)
+    assert written == 6
+    assert digest == hashlib.sha256(b"abcdef").hexdigest()
+    assert dest.read_bytes() == b"abcdef"
+
+    with pytest.raises(UploadTooLargeError):
+        await stream_to_file(_chunks(b"abc", b"defg"), dest, max_bytes=6)
+    assert not dest.exists()
+
+
+@pytest.mark.asyncio
+async def test_create_rejects_oversized_upload(tmp_path):
+    with pytest.raises(UploadTooLargeError):
+        await _store(tmp_path).create("s1", "big.log", 101)
+
+
+@pytest.mark.asyncio
+async def test_chunks_must_continue_at_current_offset(tmp_path):
+    store = _store(tmp_path)
+    upload = await store.create("s1", "app.log", 8)
+    upload = await store.append(upload, 0, _chunks(b"abcd"), content_length=4)
+    assert upload.offset == 4
+
+    with pytest.raises(UploadOffsetError) as exc_info:
+        await store.append(upload, 0, _chunks(b"abcd"), content_length=4)
+    assert exc_info.value.expected_offset == 4
+
+    # Content-Length is checked against what is left before reading the body
+    with pytest.raises(UploadTooLargeError):
+        await store.append(upload, 4, _chunks(b"efghi"), content_length=5)
+    # A body longer than announced is cut off and the partial bytes are discarded
+    with pytest.raises(UploadTooLargeError):
+        await store.append(upload, 4, _chunks(b"ef", b"ghi"), content_length=None)
+    assert store.part_path(upload.upload_id).read_bytes() == b"abcd"
+
+
+@pytest.mark.asyncio
+async def test_upload_resumes_after_restart_and_verifies_checksum(tmp_path):
+    data = b"0123456789abcdef"
+    store = _store(tmp_path)
+    upload = await store.create("s1", "app.log", len(data), sha256=hashlib.sha256(data).hexdigest())
+    await store.append(upload, 0, _chunks(data[:10]), content_length=10)
+
+    # A new store (server restart) picks up the record and re-hashes the partial file
+    restarted = _store(tmp_path)
+    upload = await restarted.get(upload.upload_id)
+    assert upload.offset == 10 and not upload.complete
+    upload = await restarted.append(upload, 10, _chunks(data[10:]), content_length=6)
+    assert upload.complete
+
+    dest = tmp_path / "s1" / "app.log"
+    assert await restarted.finish(upload, dest) == hashlib.sha256(data).hexdigest()
+    assert dest.read_bytes() == data
+    assert await restarted.get(upload.upload_id) is None
+
+
+@pytest.mark.asyncio
+async def test_checksum_mismatch_discards_upload(tmp_path):
+    store = _store(tmp_path)
+    upload = await store.create("s1", "app.log", 3, sha256="0" * 64)
+    upload = await store.append(upload, 0, _chunks(b"abc"), content_length=3)
+
+    with pytest.raises(UploadChecksumError):
+        await store.finish(upload, tmp_path / "s1" / "app.log")
+    assert await store.get(upload.upload_id) is None
+    assert not store.part_path(upload.upload_id).exists()
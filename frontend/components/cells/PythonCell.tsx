@@ -23,6 +23,7 @@ import { githubLight } from '@uiw/codemirror-theme-github'; // Or choose another
 import type { ViewUpdate } from "@codemirror/view"; // Import type for onChange handler
 
 import { type Cell } from "@/store/types"
+import { BACKEND_URL } from "@/config/api-config"
 
 // Helper for debouncing
 function debounce<F extends (...args: any[]) => any>(func: F, waitFor: number) {
@@ -39,6 +40,62 @@ function debounce<F extends (...args: any[]) => any>(func: F, waitFor: number) {
   return debounced as (...args: Parameters<F>) => void;
 }
 
+// Typed preview of a DataFrame stored as an artifact (see backend/services/artifact_store.py)
+interface DataFramePreview {
+  columns: { name: string; type: string }[];
+  rows: any[][];
+  total_rows: number;
+  truncated: boolean;
+}
+
+const artifactUrl = (artifactId: string, thumbnail = false) =>
+  `${BACKEND_URL}/api/artifacts/${artifactId}${thumbnail ? "?thumbnail=true" : ""}`;
+
+const ArtifactDataFrame: React.FC<{ artifactId: string }> = ({ artifactId }) => {
+  const [preview, setPreview] = useState<DataFramePreview | null>(null);
+  const [error, setError] = useState<string | null>(null);
+
+  useEffect(() => {
+    let cancelled = false;
+    fetch(artifactUrl(artifactId))
+      .then(response => {
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        return response.json();
+      })
+      .then(data => { if (!cancelled) setPreview(data); })
+      .catch(err => { if (!cancelled) setError(String(err)); });
+    return () => { cancelled = true; };
+  }, [artifactId]);
+
+  if (error) return <div className="text-red-600 text-xs">Could not load DataFrame preview: {error}</div>;
+  if (!preview) return <div className="text-gray-500 text-xs">Loading DataFrame...</div>;
+  return (
+    <div className="markdown-table-container my-1 border rounded p-1 bg-white overflow-x-auto">
+      <table className="text-xs">
+        <thead>
+          <tr>
+            {preview.columns.map(column => (
+              <th key={column.name} className="px-1.5 py-0.5 text-left font-medium" title={column.type}>{column.name}</th>
+            ))}
+          </tr>
+        </thead>
+        <tbody>
+          {preview.rows.map((row, rowIndex) => (
+            <tr key={rowIndex} className="border-t">
+              {row.map((value, colIndex) => (
+                <td key={colIndex} className="px-1.5 py-0.5">{value === null ? "" : String(value)}</td>
+              ))}
+            </tr>
+          ))}
+        </tbody>
+      </table>
+      {preview.truncated && (
+        <div className="text-gray-500 text-xs mt-1">Showing {preview.rows.length} of {preview.total_rows} rows</div>
+      )}
+    </div>
+  );
+};
+
 // Define the expected structure of the result content from the Python MCP server
 interface PythonExecutionResult {
   status: 'success' | 'error';
@@ -46,6 +103,7 @@ interface PythonExecutionResult {
   stderr?: string | null;
   return_value?: any | null; // Can be any JSON-serializable type
   dependencies?: string[] | null;
+  artifacts?: { kind: 'plot' | 'dataframe'; id: string }[] | null; // Plots / DataFrames referenced from stdout
   error_details?: { // If status is 'error'
     type: string;
     message: string;
@@ -357,6 +415,7 @@ const PythonCellComponent: React.FC<PythonCellProps> = ({ cell, onExecute, onUpd
     const dfRegex = /--- DataFrame ---\n([\s\S]*?)\n--- End DataFrame ---/g;
     const plotRegex = /<PLOT_BASE64>(.*?)<\/PLOT_BASE64>/g;
     const jsonRegex = /<JSON_OUTPUT>(.*?)<\/JSON_OUTPUT>/g;
+    const artifactRegex = /<ARTIFACT kind="(plot|dataframe)" id="([0-9a-f]{64}\.(?:png|jpg|json))"[^>]*\/>/g;
 
     const processChunk = (text: string) => {
       if (text.trim()) {
@@ -373,12 +432,16 @@ const PythonCellComponent: React.FC<PythonCellProps> = ({ cell, onExecute, onUpd
       { regex: dfRegex, type: 'dataframe' },
       { regex: plotRegex, type: 'plot' },
       { regex: jsonRegex, type: 'json' },
+      { regex: artifactRegex, type: 'artifact' },
     ];
     const allMatches: { index: number; length: number; type: string; content: string }[] = [];
     markers.forEach(({ regex, type }) => {
       let match;
       while ((match = regex.exec(stdout)) !== null) {
-        allMatches.push({ index: match.index, length: match[0].length, type, content: match[1] });
+        // Artifact references carry their kind in the first group and the artifact id in the second
+        const matchType = type === 'artifact' ? `artifact-${match[1]}` : type;
+        const content = type === 'artifact' ? match[2] : match[1];
+        allMatches.push({ index: match.index, length: match[0].length, type: matchType, content });
       }
     });
     allMatches.sort((a, b) => a.index - b.index);
@@ -399,6 +462,19 @@ const PythonCellComponent: React.FC<PythonCellProps> = ({ cell, onExecute, onUpd
             className="my-1 max-w-full h-auto border rounded"
           />
         );
+      } else if (match.type === 'artifact-plot') {
+        outputParts.push(
+          <a key={`artifact-plot-${match.index}`} href={artifactUrl(match.content)} target="_blank" rel="noopener noreferrer">
+            <img
+              src={artifactUrl(match.content, true)}
+              alt="Generated Plot"
+              loading="lazy"
+              className="my-1 max-w-full h-auto border rounded"
+            />
+          </a>
+        );
+      } else if (match.type === 'artifact-dataframe') {
+        outputParts.push(<ArtifactDataFrame key={`artifact-df-${match.index}`} artifactId={match.content} />);
       } else if (match.type === 'json') {
         try {
           const parsedJson = JSON.parse(match.content);
@@ -7,6 +7,7 @@ import { Plus, Trash } from "lucide-react"
 interface FileSystemConnectionFormProps {
   config: {
     allowed_directories?: string[]
+    content_index?: boolean
   }
   onConfigChange: (field: string, value: any) => void
 }
@@ -69,6 +70,19 @@ const FileSystemConnectionForm: React.FC<FileSystemConnectionFormProps> = ({ con
           <Plus className="mr-2 h-4 w-4" /> Add Directory
         </Button>
       </div>
+      <div className="flex items-center space-x-2">
+        <input
+          type="checkbox"
+          id="content_index"
+          checked={config?.content_index === true}
+          onChange={(e) => onConfigChange("content_index", e.target.checked)}
+          className="form-checkbox h-4 w-4 text-primary border-gray-300 rounded focus:ring-primary"
+        />
+        <Label htmlFor="content_index" className="cursor-pointer">Build content index</Label>
+      </div>
+      <p className="text-xs text-muted-foreground -mt-3 ml-6">
+        Indexes file contents in the background so content searches over large log directories stay fast.
+      </p>
     </div>
   )
 }
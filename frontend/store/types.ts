@@ -8,6 +8,7 @@ export const CellStatusSchema = z.enum([
   "success",
   "error",
   "stale",
+  "streaming",
 ])
 export type CellStatus = z.infer<typeof CellStatusSchema>
 